@@ -123,3 +123,17 @@ def mock_media(settings):
     
     # Cleanup
     shutil.rmtree(temp_media_root, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def reset_suggestion_cache():
+    """
+    The suggestion cache is per process: drop indexes and pending usage
+    counters between tests (primary keys are reused after rollback).
+    """
+    from django.core.cache import cache
+    from grading.suggestions import get_suggestion_cache
+    get_suggestion_cache().clear()
+    cache.clear()
+    yield
+    get_suggestion_cache().clear()
@@ -0,0 +1,68 @@
+"""
+ASGI entry point, served by the backend-stream service (uvicorn) for long-lived
+streaming responses (grading.views_stream). Everything else stays on gunicorn
+(core.wsgi).
+
+Django 4.2 keeps consuming a streaming response after the client has gone
+away. CancelOnDisconnect listens for http.disconnect once the response has
+started and cancels it, which closes the async iterator; StreamingASGIHandler
+still closes the response (request_finished, request body) when cancelled.
+"""
+import asyncio
+import contextlib
+import os
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+
+class StreamingASGIHandler(ASGIHandler):
+    async def send_response(self, response, send):
+        try:
+            await super().send_response(response, send)
+        except asyncio.CancelledError:
+            await sync_to_async(response.close, thread_sensitive=True)()
+            raise
+
+
+class CancelOnDisconnect:
+    """Cancel the wrapped HTTP application when the client disconnects during the response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = asyncio.Event()
+
+        async def send_start(message):
+            await send(message)
+            if message['type'] == 'http.response.start':
+                started.set()
+
+        async def wait_for_disconnect():
+            await started.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        response = asyncio.ensure_future(self.app(scope, receive, send_start))
+        disconnect = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await asyncio.wait({response, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect.cancel()
+            if not response.done():
+                response.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await response
+        if not response.cancelled():
+            response.result()
+
+
+django.setup(set_prefix=False)
+application = CancelOnDisconnect(StreamingASGIHandler())
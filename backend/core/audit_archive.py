@@ -0,0 +1,232 @@
+"""
+Audit Archive - Rétention des journaux d'audit (AuditLog, GradingEvent)
+
+Les tables d'audit ne font que grossir (connexions, téléchargements,
+annotations). Les lignes plus anciennes que AUDIT_RETENTION_MONTHS sont
+exportées dans des fichiers JSONL compressés, un par jour et par modèle,
+puis supprimées de la base par lots : la table ne garde qu'une fenêtre
+glissante et ses index restent petits.
+
+Arborescence (AUDIT_ARCHIVE_ROOT) :
+    manifest.json
+    core.auditlog/2025/01/2025-01-03.jsonl.gz
+    grading.gradingevent/2025/01/2025-01-03.jsonl.gz
+    grading.gradingevent/2025/01/2025-01-03.part2.jsonl.gz   (export ultérieur du même jour)
+
+Le manifeste décrit chaque shard (modèle, jour, nombre de lignes, sha256,
+premier/dernier horodatage). Un shard et le manifeste sont écrits avant la
+suppression des lignes correspondantes : après une interruption, un nouvel
+export peut dupliquer des lignes, jamais en perdre (la lecture dédoublonne
+par id).
+
+Usage:
+    python manage.py archive_audit_logs --months 12
+    search_archive('grading.gradingevent', copy_id=copy.id)
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+AUDIT_MODELS = ('core.auditlog', 'grading.gradingevent')
+MANIFEST_NAME = 'manifest.json'
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder, mais horodatages à la microseconde (pas de troncature)."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def archive_root():
+    return str(settings.AUDIT_ARCHIVE_ROOT)
+
+
+def retention_cutoff(months, now=None):
+    """Même jour, `months` mois plus tôt (borné à la fin du mois), à minuit UTC."""
+    now = now or timezone.now()
+    month_index = now.year * 12 + (now.month - 1) - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    day = min(now.day, (next_month - datetime.timedelta(days=1)).day)
+    return datetime.datetime(year, month, day, tzinfo=datetime.timezone.utc)
+
+
+def load_manifest(root=None):
+    path = os.path.join(root or archive_root(), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'version': 1, 'shards': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, root=None):
+    root = root or archive_root()
+    os.makedirs(root, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=root, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST_NAME))
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _shard_path(root, label, day):
+    base = os.path.join(label, f"{day:%Y}", f"{day:%m}", f"{day:%Y-%m-%d}")
+    path, part = f"{base}.jsonl.gz", 1
+    while os.path.exists(os.path.join(root, path)):
+        part += 1
+        path = f"{base}.part{part}.jsonl.gz"
+    return path
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_shard(root, label, day, rows):
+    """Écrit un shard (écriture atomique) et retourne son entrée de manifeste."""
+    rel_path = _shard_path(root, label, day)
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.tmp')
+    os.close(fd)
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, cls=ArchiveJSONEncoder, sort_keys=True))
+            f.write('\n')
+    digest = _sha256(tmp)
+    os.replace(tmp, full_path)
+
+    return {
+        'model': label,
+        'date': day.isoformat(),
+        'path': rel_path,
+        'rows': len(rows),
+        'sha256': digest,
+        'first': rows[0]['timestamp'].isoformat(),
+        'last': rows[-1]['timestamp'].isoformat(),
+        'created_at': timezone.now().isoformat(),
+    }
+
+
+def archive_model(label, cutoff, root=None, batch_size=1000, dry_run=False):
+    """
+    Exporte puis supprime les lignes de `label` antérieures à `cutoff`, jour
+    par jour (un shard par jour : la mémoire reste bornée à une journée).
+
+    Returns:
+        dict: {'rows': lignes archivées, 'shards': [entrées de manifeste]}
+    """
+    root = root or archive_root()
+    model = apps.get_model(label)
+    fields = _fields(model)
+    queryset = model.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return {'rows': queryset.count(), 'shards': []}
+
+    manifest = load_manifest(root)
+    summary = {'rows': 0, 'shards': []}
+
+    def close_day(day, rows):
+        entry = _write_shard(root, label, day, rows)
+        manifest['shards'].append(entry)
+        save_manifest(manifest, root)
+        # Shard et manifeste écrits : suppression par lots
+        pks = [row[model._meta.pk.attname] for row in rows]
+        for start in range(0, len(pks), batch_size):
+            model.objects.filter(pk__in=pks[start:start + batch_size]).delete()
+        summary['rows'] += len(rows)
+        summary['shards'].append(entry)
+
+    day, rows = None, []
+    ordered = queryset.order_by('timestamp', 'pk').values(*fields)
+    for row in ordered.iterator(chunk_size=batch_size):
+        row_day = row['timestamp'].astimezone(datetime.timezone.utc).date()
+        if day is not None and row_day != day:
+            close_day(day, rows)
+            rows = []
+        day = row_day
+        rows.append(row)
+    if rows:
+        close_day(day, rows)
+    return summary
+
+
+def _matches(row, filters):
+    return all(str(row.get(key)) == str(value) for key, value in filters.items())
+
+
+def search_archive(label, start=None, end=None, root=None, limit=None, **filters):
+    """
+    Lignes archivées de `label` (dicts, champs = attnames du modèle), du plus
+    récent au plus ancien. Seuls les shards dont le jour recoupe [start, end]
+    sont lus. `filters` : égalité sur un champ (ex. copy_id=..., action=...).
+    """
+    root = root or archive_root()
+    start_day = start.astimezone(datetime.timezone.utc).date().isoformat() if start else None
+    end_day = end.astimezone(datetime.timezone.utc).date().isoformat() if end else None
+
+    days = {}
+    for shard in load_manifest(root)['shards']:
+        if shard['model'] != label:
+            continue
+        if (start_day and shard['date'] < start_day) or (end_day and shard['date'] > end_day):
+            continue
+        days.setdefault(shard['date'], []).append(shard['path'])
+
+    seen, results = set(), []
+    for day in sorted(days, reverse=True):
+        day_rows = []
+        for path in days[day]:
+            with gzip.open(os.path.join(root, path), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    timestamp = parse_datetime(row['timestamp'])
+                    if (start and timestamp < start) or (end and timestamp > end):
+                        continue
+                    if not _matches(row, filters) or row['id'] in seen:
+                        continue
+                    seen.add(row['id'])
+                    day_rows.append(row)
+        day_rows.sort(key=lambda r: parse_datetime(r['timestamp']), reverse=True)
+        results.extend(day_rows)
+        if limit is not None and len(results) >= limit:
+            return results[:limit]
+    return results
+
+
+def verify_archive(root=None):
+    """Shards manquants ou altérés (sha256) : liste de chemins."""
+    root = root or archive_root()
+    broken = []
+    for shard in load_manifest(root)['shards']:
+        path = os.path.join(root, shard['path'])
+        if not os.path.exists(path):
+            broken.append(shard['path'])
+            continue
+        if _sha256(path) != shard['sha256']:
+            broken.append(shard['path'])
+    return broken
@@ -0,0 +1,297 @@
+"""
+Backup Format - Sauvegarde de la base en NDJSON compressé, un fichier par modèle
+
+L'ancien format (un seul db_backup_<ts>.json) sérialisait toute la base en
+mémoire, puis la rechargeait entièrement à la restauration : le pic mémoire
+valait plusieurs fois la taille de la base.
+
+Format "ndjson" :
+    manifest.json
+    db/auth.user.ndjson.gz
+    db/exams.exam.ndjson.gz
+    db/exams.copy.ndjson.zst        (--compression zstd, si zstandard est installé)
+
+- chaque modèle est lu par lots (QuerySet.iterator) et écrit ligne par ligne
+  (une ligne = un objet au format du sérialiseur Django "python", M2M inclus) ;
+- le manifeste liste les fichiers dans l'ordre des dépendances FK, avec leur
+  nombre de lignes et leur sha256 ;
+- la restauration vérifie les sommes de contrôle, vide les tables (TRUNCATE
+  sous PostgreSQL, DELETE brut sinon : ni chargement des lignes ni signaux
+  post_delete) puis recharge chaque modèle par lots de bulk_create, dans une
+  seule transaction ; les séquences sont recalées à la fin, et les signaux
+  core.signals.pre_restore / post_restore permettent aux applications de
+  rafraîchir leurs caches (aucun signal par ligne n'est émis).
+
+La mémoire reste bornée à un lot (--batch-size objets, 2000 par défaut),
+quelle que soit la taille de la base.
+
+Usage:
+    python manage.py backup --output-dir /backups            (format ndjson)
+    python manage.py backup_restore backup --format json     (ancien format)
+    python manage.py restore /backups/korrigo_backup_<ts>
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from itertools import islice
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from core.audit_archive import ArchiveJSONEncoder
+from core.signals import post_restore, pre_restore
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'ndjson'
+DB_DIR = 'db'
+EXCLUDED_MODELS = ('contenttypes.ContentType', 'auth.Permission', 'sessions.Session')
+COMPRESSION_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+DEFAULT_BATCH_SIZE = 2000
+
+
+def backup_models():
+    """
+    Modèles sauvegardés, triés pour que chaque modèle vienne après ceux qu'il
+    référence (FK, O2O, M2M). Les cycles éventuels gardent l'ordre des apps
+    (les contraintes FK sont différées jusqu'au commit).
+    """
+    models = [
+        model for model in apps.get_models()
+        if model._meta.label not in EXCLUDED_MODELS and not model._meta.proxy
+    ]
+    included = set(models)
+    dependencies = {}
+    for model in models:
+        related = [f.related_model for f in model._meta.concrete_fields if f.is_relation]
+        related += [
+            f.related_model for f in model._meta.many_to_many
+            if f.remote_field.through._meta.auto_created
+        ]
+        dependencies[model] = {
+            r._meta.concrete_model for r in related
+            if r is not None and r._meta.concrete_model in included and r._meta.concrete_model is not model
+        }
+
+    ordered = []
+    remaining = list(models)
+    while remaining:
+        ready = [m for m in remaining if not (dependencies[m] - set(ordered))]
+        if not ready:
+            # Cycle : on le casse dans l'ordre des apps
+            ready = remaining[:1]
+        ordered.extend(ready)
+        remaining = [m for m in remaining if m not in ready]
+    return ordered
+
+
+def _open(path, mode, compression):
+    if compression == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.open(path, mode, encoding='utf-8')
+    return gzip.open(path, mode, compresslevel=6, encoding='utf-8')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def dump_model(model, path, compression='gzip', batch_size=DEFAULT_BATCH_SIZE):
+    """Écrit toutes les lignes de `model` dans `path` ; retourne le nombre de lignes."""
+    m2m = [
+        f.name for f in model._meta.many_to_many
+        if f.remote_field.through._meta.auto_created
+    ]
+    queryset = model._base_manager.order_by('pk')
+    if m2m:
+        queryset = queryset.prefetch_related(*m2m)
+
+    rows = 0
+    with _open(path, 'wt', compression) as f:
+        for batch in _batches(queryset.iterator(chunk_size=batch_size), batch_size):
+            for item in serializers.serialize('python', batch):
+                f.write(json.dumps(item, cls=ArchiveJSONEncoder))
+                f.write('\n')
+            rows += len(batch)
+    return rows
+
+
+def dump_database(backup_dir, compression='gzip', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Sauvegarde chaque modèle dans backup_dir/db/.
+
+    Returns:
+        list: entrées du manifeste {model, path, rows, bytes, sha256}, dans
+        l'ordre de restauration
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    os.makedirs(os.path.join(backup_dir, DB_DIR), exist_ok=True)
+
+    entries = []
+    for model in backup_models():
+        label = model._meta.label_lower
+        rel_path = f"{DB_DIR}/{label}.ndjson.{COMPRESSION_EXTENSIONS[compression]}"
+        full_path = os.path.join(backup_dir, rel_path)
+        rows = dump_model(model, full_path, compression, batch_size)
+        entries.append({
+            'model': label,
+            'path': rel_path,
+            'rows': rows,
+            'bytes': os.path.getsize(full_path),
+            'sha256': file_sha256(full_path),
+        })
+    return entries
+
+
+def verify_files(backup_dir, entries):
+    """Liste des fichiers manquants ou dont le sha256 ne correspond pas."""
+    problems = []
+    for entry in entries:
+        full_path = os.path.join(backup_dir, entry['path'])
+        if not os.path.exists(full_path):
+            problems.append(f"{entry['path']}: missing")
+        elif file_sha256(full_path) != entry['sha256']:
+            problems.append(f"{entry['path']}: checksum mismatch")
+    return problems
+
+
+def _compression_of(path):
+    return 'zstd' if path.endswith('.zst') else 'gzip'
+
+
+def iter_objects(backup_dir, entry, batch_size=DEFAULT_BATCH_SIZE):
+    """Lots de DeserializedObject lus depuis le fichier d'un modèle."""
+    full_path = os.path.join(backup_dir, entry['path'])
+    with _open(full_path, 'rt', _compression_of(full_path)) as f:
+        for lines in _batches(f, batch_size):
+            yield list(serializers.deserialize('python', [json.loads(line) for line in lines]))
+
+
+@contextmanager
+def _keep_timestamps(model):
+    """bulk_create appelle pre_save : auto_now/auto_now_add écraseraient les dates sauvegardées."""
+    fields = [
+        f for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _m2m_rows(model, deserialized):
+    """Lignes des tables de liaison M2M (auto-créées) des objets d'un lot."""
+    rows = {}
+    for item in deserialized:
+        for name, targets in item.m2m_data.items():
+            field = model._meta.get_field(name)
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            rows.setdefault(through, []).extend(
+                through(**{source: item.object.pk, target: pk}) for pk in targets
+            )
+    return rows
+
+
+def restore_database(backup_dir, entries, batch_size=DEFAULT_BATCH_SIZE, log=None):
+    """
+    Remplace le contenu des modèles sauvegardés par celui de la sauvegarde.
+
+    Tout se passe dans une transaction : en cas d'erreur, la base est intacte.
+
+    Raises:
+        ValueError: fichier manquant / corrompu, ou modèle inconnu
+    """
+    log = log or logger.info
+    problems = verify_files(backup_dir, entries)
+    if problems:
+        raise ValueError(f"Backup integrity check failed: {'; '.join(problems)}")
+
+    by_label = {entry['model']: entry for entry in entries}
+    unknown = set(by_label) - {m._meta.label_lower for m in apps.get_models()}
+    if unknown:
+        raise ValueError(f"Unknown models in backup: {', '.join(sorted(unknown))}")
+    # Ordre des dépendances du code actuel (le schéma peut avoir évolué)
+    models = [m for m in backup_models() if m._meta.label_lower in by_label]
+    through_models = set()
+
+    pre_restore.send(sender=restore_database, models=models)
+    with transaction.atomic():
+        _flush_tables(models)
+
+        for model in models:
+            restored = 0
+            for batch in iter_objects(backup_dir, by_label[model._meta.label_lower], batch_size):
+                restored += len(batch)
+                if model._meta.parents:
+                    # Héritage multi-table : bulk_create impossible, sauvegarde brute (M2M incluses)
+                    for item in batch:
+                        item.save()
+                    continue
+                with _keep_timestamps(model):
+                    model._base_manager.bulk_create([item.object for item in batch], batch_size=batch_size)
+                for through, rows in _m2m_rows(model, batch).items():
+                    through._base_manager.bulk_create(rows, batch_size=batch_size)
+                    through_models.add(through)
+            log(f"{model._meta.label_lower}: {restored} row(s) restored")
+
+        # Les pk ont été insérées explicitement : recaler les séquences (PostgreSQL)
+        statements = connection.ops.sequence_reset_sql(no_style(), models + list(through_models))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    post_restore.send(sender=restore_database, models=models)
+
+
+def _flush_tables(models):
+    """
+    Vide les tables des modèles (et leurs tables M2M) sans passer par le Collector
+    de Django, qui chargerait chaque ligne et émettrait un signal par ligne.
+    Les tables qui les référencent sont vidées aussi (CASCADE, comme delete()).
+    """
+    tables = set()
+    for model in models:
+        tables.add(model._meta.db_table)
+        for field in model._meta.local_many_to_many:
+            if field.remote_field.through._meta.auto_created:
+                tables.add(field.remote_field.through._meta.db_table)
+    statements = connection.ops.sql_flush(no_style(), sorted(tables), allow_cascade=True)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
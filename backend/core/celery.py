@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.app.routes import MapRoute
 from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
@@ -16,12 +17,37 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+
+class QueueTimeLimits:
+    """
+    Task annotations: each task gets the time limits of the queue it is
+    routed to (CELERY_TASK_ROUTES -> CELERY_QUEUE_TIME_LIMITS), so an exam-wide
+    extraction is not killed at the interactive 300 s limit.
+    """
+
+    def annotate(self, task):
+        from django.conf import settings
+
+        route = MapRoute(settings.CELERY_TASK_ROUTES)(task.name) or {}
+        queue = route.get('queue', settings.CELERY_TASK_DEFAULT_QUEUE)
+        hard = settings.CELERY_QUEUE_TIME_LIMITS.get(queue)
+        if hard is None:
+            return None
+        return {'time_limit': hard, 'soft_time_limit': max(hard - 30, 1)}
+
+# Prometheus metrics per task (queue wait, runtime, memory, retries): signal handlers
+import core.celery_metrics  # noqa: E402,F401
+
 # Celery Beat periodic tasks schedule
 app.conf.beat_schedule = {
     'update-copy-status-metrics': {
         'task': 'grading.tasks.update_copy_status_metrics',
         'schedule': 60.0,  # Run every 60 seconds
     },
+    'flush-draft-store': {
+        'task': 'grading.tasks.flush_draft_store',
+        'schedule': float(os.environ.get('DRAFT_FLUSH_INTERVAL_SECONDS', '10')),
+    },
 }
 
 @app.task(bind=True, ignore_result=True)
@@ -0,0 +1,179 @@
+"""
+Prometheus instrumentation of Celery tasks (signal-based, no task changes)
+
+Per task name:
+- celery_task_queue_wait_seconds: publish -> start (time spent in the Redis
+  queue; for countdown/ETA tasks, measured from the ETA);
+- celery_task_runtime_seconds: start -> end;
+- celery_task_peak_rss_delta_bytes: growth of the worker process peak RSS
+  during the task (0 when the task stays under the previous peak);
+- celery_task_retries_total, celery_tasks_total{outcome}.
+
+The publish time travels in the "enqueued_at" message header
+(before_task_publish), so the measure spans web and worker processes.
+
+Worker exposition: with a prefork pool, set PROMETHEUS_MULTIPROC_DIR (the
+child processes write prometheus_client multiprocess files there) and
+CELERY_METRICS_PORT; the worker main process then serves the aggregated
+metrics on that port. Without PROMETHEUS_MULTIPROC_DIR the metrics live in
+core.prometheus.registry (eager tasks show up on the web /metrics endpoint).
+"""
+import logging
+import os
+import resource
+import shutil
+import sys
+import time
+
+from celery.signals import (
+    before_task_publish,
+    celeryd_init,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_process_shutdown,
+    worker_ready,
+)
+from prometheus_client import Counter, Histogram
+
+from core.prometheus import registry
+
+logger = logging.getLogger(__name__)
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+celery_task_queue_wait_seconds = Histogram(
+    'celery_task_queue_wait_seconds',
+    'Time between task publication and start of execution in seconds',
+    ['task'],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0],
+    registry=registry
+)
+
+celery_task_runtime_seconds = Histogram(
+    'celery_task_runtime_seconds',
+    'Task execution time in seconds',
+    ['task'],
+    buckets=[0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, 1800.0],
+    registry=registry
+)
+
+celery_task_peak_rss_delta_bytes = Histogram(
+    'celery_task_peak_rss_delta_bytes',
+    'Growth of the worker process peak RSS during the task in bytes',
+    ['task'],
+    buckets=[0, 1 << 20, 8 << 20, 32 << 20, 64 << 20, 128 << 20, 256 << 20, 512 << 20, 1 << 30, 2 << 30],
+    registry=registry
+)
+
+celery_task_retries_total = Counter(
+    'celery_task_retries_total',
+    'Task retries requested',
+    ['task'],
+    registry=registry
+)
+
+celery_tasks_total = Counter(
+    'celery_tasks_total',
+    'Finished task executions by outcome (SUCCESS, FAILURE, RETRY, ...)',
+    ['task', 'outcome'],
+    registry=registry
+)
+
+# task_id -> (perf_counter au démarrage, pic RSS au démarrage)
+_running = {}
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _eta_timestamp(eta):
+    if not eta:
+        return None
+    if isinstance(eta, str):
+        from datetime import datetime
+        try:
+            eta = datetime.fromisoformat(eta)
+        except ValueError:
+            return None
+    return eta.timestamp()
+
+
+@before_task_publish.connect
+def _stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def _task_started(sender=None, task_id=None, task=None, **kwargs):
+    try:
+        request = task.request
+        enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+        if enqueued_at is None and isinstance(getattr(request, 'headers', None), dict):
+            enqueued_at = request.headers.get(ENQUEUED_AT_HEADER)
+        if enqueued_at is not None and not request.is_eager:
+            ready_at = max(float(enqueued_at), _eta_timestamp(request.eta) or 0)
+            celery_task_queue_wait_seconds.labels(task=task.name).observe(max(time.time() - ready_at, 0))
+        _running[task_id] = (time.perf_counter(), _peak_rss_bytes())
+    except Exception as e:
+        # L'instrumentation ne doit jamais faire échouer une tâche
+        logger.warning(f"Celery metrics (prerun) failed for {getattr(task, 'name', sender)}: {e}")
+
+
+@task_postrun.connect
+def _task_finished(sender=None, task_id=None, task=None, state=None, **kwargs):
+    try:
+        started = _running.pop(task_id, None)
+        if started is not None:
+            start, peak_before = started
+            celery_task_runtime_seconds.labels(task=task.name).observe(time.perf_counter() - start)
+            celery_task_peak_rss_delta_bytes.labels(task=task.name).observe(
+                max(_peak_rss_bytes() - peak_before, 0)
+            )
+        celery_tasks_total.labels(task=task.name, outcome=state or 'UNKNOWN').inc()
+    except Exception as e:
+        logger.warning(f"Celery metrics (postrun) failed for {getattr(task, 'name', sender)}: {e}")
+
+
+@task_retry.connect
+def _task_retried(sender=None, **kwargs):
+    try:
+        celery_task_retries_total.labels(task=sender.name).inc()
+    except Exception as e:
+        logger.warning(f"Celery metrics (retry) failed: {e}")
+
+
+@celeryd_init.connect
+def _reset_multiprocess_dir(**kwargs):
+    # Avant le fork des enfants : on repart de fichiers vides
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+@worker_ready.connect
+def _start_metrics_server(**kwargs):
+    port = os.environ.get('CELERY_METRICS_PORT')
+    if not port:
+        return
+    from prometheus_client import CollectorRegistry, start_http_server
+
+    exposed = registry
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        exposed = CollectorRegistry()
+        multiprocess.MultiProcessCollector(exposed)
+    start_http_server(int(port), registry=exposed)
+    logger.info(f"Celery metrics exposed on :{port}")
+
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **kwargs):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,82 @@
+"""
+Archive old audit rows (AuditLog, GradingEvent) to compressed JSONL shards.
+
+Rows older than the retention window are exported to
+AUDIT_ARCHIVE_ROOT/<model>/<YYYY>/<MM>/<YYYY-MM-DD>.jsonl.gz, recorded in
+AUDIT_ARCHIVE_ROOT/manifest.json, then deleted from the database in batches.
+Archived rows stay searchable through core.audit_archive.search_archive and
+GET /api/audit/?include_archived=true.
+
+Usage:
+    python manage.py archive_audit_logs --dry-run          # Preview only
+    python manage.py archive_audit_logs                    # AUDIT_RETENTION_MONTHS
+    python manage.py archive_audit_logs --months 6 --model grading.gradingevent
+    python manage.py archive_audit_logs --verify           # Check shard checksums
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.audit_archive import (
+    AUDIT_MODELS, archive_model, archive_root, retention_cutoff, verify_archive,
+)
+
+
+class Command(BaseCommand):
+    help = 'Export audit rows older than the retention window to compressed shards, then delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=None,
+            help='Retention window in months (default: AUDIT_RETENTION_MONTHS)',
+        )
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=AUDIT_MODELS,
+            help='Only archive this model (repeatable, default: all audit models)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows fetched / deleted per query (default: 1000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count rows that would be archived without writing or deleting anything',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Verify the checksums of existing shards and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            broken = verify_archive()
+            if broken:
+                raise CommandError(f"{len(broken)} missing or corrupted shard(s): {', '.join(broken)}")
+            self.stdout.write(self.style.SUCCESS("All archived shards match the manifest"))
+            return
+
+        months = options['months'] if options['months'] is not None else settings.AUDIT_RETENTION_MONTHS
+        if months < 1:
+            raise CommandError("--months must be >= 1")
+        cutoff = retention_cutoff(months)
+        dry_run = options['dry_run']
+
+        self.stdout.write(self.style.WARNING(
+            f"Archiving audit rows older than {cutoff:%Y-%m-%d} to {archive_root()} (dry_run={dry_run})"
+        ))
+
+        total = 0
+        for label in options['model'] or AUDIT_MODELS:
+            summary = archive_model(label, cutoff, batch_size=options['batch_size'], dry_run=dry_run)
+            total += summary['rows']
+            verb = 'would be archived' if dry_run else f"archived in {len(summary['shards'])} shard(s)"
+            self.stdout.write(f"  {label}: {summary['rows']} row(s) {verb}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} row(s){' (dry run)' if dry_run else ''}"))
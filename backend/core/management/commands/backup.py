@@ -1,12 +1,13 @@
 import os
 import tempfile
-import zipfile
 from datetime import datetime
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.core import serializers
 import json
 
+from core import backup_format, media_backup
+
 
 class Command(BaseCommand):
     help = 'Backup database and media files'
@@ -23,6 +24,35 @@ class Command(BaseCommand):
             action='store_true',
             help='Include media files in backup'
         )
+        parser.add_argument(
+            '--full-media',
+            action='store_true',
+            help='Archive every media file instead of only those changed since the previous backup'
+        )
+        parser.add_argument(
+            '--media-workers',
+            type=int,
+            default=settings.MEDIA_BACKUP_WORKERS,
+            help='Media archives written in parallel'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['ndjson', 'json'],
+            default='ndjson',
+            help='Database format: ndjson (streamed, one compressed file per model) or json (legacy single file)'
+        )
+        parser.add_argument(
+            '--compression',
+            choices=['gzip', 'zstd'],
+            default='gzip',
+            help='Compression of the ndjson files (zstd requires the zstandard package)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=backup_format.DEFAULT_BATCH_SIZE,
+            help='Objects read/written per batch (ndjson format)'
+        )
 
     def handle(self, *args, **options):
         output_dir = options['output_dir']
@@ -41,51 +71,44 @@ class Command(BaseCommand):
             # Backup database
             db_backup_path = os.path.join(backup_dir, f'db_backup_{timestamp}.json')
             self.stdout.write("Backing up database...")
-            
-            # Get all models to backup (excluding some Django internal ones)
-            from django.apps import apps
-            from django.contrib.contenttypes.models import ContentType
-            
-            # Define models to backup
-            models_to_backup = []
-            for app_config in apps.get_app_configs():
-                for model in app_config.get_models():
-                    # Skip some models that don't need to be backed up
-                    if model._meta.label not in [
-                        'contenttypes.ContentType',
-                        'auth.Permission',
-                        'sessions.Session'
-                    ]:
-                        models_to_backup.append(model)
-            
-            # Serialize data
-            serialized_data = []
-            for model in models_to_backup:
-                data = serializers.serialize('json', model.objects.all(), indent=2)
-                serialized_data.extend(json.loads(data))
-            
-            with open(db_backup_path, 'w') as f:
-                json.dump(serialized_data, f, indent=2, default=str)
-            
-            # Backup media files if requested
+            database_files = None
+            if options['format'] == 'ndjson':
+                database_files = backup_format.dump_database(
+                    backup_dir,
+                    compression=options['compression'],
+                    batch_size=options['batch_size'],
+                )
+            else:
+                self._dump_legacy_json(db_backup_path)
+
+            # Backup media files if requested (incremental against the previous backup)
+            media_summary = None
             if include_media and os.path.exists(settings.MEDIA_ROOT):
-                media_backup_path = os.path.join(backup_dir, f'media_backup_{timestamp}.zip')
                 self.stdout.write("Backing up media files...")
-                with zipfile.ZipFile(media_backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(settings.MEDIA_ROOT):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, settings.MEDIA_ROOT)
-                            zipf.write(file_path, arcname)
+                parent_dir = None
+                if not options['full_media']:
+                    parent_dir = media_backup.find_parent_backup(output_dir, backup_name)
+                media_summary = media_backup.backup_media(
+                    settings.MEDIA_ROOT, backup_dir, parent_dir, workers=options['media_workers'],
+                )
+                self.stdout.write(
+                    f"Media: {media_summary['archived_files']} new/changed file(s) archived, "
+                    f"{media_summary['reused_files']} unchanged (parent: {media_summary['parent'] or 'none'})"
+                )
             
             # Create manifest
             manifest = {
                 'timestamp': timestamp,
+                'format': 'ndjson' if database_files is not None else 'json',
                 'includes_media': include_media,
                 'database_backup': os.path.basename(db_backup_path) if os.path.exists(db_backup_path) else None,
-                'media_backup': os.path.basename(media_backup_path) if include_media and os.path.exists(media_backup_path) else None,
+                'media_backup': None,
+                'media': media_summary,
                 'backup_dir': backup_dir
             }
+            if database_files is not None:
+                manifest['compression'] = options['compression']
+                manifest['database_files'] = database_files
             
             manifest_path = os.path.join(backup_dir, 'manifest.json')
             with open(manifest_path, 'w') as f:
@@ -98,4 +121,26 @@ class Command(BaseCommand):
             
         except Exception as e:
             self.stderr.write(f"Backup failed: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _dump_legacy_json(self, db_backup_path):
+        """Legacy format: whole database in one JSON file (built in memory)."""
+        # Get all models to backup (excluding some Django internal ones)
+        from django.apps import apps
+
+        # Define models to backup
+        models_to_backup = []
+        for app_config in apps.get_app_configs():
+            for model in app_config.get_models():
+                # Skip some models that don't need to be backed up
+                if model._meta.label not in backup_format.EXCLUDED_MODELS:
+                    models_to_backup.append(model)
+
+        # Serialize data
+        serialized_data = []
+        for model in models_to_backup:
+            data = serializers.serialize('json', model.objects.all(), indent=2)
+            serialized_data.extend(json.loads(data))
+
+        with open(db_backup_path, 'w') as f:
+            json.dump(serialized_data, f, indent=2, default=str)
@@ -3,11 +3,13 @@ import tempfile
 import zipfile
 import logging
 from datetime import datetime
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from django.core import serializers
 import json
 
+from core import backup_format, media_backup
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,11 +40,40 @@ class Command(BaseCommand):
             action='store_true',
             help='Include media files in backup'
         )
+        parser.add_argument(
+            '--full-media',
+            action='store_true',
+            help='Archive every media file instead of only those changed since the previous backup'
+        )
+        parser.add_argument(
+            '--media-workers',
+            type=int,
+            default=settings.MEDIA_BACKUP_WORKERS,
+            help='Media archives written in parallel'
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
             help='Show what would be done without actually doing it'
         )
+        parser.add_argument(
+            '--format',
+            choices=['ndjson', 'json'],
+            default='ndjson',
+            help='Database format (backup): ndjson (streamed, one compressed file per model) or json (legacy single file)'
+        )
+        parser.add_argument(
+            '--compression',
+            choices=['gzip', 'zstd'],
+            default='gzip',
+            help='Compression of the ndjson files (zstd requires the zstandard package)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=backup_format.DEFAULT_BATCH_SIZE,
+            help='Objects per batch when writing or restoring the ndjson format'
+        )
 
     def handle(self, *args, **options):
         action = options['action']
@@ -74,54 +105,42 @@ class Command(BaseCommand):
             # Backup database
             db_backup_path = os.path.join(backup_dir, f'db_backup_{timestamp}.json')
             self.stdout.write("Backing up database...")
-            
-            # Get all models to backup (excluding some Django internal ones)
-            from django.apps import apps
-            from django.contrib.contenttypes.models import ContentType
-            
-            # Define models to backup
-            models_to_backup = []
-            for app_config in apps.get_app_configs():
-                for model in app_config.get_models():
-                    # Skip some models that don't need to be backed up
-                    if model._meta.label not in [
-                        'contenttypes.ContentType',
-                        'auth.Permission',
-                        'sessions.Session'
-                    ]:
-                        models_to_backup.append(model)
-            
-            # Serialize data
-            serialized_data = []
-            for model in models_to_backup:
-                try:
-                    model_data = serializers.serialize('json', model.objects.all())
-                    serialized_data.extend(json.loads(model_data))
-                except Exception as e:
-                    self.stderr.write(f"Error serializing {model._meta.label}: {e}")
-            
-            with open(db_backup_path, 'w') as f:
-                json.dump(serialized_data, f, indent=2, default=str)
-            
-            # Backup media files if requested
+            database_files = None
+            if options['format'] == 'ndjson':
+                database_files = backup_format.dump_database(
+                    backup_dir, compression=options['compression'], batch_size=options['batch_size'],
+                )
+            else:
+                self._dump_legacy_json(db_backup_path)
+
+            # Backup media files if requested (incremental against the previous backup)
+            media_summary = None
             if include_media and os.path.exists(settings.MEDIA_ROOT):
-                media_backup_path = os.path.join(backup_dir, f'media_backup_{timestamp}.zip')
                 self.stdout.write("Backing up media files...")
-                with zipfile.ZipFile(media_backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(settings.MEDIA_ROOT):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, settings.MEDIA_ROOT)
-                            zipf.write(file_path, arcname)
+                parent_dir = None
+                if not options['full_media']:
+                    parent_dir = media_backup.find_parent_backup(output_dir, backup_name)
+                media_summary = media_backup.backup_media(
+                    settings.MEDIA_ROOT, backup_dir, parent_dir, workers=options['media_workers'],
+                )
+                self.stdout.write(
+                    f"Media: {media_summary['archived_files']} new/changed file(s) archived, "
+                    f"{media_summary['reused_files']} unchanged (parent: {media_summary['parent'] or 'none'})"
+                )
             
             # Create manifest
             manifest = {
                 'timestamp': timestamp,
+                'format': 'ndjson' if database_files is not None else 'json',
                 'includes_media': include_media,
                 'database_backup': os.path.basename(db_backup_path) if os.path.exists(db_backup_path) else None,
-                'media_backup': os.path.basename(media_backup_path) if include_media and os.path.exists(media_backup_path) else None,
+                'media_backup': None,
+                'media': media_summary,
                 'backup_dir': backup_dir
             }
+            if database_files is not None:
+                manifest['compression'] = options['compression']
+                manifest['database_files'] = database_files
             
             manifest_path = os.path.join(backup_dir, 'manifest.json')
             with open(manifest_path, 'w') as f:
@@ -136,6 +155,31 @@ class Command(BaseCommand):
             self.stderr.write(f"Backup failed: {str(e)}")
             raise
 
+    def _dump_legacy_json(self, db_backup_path):
+        """Legacy format: whole database in one JSON file (built in memory)."""
+        # Get all models to backup (excluding some Django internal ones)
+        from django.apps import apps
+
+        # Define models to backup
+        models_to_backup = []
+        for app_config in apps.get_app_configs():
+            for model in app_config.get_models():
+                # Skip some models that don't need to be backed up
+                if model._meta.label not in backup_format.EXCLUDED_MODELS:
+                    models_to_backup.append(model)
+
+        # Serialize data
+        serialized_data = []
+        for model in models_to_backup:
+            try:
+                model_data = serializers.serialize('json', model.objects.all())
+                serialized_data.extend(json.loads(model_data))
+            except Exception as e:
+                self.stderr.write(f"Error serializing {model._meta.label}: {e}")
+
+        with open(db_backup_path, 'w') as f:
+            json.dump(serialized_data, f, indent=2, default=str)
+
     def restore(self, options):
         backup_path = options['backup_path']
         dry_run = options['dry_run']
@@ -161,6 +205,16 @@ class Command(BaseCommand):
         
         if dry_run:
             self.stdout.write("Would restore database...")
+        elif manifest.get('format') == backup_format.FORMAT_NAME:
+            self.stdout.write("Restoring database (ndjson)...")
+            try:
+                backup_format.restore_database(
+                    backup_path, manifest['database_files'],
+                    batch_size=options['batch_size'], log=self.stdout.write,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write("Database restored successfully")
         else:
             # Restore database
             db_backup_file = manifest['database_backup']
@@ -215,7 +269,20 @@ class Command(BaseCommand):
                 else:
                     self.stderr.write(f"Database backup file not found: {db_backup_path}")
         
-        if manifest['includes_media']:
+        if manifest['includes_media'] and manifest.get('media'):
+            if dry_run:
+                self.stdout.write(f"Would restore {manifest['media']['files']} media files...")
+            else:
+                self.stdout.write("Restoring media files...")
+                try:
+                    restored = media_backup.restore_media(
+                        backup_path, settings.MEDIA_ROOT, workers=settings.MEDIA_BACKUP_WORKERS,
+                    )
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"Restored {restored} media files")
+        elif manifest['includes_media']:
+            # Legacy backups: single media zip
             media_backup_file = manifest['media_backup']
             if media_backup_file:
                 media_backup_path = os.path.join(backup_path, media_backup_file)
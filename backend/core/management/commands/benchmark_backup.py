@@ -0,0 +1,108 @@
+"""
+Benchmark of database backup formats: legacy single JSON file vs streamed NDJSON.
+
+For each format, measures the time and the peak Python memory (tracemalloc)
+of the dump and of the load (read + deserialize, as restore does). The
+backups are written to a temporary directory; nothing is written to the
+database.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core import backup_format
+
+
+def _measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _dirs, files in os.walk(path) for name in files
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare time and peak memory of the legacy JSON and the NDJSON backup formats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compression', choices=['gzip', 'zstd'], default='gzip')
+        parser.add_argument('--batch-size', type=int, default=backup_format.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        work_dir = tempfile.mkdtemp(prefix='korrigo_backup_bench_')
+        try:
+            results = {
+                'json': self._run(work_dir, 'json', options),
+                'ndjson': self._run(work_dir, 'ndjson', options),
+            }
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.stdout.write(
+            f"{'format':<8} {'objects':>9} {'size KB':>10} {'dump s':>8} {'dump MB':>8} "
+            f"{'load s':>8} {'load MB':>8}"
+        )
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<8} {r['objects']:>9} {r['size'] / 1024:>10.1f} {r['dump_s']:>8.2f} "
+                f"{r['dump_peak'] / 1024 ** 2:>8.1f} {r['load_s']:>8.2f} {r['load_peak'] / 1024 ** 2:>8.1f}"
+            )
+        legacy, streamed = results['json'], results['ndjson']
+        if streamed['dump_peak'] and streamed['load_peak']:
+            self.stdout.write(self.style.SUCCESS(
+                f"NDJSON peak memory: {legacy['dump_peak'] / streamed['dump_peak']:.1f}x lower on dump, "
+                f"{legacy['load_peak'] / streamed['load_peak']:.1f}x lower on load"
+            ))
+
+    def _run(self, work_dir, fmt, options):
+        output_dir = os.path.join(work_dir, fmt)
+        os.makedirs(output_dir)
+        _, dump_s, dump_peak = _measure(lambda: call_command(
+            'backup', output_dir=output_dir, format=fmt, compression=options['compression'],
+            batch_size=options['batch_size'], stdout=StringIO(),
+        ))
+        backup_dir = os.path.join(output_dir, os.listdir(output_dir)[0])
+        with open(os.path.join(backup_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        if fmt == 'json':
+            def load():
+                with open(os.path.join(backup_dir, manifest['database_backup'])) as f:
+                    data = json.load(f)
+                return len(list(serializers.deserialize('python', data)))
+        else:
+            def load():
+                count = 0
+                for entry in manifest['database_files']:
+                    for batch in backup_format.iter_objects(backup_dir, entry, options['batch_size']):
+                        count += len(batch)
+                return count
+
+        objects, load_s, load_peak = _measure(load)
+        return {
+            'objects': objects,
+            'size': _dir_size(backup_dir),
+            'dump_s': dump_s,
+            'dump_peak': dump_peak,
+            'load_s': load_s,
+            'load_peak': load_peak,
+        }
@@ -1,11 +1,13 @@
 import os
 import json
 import zipfile
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from django.core import serializers
 from django.db import transaction
 
+from core import backup_format, media_backup
+
 
 class Command(BaseCommand):
     help = 'Restore database and media files from backup'
@@ -21,6 +23,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be restored without actually restoring'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=backup_format.DEFAULT_BATCH_SIZE,
+            help='Objects inserted per batch (ndjson format)'
+        )
 
     def handle(self, *args, **options):
         backup_path = options['backup_path']
@@ -43,6 +51,16 @@ class Command(BaseCommand):
         
         if dry_run:
             self.stdout.write("Would restore database...")
+        elif manifest.get('format') == backup_format.FORMAT_NAME:
+            self.stdout.write("Restoring database (ndjson)...")
+            try:
+                backup_format.restore_database(
+                    backup_path, manifest['database_files'],
+                    batch_size=options['batch_size'], log=self.stdout.write,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write("Database restored successfully")
         else:
             # Restore database
             db_backup_file = manifest['database_backup']
@@ -125,7 +143,20 @@ class Command(BaseCommand):
                 else:
                     self.stderr.write(f"Database backup file not found: {db_backup_path}")
         
-        if manifest['includes_media']:
+        if manifest['includes_media'] and manifest.get('media'):
+            if dry_run:
+                self.stdout.write(f"Would restore {manifest['media']['files']} media files...")
+            else:
+                self.stdout.write("Restoring media files...")
+                try:
+                    restored = media_backup.restore_media(
+                        backup_path, settings.MEDIA_ROOT, workers=settings.MEDIA_BACKUP_WORKERS,
+                    )
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"Restored {restored} media files")
+        elif manifest['includes_media']:
+            # Legacy backups: single media zip
             media_backup_file = manifest['media_backup']
             if media_backup_file:
                 media_backup_path = os.path.join(backup_path, media_backup_file)
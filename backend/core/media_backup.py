@@ -0,0 +1,276 @@
+"""
+Media Backup - Sauvegarde incrémentale des médias par empreinte de contenu
+
+L'ancienne sauvegarde (--include-media) recompressait tout MEDIA_ROOT dans un
+seul zip ZIP_DEFLATED, sur un seul cœur, à chaque exécution, alors que les
+PNG / PDF / WebP sont déjà compressés.
+
+Arborescence d'une sauvegarde :
+    <backup_dir>/media/manifest.json.gz
+    <backup_dir>/media/media-000.zip ... media-00N.zip   (fichiers nouveaux ou modifiés)
+
+Le manifeste liste TOUS les fichiers présents au moment de la sauvegarde :
+    chemin -> {size, mtime_ns, sha256, backup, archive}
+où (backup, archive) désigne la sauvegarde et l'archive qui contiennent le
+contenu. Un fichier dont la taille et la date de modification n'ont pas
+changé depuis la sauvegarde parente n'est pas relu : son entrée est reprise
+telle quelle et pointe vers l'archive d'une sauvegarde précédente.
+
+- les formats déjà compressés sont stockés sans recompression (ZIP_STORED) ;
+- les fichiers à archiver sont répartis (par taille) entre MEDIA_BACKUP_WORKERS
+  archives écrites en parallèle (zlib et hashlib libèrent le GIL) ; chaque
+  fichier est lu, haché et écrit en une seule passe ;
+- la restauration rejoue la chaîne des sauvegardes (parent -> parent...) :
+  chaque fichier est extrait de l'archive qui le contient, puis son sha256
+  et sa date de modification sont vérifiés / restaurés.
+
+Les sauvegardes d'une même chaîne doivent rester dans le même répertoire
+(--output-dir) : supprimer une sauvegarde parente casse la restauration des
+suivantes (utiliser --full-media pour repartir d'une sauvegarde complète).
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = 'media'
+MANIFEST_NAME = 'manifest.json.gz'
+# Cache de pages rendues : régénérable, jamais sauvegardé
+EXCLUDED_DIRS = ('page_cache',)
+ALREADY_COMPRESSED = frozenset({
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.pdf',
+    '.zip', '.gz', '.zst', '.xlsx', '.docx', '.odt', '.ods',
+})
+CHUNK_SIZE = 1024 * 1024
+
+
+def scan_media(root):
+    """(chemin relatif POSIX, taille, mtime_ns) de chaque fichier sous `root`."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if directory == root and entry.name in EXCLUDED_DIRS:
+                    continue
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                yield rel_path, stat.st_size, stat.st_mtime_ns
+
+
+def load_media_manifest(backup_dir):
+    path = os.path.join(backup_dir, MEDIA_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_parent_backup(output_dir, current_name):
+    """Dernière sauvegarde de `output_dir` (hors `current_name`) ayant un manifeste média."""
+    try:
+        names = sorted(os.listdir(output_dir), reverse=True)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        if name == current_name:
+            continue
+        candidate = os.path.join(output_dir, name)
+        if os.path.isdir(candidate) and os.path.exists(os.path.join(candidate, MEDIA_DIR, MANIFEST_NAME)):
+            return candidate
+    return None
+
+
+def _shards(files, count):
+    """Répartit (chemin, taille) en `count` lots de tailles voisines (plus gros d'abord)."""
+    shards = [[0, []] for _ in range(max(count, 1))]
+    for rel_path, size in sorted(files, key=lambda item: item[1], reverse=True):
+        target = min(shards, key=lambda shard: shard[0])
+        target[0] += size
+        target[1].append(rel_path)
+    return [paths for _total, paths in shards if paths]
+
+
+def _write_archive(media_root, archive_path, rel_paths):
+    """Archive `rel_paths` ; retourne {chemin: sha256} (lecture et hachage en une passe)."""
+    digests = {}
+    with zipfile.ZipFile(archive_path, 'w', allowZip64=True) as archive:
+        for rel_path in rel_paths:
+            full_path = os.path.join(media_root, rel_path)
+            info = zipfile.ZipInfo.from_file(full_path, rel_path, strict_timestamps=False)
+            if os.path.splitext(rel_path)[1].lower() in ALREADY_COMPRESSED:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            digest = hashlib.sha256()
+            with open(full_path, 'rb') as source, archive.open(info, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    target.write(chunk)
+            digests[rel_path] = digest.hexdigest()
+    return digests
+
+
+def backup_media(media_root, backup_dir, parent_dir=None, workers=4):
+    """
+    Sauvegarde incrémentale de `media_root` dans backup_dir/media/.
+
+    Args:
+        parent_dir: sauvegarde précédente (None : sauvegarde complète)
+        workers: nombre d'archives écrites en parallèle
+
+    Returns:
+        dict: résumé pour le manifeste de la sauvegarde
+    """
+    backup_name = os.path.basename(os.path.normpath(backup_dir))
+    media_dir = os.path.join(backup_dir, MEDIA_DIR)
+    os.makedirs(media_dir, exist_ok=True)
+
+    parent = load_media_manifest(parent_dir) if parent_dir else None
+    previous = parent['files'] if parent else {}
+
+    files = {}
+    to_archive = []
+    reused = 0
+    for rel_path, size, mtime_ns in scan_media(media_root):
+        known = previous.get(rel_path)
+        if known and known['size'] == size and known['mtime_ns'] == mtime_ns:
+            files[rel_path] = known
+            reused += 1
+        else:
+            files[rel_path] = {'size': size, 'mtime_ns': mtime_ns}
+            to_archive.append((rel_path, size))
+
+    archives = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = []
+        for index, rel_paths in enumerate(_shards(to_archive, workers)):
+            archive_name = f"{MEDIA_DIR}/media-{index:03d}.zip"
+            archive_path = os.path.join(backup_dir, archive_name)
+            futures.append((archive_name, pool.submit(_write_archive, media_root, archive_path, rel_paths)))
+        for archive_name, future in futures:
+            digests = future.result()
+            for rel_path, sha256 in digests.items():
+                files[rel_path].update(sha256=sha256, backup=backup_name, archive=archive_name)
+            archives.append({
+                'path': archive_name,
+                'files': len(digests),
+                'bytes': os.path.getsize(os.path.join(backup_dir, archive_name)),
+            })
+
+    manifest = {
+        'version': 1,
+        'backup': backup_name,
+        'parent': os.path.basename(os.path.normpath(parent_dir)) if parent else None,
+        'archives': archives,
+        'files': files,
+    }
+    with gzip.open(os.path.join(media_dir, MANIFEST_NAME), 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    summary = {
+        'manifest': f"{MEDIA_DIR}/{MANIFEST_NAME}",
+        'parent': manifest['parent'],
+        'files': len(files),
+        'archived_files': len(to_archive),
+        'reused_files': reused,
+        'archived_bytes': sum(size for _path, size in to_archive),
+    }
+    logger.info(f"Media backup {backup_name}: {summary}")
+    return summary
+
+
+def manifest_chain(backup_dir):
+    """Sauvegardes de la chaîne, de `backup_dir` à la sauvegarde complète d'origine."""
+    chain = [backup_dir]
+    seen = {os.path.basename(os.path.normpath(backup_dir))}
+    manifest = load_media_manifest(backup_dir)
+    while manifest and manifest.get('parent'):
+        parent_name = manifest['parent']
+        if parent_name in seen:
+            raise ValueError(f"Media backup chain loops on {parent_name}")
+        seen.add(parent_name)
+        parent_dir = os.path.join(os.path.dirname(os.path.normpath(backup_dir)), parent_name)
+        manifest = load_media_manifest(parent_dir)
+        if manifest is None:
+            raise ValueError(f"Parent media backup missing: {parent_dir}")
+        chain.append(parent_dir)
+    return chain
+
+
+def _safe_target(media_root, rel_path):
+    target = os.path.realpath(os.path.join(media_root, rel_path))
+    if not target.startswith(os.path.realpath(media_root) + os.sep):
+        raise ValueError(f"Refusing to restore outside MEDIA_ROOT: {rel_path}")
+    return target
+
+
+def _extract_archive(archive_path, media_root, entries):
+    """Extrait `entries` ({chemin: entrée}) de l'archive ; retourne les chemins en erreur."""
+    failed = []
+    with zipfile.ZipFile(archive_path) as archive:
+        for rel_path, entry in entries.items():
+            target = _safe_target(media_root, rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.restore"
+            digest = hashlib.sha256()
+            try:
+                with archive.open(rel_path) as source, open(tmp, 'wb') as out:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                        out.write(chunk)
+            except (KeyError, zipfile.BadZipFile):
+                # Membre absent ou CRC invalide
+                digest = None
+            if digest is None or digest.hexdigest() != entry['sha256']:
+                os.remove(tmp)
+                failed.append(rel_path)
+                continue
+            os.replace(tmp, target)
+            os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return failed
+
+
+def restore_media(backup_dir, media_root, workers=4):
+    """
+    Restaure dans `media_root` l'état des médias au moment de `backup_dir`.
+
+    Returns:
+        int: nombre de fichiers restaurés
+
+    Raises:
+        ValueError: chaîne incomplète, archive manquante ou contenu altéré
+    """
+    manifest = load_media_manifest(backup_dir)
+    if manifest is None:
+        raise ValueError(f"No media manifest in {backup_dir}")
+    chain = {os.path.basename(os.path.normpath(d)): d for d in manifest_chain(backup_dir)}
+
+    groups = {}
+    for rel_path, entry in manifest['files'].items():
+        source_dir = chain.get(entry['backup'])
+        if source_dir is None:
+            raise ValueError(f"{rel_path}: stored in {entry['backup']}, which is not in the backup chain")
+        groups.setdefault(os.path.join(source_dir, entry['archive']), {})[rel_path] = entry
+    missing = [path for path in groups if not os.path.exists(path)]
+    if missing:
+        raise ValueError(f"Missing media archives: {', '.join(missing)}")
+
+    os.makedirs(media_root, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = pool.map(lambda item: _extract_archive(item[0], media_root, item[1]), groups.items())
+        failed = [path for paths in results for path in paths]
+    if failed:
+        raise ValueError(f"Checksum mismatch for {len(failed)} media file(s): {', '.join(failed[:10])}")
+    return len(manifest['files'])
@@ -3,8 +3,14 @@ P0-OP-08: Basic metrics collection middleware
 Collects HTTP request metrics for monitoring and alerting
 Conformité: Phase S5-B - Prometheus metrics integration
 """
+import json
+import math
+import os
+import tempfile
 import time
 import logging
+import uuid
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from collections import defaultdict
 from threading import Lock
@@ -12,42 +18,301 @@ from core.prometheus import record_request_metrics
 
 logger = logging.getLogger('metrics')
 
+
+class LatencySketch:
+    """
+    Mergeable streaming quantile sketch (log-bucketed histogram, DDSketch-style).
+
+    Each duration falls in bucket ceil(log_gamma(v)); every quantile is returned
+    within RELATIVE_ACCURACY of the true value. Durations are clamped to
+    [MIN_VALUE, MAX_VALUE], so a route never holds more than ~1100 buckets
+    whatever its traffic. Two sketches merge by adding bucket counts, which is
+    what makes per-worker sketches aggregatable.
+    """
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    MIN_VALUE = 1e-6      # 1 µs
+    MAX_VALUE = 3600.0    # 1 h
+
+    __slots__ = ('buckets', 'count')
+
+    def __init__(self, buckets=None):
+        self.buckets = defaultdict(int, buckets or {})
+        self.count = sum(self.buckets.values())
+
+    def add(self, value):
+        value = min(max(value, self.MIN_VALUE), self.MAX_VALUE)
+        self.buckets[math.ceil(math.log(value) / self.LOG_GAMMA)] += 1
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Milieu (relatif) du bucket ]gamma^(i-1), gamma^i]
+                return 2 * self.GAMMA ** index / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.buckets) / (self.GAMMA + 1)
+
+    def to_dict(self):
+        return {str(index): count for index, count in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(index): count for index, count in data.items()})
+
+
+def _new_entry():
+    return {
+        'count': 0,
+        'total_time': 0.0,
+        'min_time': float('inf'),
+        'max_time': 0.0,
+        'errors': 0,
+        'sketch': LatencySketch(),
+    }
+
+
+def _merge_entry(target, entry):
+    target['count'] += entry['count']
+    target['total_time'] += entry['total_time']
+    target['min_time'] = min(target['min_time'], entry['min_time'])
+    target['max_time'] = max(target['max_time'], entry['max_time'])
+    target['errors'] += entry['errors']
+    target['sketch'].merge(entry['sketch'])
+
+
+def _dump_entries(metrics):
+    return {
+        key: dict(m, min_time=None if m['min_time'] == float('inf') else m['min_time'],
+                  sketch=m['sketch'].to_dict())
+        for key, m in metrics.items()
+    }
+
+
+def _load_entries(data):
+    metrics = {}
+    for key, m in data.items():
+        entry = dict(m, sketch=LatencySketch.from_dict(m['sketch']))
+        if entry['min_time'] is None:
+            entry['min_time'] = float('inf')
+        metrics[key] = entry
+    return metrics
+
+
 class MetricsCollector:
     """
     Thread-safe metrics collector for basic application monitoring
     P0-OP-08: Provides observability without external infrastructure
+
+    Per route: count, errors, total/min/max time and a LatencySketch for
+    percentiles. With METRICS_SHARED_DIR set (gunicorn_config.py does it),
+    every worker dumps its state to <dir>/worker-<pid>-<id>.json at most every
+    METRICS_SYNC_INTERVAL_SECONDS, and get_metrics() merges all worker files:
+    /api/metrics/ shows the whole server, not the worker that answered.
+    Files of exited workers are folded into <dir>/merged.json so totals
+    survive worker restarts.
     """
-    def __init__(self):
+    MERGED_FILE = 'merged.json'
+    RESET_FILE = 'reset'
+
+    def __init__(self, shared_dir=None, sync_interval=None):
         self._lock = Lock()
-        self._metrics = defaultdict(lambda: {
-            'count': 0,
-            'total_time': 0.0,
-            'min_time': float('inf'),
-            'max_time': 0.0,
-            'errors': 0
-        })
-        
+        self._metrics = defaultdict(_new_entry)
+        self._shared_dir = shared_dir
+        self._sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._reset_seen = time.time()
+        self._pid = None
+        self._worker_file = None
+
+    @property
+    def shared_dir(self):
+        if self._shared_dir is not None:
+            return self._shared_dir
+        return getattr(settings, 'METRICS_SHARED_DIR', '')
+
+    @property
+    def sync_interval(self):
+        if self._sync_interval is not None:
+            return self._sync_interval
+        return getattr(settings, 'METRICS_SYNC_INTERVAL_SECONDS', 5.0)
+
     def record_request(self, path, method, duration, status_code):
         """Record a request metric"""
         key = f"{method} {path}"
+        sync_due = self.shared_dir and time.monotonic() - self._last_sync >= self.sync_interval
+        if sync_due:
+            # Reset demandé par un autre worker : appliqué avant d'enregistrer
+            self._apply_remote_reset(self.shared_dir)
         with self._lock:
             m = self._metrics[key]
             m['count'] += 1
             m['total_time'] += duration
             m['min_time'] = min(m['min_time'], duration)
             m['max_time'] = max(m['max_time'], duration)
+            m['sketch'].add(duration)
             if status_code >= 400:
                 m['errors'] += 1
-    
+        if sync_due:
+            self.sync()
+
     def get_metrics(self):
-        """Get current metrics snapshot"""
-        with self._lock:
-            return dict(self._metrics)
-    
+        """
+        Get current metrics snapshot, merged across workers when
+        METRICS_SHARED_DIR is set. Entries are copies (safe to read).
+        """
+        if not self.shared_dir:
+            with self._lock:
+                return self._copy(self._metrics)
+
+        self.sync()
+        merged = defaultdict(_new_entry)
+        for data in self._read_shared():
+            for key, entry in _load_entries(data).items():
+                _merge_entry(merged[key], entry)
+        return dict(merged)
+
+    def worker_count(self):
+        """Number of worker files currently merged (1 without shared dir)."""
+        if not self.shared_dir or not os.path.isdir(self.shared_dir):
+            return 1
+        return sum(1 for name in os.listdir(self.shared_dir) if name.startswith('worker-'))
+
     def reset(self):
-        """Reset all metrics"""
+        """Reset all metrics (all workers when METRICS_SHARED_DIR is set)"""
         with self._lock:
             self._metrics.clear()
+        shared_dir = self.shared_dir
+        if not shared_dir or not os.path.isdir(shared_dir):
+            return
+        # Les autres workers vident leur état à leur prochaine synchronisation
+        now = time.time()
+        self._write_json(os.path.join(shared_dir, self.RESET_FILE), {'reset_at': now})
+        self._reset_seen = now
+        for name in os.listdir(shared_dir):
+            if name.startswith('worker-') or name == self.MERGED_FILE:
+                self._remove(os.path.join(shared_dir, name))
+        self._worker_file = None
+
+    def sync(self):
+        """Write this worker's state to the shared directory."""
+        shared_dir = self.shared_dir
+        if not shared_dir:
+            return
+        try:
+            os.makedirs(shared_dir, exist_ok=True)
+            self._apply_remote_reset(shared_dir)
+            if self._pid != os.getpid() or self._worker_file is None:
+                # Nouveau process (fork) : nouveau fichier, état hérité abandonné
+                if self._pid is not None and self._pid != os.getpid():
+                    with self._lock:
+                        self._metrics.clear()
+                self._pid = os.getpid()
+                self._worker_file = os.path.join(
+                    shared_dir, f"worker-{self._pid}-{uuid.uuid4().hex[:8]}.json"
+                )
+            with self._lock:
+                data = _dump_entries(self._metrics)
+            self._write_json(self._worker_file, {'pid': self._pid, 'metrics': data})
+            self._last_sync = time.monotonic()
+        except OSError as e:
+            # Les métriques ne doivent jamais faire échouer une requête
+            logger.warning(f"Metrics sync to {shared_dir} failed: {e}")
+
+    def _apply_remote_reset(self, shared_dir):
+        try:
+            reset_at = os.path.getmtime(os.path.join(shared_dir, self.RESET_FILE))
+        except OSError:
+            return
+        if reset_at > self._reset_seen:
+            with self._lock:
+                self._metrics.clear()
+            self._reset_seen = reset_at
+
+    def _read_shared(self):
+        """Yield the metrics dict of every worker file (and of merged.json)."""
+        shared_dir = self.shared_dir
+        self._fold_dead_workers(shared_dir)
+        for name in sorted(os.listdir(shared_dir)):
+            if not (name.startswith('worker-') or name == self.MERGED_FILE):
+                continue
+            try:
+                with open(os.path.join(shared_dir, name), encoding='utf-8') as f:
+                    yield json.load(f)['metrics']
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def _fold_dead_workers(self, shared_dir):
+        import fcntl
+
+        dead = []
+        for name in os.listdir(shared_dir):
+            if not name.startswith('worker-'):
+                continue
+            pid = int(name.split('-')[1])
+            if pid != os.getpid() and not self._pid_alive(pid):
+                dead.append(name)
+        if not dead:
+            return
+
+        with open(os.path.join(shared_dir, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged_path = os.path.join(shared_dir, self.MERGED_FILE)
+            merged = defaultdict(_new_entry)
+            sources = [merged_path] + [os.path.join(shared_dir, name) for name in dead]
+            for path in sources:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        data = json.load(f)['metrics']
+                except (OSError, ValueError, KeyError):
+                    continue
+                for key, entry in _load_entries(data).items():
+                    _merge_entry(merged[key], entry)
+            self._write_json(merged_path, {'pid': None, 'metrics': _dump_entries(merged)})
+            for name in dead:
+                self._remove(os.path.join(shared_dir, name))
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def _copy(metrics):
+        snapshot = {}
+        for key, m in metrics.items():
+            snapshot[key] = dict(m, sketch=LatencySketch().merge(m['sketch']))
+        return snapshot
+
+    @staticmethod
+    def _write_json(path, payload):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
 # Global metrics collector instance
 metrics_collector = MetricsCollector()
@@ -0,0 +1,290 @@
+"""
+Per-request profiling and SQL attribution
+
+Answers "where does this endpoint spend its time: SQL, PyMuPDF or Python?".
+
+- Every request: SQL query count and time, exported as Prometheus histograms
+  per normalized route (http_request_sql_queries, http_request_sql_duration_seconds).
+- Profiled requests (header X-Profile: 1 from an admin, or a random sample
+  at PROFILING_SAMPLE_RATE): every query is recorded with its duration, repeated
+  statements are reported (N+1 detection), and a sampling profiler collects the
+  request thread's stacks every PROFILING_INTERVAL_MS. The stacks are kept in
+  "folded" format (flamegraph.pl / speedscope input).
+
+Profiles are kept in a bounded per-process ring buffer (PROFILING_BUFFER_SIZE)
+and exposed to admins by core.views_profiling (GET /api/profiling/).
+The response of a profiled request carries X-Profile-Id.
+"""
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as CounterDict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from prometheus_client import Histogram
+
+from core.auth import UserRole
+from core.middleware.metrics import MetricsMiddleware
+from core.prometheus import registry
+
+logger = logging.getLogger('metrics')
+
+http_request_sql_queries = Histogram(
+    'http_request_sql_queries',
+    'SQL queries executed per HTTP request',
+    ['method', 'path'],
+    buckets=[0, 1, 2, 5, 10, 20, 50, 100, 200, 500],
+    registry=registry
+)
+
+http_request_sql_duration_seconds = Histogram(
+    'http_request_sql_duration_seconds',
+    'Time spent in SQL per HTTP request in seconds',
+    ['method', 'path'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+    registry=registry
+)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+EXCLUDED_PREFIXES = ('/api/profiling/', '/metrics', '/api/health/')
+
+# Catégorie d'un échantillon : premier module reconnu dans la pile
+STACK_CATEGORIES = (
+    ('sql', ('django/db/', 'psycopg', 'sqlite3')),
+    ('pymupdf', ('fitz/', 'pymupdf/')),
+    ('opencv', ('cv2/',)),
+)
+
+
+class ProfileStore:
+    """Ring buffer of the last profiles (per process)."""
+
+    def __init__(self, size=None):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size or settings.PROFILING_BUFFER_SIZE)
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id):
+        with self._lock:
+            for profile in self._profiles:
+                if profile['id'] == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = None
+
+
+def get_profile_store():
+    global profile_store
+    if profile_store is None:
+        profile_store = ProfileStore()
+    return profile_store
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper hook: counts every query and, when `detailed`,
+    keeps each statement with its duration.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.detailed:
+                self.queries.append((sql, repr(params)[:200], elapsed))
+
+    def duplicates(self, threshold):
+        """
+        Statements executed at least `threshold` times: same SQL text
+        (parameters differ: N+1 pattern) or same SQL and parameters.
+        """
+        by_sql = CounterDict(sql for sql, _params, _t in self.queries)
+        by_call = CounterDict((sql, params) for sql, params, _t in self.queries)
+        time_by_sql = CounterDict()
+        for sql, _params, elapsed in self.queries:
+            time_by_sql[sql] += elapsed
+        return [
+            {
+                'sql': sql[:500],
+                'count': count,
+                'identical': max(c for (s, _p), c in by_call.items() if s == sql),
+                'time_ms': round(time_by_sql[sql] * 1000, 2),
+            }
+            for sql, count in by_sql.most_common() if count >= threshold
+        ]
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread: a daemon thread reads the target
+    thread's frame every `interval` seconds (sys._current_frames) and counts
+    folded stacks "module:function;module:function;...".
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = CounterDict()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._prefixes = ('site-packages/', f"{settings.BASE_DIR}/")
+        self._names = {}
+
+    def _name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            for prefix in self._prefixes:
+                if prefix in filename:
+                    filename = filename.split(prefix, 1)[1]
+                    break
+            name = self._names[code] = f"{filename}:{code.co_name}"
+        return name
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self._name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Folded stacks, one "stack count" line each (flamegraph.pl input)."""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def categories(self):
+        """Share of samples per category (sql, pymupdf, opencv, python)."""
+        totals = CounterDict()
+        for stack, count in self.stacks.items():
+            category = 'python'
+            for name, markers in STACK_CATEGORIES:
+                if any(marker in stack for marker in markers):
+                    category = name
+                    break
+            totals[category] += count
+        if not self.samples:
+            return {}
+        return {name: round(count / self.samples, 3) for name, count in totals.most_common()}
+
+
+class ProfilingMiddleware:
+    """
+    SQL accounting for every request, full profile for flagged/sampled ones.
+    Must come after AuthenticationMiddleware (the X-Profile header is only
+    honoured for admins).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith(EXCLUDED_PREFIXES):
+            return self.get_response(request)
+
+        profiled = self._should_profile(request)
+        recorder = QueryRecorder(detailed=profiled)
+        sampler = None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            if profiled:
+                sampler = stack.enter_context(
+                    StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000)
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        path = MetricsMiddleware._normalize_path(request.path)
+        try:
+            http_request_sql_queries.labels(method=request.method, path=path).observe(recorder.count)
+            http_request_sql_duration_seconds.labels(method=request.method, path=path).observe(recorder.duration)
+        except Exception as e:
+            # Les métriques ne doivent jamais faire échouer une requête
+            logger.warning(f"SQL metrics recording failed: {e}")
+
+        if profiled:
+            profile = self._build_profile(request, response, path, duration, recorder, sampler)
+            get_profile_store().add(profile)
+            response['X-Profile-Id'] = profile['id']
+        return response
+
+    @staticmethod
+    def _should_profile(request):
+        if request.META.get(PROFILE_HEADER) == '1':
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated and (
+                user.is_superuser or user.groups.filter(name=UserRole.ADMIN).exists()
+            ):
+                return True
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate  # nosec B311 - sampling, not security
+
+    @staticmethod
+    def _build_profile(request, response, path, duration, recorder, sampler):
+        slowest = sorted(recorder.queries, key=lambda q: q[2], reverse=True)[:20]
+        return {
+            'id': uuid.uuid4().hex,
+            'created_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'sql': {
+                'count': recorder.count,
+                'time_ms': round(recorder.duration * 1000, 2),
+                'duplicates': recorder.duplicates(settings.PROFILING_DUPLICATE_THRESHOLD),
+                'slowest': [
+                    {'sql': sql[:500], 'params': params, 'time_ms': round(t * 1000, 2)}
+                    for sql, params, t in slowest
+                ],
+            },
+            'samples': sampler.samples,
+            'categories': sampler.categories(),
+            'folded': sampler.folded(),
+        }
@@ -0,0 +1,44 @@
+"""
+AuditLog.event_id: unique UUID assigned when the event is created, so that a
+batch replayed by the audit writer does not duplicate rows.
+Existing rows get a random id before the unique constraint is added.
+"""
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_event_ids(apps, schema_editor):
+    AuditLog = apps.get_model('core', 'AuditLog')
+    batch = []
+    for log in AuditLog.objects.only('pk').iterator(chunk_size=2000):
+        log.event_id = uuid.uuid4()
+        batch.append(log)
+        if len(batch) >= 2000:
+            AuditLog.objects.bulk_update(batch, ['event_id'])
+            batch = []
+    AuditLog.objects.bulk_update(batch, ['event_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_auditlog_event_timestamp'),
+    ]
+
+    operations = [
+        # 1. Nullable column
+        migrations.AddField(
+            model_name='auditlog',
+            name='event_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        # 2. Data migration: one id per existing row
+        migrations.RunPython(fill_event_ids, migrations.RunPython.noop),
+        # 3. Unique, with a default for new rows
+        migrations.AlterField(
+            model_name='auditlog',
+            name='event_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='ID Événement'),
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+import uuid
 
 class GlobalSettings(models.Model):
     """
@@ -35,7 +37,10 @@ class AuditLog(models.Model):
     
     Référence: docs/security/MANUEL_SECURITE.md — Audit Trail RGPD
     """
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name=_("Horodatage"))
+    # Attribué à la création : un lot rejoué par core.utils.audit_writer ne crée pas de doublon
+    event_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name=_("ID Événement"))
+    # Heure de l'événement (et non de l'écriture, différée par core.utils.audit_writer)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True, verbose_name=_("Horodatage"))
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -0,0 +1,287 @@
+"""
+Orphan Scanner - Fichiers de MEDIA_ROOT qui ne sont plus référencés en base
+
+Couvre toutes les classes de médias :
+- tous les FileField / ImageField de tous les modèles (PDF sources, PDF
+  finaux, CSV, en-têtes...) ;
+- les chemins stockés en CharField (ExamDocument.storage_path) ;
+- les listes de pages JSON (Booklet.pages_images : chemins relatifs ou
+  absolus des PNG/WebP de booklets/<exam>/ et copies/pages/<copy>/, et
+  références paresseuses "pdf:<source>#<index>", qui référencent le PDF source).
+
+Mémoire bornée, quelle que soit la taille de la base et du disque :
+- les références sont lues par lots (QuerySet.iterator) ;
+- l'arborescence est parcourue en parallèle (os.scandir, un sous-arbre par
+  tâche) ;
+- les deux flux sont triés par tri externe (runs triés sur disque + fusion
+  heapq) puis comparés par fusion, sans jamais construire d'ensemble complet.
+
+page_cache/ (régénérable, géré par PageCache) et temp_uploads/ (purgé par la
+tâche cleanup_orphaned_files) ne sont pas parcourus.
+
+Usage:
+    python manage.py cleanup_orphaned_files --dry-run
+    scan_orphans(delete=True, older_than_days=7, delete_rate=50)
+"""
+import heapq
+import logging
+import os
+import posixpath
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+
+from processing.services.page_cache import is_lazy_ref, parse_page_ref
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_DIRS = ('page_cache', 'temp_uploads')
+# Chemins relatifs à MEDIA_ROOT stockés hors FileField
+PATH_FIELDS = (('exams.ExamDocument', 'storage_path'),)
+# Listes JSON de références de pages
+PAGE_LIST_FIELDS = (('exams.Booklet', 'pages_images'),)
+# Répertoires écrits par le code (hors upload_to des FileField) : classes du rapport
+GENERATED_DIRS = ('copies/pages', 'booklets', 'exams/documents')
+DEFAULT_BATCH_SIZE = 2000
+SEPARATOR = '\0'
+
+
+def normalize_ref(ref, media_root):
+    """Chemin relatif POSIX d'une référence, ou None si elle ne désigne pas un fichier de MEDIA_ROOT."""
+    if not ref or not isinstance(ref, str):
+        return None
+    if is_lazy_ref(ref):
+        try:
+            ref = parse_page_ref(ref)[0]
+        except ValueError:
+            return None
+    if os.path.isabs(ref):
+        ref = os.path.relpath(ref, media_root)
+    ref = posixpath.normpath(ref.replace(os.sep, '/'))
+    if ref.startswith('../') or ref in ('.', '..'):
+        return None
+    return ref
+
+
+def iter_references(batch_size=DEFAULT_BATCH_SIZE):
+    """Toutes les références brutes (non normalisées), lues par lots."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                queryset = model._base_manager.exclude(**{field.attname: ''}).exclude(
+                    **{f'{field.attname}__isnull': True}
+                )
+                yield from queryset.values_list(field.attname, flat=True).iterator(chunk_size=batch_size)
+    for label, name in PATH_FIELDS:
+        queryset = apps.get_model(label)._base_manager.exclude(**{name: ''})
+        yield from queryset.values_list(name, flat=True).iterator(chunk_size=batch_size)
+    for label, name in PAGE_LIST_FIELDS:
+        queryset = apps.get_model(label)._base_manager.values_list(name, flat=True)
+        for pages in queryset.iterator(chunk_size=batch_size):
+            yield from pages or []
+
+
+def media_classes():
+    """Préfixes de classement du rapport, du plus spécifique au plus général."""
+    prefixes = set(GENERATED_DIRS)
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.upload_to, str) and field.upload_to:
+                prefixes.add(field.upload_to.strip('/'))
+    return sorted(prefixes, key=len, reverse=True)
+
+
+def classify(path, prefixes):
+    for prefix in prefixes:
+        if path.startswith(prefix + '/'):
+            return prefix
+    head, _sep, _rest = path.partition('/')
+    return head if _sep else '.'
+
+
+def _walk_subtree(directory, media_root):
+    """Fichiers du sous-arbre : lignes "chemin\\0taille\\0mtime"."""
+    lines = []
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        rel_path = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+                        lines.append(f"{rel_path}{SEPARATOR}{stat.st_size}{SEPARATOR}{stat.st_mtime}")
+        except FileNotFoundError:
+            continue
+    return lines
+
+
+def iter_media_files(media_root, workers=4, fan_out_depth=2):
+    """
+    Fichiers de `media_root` (ordre quelconque). Les répertoires jusqu'à
+    `fan_out_depth` sont listés ici ; chaque sous-arbre plus profond
+    (booklets/<exam>, copies/pages, copies/final...) est parcouru par un thread.
+    """
+    subtrees = []
+    level = [(media_root, 0)]
+    while level:
+        next_level = []
+        for directory, depth in level:
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if depth == 0 and entry.name in EXCLUDED_DIRS:
+                        continue
+                    if depth + 1 < fan_out_depth:
+                        next_level.append((entry.path, depth + 1))
+                    else:
+                        subtrees.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    rel_path = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+                    yield f"{rel_path}{SEPARATOR}{stat.st_size}{SEPARATOR}{stat.st_mtime}"
+        level = next_level
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = [pool.submit(_walk_subtree, path, media_root) for path in subtrees]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def sorted_unique(items, run_size, tmp_dir):
+    """
+    Tri externe : runs de `run_size` éléments triés sur disque, puis fusion.
+    Les doublons consécutifs sont supprimés.
+    """
+    runs = []
+    buffer = []
+
+    def spill():
+        fd, path = tempfile.mkstemp(dir=tmp_dir, suffix='.run')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for item in sorted(set(buffer)):
+                f.write(item)
+                f.write('\n')
+        runs.append(path)
+        buffer.clear()
+
+    for item in items:
+        buffer.append(item)
+        if len(buffer) >= run_size:
+            spill()
+    if not runs:
+        yield from sorted(set(buffer))
+        return
+    if buffer:
+        spill()
+
+    files = [open(path, encoding='utf-8') for path in runs]
+    try:
+        previous = None
+        for line in heapq.merge(*[(line.rstrip('\n') for line in f) for f in files]):
+            if line != previous:
+                yield line
+                previous = line
+    finally:
+        for f in files:
+            f.close()
+
+
+def scan_orphans(media_root=None, older_than_days=1, delete=False, max_deletes=None, delete_rate=None,
+                 batch_size=DEFAULT_BATCH_SIZE, workers=4, on_orphan=None):
+    """
+    Compare les fichiers de MEDIA_ROOT aux références de la base.
+
+    Args:
+        older_than_days: seuls les orphelins plus anciens sont signalés / supprimés
+            (un import en cours écrit ses fichiers avant de les référencer)
+        delete: supprimer les orphelins (sinon : rapport seulement)
+        max_deletes: nombre maximum de suppressions
+        delete_rate: suppressions par seconde au maximum (None : pas de limite)
+        on_orphan: callback(path, size, deleted) pour chaque orphelin
+
+    Returns:
+        dict: compteurs globaux et par classe de médias
+    """
+    media_root = media_root or settings.MEDIA_ROOT
+    prefixes = media_classes()
+    cutoff = time.time() - older_than_days * 86400
+    interval = 1.0 / delete_rate if delete_rate else 0
+    report = {
+        'files': 0, 'bytes': 0, 'references': 0, 'missing': 0,
+        'orphans': 0, 'orphan_bytes': 0, 'recent_orphans': 0,
+        'deleted': 0, 'deleted_bytes': 0, 'errors': 0, 'by_class': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='orphan_scan_') as tmp_dir:
+        references = sorted_unique(
+            (ref for ref in (normalize_ref(r, media_root) for r in iter_references(batch_size)) if ref),
+            batch_size * 50, tmp_dir,
+        )
+        files = sorted_unique(iter_media_files(media_root, workers), batch_size * 50, tmp_dir)
+
+        ref = next(references, None)
+        last_delete = 0.0
+        for line in files:
+            path, size, mtime = line.split(SEPARATOR)
+            size = int(size)
+            report['files'] += 1
+            report['bytes'] += size
+            while ref is not None and ref < path:
+                report['missing'] += 1
+                report['references'] += 1
+                ref = next(references, None)
+            if ref == path:
+                report['references'] += 1
+                ref = next(references, None)
+                continue
+
+            if float(mtime) >= cutoff:
+                report['recent_orphans'] += 1
+                continue
+            report['orphans'] += 1
+            report['orphan_bytes'] += size
+            stats = report['by_class'].setdefault(classify(path, prefixes), {'files': 0, 'bytes': 0})
+            stats['files'] += 1
+            stats['bytes'] += size
+
+            deleted = False
+            if delete and (max_deletes is None or report['deleted'] < max_deletes):
+                if interval:
+                    wait = last_delete + interval - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    last_delete = time.monotonic()
+                try:
+                    os.unlink(os.path.join(media_root, path))
+                    deleted = True
+                    report['deleted'] += 1
+                    report['deleted_bytes'] += size
+                except OSError as e:
+                    report['errors'] += 1
+                    logger.warning(f"Could not delete orphan {path}: {e}")
+            if on_orphan:
+                on_orphan(path, size, deleted)
+
+        # Références restantes : au-delà du dernier fichier, donc absentes du disque
+        while ref is not None:
+            report['references'] += 1
+            report['missing'] += 1
+            ref = next(references, None)
+
+    logger.info(
+        f"Orphan scan: {report['files']} files, {report['orphans']} orphans "
+        f"({report['orphan_bytes']} bytes), {report['deleted']} deleted, {report['missing']} missing"
+    )
+    return report
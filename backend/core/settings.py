@@ -2,6 +2,7 @@ import os
 import dj_database_url
 from pathlib import Path
 from dotenv import load_dotenv
+from kombu import Queue
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -94,6 +95,18 @@ if DJANGO_ENV == "production" and not METRICS_TOKEN and not DEBUG:
         "Set METRICS_TOKEN environment variable to secure the endpoint."
     )
 
+# /api/metrics/ aggregation across Gunicorn workers: each worker dumps its
+# counters and latency sketches here (set by gunicorn_config.py). Empty: per-process only.
+METRICS_SHARED_DIR = os.environ.get("METRICS_SHARED_DIR", "")
+METRICS_SYNC_INTERVAL_SECONDS = float(os.environ.get("METRICS_SYNC_INTERVAL_SECONDS", "5"))
+
+# Request profiling (core.middleware.profiling): admin requests with header
+# X-Profile: 1 are always profiled, others sampled at PROFILING_SAMPLE_RATE (0-1)
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_BUFFER_SIZE = int(os.environ.get("PROFILING_BUFFER_SIZE", "50"))
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get("PROFILING_DUPLICATE_THRESHOLD", "5"))
+
 # Security Settings for Production
 # SSL/HTTPS Configuration
 # SSL_ENABLED: Set to "False" in prod-like (HTTP-only E2E), "True" in real prod
@@ -176,6 +189,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.profiling.ProfilingMiddleware',  # SQL per route + on-demand profiles (X-Profile: 1)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -357,6 +371,86 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 300
 CELERY_TASK_SOFT_TIME_LIMIT = 270
 
+# Celery queues: interactive tasks (a teacher is waiting) must not wait behind
+# exam-wide batches. Workers consume every queue unless started with -Q;
+# in production each queue has its own worker service, with its own
+# concurrency and prefetch (celery, celery-<queue> in docker-compose.prod.yml).
+#   interactive: finalize, single PDF import, lock mirroring
+#   default:     periodic housekeeping, page prefetch
+#   documents:   document extraction / OCR
+#   llm:         LLM summaries
+#   bulk:        exports, media maintenance and transcoding
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'grading.tasks.async_finalize_copy': {'queue': 'interactive'},
+    'grading.tasks.async_import_pdf': {'queue': 'interactive'},
+    'grading.tasks.mirror_copy_lock': {'queue': 'interactive'},
+    'grading.tasks.prefetch_page_images': {'queue': 'default'},
+    'exams.tasks.process_*': {'queue': 'documents'},
+    'exams.tasks.detect_subject_variants': {'queue': 'documents'},
+    '*.tasks.*summar*': {'queue': 'llm'},
+    '*.tasks.export_*': {'queue': 'bulk'},
+    'grading.tasks.cleanup_orphaned_files': {'queue': 'bulk'},
+}
+# Hard time limit per queue in seconds (soft limit = hard - 30); applied to
+# every task routed to the queue (core.celery.QueueTimeLimits)
+CELERY_QUEUE_TIME_LIMITS = {
+    queue: int(os.environ.get(f"CELERY_{queue.upper()}_TIME_LIMIT", str(default)))
+    for queue, default in (
+        ('interactive', CELERY_TASK_TIME_LIMIT),
+        ('default', CELERY_TASK_TIME_LIMIT),
+        ('documents', 1800),
+        ('llm', 3600),
+        ('bulk', 3600),
+    )
+}
+CELERY_TASK_QUEUES = [Queue(queue) for queue in CELERY_QUEUE_TIME_LIMITS]
+CELERY_TASK_ANNOTATIONS = ('core.celery.QueueTimeLimits',)
+
+# Document text extraction (exams.tasks): PDFs longer than this are split into
+# page ranges extracted by parallel tasks
+DOCUMENT_EXTRACTION_PAGE_RANGE = int(os.environ.get("DOCUMENT_EXTRACTION_PAGE_RANGE", "40"))
+
+# Subject variant detection (exams.tasks.detect_subject_variants): copies read
+# in parallel by this many processes
+SUBJECT_VARIANT_WORKERS = int(os.environ.get("SUBJECT_VARIANT_WORKERS", "4"))
+
+# LLM summaries (processing.services.llm_summary): local Ollama server reached
+# through keep-alive connections, at most LLM_SUMMARY_CONCURRENCY concurrent
+# generations per summary job
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://ollama:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:latest")
+OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "300"))
+LLM_SUMMARY_CONCURRENCY = int(os.environ.get("LLM_SUMMARY_CONCURRENCY", "2"))
+
+# Lazy page rendering (render-on-read)
+# When enabled, imports store (source PDF, page index) references in
+# Booklet.pages_images instead of rasterizing every page up front.
+LAZY_PAGE_RENDERING = os.environ.get("LAZY_PAGE_RENDERING", "false").lower() == "true"
+PAGE_CACHE_ROOT = os.environ.get("PAGE_CACHE_ROOT")  # Default: MEDIA_ROOT/page_cache
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+PAGE_RENDER_DPI = int(os.environ.get("PAGE_RENDER_DPI", "150"))
+PAGE_PREFETCH_COUNT = int(os.environ.get("PAGE_PREFETCH_COUNT", "3"))
+
+# Compact page image storage (processing.services.page_encoding)
+# Pages are classified color / gray / bilevel and stored as RGB, 8-bit gray or 1-bit.
+# Codec: png, webp (lossless) or auto (keeps the smaller of the two)
+PAGE_IMAGE_CODEC = os.environ.get("PAGE_IMAGE_CODEC", "png")
+PAGE_IMAGE_COLOR_TOLERANCE = int(os.environ.get("PAGE_IMAGE_COLOR_TOLERANCE", "24"))
+PAGE_IMAGE_COLOR_FRACTION = float(os.environ.get("PAGE_IMAGE_COLOR_FRACTION", "0.001"))
+PAGE_IMAGE_BILEVEL_MAX_MIDTONES = float(os.environ.get("PAGE_IMAGE_BILEVEL_MAX_MIDTONES", "0.005"))
+
+# Final PDF composition (PDFFlattener)
+# auto: reuse the vector pages of Copy.pdf_source when available, raster otherwise
+# raster: always rebuild pages from page images
+FINAL_PDF_MODE = os.environ.get("FINAL_PDF_MODE", "auto")
+
+# Final PDF post-processing (processing.services.pdf_optimizer)
+FINAL_PDF_OPTIMIZE = os.environ.get("FINAL_PDF_OPTIMIZE", "true").lower() == "true"
+FINAL_PDF_GARBAGE = int(os.environ.get("FINAL_PDF_GARBAGE", "4"))  # 3+: merge duplicate objects
+FINAL_PDF_DEFLATE = os.environ.get("FINAL_PDF_DEFLATE", "true").lower() == "true"
+FINAL_PDF_LINEARIZE = os.environ.get("FINAL_PDF_LINEARIZE", "true").lower() == "true"
+
 # Cache Configuration (required for django-ratelimit)
 # Production: Redis for cross-worker consistency (rate limiting, sessions)
 # Development: LocMemCache (no Redis dependency required)
@@ -378,6 +472,47 @@ else:
         }
     }
 
+# Copy edit locks (grading.locks): Redis (SET NX PX) with the CopyLock table as fallback
+COPY_LOCK_BACKEND = os.environ.get("COPY_LOCK_BACKEND", "redis" if REDIS_HOST else "db")
+COPY_LOCK_REDIS_URL = os.environ.get(
+    "COPY_LOCK_REDIS_URL",
+    f"redis://{REDIS_HOST}:{os.environ.get('REDIS_PORT', '6379')}/{os.environ.get('REDIS_DB', '1')}",
+)
+COPY_LOCK_MAX_TTL_SECONDS = int(os.environ.get("COPY_LOCK_MAX_TTL_SECONDS", "1800"))
+
+# Grading drafts autosave (grading.drafts): hot drafts in Redis, written to
+# DraftState in batches by grading.tasks.flush_draft_store
+DRAFT_STORE_BACKEND = os.environ.get("DRAFT_STORE_BACKEND", "redis" if REDIS_HOST else "db")
+DRAFT_STORE_REDIS_URL = os.environ.get("DRAFT_STORE_REDIS_URL", COPY_LOCK_REDIS_URL)
+DRAFT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("DRAFT_FLUSH_INTERVAL_SECONDS", "10"))
+DRAFT_FLUSH_BATCH_SIZE = int(os.environ.get("DRAFT_FLUSH_BATCH_SIZE", "200"))
+DRAFT_HOT_TTL_SECONDS = int(os.environ.get("DRAFT_HOT_TTL_SECONDS", "3600"))
+
+# Audit trail (AuditLog, GradingEvent): bounded in-process queue written in
+# batches by a background thread (core.utils.audit_writer)
+AUDIT_ASYNC_ENABLED = os.environ.get("AUDIT_ASYNC_ENABLED", "true").lower() == "true"
+AUDIT_QUEUE_MAX_SIZE = int(os.environ.get("AUDIT_QUEUE_MAX_SIZE", "10000"))
+AUDIT_FLUSH_BATCH_SIZE = int(os.environ.get("AUDIT_FLUSH_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+# Annotation suggestions (grading.suggestions): per-process in-memory indexes,
+# usage counters written to the database in batches
+SUGGESTION_CACHE_TTL_SECONDS = int(os.environ.get("SUGGESTION_CACHE_TTL_SECONDS", "600"))
+SUGGESTION_CACHE_MAX_INDEXES = int(os.environ.get("SUGGESTION_CACHE_MAX_INDEXES", "500"))
+SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS", "30"))
+SUGGESTION_USAGE_FLUSH_BATCH_SIZE = int(os.environ.get("SUGGESTION_USAGE_FLUSH_BATCH_SIZE", "200"))
+
+# Audit retention (core.audit_archive): older rows are moved to compressed
+# JSONL shards by `manage.py archive_audit_logs`
+AUDIT_RETENTION_MONTHS = int(os.environ.get("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_ARCHIVE_ROOT = os.environ.get("AUDIT_ARCHIVE_ROOT", str(BASE_DIR / 'audit_archive'))
+
+# Media backups (core.media_backup): incremental, archives written in parallel
+MEDIA_BACKUP_WORKERS = int(os.environ.get("MEDIA_BACKUP_WORKERS", "4"))
+
+# Orphaned media cleanup (core.orphan_scanner, daily cleanup_orphaned_files task)
+ORPHAN_CLEANUP_MIN_AGE_DAYS = int(os.environ.get("ORPHAN_CLEANUP_MIN_AGE_DAYS", "7"))
+ORPHAN_DELETE_RATE = float(os.environ.get("ORPHAN_DELETE_RATE", "50"))
+
 # Rate limiting configuration
 RATELIMIT_USE_CACHE = 'default'
 
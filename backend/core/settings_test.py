@@ -50,6 +50,8 @@ PASSWORD_HASHERS = [
 # Ensure we are in test mode
 DEBUG = False
 CELERY_TASK_ALWAYS_EAGER = True
+# Audit rows written synchronously (the writer thread cannot see the in-memory test DB)
+AUDIT_ASYNC_ENABLED = False
 
 # Disable security redirects that break test client (HTTP → HTTPS redirect causes 301)
 SECURE_SSL_REDIRECT = False
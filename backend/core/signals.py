@@ -0,0 +1,13 @@
+"""
+Core Signals - Opérations de core qui contournent les signaux des modèles
+
+pre_restore / post_restore : envoyés par core.backup_format.restore_database
+autour d'une restauration (tables vidées en SQL brut puis rechargées par
+bulk_create : ni post_save ni post_delete). Les applications qui gardent un
+état dérivé (caches, index) le rafraîchissent sur post_restore, envoyé après
+la validation de la transaction. Argument : `models`, les modèles restaurés.
+"""
+from django.dispatch import Signal
+
+pre_restore = Signal()
+post_restore = Signal()
@@ -0,0 +1,111 @@
+"""
+Tests de la rétention de l'audit (core.audit_archive, archive_audit_logs, /api/audit/)
+"""
+import datetime
+import gzip
+import json
+import os
+from io import StringIO
+
+import pytest
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+
+from core.audit_archive import load_manifest, retention_cutoff, search_archive
+from core.models import AuditLog
+from exams.models import Copy, Exam
+from grading.models import GradingEvent
+
+
+@pytest.fixture
+def archive_dir(tmp_path, settings):
+    settings.AUDIT_ARCHIVE_ROOT = str(tmp_path / 'audit_archive')
+    return settings.AUDIT_ARCHIVE_ROOT
+
+
+def _log(action, when, resource_id='1'):
+    return AuditLog.objects.create(action=action, resource_type='Copy', resource_id=resource_id,
+                                   ip_address='127.0.0.1', user_agent='pytest', timestamp=when)
+
+
+def test_retention_cutoff_clamps_to_month_end():
+    now = datetime.datetime(2026, 3, 31, 15, 0, tzinfo=datetime.timezone.utc)
+    assert retention_cutoff(1, now) == datetime.datetime(2026, 2, 28, tzinfo=datetime.timezone.utc)
+    assert retention_cutoff(15, now) == datetime.datetime(2024, 12, 31, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.django_db
+def test_archive_exports_daily_shards_then_deletes(archive_dir, teacher_user):
+    now = timezone.now()
+    old_day = now - datetime.timedelta(days=400)
+    _log('copy.download', old_day)
+    _log('copy.download', old_day + datetime.timedelta(minutes=5), resource_id='2')
+    _log('login.success', old_day + datetime.timedelta(days=1))
+    recent = _log('login.success', now)
+
+    exam = Exam.objects.create(name="Archive Exam", date=datetime.date.today())
+    copy = Copy.objects.create(exam=exam, anonymous_id="ARCH-01")
+    GradingEvent.objects.create(copy=copy, action=GradingEvent.Action.CREATE_ANN,
+                                actor=teacher_user, timestamp=old_day)
+
+    out = StringIO()
+    call_command('archive_audit_logs', '--dry-run', stdout=out)
+    assert AuditLog.objects.count() == 4
+    assert 'core.auditlog: 3 row(s) would be archived' in out.getvalue()
+
+    call_command('archive_audit_logs', '--months', '12', '--batch-size', '1', stdout=StringIO())
+
+    assert list(AuditLog.objects.values_list('id', flat=True)) == [recent.id]
+    assert not GradingEvent.objects.exists()
+
+    shards = load_manifest(archive_dir)['shards']
+    assert sorted((s['model'], s['rows']) for s in shards) == [
+        ('core.auditlog', 1), ('core.auditlog', 2), ('grading.gradingevent', 1),
+    ]
+    first = next(s for s in shards if s['model'] == 'core.auditlog' and s['rows'] == 2)
+    assert first['path'] == f"core.auditlog/{old_day:%Y}/{old_day:%m}/{old_day:%Y-%m-%d}.jsonl.gz"
+    with gzip.open(os.path.join(archive_dir, first['path']), 'rt') as f:
+        rows = [json.loads(line) for line in f]
+    assert [row['resource_id'] for row in rows] == ['1', '2']
+
+    call_command('archive_audit_logs', '--verify', stdout=StringIO())
+    with open(os.path.join(archive_dir, first['path']), 'ab') as f:
+        f.write(b'tampered')
+    with pytest.raises(CommandError):
+        call_command('archive_audit_logs', '--verify', stdout=StringIO())
+
+
+@pytest.mark.django_db
+def test_search_archive_filters_and_orders(archive_dir):
+    old_day = timezone.now() - datetime.timedelta(days=500)
+    for i in range(3):
+        _log('copy.download', old_day + datetime.timedelta(days=i), resource_id=str(i))
+    call_command('archive_audit_logs', stdout=StringIO())
+
+    rows = search_archive('core.auditlog')
+    assert [row['resource_id'] for row in rows] == ['2', '1', '0']
+    assert [row['resource_id'] for row in search_archive('core.auditlog', resource_id='1')] == ['1']
+    assert len(search_archive('core.auditlog', start=old_day + datetime.timedelta(days=1))) == 2
+    assert len(search_archive('core.auditlog', limit=1)) == 1
+
+
+@pytest.mark.django_db
+def test_audit_api_merges_live_and_archived_rows(archive_dir, api_client, admin_user, teacher_user):
+    old_day = timezone.now() - datetime.timedelta(days=500)
+    _log('copy.download', old_day, resource_id='42')
+    call_command('archive_audit_logs', stdout=StringIO())
+    _log('copy.download', timezone.now(), resource_id='42')
+
+    api_client.force_authenticate(teacher_user)
+    assert api_client.get('/api/audit/').status_code == 403
+
+    api_client.force_authenticate(admin_user)
+    response = api_client.get('/api/audit/', {'resource_id': '42'})
+    assert response.status_code == 200
+    assert response.data['count'] == 1
+
+    response = api_client.get('/api/audit/', {'resource_id': '42', 'include_archived': 'true'})
+    assert [row['archived'] for row in response.data['results']] == [False, True]
+
+    response = api_client.get('/api/audit/', {'source': 'gradingevent', 'copy_id': 'not-a-uuid'})
+    assert response.status_code == 400
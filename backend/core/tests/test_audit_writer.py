@@ -0,0 +1,110 @@
+"""
+Tests de l'écriture différée de l'audit (core.utils.audit_writer)
+"""
+from datetime import date, timedelta
+
+import pytest
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from core.models import AuditLog
+from core.utils import audit_writer
+from core.utils.audit_writer import AuditWriter, audit_queue_depth, write_events
+from exams.models import Copy, Exam
+from grading.models import GradingEvent
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    # Pas de thread : les tests appellent flush() eux-mêmes (la base de test
+    # en mémoire n'est pas visible depuis un autre thread)
+    monkeypatch.setattr(AuditWriter, '_ensure_thread', lambda self: None)
+    return AuditWriter(max_size=10, batch_size=2, interval=0.01, asynchronous=True)
+
+
+def _entry(action='test.action'):
+    return AuditLog(action=action, resource_type='Copy', resource_id='1',
+                    ip_address='127.0.0.1', user_agent='pytest')
+
+
+@pytest.mark.django_db
+def test_events_are_queued_then_written_in_batches(writer, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        writer.submit(*[_entry() for _ in range(5)])
+
+    assert AuditLog.objects.count() == 0
+    assert audit_queue_depth._value.get() == 5
+
+    assert writer.flush() == 2
+    assert writer.drain() == 3
+    assert AuditLog.objects.count() == 5
+    assert audit_queue_depth._value.get() == 0
+
+
+@pytest.mark.django_db
+def test_rolled_back_transaction_enqueues_nothing(writer, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                writer.submit(_entry())
+                raise RuntimeError("rollback")
+
+    assert writer.queue.qsize() == 0
+
+
+@pytest.mark.django_db
+def test_full_queue_falls_back_to_synchronous_write(django_capture_on_commit_callbacks, monkeypatch):
+    monkeypatch.setattr(AuditWriter, '_ensure_thread', lambda self: None)
+    writer = AuditWriter(max_size=2, batch_size=10, asynchronous=True)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        writer.submit(_entry('a'), _entry('b'), _entry('overflow'))
+
+    assert list(AuditLog.objects.values_list('action', flat=True)) == ['overflow']
+    writer.drain()
+    assert AuditLog.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_failed_flush_is_retried(writer, django_capture_on_commit_callbacks, monkeypatch):
+    with django_capture_on_commit_callbacks(execute=True):
+        writer.submit(_entry(), _entry())
+
+    def database_down(objs):
+        raise OperationalError("database is down")
+
+    with monkeypatch.context() as m:
+        m.setattr(audit_writer, 'write_events', database_down)
+        assert writer.flush() == 0
+    assert AuditLog.objects.count() == 0
+
+    assert writer.flush() == 2
+    assert AuditLog.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_replayed_grading_events_are_not_duplicated(teacher_user):
+    exam = Exam.objects.create(name="Audit Exam", date=date.today())
+    copy = Copy.objects.create(exam=exam, anonymous_id="AUDIT-01")
+    event_time = timezone.now() - timedelta(minutes=5)
+    events = [GradingEvent(copy=copy, action=GradingEvent.Action.CREATE_ANN, actor=teacher_user,
+                           timestamp=event_time)]
+
+    write_events(events)
+    write_events(events)
+
+    assert GradingEvent.objects.filter(copy=copy).count() == 1
+    # Heure de l'événement, pas celle de l'écriture
+    assert GradingEvent.objects.get(copy=copy).timestamp == event_time
+
+
+@pytest.mark.django_db
+def test_replayed_audit_logs_are_not_duplicated():
+    entries = [_entry('replayed.one'), _entry('replayed.two')]
+
+    write_events(entries)
+    # Lot rejoué (ex. commit réussi mais erreur remontée au writer)
+    write_events(entries)
+
+    assert AuditLog.objects.filter(action__startswith='replayed.').count() == 2
+    assert set(AuditLog.objects.values_list('event_id', flat=True)) == {entry.event_id for entry in entries}
@@ -0,0 +1,146 @@
+"""
+Tests du format de sauvegarde NDJSON (core.backup_format, backup / restore)
+"""
+import datetime
+import gzip
+import json
+import os
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command, CommandError
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from core.backup_format import backup_models
+from core.signals import post_restore, pre_restore
+from exams.models import Booklet, Copy, Exam
+from grading.models import Annotation, AnnotationTemplate, UserAnnotation
+from grading.suggestions import get_suggestion_cache
+
+
+def _backup(tmp_path, **options):
+    out = tmp_path / 'backups'
+    out.mkdir(exist_ok=True)
+    call_command('backup', output_dir=str(out), stdout=StringIO(), **options)
+    return str(out / os.listdir(out)[0])
+
+
+def test_models_come_after_their_dependencies():
+    order = [m._meta.label for m in backup_models()]
+
+    assert order.index('auth.User') < order.index('exams.Exam')
+    assert order.index('exams.Exam') < order.index('exams.Copy')
+    assert order.index('exams.Booklet') < order.index('exams.Copy')  # M2M Copy.booklets
+    assert order.index('exams.Copy') < order.index('grading.Annotation')
+    assert 'auth.Permission' not in order
+
+
+@pytest.mark.django_db
+def test_ndjson_backup_restore_round_trip(tmp_path, teacher_user):
+    exam = Exam.objects.create(name="Backup Exam", date=datetime.date(2026, 6, 1))
+    exam.correctors.add(teacher_user)
+    booklet = Booklet.objects.create(exam=exam, start_page=1, end_page=2)
+    copy = Copy.objects.create(exam=exam, anonymous_id="ND-01")
+    copy.booklets.add(booklet)
+    Annotation.objects.create(copy=copy, page_index=0, type=Annotation.Type.COMMENT, content="Persistent",
+                              x=0.1, y=0.1, w=0.1, h=0.1, created_by=teacher_user)
+    created_at = timezone.now() - datetime.timedelta(days=30)
+    Exam.objects.filter(pk=exam.pk).update(created_at=created_at)
+
+    backup_path = _backup(tmp_path, batch_size=1)
+    with open(os.path.join(backup_path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert manifest['format'] == 'ndjson'
+    assert manifest['database_backup'] is None
+    entry = next(e for e in manifest['database_files'] if e['model'] == 'exams.copy')
+    assert entry['rows'] == 1
+    with gzip.open(os.path.join(backup_path, entry['path']), 'rt') as f:
+        assert json.loads(f.readline())['fields']['booklets'] == [str(booklet.pk)]
+
+    Exam.objects.filter(pk=exam.pk).update(name="Modified after backup")
+    Copy.objects.filter(pk=copy.pk).delete()
+    Exam.objects.create(name="Created after backup", date=datetime.date(2026, 7, 1))
+
+    call_command('restore', backup_path, stdout=StringIO())
+
+    restored = Exam.objects.get()
+    assert restored.name == "Backup Exam"
+    assert restored.created_at == created_at
+    assert list(restored.correctors.all()) == [teacher_user]
+    restored_copy = Copy.objects.get(anonymous_id="ND-01")
+    assert list(restored_copy.booklets.all()) == [booklet]
+    assert restored_copy.annotations.get().content == "Persistent"
+    assert User.objects.get(pk=teacher_user.pk).groups.filter(name=teacher_user.groups.first().name).exists()
+    assert Group.objects.exists()
+
+
+@pytest.mark.django_db
+def test_restore_empties_tables_without_signals(tmp_path, teacher_user):
+    exam = Exam.objects.create(name="Suggestions", date=datetime.date(2026, 6, 1))
+    AnnotationTemplate.objects.create(exam=exam, exercise_number=1, question_number='1',
+                                      criterion_type='method', text="Méthode correcte")
+    UserAnnotation.objects.create(user=teacher_user, text="Revoir la méthode")
+    backup_path = _backup(tmp_path)
+    UserAnnotation.objects.create(user=teacher_user, text="Ajoutée après la sauvegarde")
+    suggestions = get_suggestion_cache()
+    user_version = suggestions._versions(('user', teacher_user.pk))[0]
+    deleted = []
+
+    def on_delete(sender, **kwargs):
+        deleted.append(sender)
+
+    post_delete.connect(on_delete)
+    try:
+        call_command('restore', backup_path, stdout=StringIO())
+    finally:
+        post_delete.disconnect(on_delete)
+
+    assert deleted == []
+    assert list(UserAnnotation.objects.values_list('text', flat=True)) == ["Revoir la méthode"]
+    assert AnnotationTemplate.objects.get().exam_id == exam.pk
+    assert suggestions._versions(('user', teacher_user.pk))[0] == user_version + 1
+    assert [a.text for a in suggestions.suggest(exam.pk, teacher_user.pk)[1]] == ["Revoir la méthode"]
+
+
+@pytest.mark.django_db
+def test_restore_sends_pre_and_post_restore(tmp_path):
+    Exam.objects.create(name="Signals", date=datetime.date(2026, 6, 1))
+    backup_path = _backup(tmp_path)
+    received = []
+
+    def on_restore(signal, sender, models, **kwargs):
+        received.append((signal, Exam in models, Exam.objects.count()))
+
+    pre_restore.connect(on_restore)
+    post_restore.connect(on_restore)
+    try:
+        Exam.objects.create(name="Created after backup", date=datetime.date(2026, 7, 1))
+        call_command('restore', backup_path, stdout=StringIO())
+    finally:
+        pre_restore.disconnect(on_restore)
+        post_restore.disconnect(on_restore)
+
+    assert received == [(pre_restore, True, 2), (post_restore, True, 1)]
+
+
+@pytest.mark.django_db
+def test_restore_refuses_corrupted_file(tmp_path):
+    Exam.objects.create(name="Checked", date=datetime.date(2026, 6, 1))
+    backup_path = _backup(tmp_path)
+    with open(os.path.join(backup_path, 'db', 'exams.exam.ndjson.gz'), 'ab') as f:
+        f.write(b'garbage')
+
+    Exam.objects.create(name="Still here", date=datetime.date(2026, 7, 1))
+    with pytest.raises(CommandError, match='checksum mismatch'):
+        call_command('restore', backup_path, stdout=StringIO())
+    assert Exam.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_benchmark_reports_both_formats(tmp_path):
+    Exam.objects.create(name="Bench", date=datetime.date(2026, 6, 1))
+    out = StringIO()
+    call_command('benchmark_backup', stdout=out)
+    assert 'json' in out.getvalue() and 'ndjson' in out.getvalue()
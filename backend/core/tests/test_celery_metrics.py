@@ -0,0 +1,87 @@
+"""
+Tests de l'instrumentation Celery (core.celery_metrics)
+"""
+import datetime
+import time
+from types import SimpleNamespace
+
+from celery.signals import before_task_publish
+
+from core import celery_metrics
+from core.celery import app
+
+
+@app.task(name='tests.celery_metrics.ok')
+def _ok_task():
+    return 'ok'
+
+
+@app.task(name='tests.celery_metrics.flaky', bind=True, max_retries=1, default_retry_delay=0)
+def _flaky_task(self):
+    if self.request.retries == 0:
+        raise self.retry(exc=RuntimeError('transient'))
+    return 'recovered'
+
+
+METRICS = (
+    celery_metrics.celery_task_queue_wait_seconds,
+    celery_metrics.celery_task_runtime_seconds,
+    celery_metrics.celery_task_peak_rss_delta_bytes,
+    celery_metrics.celery_task_retries_total,
+    celery_metrics.celery_tasks_total,
+)
+
+
+def _sample(name, **labels):
+    # Lecture directe des métriques : test_prometheus vide le registre partagé
+    for metric in METRICS:
+        for family in metric.collect():
+            for sample in family.samples:
+                if sample.name == name and sample.labels == labels:
+                    return sample.value
+    return 0
+
+
+def test_runtime_memory_and_outcome_are_recorded():
+    task = 'tests.celery_metrics.ok'
+    runs = _sample('celery_task_runtime_seconds_count', task=task)
+    successes = _sample('celery_tasks_total', task=task, outcome='SUCCESS')
+
+    assert _ok_task.delay().get() == 'ok'
+
+    assert _sample('celery_task_runtime_seconds_count', task=task) == runs + 1
+    assert _sample('celery_task_peak_rss_delta_bytes_count', task=task) == runs + 1
+    assert _sample('celery_tasks_total', task=task, outcome='SUCCESS') == successes + 1
+    # Exécution eager : pas de passage par la file
+    assert _sample('celery_task_queue_wait_seconds_count', task=task) == 0
+    assert not celery_metrics._running
+
+
+def test_retries_are_counted():
+    task = 'tests.celery_metrics.flaky'
+    retries = _sample('celery_task_retries_total', task=task)
+
+    assert _flaky_task.apply().get() == 'recovered'
+
+    assert _sample('celery_task_retries_total', task=task) == retries + 1
+    assert _sample('celery_tasks_total', task=task, outcome='RETRY') >= 1
+
+
+def test_queue_wait_measured_from_publish_header_or_eta():
+    headers = {}
+    before_task_publish.send(sender='tests.celery_metrics.ok', headers=headers)
+    assert time.time() - headers[celery_metrics.ENQUEUED_AT_HEADER] < 1
+
+    task = SimpleNamespace(name='tests.celery_metrics.queued', request=SimpleNamespace(
+        enqueued_at=time.time() - 30, eta=None, is_eager=False,
+    ))
+    celery_metrics._task_started(task_id='t1', task=task)
+    celery_metrics._task_finished(task_id='t1', task=task, state='SUCCESS')
+    assert _sample('celery_task_queue_wait_seconds_sum', task=task.name) >= 30
+
+    # Tâche différée : l'attente compte à partir de l'ETA, pas de la publication
+    task.request.eta = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)).isoformat()
+    before = _sample('celery_task_queue_wait_seconds_sum', task=task.name)
+    celery_metrics._task_started(task_id='t2', task=task)
+    celery_metrics._task_finished(task_id='t2', task=task, state='SUCCESS')
+    assert _sample('celery_task_queue_wait_seconds_sum', task=task.name) - before < 5
@@ -0,0 +1,29 @@
+"""
+Tests du routage Celery (files interactive / bulk et limites de temps par file)
+"""
+from core.celery import app, QueueTimeLimits
+from exams.tasks import process_single_document
+from grading.tasks import async_finalize_copy
+
+
+def _queue(name):
+    return app.amqp.router.route({}, name)['queue'].name
+
+
+def test_tasks_are_routed_by_workload():
+    assert _queue('grading.tasks.async_finalize_copy') == 'interactive'
+    assert _queue('grading.tasks.async_import_pdf') == 'interactive'
+    assert _queue('exams.tasks.process_document_set') == 'documents'
+    assert _queue('exams.tasks.detect_subject_variants') == 'documents'
+    assert _queue('grading.tasks.cleanup_orphaned_files') == 'bulk'
+    assert _queue('grading.tasks.flush_draft_store') == 'default'
+    assert _queue('grading.tasks.prefetch_page_images') == 'default'
+    assert _queue('grading.tasks.generate_exam_summaries') == 'llm'
+    assert {q.name for q in app.conf.task_queues} == {'interactive', 'default', 'documents', 'llm', 'bulk'}
+
+
+def test_time_limits_follow_the_queue(settings):
+    settings.CELERY_QUEUE_TIME_LIMITS = dict(settings.CELERY_QUEUE_TIME_LIMITS, documents=600)
+
+    assert QueueTimeLimits().annotate(process_single_document) == {'time_limit': 600, 'soft_time_limit': 570}
+    assert async_finalize_copy.time_limit == 300
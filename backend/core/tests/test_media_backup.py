@@ -0,0 +1,93 @@
+"""
+Tests des sauvegardes médias incrémentales (core.media_backup, backup / restore --include-media)
+"""
+import os
+import shutil
+import zipfile
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command, CommandError
+
+from core.media_backup import backup_media, load_media_manifest, restore_media
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_incremental_chain_archives_only_changes(tmp_path):
+    media = str(tmp_path / 'media')
+    backups = tmp_path / 'backups'
+    _write(media, 'copies/pages/a/p1.png', b'\x89PNG' + b'a' * 5000)
+    _write(media, 'copies/notes.txt', b'hello ' * 1000)
+    _write(media, 'page_cache/ab/cached.png', b'cache')
+
+    first = str(backups / 'korrigo_backup_1')
+    summary = backup_media(media, first, workers=2)
+    assert (summary['files'], summary['archived_files'], summary['parent']) == (2, 2, None)
+
+    members = {}
+    for archive in load_media_manifest(first)['archives']:
+        with zipfile.ZipFile(os.path.join(first, archive['path'])) as zf:
+            members.update({info.filename: info for info in zf.infolist()})
+    assert members['copies/pages/a/p1.png'].compress_type == zipfile.ZIP_STORED
+    assert members['copies/notes.txt'].compress_type == zipfile.ZIP_DEFLATED
+
+    _write(media, 'copies/pages/a/p2.png', b'\x89PNG' + b'b' * 100)
+    _write(media, 'copies/notes.txt', b'changed')
+    second = str(backups / 'korrigo_backup_2')
+    summary = backup_media(media, second, parent_dir=first, workers=2)
+    assert (summary['files'], summary['archived_files'], summary['reused_files']) == (3, 2, 1)
+    assert load_media_manifest(second)['files']['copies/pages/a/p1.png']['backup'] == 'korrigo_backup_1'
+
+    restored = str(tmp_path / 'restored')
+    assert restore_media(second, restored) == 3
+    with open(os.path.join(restored, 'copies/notes.txt'), 'rb') as f:
+        assert f.read() == b'changed'
+    with open(os.path.join(restored, 'copies/pages/a/p1.png'), 'rb') as f:
+        assert f.read() == b'\x89PNG' + b'a' * 5000
+    assert not os.path.exists(os.path.join(restored, 'page_cache'))
+    assert os.stat(os.path.join(restored, 'copies/pages/a/p1.png')).st_mtime_ns == \
+        os.stat(os.path.join(media, 'copies/pages/a/p1.png')).st_mtime_ns
+
+    shutil.rmtree(first)
+    with pytest.raises(ValueError, match='Parent media backup missing'):
+        restore_media(second, str(tmp_path / 'again'))
+
+
+@pytest.mark.django_db
+def test_backup_commands_chain_media(tmp_path, settings, monkeypatch):
+    from core.management.commands import backup as backup_command
+
+    # Deux sauvegardes dans la même seconde auraient le même nom
+    clock = mock.Mock()
+    clock.now.return_value.strftime.side_effect = ['20260101_000000', '20260102_000000']
+    monkeypatch.setattr(backup_command, 'datetime', clock)
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    _write(settings.MEDIA_ROOT, 'exams/source.pdf', b'%PDF-1.4 source')
+    out = tmp_path / 'backups'
+
+    call_command('backup', output_dir=str(out), include_media=True, stdout=StringIO())
+    output = StringIO()
+    call_command('backup', output_dir=str(out), include_media=True, stdout=output)
+    assert '0 new/changed file(s) archived, 1 unchanged (parent: korrigo_backup_20260101_000000)' in output.getvalue()
+    latest = str(out / 'korrigo_backup_20260102_000000')
+
+    os.remove(os.path.join(settings.MEDIA_ROOT, 'exams/source.pdf'))
+    call_command('restore', latest, stdout=StringIO())
+    with open(os.path.join(settings.MEDIA_ROOT, 'exams/source.pdf'), 'rb') as f:
+        assert f.read() == b'%PDF-1.4 source'
+
+    archive = str(out / 'korrigo_backup_20260101_000000' / 'media' / 'media-000.zip')
+    with open(archive, 'rb') as f:
+        data = f.read()
+    with open(archive, 'wb') as f:
+        f.write(data.replace(b'%PDF-1.4 source', b'%PDF-1.4 SOURCE'))
+    with pytest.raises(CommandError, match='Checksum mismatch'):
+        call_command('restore', latest, stdout=StringIO())
@@ -162,3 +162,91 @@ class MetricsMiddlewareTests(TestCase):
         response = self.middleware.process_response(request, response)
         
         self.assertIn('X-Response-Time-Ms', response)
+
+
+class LatencySketchTests(TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        """Sketch quantiles stay within 1% of the exact value"""
+        from core.middleware.metrics import LatencySketch
+        values = [0.001 * (i + 1) for i in range(1000)]  # 1ms .. 1s
+        sketch = LatencySketch()
+        for v in values:
+            sketch.add(v)
+
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=exact * 0.011)
+
+    def test_merge_equals_single_stream_and_memory_is_bounded(self):
+        """Merged per-worker sketches give the same answer as one sketch"""
+        from core.middleware.metrics import LatencySketch
+        a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for i in range(5000):
+            v = 0.0005 * (i % 977 + 1)
+            (a if i % 2 else b).add(v)
+            both.add(v)
+        merged = LatencySketch.from_dict(a.to_dict()).merge(b)
+        self.assertEqual(merged.quantile(0.99), both.quantile(0.99))
+
+        for v in (1e-9, 1e-3, 10.0, 1e6):
+            both.add(v)
+        self.assertLess(len(both.buckets), 1200)
+
+
+class SharedMetricsCollectorTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shared_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _worker(self):
+        return MetricsCollector(shared_dir=self.shared_dir, sync_interval=0)
+
+    def test_metrics_are_merged_across_workers(self):
+        """Any worker reports the requests of all workers, with percentiles"""
+        worker_a, worker_b = self._worker(), self._worker()
+        for i in range(90):
+            worker_a.record_request('/api/test/', 'GET', 0.010, 200)
+        for i in range(10):
+            worker_b.record_request('/api/test/', 'GET', 1.0, 500)
+
+        endpoint = worker_a.get_metrics()['GET /api/test/']
+        self.assertEqual(endpoint['count'], 100)
+        self.assertEqual(endpoint['errors'], 10)
+        self.assertAlmostEqual(endpoint['sketch'].quantile(0.5), 0.010, delta=0.0002)
+        self.assertAlmostEqual(endpoint['sketch'].quantile(0.99), 1.0, delta=0.011)
+        self.assertEqual(worker_b.get_metrics()['GET /api/test/']['count'], 100)
+
+    def test_exited_worker_totals_are_kept(self):
+        """Files of exited workers are folded into merged.json"""
+        import os
+        worker = self._worker()
+        worker.record_request('/api/test/', 'GET', 0.1, 200)
+        exited = self._worker()
+        exited.record_request('/api/test/', 'GET', 0.2, 200)
+        # Same content, under the name of a pid that no longer exists
+        dead_file = os.path.join(self.shared_dir, 'worker-999999999-dead.json')
+        os.rename(exited._worker_file, dead_file)
+
+        self.assertEqual(worker.get_metrics()['GET /api/test/']['count'], 2)
+        self.assertIn('merged.json', os.listdir(self.shared_dir))
+        self.assertFalse(os.path.exists(dead_file))
+        self.assertEqual(worker.get_metrics()['GET /api/test/']['count'], 2)
+
+    def test_reset_clears_every_worker(self):
+        """Reset from one worker is applied by the others on their next sync"""
+        import time as _time
+        worker_a, worker_b = self._worker(), self._worker()
+        worker_a.record_request('/api/test/', 'GET', 0.1, 200)
+        worker_b.record_request('/api/test/', 'GET', 0.1, 200)
+        _time.sleep(0.01)
+
+        worker_a.reset()
+        worker_b.record_request('/api/other/', 'GET', 0.1, 200)
+
+        metrics = worker_a.get_metrics()
+        self.assertNotIn('GET /api/test/', metrics)
+        self.assertEqual(metrics['GET /api/other/']['count'], 1)
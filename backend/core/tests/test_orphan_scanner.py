@@ -0,0 +1,105 @@
+"""
+Tests de la détection des médias orphelins (core.orphan_scanner, cleanup_orphaned_files)
+"""
+import datetime
+import os
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from core.orphan_scanner import scan_orphans, sorted_unique
+from exams.models import Booklet, Copy, Exam
+
+
+def _write(root, rel_path, content=b'x', age_days=10):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def media(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    root = settings.MEDIA_ROOT
+    exam = Exam.objects.create(name="Orphans", date=datetime.date(2026, 6, 1),
+                               pdf_source='exams/source/scan.pdf')
+    Booklet.objects.create(exam=exam, start_page=1, end_page=3, pages_images=[
+        f'booklets/{exam.id}/p1.png',
+        os.path.join(root, f'booklets/{exam.id}/p2.png'),
+        'pdf:exams/source/lazy.pdf#2',
+    ])
+    Copy.objects.create(exam=exam, anonymous_id="ORPH-01", final_pdf='copies/final/kept.pdf')
+
+    _write(root, 'exams/source/scan.pdf', b'%PDF' * 10)
+    _write(root, 'exams/source/lazy.pdf')
+    _write(root, f'booklets/{exam.id}/p1.png')
+    _write(root, f'booklets/{exam.id}/p2.png')
+    _write(root, f'booklets/{exam.id}/p3.png', b'p' * 100)
+    _write(root, 'copies/pages/old-copy/p1.webp', b'w' * 50)
+    _write(root, 'copies/final/gone.pdf', b'f' * 20)
+    _write(root, 'copies/final/just_written.pdf', age_days=0)
+    _write(root, 'page_cache/ab/cached.png')
+    _write(root, 'temp_uploads/upload.pdf')
+    return root, exam
+
+
+@pytest.mark.django_db
+def test_scan_reports_orphans_of_every_class(media):
+    root, exam = media
+    seen = []
+
+    report = scan_orphans(older_than_days=1, batch_size=1, on_orphan=lambda *args: seen.append(args))
+
+    assert report['files'] == 8  # page_cache/ et temp_uploads/ ignorés
+    assert sorted(path for path, _size, _deleted in seen) == [
+        'booklets/%s/p3.png' % exam.id, 'copies/final/gone.pdf', 'copies/pages/old-copy/p1.webp',
+    ]
+    assert report['orphan_bytes'] == 170
+    assert report['recent_orphans'] == 1
+    assert report['missing'] == 1  # copies/final/kept.pdf
+    assert report['by_class'] == {
+        'booklets': {'files': 1, 'bytes': 100},
+        'copies/final': {'files': 1, 'bytes': 20},
+        'copies/pages': {'files': 1, 'bytes': 50},
+    }
+    assert report['deleted'] == 0
+    assert os.path.exists(os.path.join(root, 'copies/final/gone.pdf'))
+
+
+@pytest.mark.django_db
+def test_delete_respects_limit_and_keeps_referenced_files(media):
+    root, exam = media
+
+    report = scan_orphans(older_than_days=1, delete=True, max_deletes=2, delete_rate=1000)
+    assert (report['orphans'], report['deleted']) == (3, 2)
+
+    report = scan_orphans(older_than_days=1, delete=True)
+    assert (report['orphans'], report['deleted']) == (1, 1)
+    for rel_path in ('exams/source/scan.pdf', 'exams/source/lazy.pdf', f'booklets/{exam.id}/p2.png',
+                     'copies/final/just_written.pdf', 'page_cache/ab/cached.png'):
+        assert os.path.exists(os.path.join(root, rel_path))
+
+
+@pytest.mark.django_db
+def test_command_dry_run_prints_size_report(media):
+    root, _exam = media
+    out = StringIO()
+
+    call_command('cleanup_orphaned_files', dry_run=True, verbosity=2, stdout=out)
+
+    output = out.getvalue()
+    assert 'Orphaned files found: 3' in output
+    assert '[DRY-RUN] Would delete: copies/final/gone.pdf' in output
+    assert 'Referenced files missing on disk: 1' in output
+    assert os.path.exists(os.path.join(root, 'copies/final/gone.pdf'))
+
+
+def test_external_sort_merges_runs(tmp_path):
+    items = [f'file-{i % 37:03d}' for i in range(500)]
+    assert list(sorted_unique(iter(items), 16, str(tmp_path))) == sorted(set(items))
@@ -0,0 +1,88 @@
+"""
+Tests du profilage à la demande (core.middleware.profiling, /api/profiling/)
+"""
+import threading
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+
+from core.middleware import profiling
+from core.middleware.profiling import QueryRecorder, StackSampler
+from core.prometheus import registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(profiling, 'profile_store', None)
+
+
+@pytest.mark.django_db
+def test_query_recorder_reports_repeated_statements(admin_user):
+    recorder = QueryRecorder(detailed=True)
+    with connection.execute_wrapper(recorder):
+        for _ in range(6):
+            User.objects.filter(pk=admin_user.pk).first()
+        User.objects.count()
+
+    assert recorder.count == 7
+    duplicates = recorder.duplicates(threshold=5)
+    assert len(duplicates) == 1
+    assert duplicates[0]['count'] == 6
+    assert duplicates[0]['identical'] == 6
+
+
+def _busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stack_sampler_collects_folded_stacks(settings):
+    with StackSampler(threading.get_ident(), 0.002) as sampler:
+        _busy_wait(0.1)
+
+    assert sampler.samples > 5
+    assert '_busy_wait' in sampler.folded()
+    assert sampler.categories() == {'python': 1.0}
+
+
+@pytest.mark.django_db
+def test_profile_header_is_honoured_for_staff_only(client, admin_user, teacher_user, settings):
+    settings.PROFILING_SAMPLE_RATE = 0
+
+    client.force_login(teacher_user)
+    response = client.get('/api/me/', HTTP_X_PROFILE='1')
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response
+
+    client.force_login(admin_user)
+    response = client.get('/api/me/', HTTP_X_PROFILE='1')
+    profile_id = response['X-Profile-Id']
+
+    listing = client.get('/api/profiling/').json()
+    assert [p['id'] for p in listing['results']] == [profile_id]
+    assert listing['results'][0]['sql_count'] > 0
+
+    detail = client.get(f'/api/profiling/{profile_id}/').json()
+    assert detail['route'] == '/api/me/'
+    assert detail['sql']['slowest']
+    assert 'folded' not in detail
+    folded = client.get(f'/api/profiling/{profile_id}/', {'output': 'folded'})
+    assert folded['Content-Type'].startswith('text/plain')
+
+    client.force_login(teacher_user)
+    assert client.get('/api/profiling/').status_code == 403
+
+
+@pytest.mark.django_db
+def test_sql_histograms_per_route(client, admin_user):
+    client.force_login(admin_user)
+    client.get('/api/me/')
+
+    count = registry.get_sample_value(
+        'http_request_sql_queries_count', {'method': 'GET', 'path': '/api/me/'}
+    )
+    assert count and count >= 1
+    assert not profiling.get_profile_store().list()
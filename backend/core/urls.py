@@ -50,6 +50,19 @@ urlpatterns += [
     path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
+# Request profiles (admin only, see core.middleware.profiling)
+from core.views_profiling import ProfileDetailView, ProfileListView
+urlpatterns += [
+    path('api/profiling/', ProfileListView.as_view(), name='profiling_list'),
+    path('api/profiling/<str:profile_id>/', ProfileDetailView.as_view(), name='profiling_detail'),
+]
+
+# Audit search, including archived shards (admin only)
+from core.views_audit import AuditSearchView
+urlpatterns += [
+    path('api/audit/', AuditSearchView.as_view(), name='audit_search'),
+]
+
 # Dev/E2E endpoints (only if E2E_SEED_TOKEN is set)
 if hasattr(settings, 'E2E_SEED_TOKEN') and settings.E2E_SEED_TOKEN:
     from core.views_dev import seed_e2e_endpoint
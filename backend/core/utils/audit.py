@@ -33,18 +33,24 @@ def log_audit(request: HttpRequest, action: str, resource_type: str, resource_id
         resource_type: Type de ressource (ex: 'Copy', 'Exam', 'Student')
         resource_id: ID de la ressource (UUID, int, etc.)
         metadata: Données contextuelles additionnelles (dict)
+
+    Returns:
+        AuditLog: instance NON sauvegardée (pk à None) : l'écriture est différée
+        et groupée par core.utils.audit_writer. L'événement est identifié par
+        son event_id, attribué ici.
     
     Examples:
         >>> log_audit(request, 'login.success', 'User', user.id)
         >>> log_audit(request, 'copy.download', 'Copy', copy.id, {'anonymous_id': copy.anonymous_id})
     """
     from core.models import AuditLog
+    from core.utils.audit_writer import submit_audit
     
     user = getattr(request, 'user', None)
     student_id = request.session.get('student_id')
 
-    # Créer l'entrée d'audit
-    audit_entry = AuditLog.objects.create(
+    # Créer l'entrée d'audit (écriture groupée en arrière-plan, cf. audit_writer)
+    audit_entry = AuditLog(
         user=user if user and user.is_authenticated else None,
         student_id=student_id,
         action=action,
@@ -54,6 +60,7 @@ def log_audit(request: HttpRequest, action: str, resource_type: str, resource_id
         user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],  # Limite pour éviter overflow
         metadata=metadata or {}
     )
+    submit_audit(audit_entry)
 
     # Log structuré pour monitoring externe (Sentry, CloudWatch, etc.)
     audit_logger.info(
@@ -0,0 +1,237 @@
+"""
+Audit Writer - Écriture différée et groupée des journaux d'audit
+
+Les événements d'audit (AuditLog, GradingEvent) sont produits dans le chemin
+de chaque requête : connexion, téléchargement de PDF, liste de copies élève,
+chaque annotation. Plutôt qu'un INSERT synchrone par événement, ils sont
+placés dans une file bornée en mémoire et un thread par process les écrit par
+lots (bulk_create).
+
+Garanties :
+- at-least-once tant que le process vit : un lot en échec est conservé et
+  réessayé au cycle suivant, la file est vidée à l'arrêt (atexit). Les
+  AuditLog (event_id, unique) et les GradingEvent (id) ont une clé UUID
+  attribuée à la création, un lot rejoué ne produit pas de doublon
+  (ignore_conflicts) ;
+- un événement produit dans une transaction n'est mis en file qu'au commit
+  (transaction.on_commit) : pas d'audit pour une écriture annulée ;
+- file pleine : écriture synchrone, l'événement n'est jamais abandonné.
+
+AUDIT_ASYNC_ENABLED=False (tests, scripts) : écriture immédiate, dans la
+transaction courante, comme avant.
+
+Métriques : audit_queue_depth, audit_flush_duration_seconds,
+audit_events_total{model, path}, audit_flush_errors_total.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from prometheus_client import Counter, Gauge, Histogram
+
+from core.prometheus import registry
+
+logger = logging.getLogger(__name__)
+
+audit_queue_depth = Gauge(
+    'audit_queue_depth',
+    'Audit events waiting in the in-process queue',
+    registry=registry
+)
+
+audit_flush_duration_seconds = Histogram(
+    'audit_flush_duration_seconds',
+    'Duration of one audit batch write in seconds',
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+    registry=registry
+)
+
+# path: queued (file), sync (mode synchrone), overflow (file pleine)
+audit_events_total = Counter(
+    'audit_events_total',
+    'Audit events recorded',
+    ['model', 'path'],
+    registry=registry
+)
+
+audit_flush_errors_total = Counter(
+    'audit_flush_errors_total',
+    'Audit batch writes that failed and were kept for retry',
+    registry=registry
+)
+
+
+def write_events(objs):
+    """
+    Écrit des instances AuditLog / GradingEvent non sauvegardées, un
+    bulk_create par modèle. Si une contrainte échoue (ex. copie supprimée
+    entre-temps), le lot est repris ligne à ligne et seules les lignes
+    invalides sont écartées.
+    """
+    by_model = defaultdict(list)
+    for obj in objs:
+        by_model[type(obj)].append(obj)
+
+    for model, rows in by_model.items():
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(rows, ignore_conflicts=True)
+        except IntegrityError:
+            for row in rows:
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create([row], ignore_conflicts=True)
+                except IntegrityError as e:
+                    logger.error(f"Dropping invalid {model.__name__} audit event: {e}")
+
+
+class AuditWriter:
+    """
+    File bornée + thread d'écriture par lots. Un seul par process
+    (get_audit_writer), redémarré après un fork (workers Gunicorn/Celery).
+    """
+
+    def __init__(self, max_size=None, batch_size=None, interval=None, asynchronous=None):
+        self.queue = queue.Queue(maxsize=max_size or settings.AUDIT_QUEUE_MAX_SIZE)
+        self.batch_size = batch_size or settings.AUDIT_FLUSH_BATCH_SIZE
+        self.interval = interval if interval is not None else settings.AUDIT_FLUSH_INTERVAL_SECONDS
+        self.asynchronous = settings.AUDIT_ASYNC_ENABLED if asynchronous is None else asynchronous
+        self._pending = []
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, *objs):
+        """Enregistre des événements d'audit (instances non sauvegardées)."""
+        if not objs:
+            return
+        if not self.asynchronous:
+            write_events(objs)
+            self._count(objs, 'sync')
+            return
+        transaction.on_commit(lambda: self._enqueue(objs))
+
+    def _enqueue(self, objs):
+        queued, overflow = [], []
+        for obj in objs:
+            try:
+                self.queue.put_nowait(obj)
+                queued.append(obj)
+            except queue.Full:
+                overflow.append(obj)
+        audit_queue_depth.set(self.queue.qsize())
+        self._count(queued, 'queued')
+
+        if overflow:
+            logger.warning(f"Audit queue full, writing {len(overflow)} event(s) synchronously")
+            write_events(overflow)
+            self._count(overflow, 'overflow')
+        self._ensure_thread()
+
+    @staticmethod
+    def _count(objs, path):
+        by_model = defaultdict(int)
+        for obj in objs:
+            by_model[type(obj).__name__] += 1
+        for model, count in by_model.items():
+            audit_events_total.labels(model=model, path=path).inc(count)
+
+    def flush(self):
+        """
+        Écrit un lot (au plus batch_size événements, en commençant par le lot
+        en échec précédent). Returns: nombre d'événements écrits.
+        """
+        with self._flush_lock:
+            batch, self._pending = self._pending, []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            audit_queue_depth.set(self.queue.qsize())
+            if not batch:
+                return 0
+
+            start = time.monotonic()
+            try:
+                write_events(batch)
+            except DatabaseError as e:
+                # Conservé pour le prochain cycle (at-least-once)
+                self._pending = batch
+                audit_flush_errors_total.inc()
+                logger.warning(f"Audit flush of {len(batch)} event(s) failed, will retry: {e}")
+                return 0
+            finally:
+                audit_flush_duration_seconds.observe(time.monotonic() - start)
+            return len(batch)
+
+    def drain(self):
+        """Écrit tout ce qui est en attente (arrêt du process). Returns: total écrit."""
+        total = 0
+        while True:
+            written = self.flush()
+            total += written
+            if not written:
+                return total
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                written = self.flush()
+            except Exception:
+                logger.exception("Audit writer loop error")
+                written = 0
+            finally:
+                close_old_connections()
+            # Lot plein : on enchaîne, sinon on attend le prochain cycle
+            if written < self.batch_size:
+                self._stop.wait(self.interval)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+        if self._pid == os.getpid():
+            written = self.drain()
+            if self.queue.qsize() or self._pending:
+                logger.error(
+                    f"Audit writer stopped with {self.queue.qsize() + len(self._pending)} unwritten event(s)"
+                )
+            elif written:
+                logger.info(f"Audit writer drained {written} event(s) at shutdown")
+
+
+_writer = None
+
+
+def get_audit_writer():
+    """Writer partagé par process."""
+    global _writer
+    if _writer is None:
+        _writer = AuditWriter()
+        atexit.register(_writer.close)
+    return _writer
+
+
+def submit_audit(*objs):
+    """Raccourci : get_audit_writer().submit(*objs)."""
+    get_audit_writer().submit(*objs)
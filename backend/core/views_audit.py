@@ -0,0 +1,125 @@
+"""
+Audit search endpoint: live audit tables plus archived shards (core.audit_archive).
+
+GET /api/audit/?source=gradingevent&copy_id=<uuid>&include_archived=true
+"""
+import datetime
+import logging
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.audit_archive import search_archive
+from core.auth import IsAdminOnly
+
+logger = logging.getLogger('audit')
+
+# source -> (model label, filtres acceptés : paramètre -> champ)
+AUDIT_SOURCES = {
+    'auditlog': ('core.auditlog', {
+        'action': 'action',
+        'resource_type': 'resource_type',
+        'resource_id': 'resource_id',
+        'user_id': 'user_id',
+        'student_id': 'student_id',
+    }),
+    'gradingevent': ('grading.gradingevent', {
+        'action': 'action',
+        'copy_id': 'copy_id',
+        'actor_id': 'actor_id',
+    }),
+}
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+
+def _parse_bound(value, end=False):
+    """Date (YYYY-MM-DD, journée entière) ou datetime ISO 8601."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.datetime.combine(day, datetime.time.max if end else datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+class AuditSearchView(APIView):
+    """
+    GET /api/audit/ - Recherche dans l'audit (enquête)
+    Permission: Admin only
+
+    Query params:
+        source: auditlog (défaut) | gradingevent
+        action, resource_type, resource_id, user_id, student_id (auditlog)
+        action, copy_id, actor_id (gradingevent)
+        start, end: date ou datetime ISO 8601
+        include_archived: true pour lire aussi les shards archivés
+        limit: nombre maximum de lignes (défaut 200, max 1000)
+    """
+    permission_classes = [IsAdminOnly]
+
+    def get(self, request):
+        from django.apps import apps
+
+        source = request.query_params.get('source', 'auditlog')
+        if source not in AUDIT_SOURCES:
+            return Response({"detail": f"source must be one of {', '.join(AUDIT_SOURCES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        label, accepted = AUDIT_SOURCES[source]
+        model = apps.get_model(label)
+
+        try:
+            start = _parse_bound(request.query_params.get('start'))
+            end = _parse_bound(request.query_params.get('end'), end=True)
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        include_archived = request.query_params.get('include_archived', '').lower() == 'true'
+        filters = {
+            field: request.query_params[param]
+            for param, field in accepted.items() if request.query_params.get(param)
+        }
+
+        try:
+            queryset = model.objects.filter(**filters)
+            if start:
+                queryset = queryset.filter(timestamp__gte=start)
+            if end:
+                queryset = queryset.filter(timestamp__lte=end)
+            fields = [f.attname for f in model._meta.concrete_fields]
+            live = list(queryset.order_by('-timestamp').values(*fields)[:limit + 1])
+        except (DjangoValidationError, ValueError) as e:
+            # Filtre invalide pour le type du champ (ex. copy_id non UUID)
+            return Response({"detail": f"Invalid filter: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        archived = []
+        if include_archived:
+            archived = [
+                dict(row, timestamp=parse_datetime(row['timestamp']))
+                for row in search_archive(label, start=start, end=end, limit=limit + 1, **filters)
+            ]
+
+        results = sorted(
+            [dict(row, archived=False) for row in live] + [dict(row, archived=True) for row in archived],
+            key=lambda row: row['timestamp'],
+            reverse=True,
+        )
+        logger.info(
+            f"Audit search by user {request.user.id}: source={source} filters={filters} "
+            f"include_archived={include_archived}"
+        )
+        return Response({
+            'source': source,
+            'count': min(len(results), limit),
+            'truncated': len(results) > limit,
+            'results': results[:limit],
+        })
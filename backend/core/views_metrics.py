@@ -6,13 +6,24 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from django.utils.decorators import method_decorator
-from core.middleware.metrics import metrics_collector
+from core.middleware.metrics import LatencySketch, metrics_collector
 from core.utils.ratelimit import maybe_ratelimit
 import logging
 
 logger = logging.getLogger('audit')
 
 
+def _percentiles_ms(sketch, min_time=None, max_time=None):
+    """p50/p95/p99 in ms (±1%), clamped to the observed min/max."""
+    result = {}
+    for name, q in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        value = sketch.quantile(q)
+        if value is not None and min_time is not None:
+            value = min(max(value, min_time), max_time)
+        result[name] = round(value * 1000, 2) if value is not None else None
+    return result
+
+
 class MetricsView(APIView):
     """
     GET /api/metrics/ - Returns collected application metrics
@@ -35,12 +46,19 @@ class MetricsView(APIView):
             'total_requests': sum(m['count'] for m in metrics.values()),
             'total_errors': sum(m['errors'] for m in metrics.values()),
             'avg_response_time': 0.0,
+            'workers': metrics_collector.worker_count(),
             'endpoints': []
         }
         
         total_time = sum(m['total_time'] for m in metrics.values())
         if summary['total_requests'] > 0:
             summary['avg_response_time'] = total_time / summary['total_requests']
+
+        # Percentiles over all routes: sketches are mergeable
+        overall = LatencySketch()
+        for m in metrics.values():
+            overall.merge(m['sketch'])
+        summary.update(_percentiles_ms(overall))
         
         # Format endpoint metrics
         for endpoint, m in sorted(metrics.items(), key=lambda x: x[1]['count'], reverse=True):
@@ -52,6 +70,7 @@ class MetricsView(APIView):
                 'avg_time_ms': round(avg_time * 1000, 2),
                 'min_time_ms': round(m['min_time'] * 1000, 2),
                 'max_time_ms': round(m['max_time'] * 1000, 2),
+                **_percentiles_ms(m['sketch'], m['min_time'], m['max_time']),
                 'error_rate': round(m['errors'] / m['count'] * 100, 2) if m['count'] > 0 else 0.0
             })
         
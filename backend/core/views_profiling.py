@@ -0,0 +1,61 @@
+"""
+Request profiles recorded by core.middleware.profiling (admin only).
+
+GET    /api/profiling/                     - Latest profiles (summary)
+GET    /api/profiling/<id>/                - Full profile (SQL, duplicates, samples)
+GET    /api/profiling/<id>/?output=folded  - Folded stacks (flamegraph.pl / speedscope)
+DELETE /api/profiling/                     - Clear the buffer
+
+Profiles are kept per process: with several Gunicorn workers, fetch the
+profile from the worker that served the request (X-Profile-Id header).
+"""
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.auth import IsAdminOnly
+from core.middleware.profiling import get_profile_store
+import logging
+
+logger = logging.getLogger('audit')
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdminOnly]
+
+    def get(self, request):
+        summaries = [
+            {
+                'id': p['id'],
+                'created_at': p['created_at'],
+                'method': p['method'],
+                'path': p['path'],
+                'status': p['status'],
+                'duration_ms': p['duration_ms'],
+                'sql_count': p['sql']['count'],
+                'sql_time_ms': p['sql']['time_ms'],
+                'duplicate_queries': len(p['sql']['duplicates']),
+                'categories': p['categories'],
+            }
+            for p in get_profile_store().list()
+        ]
+        return Response({'count': len(summaries), 'results': summaries})
+
+    def delete(self, request):
+        logger.warning(f"Request profiles cleared by user {request.user.id}")
+        get_profile_store().clear()
+        return Response({'status': 'profiles_cleared'})
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [IsAdminOnly]
+
+    def get(self, request, profile_id):
+        profile = get_profile_store().get(profile_id)
+        if profile is None:
+            return Response({"detail": "Profile not found (expired or served by another worker)."},
+                            status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('output') == 'folded':
+            return HttpResponse(profile['folded'], content_type='text/plain; charset=utf-8')
+        return Response({key: value for key, value in profile.items() if key != 'folded'})
@@ -0,0 +1,92 @@
+"""
+Benchmark of document chunking (exams.services.document_chunker).
+
+Chunks a synthetic barème (--pages pages, several exercises with lettered
+questions and criteria) or the pages of an existing extraction, then times
+the incremental re-chunking after a change on the last page and on the
+middle page. Nothing is written to the database.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import DocumentTextExtraction
+from exams.services.document_chunker import DocumentChunker
+
+QUESTIONS_PER_PAGE = 3
+PAGES_PER_EXERCISE = 5
+
+
+def synthetic_bareme(page_count):
+    """Pages d'un barème : un exercice toutes les PAGES_PER_EXERCISE pages."""
+    pages = []
+    for page in range(page_count):
+        lines = []
+        if page % PAGES_PER_EXERCISE == 0:
+            lines.append(f"EXERCICE {page // PAGES_PER_EXERCISE + 1} (4 points)")
+        for q in range(QUESTIONS_PER_PAGE):
+            lines += [
+                f"{page % PAGES_PER_EXERCISE + 1}{'abc'[q]}",
+                "Méthode correcte : 0,5 pt",
+                "Erreur de signe : -0,25 pt, report en cascade accepté",
+                "Justification de la convergence attendue. " * 4,
+            ]
+        pages.append((page + 1, '\n'.join(lines)))
+    return pages
+
+
+def _best(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings)
+
+
+class Command(BaseCommand):
+    help = 'Time full and incremental chunking of a barème'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=100, help='Synthetic barème size (default: 100)')
+        parser.add_argument('--extraction', help='DocumentTextExtraction UUID: chunk its pages instead')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measure, best kept (default: 5)')
+
+    def handle(self, *args, **options):
+        doc_type = 'bareme'
+        if options['extraction']:
+            try:
+                extraction = DocumentTextExtraction.objects.select_related('document').get(
+                    id=options['extraction']
+                )
+            except DocumentTextExtraction.DoesNotExist:
+                raise CommandError(f"Extraction {options['extraction']} not found")
+            doc_type = extraction.document.doc_type
+            pages = list(extraction.pages.order_by('page_number').values_list('page_number', 'page_text'))
+        else:
+            pages = synthetic_bareme(options['pages'])
+        if not pages:
+            raise CommandError('No page to chunk')
+
+        repeat = max(options['repeat'], 1)
+        chunker, full_s = _best(lambda: DocumentChunker(pages, doc_type), repeat)
+        self.stdout.write(
+            f"{len(pages)} pages, {len(chunker.text) / 1024:.0f} KB, {len(chunker.chunks)} chunks "
+            f"({doc_type})"
+        )
+        self.stdout.write(f"{'run':<24} {'ms':>8} {'kept':>6}")
+        self.stdout.write(f"{'full':<24} {full_s * 1000:>8.2f} {'-':>6}")
+
+        for label, index in (('incremental last page', len(pages) - 1), ('incremental middle', len(pages) // 2)):
+            changed = list(pages)
+            changed[index] = (pages[index][0], pages[index][1] + "\nCritère ajouté : 0,25 pt")
+
+            def rechunk():
+                incremental = DocumentChunker(pages, doc_type)
+                started = time.perf_counter()
+                kept = incremental.update(changed)
+                return kept, time.perf_counter() - started
+
+            timings = [rechunk() for _ in range(repeat)]
+            kept = timings[0][0]
+            self.stdout.write(f"{label:<24} {min(t for _, t in timings) * 1000:>8.2f} {kept:>6}")
@@ -0,0 +1,143 @@
+"""
+Re-encode existing booklet page images in their most compact lossless form
+(8-bit gray / 1-bit / WebP, see processing.services.page_encoding) and record
+the per-page format in Booklet.pages_formats.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exams.models import Booklet
+from processing.services.page_cache import is_lazy_ref
+from processing.services.page_encoding import CODEC_AUTO, CODEC_PNG, CODEC_WEBP, transcode_page_file
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Transcode existing page images to gray/bilevel/WebP storage and report bytes saved'
+
+    # Booklets whose pages are submitted to the pool at once
+    BATCH_SIZE = 50
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', action='append', help='Only booklets of this exam (UUID, repeatable)')
+        parser.add_argument(
+            '--codec',
+            choices=[CODEC_PNG, CODEC_WEBP, CODEC_AUTO],
+            default=None,
+            help='Target codec (default: settings.PAGE_IMAGE_CODEC)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Parallel encoding processes (1 = in-process)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Also re-encode booklets whose page formats are already recorded',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the gains without writing any file',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        booklets = Booklet.objects.exclude(pages_images=[]).order_by('exam_id', 'start_page')
+        if options['exam']:
+            booklets = booklets.filter(exam_id__in=options['exam'])
+
+        transcode = partial(transcode_page_file, codec=options['codec'], dry_run=dry_run)
+        workers = max(1, options['workers'])
+        totals = {'pages': 0, 'changed': 0, 'failed': 0, 'before': 0, 'after': 0}
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            batch = []
+            for booklet in booklets.iterator():
+                if not options['force'] and self._is_transcoded(booklet):
+                    continue
+                batch.append(booklet)
+                if len(batch) >= self.BATCH_SIZE:
+                    self._process_batch(batch, transcode, pool, dry_run, totals)
+                    batch = []
+            if batch:
+                self._process_batch(batch, transcode, pool, dry_run, totals)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        saved = totals['before'] - totals['after']
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['pages']} pages scanned, {totals['changed']} transcoded, {totals['failed']} failed; "
+            f"{totals['before']} -> {totals['after']} bytes ({saved} saved)"
+        ))
+
+    @staticmethod
+    def _is_transcoded(booklet):
+        formats = booklet.pages_formats or []
+        return len(formats) == len(booklet.pages_images) and all(formats)
+
+    def _process_batch(self, batch, transcode, pool, dry_run, totals):
+        jobs = []  # (booklet, page index, absolute path)
+        for booklet in batch:
+            for index, ref in enumerate(booklet.pages_images):
+                if not is_lazy_ref(ref):
+                    jobs.append((booklet, index, os.path.join(settings.MEDIA_ROOT, ref)))
+
+        paths = [path for _booklet, _index, path in jobs]
+        results = pool.map(transcode, paths, chunksize=8) if pool is not None else map(transcode, paths)
+
+        updates = {}  # booklet id -> (booklet, pages, formats, obsolete files)
+        for (booklet, index, _path), result in zip(jobs, results):
+            totals['pages'] += 1
+            if 'error' in result:
+                totals['failed'] += 1
+                self.stderr.write(f"{result['path']}: {result['error']}")
+                continue
+
+            totals['before'] += result['old_bytes']
+            totals['after'] += result['new_bytes']
+            _booklet, pages, formats, obsolete = updates.setdefault(booklet.id, (
+                booklet,
+                list(booklet.pages_images),
+                self._aligned_formats(booklet),
+                [],
+            ))
+            formats[index] = result['format']
+            if result['changed']:
+                totals['changed'] += 1
+                if result['new_path'] != result['path']:
+                    pages[index] = os.path.relpath(result['new_path'], settings.MEDIA_ROOT)
+                    obsolete.append(result['path'])
+
+        if dry_run:
+            return
+
+        for booklet, pages, formats, obsolete in updates.values():
+            booklet.pages_images = pages
+            booklet.pages_formats = formats
+            booklet.save(update_fields=['pages_images', 'pages_formats'])
+            # Old files are removed only once the booklet points to the new ones
+            for path in obsolete:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Page images transcoded for booklet {booklet.id}")
+
+    @staticmethod
+    def _aligned_formats(booklet):
+        formats = list(booklet.pages_formats or [])
+        count = len(booklet.pages_images)
+        return (formats + [None] * count)[:count]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0022_copy_llm_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booklet',
+            name='pages_formats',
+            field=models.JSONField(blank=True, default=list, help_text='Format de stockage de chaque page ("gray/png", "bilevel/png"...), aligné sur pages_images. Vide pour les pages historiques.', verbose_name='Formats des pages'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0023_booklet_pages_formats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copy',
+            name='llm_summary_hash',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 des données de correction ayant servi au bilan LLM', max_length=64, verbose_name='Empreinte du contexte du bilan'),
+        ),
+    ]
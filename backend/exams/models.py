@@ -140,6 +140,13 @@ class Booklet(models.Model):
         verbose_name=_("Liste des pages ordonnée"),
         help_text=_("Liste des chemins des images [P1, P2, P3, P4] après split.")
     )
+    pages_formats = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_("Formats des pages"),
+        help_text=_("Format de stockage de chaque page (\"gray/png\", \"bilevel/png\"...), "
+                    "aligné sur pages_images. Vide pour les pages historiques.")
+    )
 
     class Meta:
         verbose_name = _("Fascicule")
@@ -309,6 +316,13 @@ class Copy(models.Model):
         verbose_name=_("Bilan LLM"),
         help_text=_("Bilan personnalisé généré par LLM après finalisation")
     )
+    llm_summary_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name=_("Empreinte du contexte du bilan"),
+        help_text=_("SHA-256 des données de correction ayant servi au bilan LLM")
+    )
 
     # Subject variant (Sujet A / Sujet B) — set manually by corrector
     subject_variant = models.CharField(
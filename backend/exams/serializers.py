@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.core.validators import FileExtensionValidator
 from django.utils.translation import gettext_lazy as _
+from django.urls import reverse
 from .models import Exam, Booklet, Copy, ExamPDF
+from processing.services.page_cache import is_lazy_ref
 from .validators import (
     validate_pdf_size,
     validate_pdf_not_empty,
@@ -11,15 +13,17 @@ from .validators import (
 
 class BookletSerializer(serializers.ModelSerializer):
     header_image_url = serializers.SerializerMethodField()
+    pages_images = serializers.SerializerMethodField()
 
     class Meta:
         model = Booklet
         fields = [
             'id', 'start_page', 'end_page', 
             'pages_images', # REQUIRED for CorrectorDesk.vue
+            'pages_formats',
             'header_image', 'header_image_url', 'student_name_guess'
         ]
-        read_only_fields = ['pages_images']
+        read_only_fields = ['pages_images', 'pages_formats']
 
     def get_header_image_url(self, obj):
         request = self.context.get('request')
@@ -27,6 +31,18 @@ class BookletSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.header_image.url)
         return None
 
+    def get_pages_images(self, obj):
+        # Lazy (source PDF, page) references are exposed as render-on-read URLs
+        request = self.context.get('request')
+        pages = []
+        for index, page in enumerate(obj.pages_images or []):
+            if is_lazy_ref(page):
+                page = reverse('booklet-page-image', kwargs={'id': obj.id, 'index': index})
+                if request:
+                    page = request.build_absolute_uri(page)
+            pages.append(page)
+        return pages
+
 class ExamPDFSerializer(serializers.ModelSerializer):
     """Serializer for individual PDF files in INDIVIDUAL_A4 mode"""
     
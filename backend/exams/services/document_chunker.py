@@ -0,0 +1,211 @@
+"""
+Document Chunker - Découpe le texte extrait d'un document (sujet, corrigé, barème)
+en segments par exercice puis par question.
+
+Le texte des pages est concaténé une fois (séparateur « \\n ») avec une table
+des offsets de début de page : la page d'un offset est une recherche
+dichotomique (bisect). Les marqueurs d'exercice et de question sont lus en
+une seule passe, par fusion des deux recherches dans l'ordre du texte ;
+chaque segment, exercice ou question, reçoit les pages exactes de son premier
+et de son dernier caractère non blanc.
+
+Le découpage est incrémental : DocumentChunker.update() ne ré-analyse le texte
+qu'à partir de l'exercice contenant la première page modifiée, les segments
+des exercices précédents sont conservés tels quels.
+"""
+import bisect
+import re
+
+EXERCISE_PATTERN = re.compile(r'(?i:EXERCICE)\s*(\d+)')
+
+# Les questions sont en début de ligne : on cherche le « \n » qui les précède
+# (recherche littérale rapide), le label en lookahead ; le groupe vide final
+# marque la fin du marqueur.
+QUESTION_PATTERNS = {
+    # Barème : ligne réduite à un label de question (1, 2, 3a, 3b, A.1, B2...)
+    'bareme': re.compile(r'\n(?=([A-Z]?\d+[a-z]?(?:\.\d+)?)\s*\n())'),
+    # Sujet / corrigé : « 1 », « Q2 », « Question 3b », « 4.1 » en début de ligne
+    'default': re.compile(r'\n(?=(?i:(?:Q|Question\s*)?(\d+[a-z]?(?:\.\d+)?)\b)())'),
+}
+
+BAREME_TAGS = (
+    (('plaf',), 'plafond'),
+    (('erreur',), 'erreur_typique'),
+    (('méthode', 'methode'), 'methode'),
+    (('justification',), 'justification'),
+    (('report en cascade',), 'report_cascade'),
+)
+
+
+def chunk_document(pages_text, doc_type):
+    """
+    Découpe le texte extrait en segments exploitables.
+
+    Pour le barème : découpe par exercice → question → critères (tags).
+    Pour le corrigé/sujet : découpe par exercice → question.
+
+    Args:
+        pages_text: list of (page_number, text), dans l'ordre des pages
+        doc_type: 'sujet', 'corrige', 'bareme'
+
+    Returns:
+        list of chunk dicts with keys: text, page_start, page_end,
+        exercise_number, question_label, tags
+    """
+    return DocumentChunker(pages_text, doc_type).chunks
+
+
+class DocumentChunker:
+    """
+    Segments d'un document et table des offsets de ses pages.
+
+    Attributes:
+        chunks: segments (dicts, voir chunk_document)
+        spans: pour chaque segment, (début, fin) de son exercice dans le texte
+            concaténé ; (0, len) pour un document sans exercice détecté
+    """
+
+    def __init__(self, pages_text, doc_type):
+        self.doc_type = doc_type
+        self.question_pattern = QUESTION_PATTERNS['bareme' if doc_type == 'bareme' else 'default']
+        self.chunks = []
+        self.spans = []
+        self._load(pages_text)
+        self._rescan(0)
+
+    def _load(self, pages_text):
+        self.pages = [(page_number, text) for page_number, text in pages_text]
+        self.page_numbers = [page_number for page_number, _ in self.pages]
+        self.offsets = []
+        offset = 0
+        for _, text in self.pages:
+            self.offsets.append(offset)
+            offset += len(text) + 1
+        self.text = '\n'.join(text for _, text in self.pages)
+
+    def page_at(self, offset):
+        """Numéro de la page contenant l'offset `offset` du texte concaténé."""
+        if not self.pages:
+            return None
+        return self.page_numbers[max(bisect.bisect_right(self.offsets, offset) - 1, 0)]
+
+    def update(self, pages_text):
+        """
+        Remplace les pages et re-découpe à partir de l'exercice contenant la
+        première page modifiée.
+
+        Returns:
+            int: nombre de segments conservés sans ré-analyse (en tête de self.chunks)
+        """
+        new_pages = [(page_number, text) for page_number, text in pages_text]
+        first = next(
+            (i for i, (old, new) in enumerate(zip(self.pages, new_pages)) if old != new),
+            min(len(self.pages), len(new_pages)),
+        )
+        if first == len(self.pages) == len(new_pages):
+            return len(self.chunks)
+
+        # Un marqueur commencé avant la page modifiée peut s'y terminer :
+        # on reprend au début de l'exercice qui la précède strictement.
+        change = self.offsets[first] if first < len(self.pages) else len(self.text)
+        starts = sorted({start for start, _end in self.spans if start < change})
+        resume = starts[-1] if starts else 0
+        kept = bisect.bisect_left([start for start, _end in self.spans], resume)
+
+        self._load(new_pages)
+        del self.chunks[kept:]
+        del self.spans[kept:]
+        if not self._rescan(resume):
+            # L'exercice de reprise a disparu (marqueur modifié) : découpage complet
+            self.chunks, self.spans = [], []
+            self._rescan(0)
+            return 0
+        return kept
+
+    def _rescan(self, pos):
+        """
+        Découpe le texte à partir de `pos` (0 ou début d'exercice) et ajoute les
+        segments ; False si `pos` n'est plus un début d'exercice.
+        """
+        exercises = []
+        questions = self._questions(pos)
+        question = next(questions, None)
+        for match in EXERCISE_PATTERN.finditer(self.text, pos):
+            while question is not None and question[1] < match.start():
+                if exercises:
+                    exercises[-1][2].append(question)
+                question = next(questions, None)
+            exercises.append((int(match.group(1)), match.start(), []))
+        while exercises and question is not None:
+            exercises[-1][2].append(question)
+            question = next(questions, None)
+
+        if pos and (not exercises or exercises[0][1] != pos):
+            return False
+
+        if not exercises:
+            start, end = self._strip(0, len(self.text))
+            self.chunks.append({
+                'text': self.text[start:end],
+                'page_start': self.page_at(start) if start < end else self.page_at(0),
+                'page_end': self.page_at(end - 1) if start < end else self.page_at(len(self.text)),
+                'exercise_number': None,
+                'question_label': '',
+                'tags': [self.doc_type],
+            })
+            self.spans.append((0, len(self.text)))
+            return True
+
+        for idx, (ex_num, start, questions) in enumerate(exercises):
+            end = exercises[idx + 1][1] if idx + 1 < len(exercises) else len(self.text)
+            for chunk in self._exercise_chunks(ex_num, start, end, questions):
+                self.chunks.append(chunk)
+                self.spans.append((start, end))
+        return True
+
+    def _questions(self, pos):
+        """(label, début, fin) des marqueurs de question, sans chevauchement (« Question\\n2 »)."""
+        end = pos
+        for match in self.question_pattern.finditer(self.text, pos):
+            if match.end() >= end:
+                end = match.end(2)
+                yield match.group(1), match.end(), end
+
+    def _exercise_chunks(self, ex_num, start, end, questions):
+        _, ex_end = self._strip(start, end)
+        questions = [(label, q_start) for label, q_start, q_end in questions if q_end <= ex_end]
+        split = questions if self.doc_type == 'bareme' else (questions if len(questions) > 1 else [])
+
+        if not split:
+            return [self._chunk(start, ex_end, ex_num, '', [self.doc_type, f'exercice_{ex_num}'])]
+
+        chunks = []
+        for i, (label, q_start) in enumerate(split):
+            q_end = split[i + 1][1] if i + 1 < len(split) else ex_end
+            tags = [self.doc_type, f'exercice_{ex_num}', f'question_{label}']
+            chunk = self._chunk(q_start, q_end, ex_num, label, tags)
+            if self.doc_type == 'bareme':
+                text_lower = chunk['text'].lower()
+                tags.extend(tag for needles, tag in BAREME_TAGS if any(n in text_lower for n in needles))
+            chunks.append(chunk)
+        return chunks
+
+    def _chunk(self, start, end, ex_num, label, tags):
+        start, end = self._strip(start, end)
+        return {
+            'text': self.text[start:end],
+            'page_start': self.page_at(start),
+            'page_end': self.page_at(max(end - 1, start)),
+            'exercise_number': ex_num,
+            'question_label': label,
+            'tags': tags,
+        }
+
+    def _strip(self, start, end):
+        """Bornes de text[start:end].strip(), sans copie du texte."""
+        text = self.text
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
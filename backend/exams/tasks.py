@@ -1,10 +1,19 @@
 """
 Celery tasks pour l'extraction de texte des documents PDF (sujet, corrigé, barème).
 Pipeline : extraction page par page → chunking par exercice/question → indexation.
+
+Les documents d'un lot sont traités en parallèle (un groupe Celery, une tâche
+par document) ; un PDF de plus de DOCUMENT_EXTRACTION_PAGE_RANGE pages est
+découpé en plages de pages extraites en parallèle, réunies par un chord.
+Un document déjà extrait (même sha256 et même type, dans n'importe quel
+examen) n'est pas ré-extrait : ses pages et segments sont recopiés.
+
+detect_subject_variants lit la référence du sujet (A/B) en pied de dernière
+page de chaque copie d'un examen, dans un pool de processus.
 """
-import re
 import logging
-from celery import shared_task
+from celery import chord, group, shared_task
+from django.db import transaction
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -24,23 +33,37 @@ def process_document_set(self, document_set_id):
         logger.error(f"DocumentSet {document_set_id} introuvable.")
         return {'status': 'error', 'detail': 'DocumentSet introuvable'}
 
-    results = []
+    pending = []
+    reused = 0
     for doc in doc_set.documents.all():
         extraction = doc.extractions.filter(
             status__in=['pending', 'failed']
         ).order_by('-created_at').first()
 
         if not extraction:
+            if doc.extractions.filter(status=DocumentTextExtraction.Status.DONE).exists():
+                continue
             extraction = DocumentTextExtraction.objects.create(
                 document=doc,
                 status=DocumentTextExtraction.Status.PENDING,
                 engine='pymupdf'
             )
 
-        result = process_single_document(str(extraction.id))
-        results.append(result)
+        source = DocumentTextExtraction.objects.filter(
+            status=DocumentTextExtraction.Status.DONE,
+            document__sha256=doc.sha256,
+            document__doc_type=doc.doc_type,
+        ).exclude(document=doc).order_by('-extracted_at').first()
+        if source:
+            _reuse_extraction(extraction, source)
+            reused += 1
+        else:
+            pending.append(str(extraction.id))
 
-    return {'status': 'done', 'results': results}
+    if pending:
+        group(process_single_document.si(extraction_id) for extraction_id in pending).apply_async()
+
+    return {'status': 'dispatched', 'dispatched': len(pending), 'reused': reused}
 
 
 @shared_task(bind=True, max_retries=2, default_retry_delay=30)
@@ -48,14 +71,12 @@ def process_single_document(self, extraction_id):
     """
     Extrait le texte d'un document PDF page par page,
     puis découpe en chunks par exercice/question.
+    Au-delà de DOCUMENT_EXTRACTION_PAGE_RANGE pages, l'extraction est
+    répartie en plages (process_page_range) et terminée par
+    process_extraction_pages.
     """
-    import os
     from django.conf import settings
-    from exams.models import (
-        DocumentTextExtraction,
-        DocumentPage,
-        DocumentChunk,
-    )
+    from exams.models import DocumentTextExtraction
 
     try:
         extraction = DocumentTextExtraction.objects.select_related('document').get(id=extraction_id)
@@ -70,34 +91,134 @@ def process_single_document(self, extraction_id):
     try:
         import fitz
 
-        abs_path = os.path.join(settings.MEDIA_ROOT, document.storage_path)
-        if not os.path.exists(abs_path):
-            raise FileNotFoundError(f"Fichier introuvable : {abs_path}")
+        with fitz.open(_document_path(document)) as pdf:
+            page_count = pdf.page_count
+            range_size = max(settings.DOCUMENT_EXTRACTION_PAGE_RANGE, 1)
+            if page_count <= range_size:
+                pages_text = _extract_pages(pdf, 0, page_count)
+            else:
+                pages_text = None
 
-        pdf = fitz.open(abs_path)
+        if pages_text is None:
+            chord(
+                process_page_range.si(extraction_id, start, min(start + range_size, page_count))
+                for start in range(0, page_count, range_size)
+            )(process_extraction_pages.s(extraction_id))
+            return {
+                'status': 'dispatched',
+                'document_id': str(document.id),
+                'pages': page_count,
+            }
 
-        # --- Étape 1 : Extraction page par page ---
-        DocumentPage.objects.filter(extraction=extraction).delete()
-        pages_text = []
-        for page_num in range(pdf.page_count):
-            page = pdf[page_num]
-            text = page.get_text()
-            DocumentPage.objects.create(
-                extraction=extraction,
-                page_number=page_num + 1,
-                page_text=text
-            )
-            pages_text.append((page_num + 1, text))
+        return _store_extraction(extraction, pages_text)
 
-        pdf.close()
+    except Exception as exc:
+        _fail_extraction(extraction, exc)
+        return {'status': 'error', 'detail': str(exc)}
+
+
+@shared_task
+def process_page_range(extraction_id, start, end):
+    """Texte des pages [start, end[ (0-based) : liste de [numéro de page, texte]."""
+    from exams.models import DocumentTextExtraction
+
+    extraction = DocumentTextExtraction.objects.select_related('document').get(id=extraction_id)
+    try:
+        import fitz
+
+        with fitz.open(_document_path(extraction.document)) as pdf:
+            return _extract_pages(pdf, start, end)
+    except Exception as exc:
+        _fail_extraction(extraction, exc)
+        return None
 
-        # --- Étape 2 : Chunking intelligent ---
-        DocumentChunk.objects.filter(extraction=extraction).delete()
-        doc_type = document.doc_type
-        chunks = _chunk_document(pages_text, doc_type)
 
-        for i, chunk in enumerate(chunks):
-            DocumentChunk.objects.create(
+@shared_task
+def process_extraction_pages(ranges, extraction_id):
+    """Callback du chord : réunit les plages de pages puis découpe et indexe."""
+    from exams.models import DocumentTextExtraction
+
+    extraction = DocumentTextExtraction.objects.select_related('document').get(id=extraction_id)
+    if any(pages is None for pages in ranges):
+        # Une plage a échoué : l'extraction est déjà marquée FAILED
+        return {'status': 'error', 'detail': extraction.error_message}
+    try:
+        pages_text = [(page_number, text) for pages in ranges for page_number, text in pages]
+        return _store_extraction(extraction, pages_text)
+    except Exception as exc:
+        _fail_extraction(extraction, exc)
+        return {'status': 'error', 'detail': str(exc)}
+
+
+def _document_path(document):
+    import os
+    from django.conf import settings
+
+    abs_path = os.path.join(settings.MEDIA_ROOT, document.storage_path)
+    if not os.path.exists(abs_path):
+        raise FileNotFoundError(f"Fichier introuvable : {abs_path}")
+    return abs_path
+
+
+def _extract_pages(pdf, start, end):
+    return [[page_num + 1, pdf[page_num].get_text()] for page_num in range(start, end)]
+
+
+def _fail_extraction(extraction, exc):
+    from exams.models import DocumentTextExtraction
+
+    extraction.status = DocumentTextExtraction.Status.FAILED
+    extraction.error_message = str(exc)[:500]
+    extraction.save(update_fields=['status', 'error_message'])
+    logger.error(f"Extraction échouée pour {extraction.document.original_filename}: {exc}", exc_info=True)
+
+
+def _store_extraction(extraction, pages_text):
+    """
+    Écrit pages et chunks (bulk_create), indexe les chunks pour la recherche
+    de suggestions, puis marque l'extraction DONE.
+
+    Ré-extraction (pages déjà en base) : seules les pages modifiées sont
+    réécrites, et DocumentChunker.update() ne re-découpe qu'à partir de
+    l'exercice de la première page modifiée ; les segments précédents
+    restent en base (et dans l'index de recherche) tels quels.
+
+    Args:
+        pages_text: list of (page_number, text), dans l'ordre des pages
+    """
+    from exams.models import DocumentTextExtraction, DocumentPage, DocumentChunk
+    from exams.services.document_chunker import DocumentChunker
+    from grading import search_index
+
+    document = extraction.document
+    doc_type = document.doc_type
+    pages_text = [(page_number, text) for page_number, text in pages_text]
+    previous = list(
+        DocumentPage.objects.filter(extraction=extraction)
+        .order_by('page_number').values_list('page_number', 'page_text')
+    )
+    if previous:
+        chunker = DocumentChunker(previous, doc_type)
+        kept = _kept_chunks(extraction, chunker.chunks[:chunker.update(pages_text)])
+    else:
+        chunker = DocumentChunker(pages_text, doc_type)
+        kept = 0
+    chunks = chunker.chunks
+    unchanged = set(previous) & set(pages_text)
+
+    with transaction.atomic():
+        DocumentPage.objects.filter(extraction=extraction).exclude(
+            page_number__in=[page_number for page_number, _text in unchanged]
+        ).delete()
+        DocumentPage.objects.bulk_create([
+            DocumentPage(extraction=extraction, page_number=page_number, page_text=text)
+            for page_number, text in pages_text
+            if (page_number, text) not in unchanged
+        ])
+
+        DocumentChunk.objects.filter(extraction=extraction, chunk_index__gte=kept).delete()
+        created = DocumentChunk.objects.bulk_create([
+            DocumentChunk(
                 extraction=extraction,
                 doc_type=doc_type,
                 chunk_index=i,
@@ -108,193 +229,185 @@ def process_single_document(self, extraction_id):
                 chunk_text=chunk['text'],
                 tags=chunk.get('tags', [])
             )
+            for i, chunk in enumerate(chunks[kept:], start=kept)
+        ])
+        search_index.index_chunks(created)
 
         extraction.status = DocumentTextExtraction.Status.DONE
         extraction.extracted_at = timezone.now()
         extraction.error_message = None
         extraction.save(update_fields=['status', 'extracted_at', 'error_message'])
 
-        logger.info(
-            f"Extraction réussie : {document.original_filename} "
-            f"({len(pages_text)} pages, {len(chunks)} chunks)"
-        )
-
-        return {
-            'status': 'done',
-            'document_id': str(document.id),
-            'pages': len(pages_text),
-            'chunks': len(chunks),
-        }
+    logger.info(
+        f"Extraction réussie : {document.original_filename} "
+        f"({len(pages_text)} pages, {len(chunks)} chunks)"
+    )
 
-    except Exception as exc:
-        extraction.status = DocumentTextExtraction.Status.FAILED
-        extraction.error_message = str(exc)[:500]
-        extraction.save(update_fields=['status', 'error_message'])
-        logger.error(f"Extraction échouée pour {document.original_filename}: {exc}", exc_info=True)
-        return {'status': 'error', 'detail': str(exc)}
+    return {
+        'status': 'done',
+        'document_id': str(document.id),
+        'pages': len(pages_text),
+        'chunks': len(chunks),
+    }
 
 
-def _chunk_document(pages_text, doc_type):
+def _kept_chunks(extraction, expected):
     """
-    Découpe le texte extrait en segments exploitables.
-    
-    Pour le barème : découpe par exercice → question → critères.
-    Pour le corrigé/sujet : découpe par exercice → question.
-    
-    Args:
-        pages_text: list of (page_number, text)
-        doc_type: 'sujet', 'corrige', 'bareme'
-    
-    Returns:
-        list of chunk dicts with keys: text, page_start, page_end,
-        exercise_number, question_label, tags
+    Nombre de segments en tête déjà en base : ceux que update() a conservés,
+    s'ils sont bien ceux qu'a écrits l'extraction précédente (0 sinon, et
+    tous les segments sont réécrits).
     """
-    full_text = "\n".join(text for _, text in pages_text)
-    
-    # Patterns pour détecter les exercices et questions
-    exercise_pattern = re.compile(
-        r'(?:EXERCICE|Exercice)\s*(\d+)',
-        re.IGNORECASE
-    )
-    question_pattern = re.compile(
-        r'^(?:Q|Question\s*)?(\d+[a-z]?(?:\.\d+)?)\b',
-        re.MULTILINE | re.IGNORECASE
-    )
-    # Pattern spécifique barème : lignes avec "Pts" ou points numériques
-    bareme_question_pattern = re.compile(
-        r'^([A-Z]?\d+[a-z]?(?:\.\d+)?)\s*$',
-        re.MULTILINE
+    from exams.models import DocumentChunk
+
+    fields = ('chunk_text', 'page_start', 'page_end', 'exercise_number', 'question_label', 'tags')
+    stored = list(
+        DocumentChunk.objects.filter(extraction=extraction, chunk_index__lt=len(expected))
+        .order_by('chunk_index').values_list(*fields)
     )
+    wanted = [
+        (chunk['text'], chunk['page_start'], chunk['page_end'], chunk['exercise_number'],
+         chunk['question_label'], chunk['tags'])
+        for chunk in expected
+    ]
+    return len(expected) if stored == wanted else 0
 
-    chunks = []
-    
-    # Découper par exercice d'abord
-    exercise_splits = list(exercise_pattern.finditer(full_text))
-    
-    if not exercise_splits:
-        # Pas de structure exercice détectée → un seul chunk
-        page_start = pages_text[0][0] if pages_text else None
-        page_end = pages_text[-1][0] if pages_text else None
-        chunks.append({
-            'text': full_text.strip(),
-            'page_start': page_start,
-            'page_end': page_end,
-            'exercise_number': None,
-            'question_label': '',
-            'tags': [doc_type],
-        })
-        return chunks
-
-    for idx, match in enumerate(exercise_splits):
-        ex_num = int(match.group(1))
-        start = match.start()
-        end = exercise_splits[idx + 1].start() if idx + 1 < len(exercise_splits) else len(full_text)
-        ex_text = full_text[start:end].strip()
-
-        # Trouver les pages couvertes
-        page_start = _find_page_for_offset(pages_text, start, full_text)
-        page_end = _find_page_for_offset(pages_text, end - 1, full_text)
-
-        if doc_type == 'bareme':
-            # Pour le barème, découper plus finement par question
-            q_chunks = _chunk_bareme_exercise(ex_text, ex_num, page_start, page_end)
-            if q_chunks:
-                chunks.extend(q_chunks)
-            else:
-                chunks.append({
-                    'text': ex_text,
-                    'page_start': page_start,
-                    'page_end': page_end,
-                    'exercise_number': ex_num,
-                    'question_label': '',
-                    'tags': [doc_type, f'exercice_{ex_num}'],
-                })
-        else:
-            # Pour sujet/corrigé, découper par question si possible
-            q_splits = list(question_pattern.finditer(ex_text))
-            if len(q_splits) > 1:
-                for qi, qm in enumerate(q_splits):
-                    q_start = qm.start()
-                    q_end = q_splits[qi + 1].start() if qi + 1 < len(q_splits) else len(ex_text)
-                    q_text = ex_text[q_start:q_end].strip()
-                    q_label = qm.group(1)
-                    chunks.append({
-                        'text': q_text,
-                        'page_start': page_start,
-                        'page_end': page_end,
-                        'exercise_number': ex_num,
-                        'question_label': q_label,
-                        'tags': [doc_type, f'exercice_{ex_num}', f'question_{q_label}'],
-                    })
-            else:
-                chunks.append({
-                    'text': ex_text,
-                    'page_start': page_start,
-                    'page_end': page_end,
-                    'exercise_number': ex_num,
-                    'question_label': '',
-                    'tags': [doc_type, f'exercice_{ex_num}'],
-                })
 
-    return chunks
+def _reuse_extraction(extraction, source):
+    """Recopie (bulk_create) les pages et chunks d'une extraction DONE du même fichier."""
+    from exams.models import DocumentTextExtraction, DocumentPage, DocumentChunk
+    from grading import search_index
 
+    with transaction.atomic():
+        DocumentPage.objects.filter(extraction=extraction).delete()
+        DocumentPage.objects.bulk_create([
+            DocumentPage(extraction=extraction, page_number=page_number, page_text=text)
+            for page_number, text in source.pages.values_list('page_number', 'page_text')
+        ])
 
-def _chunk_bareme_exercise(ex_text, ex_num, page_start, page_end):
-    """
-    Découpe un exercice du barème en chunks par question.
-    Détecte les patterns : numéro de question suivi de critères et points.
-    """
-    # Pattern : ligne commençant par un label de question (1, 2, 3a, 3b, A.1, B.2, etc.)
-    q_pattern = re.compile(
-        r'^([A-Z]?\d+[a-z]?(?:\.\d+)?)\s*\n',
-        re.MULTILINE
-    )
-    
-    matches = list(q_pattern.finditer(ex_text))
-    if not matches:
-        return []
-
-    chunks = []
-    for i, m in enumerate(matches):
-        q_label = m.group(1)
-        start = m.start()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(ex_text)
-        q_text = ex_text[start:end].strip()
-
-        # Détecter les tags automatiquement
-        tags = ['bareme', f'exercice_{ex_num}', f'question_{q_label}']
-        text_lower = q_text.lower()
-        if 'plaf' in text_lower or 'plafond' in text_lower:
-            tags.append('plafond')
-        if 'erreur' in text_lower:
-            tags.append('erreur_typique')
-        if 'méthode' in text_lower or 'methode' in text_lower:
-            tags.append('methode')
-        if 'justification' in text_lower:
-            tags.append('justification')
-        if 'report en cascade' in text_lower:
-            tags.append('report_cascade')
-
-        chunks.append({
-            'text': q_text,
-            'page_start': page_start,
-            'page_end': page_end,
-            'exercise_number': ex_num,
-            'question_label': q_label,
-            'tags': tags,
-        })
+        DocumentChunk.objects.filter(extraction=extraction).delete()
+        created = DocumentChunk.objects.bulk_create([
+            DocumentChunk(extraction=extraction, **fields)
+            for fields in source.chunks.values(
+                'doc_type', 'chunk_index', 'page_start', 'page_end',
+                'exercise_number', 'question_label', 'chunk_text', 'tags',
+            )
+        ])
+        search_index.index_chunks(created)
 
-    return chunks
+        extraction.status = DocumentTextExtraction.Status.DONE
+        extraction.engine = source.engine
+        extraction.extracted_at = timezone.now()
+        extraction.error_message = None
+        extraction.save(update_fields=['status', 'engine', 'extracted_at', 'error_message'])
+
+    logger.info(
+        f"Extraction réutilisée pour {extraction.document.original_filename} "
+        f"(même contenu que le document {source.document_id})"
+    )
 
 
-def _find_page_for_offset(pages_text, char_offset, full_text):
+@shared_task(bind=True)
+def detect_subject_variants(self, exam_id):
     """
-    Trouve le numéro de page correspondant à un offset de caractère
-    dans le texte concaténé.
+    Détecte le sujet (A/B) de chaque copie d'un examen (processing.services.subject_variant)
+    dans un pool de SUBJECT_VARIANT_WORKERS processus, puis enregistre les sujets
+    détectés en une seule mise à jour groupée.
+    Avancement publié dans l'état PROGRESS de la tâche (GET /api/grading/tasks/<id>/).
     """
-    current_offset = 0
-    for page_num, text in pages_text:
-        current_offset += len(text) + 1  # +1 for \n separator
-        if current_offset > char_offset:
-            return page_num
-    return pages_text[-1][0] if pages_text else None
+    import os
+    import signal
+    from billiard import Pool
+    from billiard.exceptions import TimeoutError as PoolTimeoutError
+    from django.conf import settings
+    from exams.models import Copy
+    from processing.services.subject_variant import COPY_TIMEOUT, detect_copy_variant
+
+    copies = {
+        str(copy.id): copy
+        for copy in Copy.objects.filter(exam_id=exam_id).order_by('anonymous_id')
+    }
+    results = {'total': len(copies), 'processed': 0, 'detected': 0, 'failed': 0, 'errors': [], 'copies': []}
+
+    items = []
+    for copy_id, copy in copies.items():
+        path = os.path.join(settings.MEDIA_ROOT, copy.pdf_source.name) if copy.pdf_source else None
+        if path and os.path.exists(path):
+            items.append((copy_id, path))
+            continue
+        results['processed'] += 1
+        results['failed'] += 1
+        results['errors'].append({
+            'id': copy_id,
+            'anonymous_id': copy.anonymous_id,
+            'detail': 'Fichier PDF introuvable' if path else 'Pas de PDF source',
+        })
+
+    def report():
+        if not self.request.is_eager:
+            self.update_state(state='PROGRESS', meta={
+                key: results[key] for key in ('total', 'processed', 'detected', 'failed')
+            })
+
+    report()
+    # billiard : un worker Celery (prefork) est démoniaque et ne peut pas
+    # lancer de pool multiprocessing de la bibliothèque standard
+    workers = min(max(settings.SUBJECT_VARIANT_WORKERS, 1), len(items))
+    pool = Pool(workers) if workers > 1 else None
+    updated = []
+    timed_out = False
+
+    def pool_detections():
+        nonlocal timed_out
+        # Une soumission par copie : avec imap, billiard ne crédite la réception
+        # des résultats qu'à un seul worker et les autres attendent 30 s avant de s'arrêter
+        pending = [(item, pool.apply_async(detect_copy_variant, (item,))) for item in items]
+        for (copy_id, _path), result in pending:
+            try:
+                yield result.get(timeout=COPY_TIMEOUT)
+            except PoolTimeoutError:
+                timed_out = True
+                # Processus bloqué (souvent dans MuPDF / tesseract, sourd à SIGTERM)
+                for pid in result.worker_pids():
+                    pool.terminate_job(pid, signal.SIGKILL)
+                yield {'copy_id': copy_id, 'detail': f'Délai de détection dépassé ({COPY_TIMEOUT} s)'}
+
+    try:
+        detections = pool_detections() if pool is not None else map(detect_copy_variant, items)
+        for detection in detections:
+            copy = copies[detection['copy_id']]
+            results['processed'] += 1
+            if detection.get('variant'):
+                results['detected'] += 1
+                if copy.subject_variant != detection['variant']:
+                    copy.subject_variant = detection['variant']
+                    updated.append(copy)
+            else:
+                results['failed'] += 1
+                results['errors'].append({
+                    'id': str(copy.id),
+                    'anonymous_id': copy.anonymous_id,
+                    'detail': detection.get('detail') or f"Aucune référence trouvée : {detection['text'][:100]}",
+                })
+            results['copies'].append({
+                'id': str(copy.id),
+                'anonymous_id': copy.anonymous_id,
+                'subject_variant': detection.get('variant'),
+                'method': detection.get('method'),
+                'text': detection.get('text', '')[:100],
+            })
+            report()
+    finally:
+        if pool is not None and timed_out:
+            # Job perdu encore en attente : join() ne rendrait pas la main
+            pool.terminate()
+        elif pool is not None:
+            pool.close()
+            pool.join()
+
+    Copy.objects.bulk_update(updated, ['subject_variant'], batch_size=500)
+    results['updated'] = len(updated)
+    logger.info(
+        f"Sujets détectés pour l'examen {exam_id} : {results['detected']}/{results['total']} "
+        f"({results['updated']} mis à jour)"
+    )
+    return results
@@ -0,0 +1,78 @@
+"""
+Tests for the booklet boundary detection endpoint (BATCH_A3 re-split).
+"""
+import fitz
+import pytest
+from django.core.files.base import ContentFile
+from rest_framework import status
+
+from exams.models import Exam, Copy
+
+
+def _batch_pdf_bytes(layout):
+    doc = fitz.open()
+    for kind in layout:
+        page = doc.new_page(width=595, height=842)
+        if kind == 'H':
+            page.draw_rect(fitz.Rect(40, 30, 555, 110), color=(0, 0, 0), width=3)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def batch_exam(db):
+    exam = Exam.objects.create(name="Bac blanc", pages_per_booklet=4)
+    exam.pdf_source.save("batch.pdf", ContentFile(_batch_pdf_bytes("H..." "H." "H...")))
+    return exam
+
+
+@pytest.mark.django_db
+class TestBookletBoundariesAPI:
+
+    def url(self, exam):
+        return f'/api/exams/{exam.id}/booklet-boundaries/'
+
+    def test_get_returns_proposal(self, teacher_client, batch_exam):
+        response = teacher_client.get(self.url(batch_exam))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['booklets'] == [[1, 4], [5, 6], [7, 10]]
+        assert not batch_exam.booklets.exists()
+
+    def test_post_splits_on_confirmed_boundaries(self, teacher_client, batch_exam):
+        response = teacher_client.post(
+            self.url(batch_exam), {'boundaries': [[1, 4], [5, 6], [7, 10]]}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        ranges = sorted((b.start_page, b.end_page, len(b.pages_images)) for b in batch_exam.booklets.all())
+        assert ranges == [(1, 4, 4), (5, 6, 2), (7, 10, 4)]
+        assert batch_exam.copies.filter(status=Copy.Status.READY).count() == 3
+
+    def test_post_rejects_invalid_boundaries(self, teacher_client, batch_exam):
+        response = teacher_client.post(self.url(batch_exam), {'boundaries': [[1, 20]]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not batch_exam.booklets.exists()
+
+    def test_post_requires_gaps_to_be_marked_ignored(self, teacher_client, batch_exam):
+        response = teacher_client.post(self.url(batch_exam), {'boundaries': [[1, 4], [7, 10]]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not batch_exam.booklets.exists()
+
+        response = teacher_client.post(
+            self.url(batch_exam), {'boundaries': [[1, 4], [7, 10]], 'ignored_pages': [5, 6]}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        ranges = sorted((b.start_page, b.end_page) for b in batch_exam.booklets.all())
+        assert ranges == [(1, 4), (7, 10)]
+
+    def test_post_refused_when_copies_in_correction(self, teacher_client, batch_exam):
+        Copy.objects.create(exam=batch_exam, anonymous_id="BB-001", status=Copy.Status.GRADED)
+
+        response = teacher_client.post(self.url(batch_exam), {'boundaries': [[1, 4]]}, format='json')
+
+        assert response.status_code == status.HTTP_409_CONFLICT
@@ -0,0 +1,52 @@
+"""
+Tests du découpage des documents (exams.services.document_chunker)
+"""
+from io import StringIO
+
+from django.core.management import call_command
+
+from exams.services.document_chunker import DocumentChunker, chunk_document
+
+BAREME = [
+    (1, "EXERCICE 1 (5 points)\n1\nMéthode correcte : 1 pt\n2a\nErreur de signe : -0,5"),
+    (2, "suite de 2a\n2b\nJustification attendue\n"),
+    (3, "Exercice 2\n1\nPlafond à 2 pts"),
+    (4, "report en cascade accepté\nExercice 3\nBarème global"),
+]
+
+
+def test_question_chunks_get_their_own_pages():
+    chunks = chunk_document(BAREME, 'bareme')
+
+    assert [(c['exercise_number'], c['question_label'], c['page_start'], c['page_end']) for c in chunks] == [
+        (1, '1', 1, 1), (1, '2a', 1, 2), (1, '2b', 2, 2), (2, '1', 3, 4), (3, '', 4, 4),
+    ]
+    assert chunks[1]['text'] == "2a\nErreur de signe : -0,5\nsuite de 2a"
+    assert chunks[1]['tags'] == ['bareme', 'exercice_1', 'question_2a', 'erreur_typique']
+    assert chunks[3]['tags'] == ['bareme', 'exercice_2', 'question_1', 'plafond', 'report_cascade']
+
+    sujet = chunk_document([(1, "Préambule\nExercice 1\n1. Calculer"), (2, "2. Conclure")], 'sujet')
+    assert [(c['question_label'], c['page_start'], c['page_end']) for c in sujet] == [('1', 1, 1), ('2', 2, 2)]
+    assert chunk_document([(1, "  "), (2, "Sans structure"), (3, "")], 'corrige')[0]['page_start'] == 2
+
+
+def test_update_rescans_from_the_changed_exercise():
+    chunker = DocumentChunker(BAREME, 'bareme')
+    first = chunker.chunks[:3]
+
+    changed = BAREME[:3] + [(4, "Exercice 3\n1\nNouveau critère"), (5, "Exercice 4\nFin")]
+    assert chunker.update(changed) == 3
+    assert chunker.chunks[:3] == first
+    assert chunker.chunks == chunk_document(changed, 'bareme')
+    assert chunker.update(changed) == len(chunker.chunks)
+
+    # Le marqueur de l'exercice 2 modifié : l'exercice 1 s'étend sur la page 3
+    changed = BAREME[:2] + [(3, "Rien\n1\nPlafond à 2 pts")] + BAREME[3:]
+    assert chunker.update(changed) == 0
+    assert chunker.chunks == chunk_document(changed, 'bareme')
+
+
+def test_benchmark_command_reports_full_and_incremental_timings():
+    out = StringIO()
+    call_command('benchmark_chunking', pages=20, repeat=1, stdout=out)
+    assert 'incremental' in out.getvalue()
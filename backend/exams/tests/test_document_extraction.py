@@ -0,0 +1,127 @@
+"""
+Tests du pipeline d'extraction des documents (exams.tasks) :
+groupe par document, plages de pages, réutilisation par sha256.
+"""
+import datetime
+import hashlib
+import os
+
+import fitz
+import pytest
+
+from exams.models import (
+    DocumentChunk, DocumentPage, DocumentTextExtraction, Exam, ExamDocument, ExamDocumentSet,
+)
+from exams.tasks import process_document_set
+
+
+def _pdf(pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _document_set(exam_name, docs, root):
+    exam = Exam.objects.create(name=exam_name, date=datetime.date(2026, 6, 1))
+    doc_set = ExamDocumentSet.objects.create(exam=exam, version=1)
+    for doc_type, data in docs.items():
+        rel_path = f'exams/documents/{exam.id}/{doc_type}.pdf'
+        os.makedirs(os.path.join(root, os.path.dirname(rel_path)), exist_ok=True)
+        with open(os.path.join(root, rel_path), 'wb') as f:
+            f.write(data)
+        ExamDocument.objects.create(
+            document_set=doc_set, doc_type=doc_type, original_filename=f'{doc_type}.pdf',
+            storage_path=rel_path, sha256=hashlib.sha256(data).hexdigest(), file_size=len(data),
+        )
+    return doc_set
+
+
+@pytest.mark.django_db
+def test_document_set_is_extracted_per_document_and_page_range(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.DOCUMENT_EXTRACTION_PAGE_RANGE = 2
+    doc_set = _document_set("Extraction", {
+        'sujet': _pdf(['Exercice 1', 'Question 1', 'Exercice 2', 'Question 2', 'Fin']),
+        'bareme': _pdf(['Exercice 1']),
+    }, str(tmp_path))
+
+    result = process_document_set(str(doc_set.id))
+
+    assert result == {'status': 'dispatched', 'dispatched': 2, 'reused': 0}
+    sujet = DocumentTextExtraction.objects.get(document__doc_type='sujet')
+    assert sujet.status == DocumentTextExtraction.Status.DONE
+    assert list(sujet.pages.values_list('page_number', flat=True)) == [1, 2, 3, 4, 5]
+    assert 'Exercice 2' in sujet.pages.get(page_number=3).page_text
+    assert list(sujet.chunks.values_list('exercise_number', flat=True).distinct()) == [1, 2]
+
+    # Relancer un lot entièrement extrait ne refait rien
+    assert process_document_set(str(doc_set.id)) == {'status': 'dispatched', 'dispatched': 0, 'reused': 0}
+    assert DocumentTextExtraction.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_identical_document_reuses_done_extraction(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    pages = _pdf(['Exercice 1', 'Exercice 2'])
+    first = _document_set("Original", {'sujet': pages}, str(tmp_path))
+    process_document_set(str(first.id))
+    second = _document_set("Copie", {'sujet': pages, 'corrige': pages}, str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), second.documents.get(doc_type='sujet').storage_path))
+
+    result = process_document_set(str(second.id))
+
+    # Même sha256 et même type : recopié sans relire le fichier ; le corrigé (autre type) est extrait
+    assert result == {'status': 'dispatched', 'dispatched': 1, 'reused': 1}
+    reused = DocumentTextExtraction.objects.get(document__document_set=second, document__doc_type='sujet')
+    assert reused.status == DocumentTextExtraction.Status.DONE
+    assert reused.pages.count() == 2
+    assert list(reused.chunks.values_list('chunk_text', flat=True)) == \
+        list(DocumentChunk.objects.filter(extraction__document__document_set=first).values_list('chunk_text', flat=True))
+    assert DocumentPage.objects.filter(extraction__document__document_set=second).count() == 4
+
+
+@pytest.mark.django_db
+def test_missing_file_marks_extraction_failed(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.DOCUMENT_EXTRACTION_PAGE_RANGE = 1
+    doc_set = _document_set("Manquant", {'sujet': _pdf(['Exercice 1', 'Exercice 2'])}, str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), doc_set.documents.get().storage_path))
+
+    process_document_set(str(doc_set.id))
+
+    extraction = DocumentTextExtraction.objects.get()
+    assert extraction.status == DocumentTextExtraction.Status.FAILED
+    assert 'introuvable' in extraction.error_message
+
+
+@pytest.mark.django_db
+def test_reextraction_rewrites_only_from_the_changed_exercise(settings, tmp_path):
+    from exams.services.document_chunker import chunk_document
+    from exams.tasks import _store_extraction
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    doc_set = _document_set("Re-extraction", {'sujet': _pdf(['Exercice 1'])}, str(tmp_path))
+    extraction = DocumentTextExtraction.objects.create(document=doc_set.documents.get(), engine='pymupdf')
+    pages = [
+        (1, 'Exercice 1\n1 Calculer\n2 Justifier'), (2, 'Exercice 2\n1 Tracer'),
+        (3, 'Exercice 3\n1 Conclure\n2 Vérifier'),
+    ]
+    _store_extraction(extraction, pages)
+    before = dict(extraction.chunks.values_list('chunk_index', 'id'))
+    page_ids = dict(extraction.pages.values_list('page_number', 'id'))
+
+    pages[2] = (3, 'Exercice 3\n1 Conclure\n2 Vérifier\n3 Généraliser')
+    _store_extraction(extraction, pages)
+
+    after = dict(extraction.chunks.values_list('chunk_index', 'id'))
+    # Reprise à l'exercice qui précède la page modifiée : exercice 1 conservé
+    # (mêmes lignes), exercices 2 et 3 réécrits
+    assert [after[i] == before[i] for i in range(2)] == [True, True]
+    assert all(after[i] not in before.values() for i in range(2, len(after)))
+    assert [c.chunk_text for c in extraction.chunks.order_by('chunk_index')] == \
+        [c['text'] for c in chunk_document(pages, 'sujet')]
+    assert dict(extraction.pages.values_list('page_number', 'id'))[1] == page_ids[1]
+    assert extraction.pages.get(page_number=3).page_text.endswith('Généraliser')
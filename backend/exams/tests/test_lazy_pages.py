@@ -0,0 +1,77 @@
+"""
+Tests for lazy (render-on-read) page images.
+"""
+import os
+
+import pytest
+from django.core.files.base import ContentFile
+from rest_framework import status
+
+from exams.models import Exam, Copy
+from exams.tests.fixtures.pdf_fixtures import create_valid_pdf
+from processing.services.page_cache import PageCache, is_lazy_ref
+from processing.services.pdf_splitter import PDFSplitter
+
+
+@pytest.fixture
+def lazy_settings(settings):
+    settings.LAZY_PAGE_RENDERING = True
+    settings.PAGE_RENDER_DPI = 36
+    settings.PAGE_PREFETCH_COUNT = 2
+    return settings
+
+
+@pytest.fixture
+def lazy_copy(db, lazy_settings, teacher_user):
+    exam = Exam.objects.create(name="Lazy", pages_per_booklet=4)
+    exam.pdf_source.save("lazy.pdf", ContentFile(create_valid_pdf(pages=8)))
+    booklets = PDFSplitter().split_exam(exam)
+    copies = []
+    for i, booklet in enumerate(booklets):
+        copy = Copy.objects.create(
+            exam=exam, anonymous_id=f"LAZY-{i}", status=Copy.Status.READY,
+            assigned_corrector=teacher_user,
+        )
+        copy.booklets.add(booklet)
+        copies.append(copy)
+    return copies
+
+
+@pytest.mark.django_db
+class TestLazyPageRendering:
+
+    def test_split_stores_references_without_rendering(self, lazy_copy, lazy_settings):
+        booklet = lazy_copy[0].booklets.get()
+        assert len(booklet.pages_images) == 4
+        assert all(is_lazy_ref(p) for p in booklet.pages_images)
+        assert not os.path.exists(os.path.join(lazy_settings.MEDIA_ROOT, 'booklets'))
+
+    def test_serializer_exposes_page_urls(self, teacher_client, lazy_copy):
+        booklet = lazy_copy[0].booklets.get()
+        response = teacher_client.get(f'/api/exams/{lazy_copy[0].exam_id}/booklets/')
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        pages = [b for b in data if str(b['id']) == str(booklet.id)][0]['pages_images']
+        assert pages[1].endswith(f'/api/exams/booklets/{booklet.id}/pages/1/image/')
+
+    def test_page_endpoint_renders_and_prefetches_lot(self, teacher_client, lazy_copy):
+        first, second = [c.booklets.get() for c in lazy_copy]
+        cache = PageCache()
+
+        response = teacher_client.get(f'/api/exams/booklets/{first.id}/pages/3/image/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'image/png'
+        assert b''.join(response.streaming_content).startswith(b'\x89PNG')
+        response.close()
+        assert cache.get(first.pages_images[3]) is not None
+        # Last page of the copy: the next copy of the corrector's lot is warmed
+        assert cache.get(second.pages_images[0]) is not None
+        assert cache.get(second.pages_images[1]) is not None
+        assert cache.get(second.pages_images[2]) is None
+
+    def test_page_endpoint_out_of_range(self, teacher_client, lazy_copy):
+        booklet = lazy_copy[0].booklets.get()
+        response = teacher_client.get(f'/api/exams/booklets/{booklet.id}/pages/9/image/')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
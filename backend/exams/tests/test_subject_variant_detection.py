@@ -0,0 +1,108 @@
+"""
+Tests de la détection du sujet (A/B) en tâche de fond (exams.tasks.detect_subject_variants) :
+couche texte du pied de page d'abord, OCR de la seule bande de pied en repli.
+"""
+import datetime
+import signal
+import time
+
+import fitz
+import pytest
+
+from exams.models import Copy, Exam
+from exams.tasks import detect_subject_variants
+from processing.services import subject_variant
+
+
+def _pdf(media_root, name, footer=None, body="Annexe"):
+    doc = fitz.open()
+    for _ in range(2):
+        page = doc.new_page()
+        page.insert_text((72, 100), body)
+    if footer:
+        page.insert_text((72, page.rect.height - 30), footer)
+    path = media_root / "copies" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return f"copies/{name}"
+
+
+@pytest.fixture
+def exam_copies(db, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    exam = Exam.objects.create(name="Sujets", date=datetime.date(2026, 6, 1))
+    footers = {"SUJ-1": "Ref. 26-BBMATHS-ME1", "SUJ-2": "Ref. 26-BBMATH-ME1", "SUJ-3": "Ref. 26-BBMATHS-ME1"}
+    for anonymous_id, footer in footers.items():
+        Copy.objects.create(exam=exam, anonymous_id=anonymous_id, pdf_source=_pdf(tmp_path, f"{anonymous_id}.pdf", footer))
+    Copy.objects.create(exam=exam, anonymous_id="SUJ-4")
+    return exam
+
+
+@pytest.mark.django_db
+def test_text_layer_detection_in_process_pool(exam_copies, settings, teacher_client, monkeypatch):
+    settings.SUBJECT_VARIANT_WORKERS = 2
+    monkeypatch.setattr(subject_variant, 'ocr_footer', lambda *args: pytest.fail("OCR inutile"))
+
+    resp = teacher_client.post(f"/api/exams/{exam_copies.id}/auto-detect-subject/")
+
+    assert resp.status_code == 202
+    assert resp.data['task_id']
+    variants = dict(Copy.objects.filter(exam=exam_copies).values_list('anonymous_id', 'subject_variant'))
+    assert variants == {"SUJ-1": 'A', "SUJ-2": 'B', "SUJ-3": 'A', "SUJ-4": None}
+
+    result = detect_subject_variants.apply(args=[str(exam_copies.id)]).get()
+    assert (result['total'], result['processed'], result['detected'], result['failed']) == (4, 4, 3, 1)
+    assert result['updated'] == 0
+    assert {entry['method'] for entry in result['copies']} == {'text'}
+    assert result['errors'] == [{'id': result['errors'][0]['id'], 'anonymous_id': "SUJ-4", 'detail': 'Pas de PDF source'}]
+
+
+@pytest.mark.django_db
+def test_ocr_only_on_footer_strip_when_text_layer_lacks_reference(settings, tmp_path, monkeypatch):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.SUBJECT_VARIANT_WORKERS = 1
+    exam = Exam.objects.create(name="Scans", date=datetime.date(2026, 6, 1))
+    # Référence hors du pied de page : invisible pour la lecture de la bande
+    scanned = Copy.objects.create(
+        exam=exam, anonymous_id="SCAN-1", pdf_source=_pdf(tmp_path, "scan.pdf", body="BBMATHS en haut de page"),
+    )
+    strips = []
+
+    def fake_ocr(page, clip, dpi=subject_variant.OCR_DPI):
+        pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        strips.append((pix.n, pix.height / pix.width))
+        return "Ref 26 BB MATH ME1\n"
+
+    monkeypatch.setattr(subject_variant, 'ocr_footer', fake_ocr)
+
+    result = detect_subject_variants.apply(args=[str(exam.id)]).get()
+
+    assert result['copies'][0]['method'] == 'ocr'
+    assert strips[0][0] == 1
+    assert strips[0][1] == pytest.approx(subject_variant.FOOTER_RATIO * 842 / 595, rel=0.02)
+    scanned.refresh_from_db()
+    assert scanned.subject_variant == 'B'
+
+
+@pytest.mark.django_db
+def test_stuck_pool_process_times_out(exam_copies, settings, monkeypatch):
+    settings.SUBJECT_VARIANT_WORKERS = 2
+    read_reference = subject_variant.read_reference
+
+    def slow_read(pdf_path):
+        if pdf_path.endswith("SUJ-2.pdf"):
+            # Bloqué comme dans un appel natif : SIGTERM sans effet
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            time.sleep(30)
+        return read_reference(pdf_path)
+
+    monkeypatch.setattr(subject_variant, 'read_reference', slow_read)
+    monkeypatch.setattr(subject_variant, 'COPY_TIMEOUT', 1)
+    started = time.monotonic()
+
+    result = detect_subject_variants.apply(args=[str(exam_copies.id)]).get()
+
+    assert time.monotonic() - started < 10
+    assert (result['detected'], result['failed']) == (2, 2)
+    assert any(error['anonymous_id'] == "SUJ-2" and 'Délai' in error['detail'] for error in result['errors'])
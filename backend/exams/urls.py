@@ -4,9 +4,9 @@ from .views import (
     ExamDetailView, CopyListView, MergeBookletsView, ExportAllView, CSVExportView,
     CopyIdentificationView, UnidentifiedCopiesView, StudentCopiesView,
     CopyImportView, ExamSourceUploadView, BookletSplitView, BookletDetailView,
-    BookletHeaderView, ExamDispatchView, IndividualPDFUploadView, PronoteExportView,
+    BookletHeaderView, BookletPageImageView, ExamDispatchView, IndividualPDFUploadView, PronoteExportView,
     CopyValidationView, BulkCopyValidationView,
-    BulkSubjectVariantView, AutoDetectSubjectVariantView
+    BulkSubjectVariantView, AutoDetectSubjectVariantView, ExamBookletBoundariesView
 )
 from .views_documents import (
     DocumentSetUploadView,
@@ -28,7 +28,9 @@ urlpatterns = [
 
     # Mission 16: Booklet Management
     path('<uuid:exam_id>/booklets/', BookletListView.as_view(), name='booklet-list'),
+    path('<uuid:exam_id>/booklet-boundaries/', ExamBookletBoundariesView.as_view(), name='booklet-boundaries'),
     path('booklets/<uuid:id>/header/', BookletHeaderView.as_view(), name='booklet-header'),
+    path('booklets/<uuid:id>/pages/<int:index>/image/', BookletPageImageView.as_view(), name='booklet-page-image'),
     path('booklets/<uuid:id>/split/', BookletSplitView.as_view(), name='booklet-split'),
     path('booklets/<uuid:id>/', BookletDetailView.as_view(), name='booklet-detail'),
     
@@ -349,13 +349,15 @@ class BookletHeaderView(APIView):
 
         # Case 2: Crop top of first page
         if booklet.pages_images:
-            first_page = booklet.pages_images[0]
-            # Try media root
-            full_path = os.path.join(settings.MEDIA_ROOT, first_page)
-            if not os.path.exists(full_path):
-                full_path = first_page  # absolute path fallback
+            from processing.services.page_cache import resolve_page_path
+            try:
+                # Media path, absolute path or lazy (source PDF, page) reference
+                full_path = resolve_page_path(booklet.pages_images[0])
+            except (ValueError, FileNotFoundError) as e:
+                logger.error(f"BookletHeaderView page render failed: {e}")
+                full_path = None
 
-            if os.path.exists(full_path):
+            if full_path and os.path.exists(full_path):
                 try:
                     with PILImage.open(full_path) as img:
                         w, h = img.size
@@ -377,6 +379,49 @@ class BookletHeaderView(APIView):
         return HttpResponse(status=404)
 
 
+class BookletPageImageView(APIView):
+    """
+    Serve one page image of a booklet.
+    In lazy mode (settings.LAZY_PAGE_RENDERING) the page is rendered on first
+    request into the bounded page cache, and the next pages of the corrector's
+    lot are warmed in the background.
+    """
+    permission_classes = [IsTeacherOrAdmin]
+
+    def get(self, request, id, index):
+        from django.conf import settings
+        from django.http import FileResponse
+        from processing.services.page_cache import resolve_page_path, upcoming_page_refs
+
+        booklet = get_object_or_404(Booklet, id=id)
+        pages = booklet.pages_images or []
+        if index >= len(pages):
+            return Response({"error": "Page hors limites."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            full_path = resolve_page_path(pages[index])
+        except (ValueError, FileNotFoundError) as e:
+            logger.error(f"Page render failed for booklet {booklet.id} page {index}: {e}")
+            full_path = None
+
+        if not full_path or not os.path.exists(full_path):
+            return Response({"error": _("Page indisponible.")}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            refs = upcoming_page_refs(booklet, index, request.user, settings.PAGE_PREFETCH_COUNT)
+            if refs:
+                from grading.tasks import prefetch_page_images
+                prefetch_page_images.delay(refs)
+        except Exception as e:
+            # Prefetch is best-effort: never fail the page itself
+            logger.warning(f"Page prefetch scheduling failed: {e}")
+
+        content_type = 'image/webp' if full_path.endswith('.webp') else 'image/png'
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
 class BookletDetailView(generics.RetrieveDestroyAPIView):
     queryset = Booklet.objects.all()
     serializer_class = BookletSerializer
@@ -413,24 +458,22 @@ class BookletSplitView(APIView):
         # Determine source page index
         page_index = booklet.start_page - 1
         
-        import tempfile
-        from processing.services.splitter import A3Splitter
+        from processing.services.splitter import A3Splitter, pixmap_to_array
 
         try:
             doc = fitz.open(booklet.exam.pdf_source.path)
-            if page_index < 0 or page_index >= doc.page_count:
-                return Response({"error": "Page hors limites."}, status=status.HTTP_404_NOT_FOUND)
-                
-            page = doc.load_page(page_index)
-            pix = page.get_pixmap(dpi=150)
-            
-            fd, temp_path = tempfile.mkstemp(suffix=".png")
-            os.close(fd)
-            pix.save(temp_path)
-            
-            # Use Splitter Service
+            try:
+                if page_index < 0 or page_index >= doc.page_count:
+                    return Response({"error": "Page hors limites."}, status=status.HTTP_404_NOT_FOUND)
+
+                page = doc.load_page(page_index)
+                image = pixmap_to_array(page.get_pixmap(dpi=150, alpha=False))
+            finally:
+                doc.close()
+
+            # Use Splitter Service (in-memory, no temp file round trip)
             splitter = A3Splitter()
-            result = splitter.process_scan(temp_path)
+            result = splitter.process_image(image)
             
             return Response({
                 "message": "Split analysis complete",
@@ -444,9 +487,6 @@ class BookletSplitView(APIView):
                 safe_error_response(e, context="Page analysis", user_message="Échec de l'analyse de la page."),
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        finally:
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.unlink(temp_path)
 
 class ExamDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsTeacherOrAdmin]  # Teacher/Admin only
@@ -756,6 +796,100 @@ class ExamSourceUploadView(APIView):
                 safe_error_response(e, context="PDF upload", user_message="Échec du traitement du PDF."),
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class ExamBookletBoundariesView(APIView):
+    """
+    Détection automatique des coupures entre fascicules (mode BATCH_A3).
+
+    GET  : passe basse résolution sur tout le PDF source, renvoie la proposition
+           (plages de pages + anomalies) sans rien écrire.
+    POST : {"boundaries": [[start, end], ...], "ignored_pages": [n, ...]} —
+           redécoupe l'examen selon les plages confirmées ; seules ces pages sont
+           rendues en pleine résolution. Toute page hors des plages doit figurer
+           dans ignored_pages (optionnel), sinon 400.
+    """
+    permission_classes = [IsTeacherOrAdmin]
+
+    def get(self, request, exam_id):
+        exam = get_object_or_404(Exam, id=exam_id)
+        if not exam.pdf_source:
+            return Response(
+                {"error": _("Le PDF source n'est pas disponible pour cet examen")},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        from processing.services.booklet_boundaries import BookletBoundaryDetector
+
+        try:
+            proposal = BookletBoundaryDetector().detect(
+                exam.pdf_source.path, expected_pages=exam.pages_per_booklet
+            )
+        except Exception as e:
+            from core.utils.errors import safe_error_response
+            return Response(
+                safe_error_response(e, context="Boundary detection", user_message="Échec de la détection des fascicules."),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(proposal, status=status.HTTP_200_OK)
+
+    def post(self, request, exam_id):
+        exam = get_object_or_404(Exam, id=exam_id)
+        boundaries = request.data.get('boundaries')
+        if not isinstance(boundaries, list) or not boundaries:
+            return Response({"error": "boundaries field required"}, status=status.HTTP_400_BAD_REQUEST)
+        ignored_pages = request.data.get('ignored_pages', [])
+        if not isinstance(ignored_pages, list):
+            return Response({"error": "ignored_pages must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Same protocol as re-upload: never re-split copies already in correction
+        non_staging_copies = exam.copies.exclude(status=Copy.Status.STAGING).count()
+        if non_staging_copies > 0:
+            return Response(
+                {"error": _(f"Impossible de redécouper: {non_staging_copies} copie(s) sont déjà en cours de traitement ou corrigées.")},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        from processing.services.pdf_splitter import PDFSplitter
+        from django.utils import timezone
+
+        try:
+            with transaction.atomic():
+                exam.copies.filter(status=Copy.Status.STAGING).delete()
+                exam.booklets.all().delete()
+
+                booklets = PDFSplitter(dpi=150).split_exam(
+                    exam, force=True, boundaries=boundaries, ignored_pages=ignored_pages
+                )
+
+                for i, booklet in enumerate(booklets):
+                    has_pages = bool(booklet.pages_images)
+                    copy = Copy.objects.create(
+                        exam=exam,
+                        anonymous_id=generate_anonymous_id(exam, i),
+                        status=Copy.Status.READY if has_pages else Copy.Status.STAGING,
+                        is_identified=False,
+                        validated_at=timezone.now() if has_pages else None
+                    )
+                    copy.booklets.add(booklet)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            from core.utils.errors import safe_error_response
+            logger.error(f"Boundary split failed for exam {exam.id}: {str(e)}", exc_info=True)
+            return Response(
+                safe_error_response(e, context="Booklet split", user_message="Échec du découpage des fascicules."),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        logger.info(f"Exam {exam.id} re-split from confirmed boundaries: {len(booklets)} booklets")
+        return Response({
+            "message": f"{len(booklets)} copies créées.",
+            "booklets_created": len(booklets)
+        }, status=status.HTTP_201_CREATED)
+
+
 class CopyValidationView(APIView):
     permission_classes = [IsTeacherOrAdmin]
 
@@ -1178,95 +1312,27 @@ class BulkSubjectVariantView(APIView):
 
 class AutoDetectSubjectVariantView(APIView):
     """
-    OCR auto-detect subject variant from the reference at the bottom of the last page (annexe).
+    Auto-detect subject variant from the reference at the bottom of the last page (annexe).
     POST /api/exams/<exam_id>/auto-detect-subject/
     Convention: BBMATHS... = Sujet A, BBMATH... (no S) = Sujet B
+
+    Runs in the background (exams.tasks.detect_subject_variants): 202 + task_id,
+    progress and result via GET /api/grading/tasks/<task_id>/.
     """
     permission_classes = [IsTeacherOrAdmin]
 
     def post(self, request, exam_id):
-        import fitz
-        import io
-        import os
-        import re
-        from PIL import Image
-        import pytesseract
-        import logging
-        from django.conf import settings
+        from exams.tasks import detect_subject_variants
 
-        logger = logging.getLogger(__name__)
         exam = get_object_or_404(Exam, id=exam_id)
+        try:
+            result = detect_subject_variants.delay(str(exam.id))
+        except Exception as e:
+            logger.error(f"Impossible de lancer la détection des sujets: {e}")
+            return Response(
+                {'detail': f'Erreur lors du lancement de la détection des sujets: {str(e)[:300]}'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
-        # Media root: try standard path first, then Docker volume
-        media_paths = [
-            settings.MEDIA_ROOT,
-            '/var/lib/docker/volumes/docker_media_volume/_data',
-        ]
-
-        copies = Copy.objects.filter(exam=exam).order_by('anonymous_id')
-        results = {'detected': 0, 'failed': 0, 'errors': [], 'copies': []}
-
-        for copy in copies:
-            if not copy.pdf_source:
-                results['errors'].append({'id': str(copy.id), 'error': 'No PDF source'})
-                results['failed'] += 1
-                continue
-
-            # Find the actual file
-            pdf_path = None
-            for base in media_paths:
-                candidate = os.path.join(base, copy.pdf_source.name)
-                if os.path.exists(candidate):
-                    pdf_path = candidate
-                    break
-
-            if not pdf_path:
-                results['errors'].append({'id': str(copy.id), 'error': 'PDF file not found'})
-                results['failed'] += 1
-                continue
-
-            try:
-                doc = fitz.open(pdf_path)
-                last_page = doc[-1]
-                # Render bottom 15% at 150 DPI for OCR
-                pix = last_page.get_pixmap(dpi=150)
-                img = Image.open(io.BytesIO(pix.tobytes("png")))
-                w, h = img.size
-                bottom = img.crop((0, int(h * 0.85), w, h))
-                text = pytesseract.image_to_string(bottom, lang="eng")
-                doc.close()
-
-                # Detect reference pattern
-                text_clean = re.sub(r'[^A-Z0-9]', '', text.upper())
-                variant = None
-                if re.search(r'BBMATHS', text_clean):
-                    variant = 'A'
-                elif re.search(r'BBMATH', text_clean):
-                    variant = 'B'
-
-                if variant:
-                    copy.subject_variant = variant
-                    copy.save(update_fields=['subject_variant'])
-                    results['detected'] += 1
-                else:
-                    results['errors'].append({
-                        'id': str(copy.id),
-                        'anonymous_id': copy.anonymous_id,
-                        'error': f'No reference found in OCR text: {text.strip()[:100]}'
-                    })
-                    results['failed'] += 1
-
-                results['copies'].append({
-                    'id': str(copy.id),
-                    'anonymous_id': copy.anonymous_id,
-                    'subject_variant': variant,
-                    'ocr_text': text.strip()[:100],
-                })
-
-            except Exception as e:
-                logger.error(f"OCR failed for copy {copy.id}: {e}")
-                results['errors'].append({'id': str(copy.id), 'error': str(e)[:200]})
-                results['failed'] += 1
-
-        return Response(results)
+        return Response({'task_id': result.id, 'exam_id': str(exam.id)}, status=status.HTTP_202_ACCEPTED)
 
@@ -0,0 +1,715 @@
+"""
+Draft Store - Autosave des brouillons de correction (DraftState) en write-behind.
+
+L'éditeur sauvegarde à chaque frappe. Plutôt que de renvoyer tout le payload
+et d'écrire en base à chaque fois, le client envoie un patch JSON (RFC 6902)
+calculé contre la version qu'il connaît :
+
+    PUT {"client_id": ..., "version": 7, "patch": [{"op": "replace", "path": "/content", "value": "..."}]}
+
+Backend Redis (settings.DRAFT_STORE_BACKEND = 'redis') :
+- le brouillon chaud est un hash Redis (base + version + client_id) et une
+  liste de patches en attente ; une sauvegarde = un seul appel de script Lua
+  (vérification client_id / version, ajout du patch ou remplacement,
+  marquage "dirty") ;
+- le patch est d'abord appliqué au document courant gardé en mémoire du
+  process (LRU, par brouillon et version) : un patch inapplicable est refusé
+  (400) comme avec le backend 'db'. Si le process n'a pas ce document, un
+  premier appel du script le lit (base + patches en attente) ;
+- la tâche périodique flush_draft_store recopie les brouillons modifiés dans
+  DraftState par lots (bulk_update), puis compacte la liste de patches ;
+- la finalisation d'une copie force le flush et évince ses brouillons.
+
+Backend 'db' (Redis non configuré, ou injoignable : repli opération par
+opération) : écriture directe dans DraftState, patches compris. Un brouillon
+écrit en base pendant une panne de Redis n'est pas écrasé par son ancienne
+version chaude au flush suivant.
+
+La sémantique client_id est inchangée : un brouillon appartient à la session
+(client_id) qui l'a créé, une autre session reçoit un conflit.
+"""
+import copy as copy_module
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from exams.models import Copy
+from grading.models import DraftState
+
+logger = logging.getLogger(__name__)
+
+PATCH_OPS = {'add', 'remove', 'replace', 'move', 'copy', 'test'}
+
+GRADED_MESSAGE = "Impossible de sauvegarder un brouillon sur une copie corrigée."
+CONFLICT_MESSAGE = "Conflit de brouillon : modifié par une autre session."
+VERSION_MESSAGE = "Version du brouillon obsolète : renvoyer le brouillon complet."
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+class DraftConflictError(Exception):
+    """
+    Sauvegarde refusée : autre session (client_id) ou patch calculé contre
+    une version périmée (`version` = version courante du brouillon).
+    """
+
+    def __init__(self, message=CONFLICT_MESSAGE, version=None):
+        super().__init__(message)
+        self.version = version
+
+
+# ---------------------------------------------------------------------------
+# JSON Patch (RFC 6902) / JSON Pointer (RFC 6901)
+# ---------------------------------------------------------------------------
+
+def _parse_pointer(path):
+    if not isinstance(path, str) or (path and not path.startswith('/')):
+        raise JsonPatchError(f"Invalid JSON pointer: {path!r}")
+    if path == '':
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in path[1:].split('/')]
+
+
+def validate_patch(patch):
+    """Contrôle syntaxique d'un patch (sans document). Raises JsonPatchError."""
+    if not isinstance(patch, list):
+        raise JsonPatchError("patch must be a list of operations")
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in PATCH_OPS:
+            raise JsonPatchError(f"Invalid patch operation: {operation!r}")
+        _parse_pointer(operation.get('path'))
+        if operation['op'] in ('add', 'replace', 'test') and 'value' not in operation:
+            raise JsonPatchError(f"'{operation['op']}' requires a value")
+        if operation['op'] in ('move', 'copy'):
+            _parse_pointer(operation.get('from'))
+
+
+def _list_index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _walk(doc, tokens):
+    """Conteneur parent de la cible et dernier jeton."""
+    target = doc
+    for token in tokens[:-1]:
+        if isinstance(target, list):
+            target = target[_list_index(target, token)]
+        elif isinstance(target, dict) and token in target:
+            target = target[token]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return target, tokens[-1]
+
+
+def _get(doc, tokens):
+    if not tokens:
+        return doc
+    parent, key = _walk(doc, tokens)
+    if isinstance(parent, list):
+        return parent[_list_index(parent, key)]
+    if isinstance(parent, dict) and key in parent:
+        return parent[key]
+    raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def _add(doc, tokens, value):
+    if not tokens:
+        return value
+    parent, key = _walk(doc, tokens)
+    if isinstance(parent, list):
+        parent.insert(_list_index(parent, key, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise JsonPatchError(f"Cannot add to a scalar at /{'/'.join(tokens)}")
+    return doc
+
+
+def _remove(doc, tokens):
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root")
+    _get(doc, tokens)
+    parent, key = _walk(doc, tokens)
+    if isinstance(parent, list):
+        del parent[_list_index(parent, key)]
+    else:
+        del parent[key]
+    return doc
+
+
+def apply_patch(doc, patch):
+    """
+    Applique un patch RFC 6902 (atomique : le document d'entrée n'est jamais
+    modifié, une opération invalide fait échouer tout le patch).
+
+    Raises:
+        JsonPatchError
+    """
+    validate_patch(patch)
+    doc = copy_module.deepcopy(doc)
+    for operation in patch:
+        op = operation['op']
+        tokens = _parse_pointer(operation['path'])
+        if op == 'add':
+            doc = _add(doc, tokens, copy_module.deepcopy(operation['value']))
+        elif op == 'remove':
+            doc = _remove(doc, tokens)
+        elif op == 'replace':
+            if tokens:
+                doc = _remove(doc, tokens)
+            doc = _add(doc, tokens, copy_module.deepcopy(operation['value']))
+        elif op == 'test':
+            if _get(doc, tokens) != operation['value']:
+                raise JsonPatchError(f"Test failed at {operation['path']}")
+        else:
+            source = _parse_pointer(operation['from'])
+            value = copy_module.deepcopy(_get(doc, source))
+            if op == 'move':
+                if tokens[:len(source)] == source and tokens != source:
+                    raise JsonPatchError("Cannot move a value into itself")
+                doc = _remove(doc, source)
+            doc = _add(doc, tokens, value)
+    return doc
+
+
+# ---------------------------------------------------------------------------
+# Stores
+# ---------------------------------------------------------------------------
+
+def _check_client(current_client_id, client_id):
+    if current_client_id and str(current_client_id) != str(client_id):
+        raise DraftConflictError()
+
+
+def _draft_response(draft):
+    return {
+        "id": str(draft.id),
+        "payload": draft.payload,
+        "version": draft.version,
+        "updated_at": draft.updated_at,
+        "client_id": str(draft.client_id) if draft.client_id else None,
+    }
+
+
+class DatabaseDraftStore:
+    """Écriture directe dans DraftState (comportement historique)."""
+
+    name = 'db'
+
+    def get(self, copy_id, user):
+        draft = DraftState.objects.filter(copy_id=copy_id, owner=user).first()
+        return _draft_response(draft) if draft else None
+
+    def save(self, copy_id, user, client_id, payload=None, patch=None, base_version=None):
+        """
+        Returns:
+            dict: {'version', 'updated_at'}
+
+        Raises:
+            Copy.DoesNotExist, ValueError (copie corrigée, patch invalide),
+            DraftConflictError
+        """
+        copy = Copy.objects.only('id', 'status').get(id=copy_id)
+        if copy.status == Copy.Status.GRADED:
+            raise ValueError(GRADED_MESSAGE)
+
+        existing = DraftState.objects.filter(copy=copy, owner=user).first()
+        if existing is not None:
+            _check_client(existing.client_id, client_id)
+
+        if patch is not None and existing is None:
+            if base_version not in (None, 0):
+                raise DraftConflictError(VERSION_MESSAGE, version=0)
+            payload = apply_patch({}, patch)
+
+        draft, created = DraftState.objects.get_or_create(
+            copy=copy,
+            owner=user,
+            defaults={"payload": payload or {}, "client_id": client_id, "version": 1},
+        )
+        if created:
+            return {"version": draft.version, "updated_at": draft.updated_at}
+
+        if patch is not None:
+            if base_version != draft.version:
+                raise DraftConflictError(VERSION_MESSAGE, version=draft.version)
+            payload = apply_patch(draft.payload, patch)
+
+        # Conditional update: the row must still carry the version and client
+        # we just checked
+        updated_count = DraftState.objects.filter(
+            id=draft.id, client_id=draft.client_id, version=draft.version,
+        ).update(payload=payload, version=F('version') + 1, updated_at=timezone.now())
+        if updated_count == 0:
+            raise DraftConflictError()
+
+        draft.refresh_from_db(fields=['version', 'updated_at'])
+        return {"version": draft.version, "updated_at": draft.updated_at}
+
+    def delete(self, copy_id, user):
+        DraftState.objects.filter(copy_id=copy_id, owner=user).delete()
+
+    def flush(self, batch_size=None):
+        return 0
+
+    def flush_copy(self, copy_id, evict=False):
+        return 0
+
+
+class RedisDraftStore:
+    """
+    Brouillons chauds dans Redis, recopiés dans DraftState par lots.
+
+    Clés :
+        draft:<copy>:<owner>       hash {id, client_id, base, base_version, version, updated_at}
+        draft:<copy>:<owner>:ops   liste des patches (JSON) appliqués depuis base
+        drafts:dirty               ensemble des brouillons à recopier
+
+    Invariant : version == base_version + LLEN(ops).
+    """
+
+    name = 'redis'
+    KEY_PREFIX = 'draft:'
+    DIRTY_KEY = 'drafts:dirty'
+
+    # KEYS: hash, ops, dirty. ARGV: client_id, mode, data, updated_at, base_version, id
+    # mode 'full' : remplace le payload ; 'patch' : ajoute le patch, déjà validé
+    # contre le brouillon `id` à la version base_version ; 'state' : contrôles
+    # seuls, retourne l'état à valider.
+    # Returns {-1} (absent), {-2} (autre session), {-3, version} (version
+    # périmée), {-4, id, base, patches...} (état), {-5} (brouillon recréé
+    # depuis la validation) ou {version, id}.
+    SAVE_SCRIPT = """
+    local state = redis.call('HMGET', KEYS[1], 'client_id', 'version', 'id')
+    if not state[1] then return {-1} end
+    if state[1] ~= '' and state[1] ~= ARGV[1] then return {-2} end
+    local version = tonumber(state[2])
+    if ARGV[2] == 'full' then
+        redis.call('DEL', KEYS[2])
+        redis.call('HSET', KEYS[1], 'base', ARGV[3], 'base_version', version + 1)
+    else
+        if tonumber(ARGV[5]) ~= version then return {-3, version} end
+        if ARGV[2] == 'state' then
+            local reply = {-4, state[3], redis.call('HGET', KEYS[1], 'base')}
+            for _, op in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+                reply[#reply + 1] = op
+            end
+            return reply
+        end
+        if state[3] ~= ARGV[6] then return {-5} end
+        redis.call('RPUSH', KEYS[2], ARGV[3])
+    end
+    version = version + 1
+    redis.call('HSET', KEYS[1], 'version', version, 'updated_at', ARGV[4])
+    redis.call('PERSIST', KEYS[1])
+    redis.call('PERSIST', KEYS[2])
+    redis.call('SADD', KEYS[3], KEYS[1])
+    return {version, state[3]}
+    """
+
+    # KEYS: hash, ops. ARGV: id, client_id, payload, version, updated_at, ttl_ms
+    SEED_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+    redis.call('DEL', KEYS[2])
+    redis.call('HSET', KEYS[1], 'id', ARGV[1], 'client_id', ARGV[2], 'base', ARGV[3],
+               'base_version', ARGV[4], 'version', ARGV[4], 'updated_at', ARGV[5])
+    redis.call('PEXPIRE', KEYS[1], ARGV[6])
+    return 1
+    """
+
+    # Après recopie en base de l'état (base_version + n patches) :
+    # KEYS: hash, ops, dirty. ARGV: base_version lu, n, payload, version recopiée, ttl_ms
+    COMPACT_SCRIPT = """
+    if redis.call('HGET', KEYS[1], 'base_version') ~= ARGV[1] then return 0 end
+    redis.call('LTRIM', KEYS[2], tonumber(ARGV[2]), -1)
+    redis.call('HSET', KEYS[1], 'base', ARGV[3], 'base_version', ARGV[4])
+    if redis.call('HGET', KEYS[1], 'version') == ARGV[4] then
+        redis.call('SREM', KEYS[3], KEYS[1])
+        redis.call('PEXPIRE', KEYS[1], ARGV[5])
+        redis.call('DEL', KEYS[2])
+    end
+    return 1
+    """
+
+    # Documents courants gardés en mémoire du process : {clé: (id, version, payload)}
+    DOC_CACHE_SIZE = 1000
+
+    def __init__(self, client=None, ttl_seconds=None):
+        import redis
+
+        if client is None:
+            client = redis.Redis.from_url(settings.DRAFT_STORE_REDIS_URL, socket_timeout=1)
+        self.client = client
+        self.unavailable_errors = (redis.RedisError, OSError)
+        self._docs = OrderedDict()
+        self._docs_lock = threading.Lock()
+        # Brouillons écrits en base pendant une panne : copie chaude à jeter
+        self._stale_keys = set()
+        self.ttl_ms = int((ttl_seconds or settings.DRAFT_HOT_TTL_SECONDS) * 1000)
+        self._save = client.register_script(self.SAVE_SCRIPT)
+        self._seed = client.register_script(self.SEED_SCRIPT)
+        self._compact = client.register_script(self.COMPACT_SCRIPT)
+        self._db = DatabaseDraftStore()
+
+    def _key(self, copy_id, owner_id):
+        return f"{self.KEY_PREFIX}{copy_id}:{owner_id}"
+
+    @staticmethod
+    def _decode(state, ops):
+        if not state:
+            return None, []
+        return {k.decode(): v.decode() for k, v in state.items()}, [op.decode() for op in ops]
+
+    def _read(self, key):
+        with self.client.pipeline(transaction=True) as pipe:
+            state, ops = pipe.hgetall(key).lrange(f"{key}:ops", 0, -1).execute()
+        return self._decode(state, ops)
+
+    # --- Documents en mémoire du process ---------------------------------------
+
+    def _cached(self, key, draft_id, version):
+        with self._docs_lock:
+            cached = self._docs.get(key)
+        if cached is not None and cached[:2] == (draft_id, version):
+            return cached[2]
+        return None
+
+    def _remember(self, key, draft_id, version, payload):
+        with self._docs_lock:
+            self._docs[key] = (draft_id, version, payload)
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.DOC_CACHE_SIZE:
+                self._docs.popitem(last=False)
+
+    def _forget(self, *keys):
+        with self._docs_lock:
+            for key in keys:
+                self._docs.pop(key, None)
+
+    def _materialize(self, key, state, ops):
+        """
+        Payload courant : document en mémoire à cette version, sinon base +
+        patches en attente (tous appliqués avec succès à l'écriture).
+
+        Raises:
+            JsonPatchError: état chaud incohérent
+        """
+        version = int(state['version'])
+        doc = self._cached(key, state['id'], version)
+        if doc is None:
+            doc = json.loads(state['base'])
+            for raw in ops:
+                doc = apply_patch(doc, json.loads(raw))
+            self._remember(key, state['id'], version, doc)
+        return doc
+
+    # --- Opérations (repli sur la base si Redis est injoignable) -----------------
+
+    def get(self, copy_id, user):
+        try:
+            return self._get_hot(copy_id, user)
+        except self.unavailable_errors as e:
+            logger.warning(f"Draft store redis unavailable ({e}), falling back to database")
+            return self._db.get(copy_id, user)
+
+    def save(self, copy_id, user, client_id, payload=None, patch=None, base_version=None):
+        """
+        Returns:
+            dict: {'version', 'updated_at'}
+
+        Raises:
+            Copy.DoesNotExist, ValueError (copie corrigée, patch invalide),
+            DraftConflictError
+        """
+        if patch is not None:
+            validate_patch(patch)
+        try:
+            return self._save_with_load(copy_id, user, client_id, payload, patch, base_version)
+        except self.unavailable_errors as e:
+            logger.warning(f"Draft store redis unavailable ({e}), falling back to database")
+            self._mark_stale(self._key(copy_id, user.id))
+            return self._db.save(copy_id, user, client_id, payload=payload, patch=patch, base_version=base_version)
+
+    def delete(self, copy_id, user):
+        key = self._key(copy_id, user.id)
+        self._forget(key)
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.delete(key, f"{key}:ops").srem(self.DIRTY_KEY, key).execute()
+        except self.unavailable_errors as e:
+            logger.warning(f"Draft store redis unavailable ({e}), deleting from database only")
+            self._mark_stale(key)
+        self._db.delete(copy_id, user)
+
+    def _mark_stale(self, key):
+        self._forget(key)
+        with self._docs_lock:
+            self._stale_keys.add(key)
+
+    def _drop_stale(self):
+        """Supprime les copies chaudes dépassées par une écriture de repli."""
+        if not self._stale_keys:
+            return
+        with self._docs_lock:
+            keys, self._stale_keys = self._stale_keys, set()
+        try:
+            with self.client.pipeline() as pipe:
+                for key in keys:
+                    pipe.delete(key, f"{key}:ops").srem(self.DIRTY_KEY, key)
+                pipe.execute()
+        except self.unavailable_errors:
+            with self._docs_lock:
+                self._stale_keys |= keys
+            raise
+
+    def _get_hot(self, copy_id, user):
+        self._drop_stale()
+        key = self._key(copy_id, user.id)
+        state, ops = self._read(key)
+        if state is None:
+            return self._db.get(copy_id, user)
+        return {
+            "id": state['id'],
+            "payload": copy_module.deepcopy(self._materialize(key, state, ops)),
+            "version": int(state['version']),
+            "updated_at": parse_datetime(state['updated_at']),
+            "client_id": state['client_id'] or None,
+        }
+
+    def _save_with_load(self, copy_id, user, client_id, payload, patch, base_version):
+        self._drop_stale()
+        key = self._key(copy_id, user.id)
+        now = timezone.now()
+
+        version = self._save_hot(key, str(client_id), payload, patch, base_version, now)
+        if version is None:
+            # Brouillon absent du cache : contrôles en base, création
+            # éventuelle (write-through), puis chargement dans Redis.
+            created = self._load(copy_id, user, client_id, payload, patch, base_version)
+            if created is not None:
+                return created
+            version = self._save_hot(key, str(client_id), payload, patch, base_version, now)
+            if version is None:
+                raise DraftConflictError()
+        return {"version": version, "updated_at": now}
+
+    def _run_save(self, key, client_id, mode, data, now, base_version=None, draft_id=''):
+        """Un appel de SAVE_SCRIPT ; None si le brouillon est absent de Redis."""
+        result = self._save(
+            keys=[key, f"{key}:ops", self.DIRTY_KEY],
+            args=[client_id, mode, data, now.isoformat(),
+                  '' if base_version is None else int(base_version), draft_id],
+        )
+        if result[0] == -1:
+            return None
+        if result[0] == -2:
+            raise DraftConflictError()
+        if result[0] == -3:
+            raise DraftConflictError(VERSION_MESSAGE, version=int(result[1]))
+        return result
+
+    def _save_hot(self, key, client_id, payload, patch, base_version, now):
+        """
+        Nouvelle version du brouillon chaud, None s'il est absent de Redis.
+        Un seul appel de script si le document courant est en mémoire.
+        """
+        if patch is None:
+            payload = payload or {}
+            result = self._run_save(key, client_id, 'full', json.dumps(payload), now)
+            if result is None:
+                return None
+            version, draft_id = int(result[0]), result[1].decode()
+            self._remember(key, draft_id, version, copy_module.deepcopy(payload))
+            return version
+
+        with self._docs_lock:
+            cached = self._docs.get(key)
+        for _attempt in range(2):
+            if cached is None or cached[1] != base_version:
+                # Document absent de ce process : lecture de l'état, contrôles compris
+                result = self._run_save(key, client_id, 'state', '', now, base_version)
+                if result is None:
+                    return None
+                base, ops = result[2].decode(), [op.decode() for op in result[3:]]
+                state = {'id': result[1].decode(), 'version': base_version, 'base': base}
+                self._forget(key)
+                cached = (state['id'], base_version, self._materialize(key, state, ops))
+            draft_id, _version, doc = cached
+            # Même contrôle que DatabaseDraftStore : JsonPatchError si inapplicable
+            patched = apply_patch(doc, patch)
+
+            result = self._run_save(key, client_id, 'patch', json.dumps(patch), now, base_version, draft_id)
+            if result is None:
+                return None
+            if result[0] == -5:
+                cached = None  # brouillon supprimé puis recréé : document en mémoire périmé
+                continue
+            version = int(result[0])
+            self._remember(key, draft_id, version, patched)
+            return version
+        raise DraftConflictError()
+
+    def _load(self, copy_id, user, client_id, payload, patch, base_version):
+        """
+        Returns:
+            dict | None: Réponse de sauvegarde si le brouillon vient d'être
+            créé en base, None s'il a été chargé dans Redis.
+        """
+        copy = Copy.objects.only('id', 'status').get(id=copy_id)
+        if copy.status == Copy.Status.GRADED:
+            raise ValueError(GRADED_MESSAGE)
+
+        draft = DraftState.objects.filter(copy=copy, owner=user).first()
+        if draft is None:
+            saved = self._db.save(copy_id, user, client_id, payload=payload, patch=patch, base_version=base_version)
+            draft = DraftState.objects.get(copy=copy, owner=user)
+            self._seed_from(draft)
+            return saved
+
+        _check_client(draft.client_id, client_id)
+        self._seed_from(draft)
+        return None
+
+    def _seed_from(self, draft):
+        key = self._key(draft.copy_id, draft.owner_id)
+        self._seed(
+            keys=[key, f"{key}:ops"],
+            args=[
+                str(draft.id),
+                str(draft.client_id) if draft.client_id else '',
+                json.dumps(draft.payload),
+                draft.version,
+                draft.updated_at.isoformat(),
+                self.ttl_ms,
+            ],
+        )
+
+    def flush(self, batch_size=None):
+        """
+        Recopie les brouillons modifiés dans DraftState.
+
+        Returns:
+            int: Nombre de brouillons recopiés.
+        """
+        batch_size = batch_size or settings.DRAFT_FLUSH_BATCH_SIZE
+        flushed = 0
+        batch = []
+        for raw_key in self.client.sscan_iter(self.DIRTY_KEY, count=batch_size):
+            batch.append(raw_key.decode())
+            if len(batch) >= batch_size:
+                flushed += self._flush_keys(batch)
+                batch = []
+        if batch:
+            flushed += self._flush_keys(batch)
+        return flushed
+
+    def flush_copy(self, copy_id, evict=False):
+        """Recopie (et évince si `evict`) les brouillons d'une copie."""
+        owner_ids = list(DraftState.objects.filter(copy_id=copy_id).values_list('owner_id', flat=True))
+        keys = [self._key(copy_id, owner_id) for owner_id in owner_ids]
+        if not keys:
+            return 0
+        dirty = [key for key, is_dirty in zip(keys, self._smismember(keys)) if is_dirty]
+        flushed = self._flush_keys(dirty) if dirty else 0
+        if evict:
+            self._forget(*keys)
+            with self.client.pipeline() as pipe:
+                for key in keys:
+                    pipe.delete(key, f"{key}:ops").srem(self.DIRTY_KEY, key)
+                pipe.execute()
+        return flushed
+
+    def _smismember(self, keys):
+        with self.client.pipeline() as pipe:
+            for key in keys:
+                pipe.sismember(self.DIRTY_KEY, key)
+            return pipe.execute()
+
+    def _flush_keys(self, keys):
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key).lrange(f"{key}:ops", 0, -1)
+            replies = pipe.execute()
+
+        snapshots = {}
+        gone = []
+        for key, state, ops in zip(keys, replies[0::2], replies[1::2]):
+            state, ops = self._decode(state, ops)
+            if state is None:
+                gone.append(key)
+                continue
+            try:
+                snapshots[key] = (state, len(ops), self._materialize(key, state, ops))
+            except JsonPatchError as e:
+                # Reste "dirty" : la dernière version recopiée en base est conservée
+                logger.error(f"Draft {key}: hot state cannot be materialized, not flushed ({e})")
+
+        if gone:
+            self.client.srem(self.DIRTY_KEY, *gone)
+        if not snapshots:
+            return 0
+
+        drafts = {
+            str(pk): draft
+            for pk, draft in DraftState.objects.in_bulk([state['id'] for state, _n, _payload in snapshots.values()]).items()
+        }
+        to_update = []
+        superseded = []
+        for key, (state, n, payload) in list(snapshots.items()):
+            draft = drafts.get(state['id'])
+            if draft is None:
+                continue  # supprimé entre-temps
+            if draft.updated_at > parse_datetime(state['updated_at']):
+                # Écrit en base pendant une panne de Redis : la version chaude est périmée
+                superseded.append(key)
+                del snapshots[key]
+                continue
+            draft.payload = payload
+            draft.version = int(state['base_version']) + n
+            draft.updated_at = parse_datetime(state['updated_at'])
+            to_update.append(draft)
+
+        with transaction.atomic():
+            DraftState.objects.bulk_update(to_update, ['payload', 'version', 'updated_at'])
+
+        self._forget(*superseded)
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in superseded:
+                pipe.delete(key, f"{key}:ops").srem(self.DIRTY_KEY, key)
+            for key, (state, n, payload) in snapshots.items():
+                self._compact(
+                    keys=[key, f"{key}:ops", self.DIRTY_KEY],
+                    args=[state['base_version'], n, json.dumps(payload), int(state['base_version']) + n, self.ttl_ms],
+                    client=pipe,
+                )
+            pipe.execute()
+
+        logger.debug(f"Draft store flush: {len(to_update)} drafts written")
+        return len(to_update)
+
+
+_store = None
+
+
+def get_draft_store():
+    """Store partagé par process (settings.DRAFT_STORE_BACKEND)."""
+    global _store
+    if _store is None:
+        _store = RedisDraftStore() if settings.DRAFT_STORE_BACKEND == 'redis' else DatabaseDraftStore()
+    return _store
@@ -0,0 +1,295 @@
+"""
+Copy Lock Manager - Verrou d'édition d'une copie, à backend interchangeable.
+
+Chaque onglet de correction ouvert envoie un heartbeat périodique. Sur la table
+CopyLock, chacun est une écriture Postgres (plus une lecture de la copie). Le
+backend Redis ramène ces opérations à une commande atomique :
+
+- acquisition : SET key value NX PX ttl ;
+- heartbeat / libération : script Lua qui compare la valeur avant PEXPIRE / DEL
+  (jamais de prolongation ou de suppression du verrou d'un autre).
+
+La table CopyLock reste le backend de repli (Redis indisponible ou non
+configuré) et reçoit, de façon asynchrone (tâche Celery mirror_copy_lock),
+l'état des verrous Redis pour l'audit. Seuls les changements d'état
+(acquisition, libération) sont recopiés, pas les heartbeats.
+"""
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+class LockConflictError(Exception):
+    pass
+
+
+@dataclass
+class LockState:
+    """Verrou détenu sur une copie, indépendamment du backend."""
+    copy_id: str
+    owner_id: int
+    token: str
+    expires_at: datetime
+
+    @cached_property
+    def owner(self):
+        return get_user_model().objects.get(pk=self.owner_id)
+
+
+class DatabaseLockBackend:
+    """Verrous stockés dans la table CopyLock (comportement historique)."""
+
+    name = 'db'
+    unavailable_errors = ()
+
+    def acquire(self, copy_id, user_id, ttl_seconds):
+        from grading.models import CopyLock
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        with transaction.atomic():
+            lock = CopyLock.objects.select_for_update().filter(copy_id=copy_id).first()
+            if lock is not None and lock.expires_at > now and lock.owner_id != user_id:
+                raise LockConflictError("Copy is locked by another user.")
+
+            if lock is not None and lock.expires_at > now:
+                lock.expires_at = expires_at
+                lock.save(update_fields=['expires_at'])
+                return self._state(lock), False
+
+            if lock is not None:
+                lock.delete()
+            lock = CopyLock.objects.create(copy_id=copy_id, owner_id=user_id, expires_at=expires_at)
+            return self._state(lock), True
+
+    def heartbeat(self, copy_id, user_id, token, ttl_seconds):
+        from grading.models import CopyLock
+
+        now = timezone.now()
+        with transaction.atomic():
+            lock = CopyLock.objects.select_for_update().filter(copy_id=copy_id).first()
+            if lock is None or lock.expires_at <= now:
+                raise LockConflictError("Lock not found or expired.")
+            self._check_owner(lock.owner_id, str(lock.token), user_id, token)
+            lock.expires_at = now + timedelta(seconds=ttl_seconds)
+            lock.save(update_fields=['expires_at'])
+            return self._state(lock)
+
+    def release(self, copy_id, user_id, token):
+        from grading.models import CopyLock
+
+        with transaction.atomic():
+            lock = CopyLock.objects.select_for_update().filter(copy_id=copy_id).first()
+            if lock is None:
+                return False
+            if lock.expires_at > timezone.now():
+                self._check_owner(lock.owner_id, str(lock.token), user_id, token)
+            lock.delete()
+            return True
+
+    def status(self, copy_id):
+        from grading.models import CopyLock
+
+        lock = CopyLock.objects.filter(copy_id=copy_id, expires_at__gt=timezone.now()).first()
+        return self._state(lock) if lock else None
+
+    @staticmethod
+    def _check_owner(owner_id, current_token, user_id, token):
+        if owner_id != user_id:
+            raise LockConflictError("Copy is locked by another user.")
+        if current_token != str(token):
+            raise PermissionError("Invalid lock token.")
+
+    @staticmethod
+    def _state(lock):
+        return LockState(str(lock.copy_id), lock.owner_id, str(lock.token), lock.expires_at)
+
+
+class RedisLockBackend:
+    """
+    Verrous Redis. Valeur : "<token>|<owner_id>", expiration portée par la clé.
+    """
+
+    name = 'redis'
+    KEY_PREFIX = 'copylock:'
+
+    # Prolonge (ou supprime) le verrou seulement s'il porte encore la valeur
+    # attendue : un verrou expiré puis repris par un autre n'est jamais touché.
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client=None):
+        import redis
+
+        if client is None:
+            client = redis.Redis.from_url(settings.COPY_LOCK_REDIS_URL, socket_timeout=1)
+        self.client = client
+        self.unavailable_errors = (redis.RedisError, OSError)
+        self._renew = client.register_script(self.RENEW_SCRIPT)
+        self._release = client.register_script(self.RELEASE_SCRIPT)
+
+    def _key(self, copy_id):
+        return f"{self.KEY_PREFIX}{copy_id}"
+
+    @staticmethod
+    def _value(token, user_id):
+        return f"{token}|{user_id}"
+
+    def _read(self, copy_id):
+        """(token, owner_id, pttl ms) du verrou courant, ou None."""
+        key = self._key(copy_id)
+        with self.client.pipeline() as pipe:
+            raw, pttl = pipe.get(key).pttl(key).execute()
+        if raw is None or pttl is None or pttl <= 0:
+            return None
+        token, _sep, owner_id = raw.decode().partition('|')
+        return token, int(owner_id), pttl
+
+    def _state(self, copy_id, token, owner_id, pttl_ms):
+        expires_at = datetime.now(dt_timezone.utc) + timedelta(milliseconds=pttl_ms)
+        return LockState(str(copy_id), owner_id, token, expires_at)
+
+    def acquire(self, copy_id, user_id, ttl_seconds):
+        ttl_ms = int(ttl_seconds * 1000)
+        token = str(uuid.uuid4())
+        if self.client.set(self._key(copy_id), self._value(token, user_id), nx=True, px=ttl_ms):
+            return self._state(copy_id, token, user_id, ttl_ms), True
+
+        current = self._read(copy_id)
+        if current is None:
+            # Expiré entre SET NX et GET : une seule nouvelle tentative
+            if self.client.set(self._key(copy_id), self._value(token, user_id), nx=True, px=ttl_ms):
+                return self._state(copy_id, token, user_id, ttl_ms), True
+            raise LockConflictError("Copy is locked by another user.")
+
+        current_token, owner_id, _pttl = current
+        if owner_id != user_id:
+            raise LockConflictError("Copy is locked by another user.")
+        # Même correcteur (autre onglet, rechargement) : on prolonge son verrou
+        if self._renew(keys=[self._key(copy_id)], args=[self._value(current_token, user_id), ttl_ms]):
+            return self._state(copy_id, current_token, user_id, ttl_ms), False
+        raise LockConflictError("Lock not found or expired.")
+
+    def heartbeat(self, copy_id, user_id, token, ttl_seconds):
+        ttl_ms = int(ttl_seconds * 1000)
+        if self._renew(keys=[self._key(copy_id)], args=[self._value(token, user_id), ttl_ms]):
+            return self._state(copy_id, str(token), user_id, ttl_ms)
+
+        current = self._read(copy_id)
+        if current is None:
+            raise LockConflictError("Lock not found or expired.")
+        DatabaseLockBackend._check_owner(current[1], current[0], user_id, token)
+        raise LockConflictError("Lock not found or expired.")
+
+    def release(self, copy_id, user_id, token):
+        if self._release(keys=[self._key(copy_id)], args=[self._value(token, user_id)]):
+            return True
+
+        current = self._read(copy_id)
+        if current is None:
+            return False
+        DatabaseLockBackend._check_owner(current[1], current[0], user_id, token)
+        return False
+
+    def status(self, copy_id):
+        current = self._read(copy_id)
+        if current is None:
+            return None
+        token, owner_id, pttl = current
+        return self._state(copy_id, token, owner_id, pttl)
+
+
+class CopyLockManager:
+    """
+    Point d'entrée des verrous de copie (GradingService.*_lock).
+
+    Si le backend principal (Redis) est injoignable, l'opération est rejouée
+    sur la table CopyLock. Les changements d'état faits dans Redis sont
+    recopiés dans CopyLock par la tâche Celery mirror_copy_lock.
+    """
+
+    def __init__(self, backend=None, fallback=None, mirror=None):
+        self.backend = backend or get_default_backend()
+        self.fallback = fallback if fallback is not None else DatabaseLockBackend()
+        self.mirror = self.backend.name != 'db' if mirror is None else mirror
+
+    def _call(self, operation, *args):
+        try:
+            return getattr(self.backend, operation)(*args), self.backend
+        except self.backend.unavailable_errors as e:
+            logger.warning(f"Lock backend {self.backend.name} unavailable ({e}), falling back to database")
+            return getattr(self.fallback, operation)(*args), self.fallback
+
+    def acquire(self, copy_id, user_id, ttl_seconds):
+        (state, created), backend = self._call('acquire', str(copy_id), user_id, ttl_seconds)
+        if created:
+            self._mirror(backend, state.copy_id, state)
+        return state, created
+
+    def heartbeat(self, copy_id, user_id, token, ttl_seconds):
+        state, _backend = self._call('heartbeat', str(copy_id), user_id, str(token), ttl_seconds)
+        return state
+
+    def release(self, copy_id, user_id, token):
+        released, backend = self._call('release', str(copy_id), user_id, str(token))
+        if released:
+            self._mirror(backend, str(copy_id), None, released_token=str(token))
+        return released
+
+    def status(self, copy_id):
+        state, _backend = self._call('status', str(copy_id))
+        return state
+
+    def _mirror(self, backend, copy_id, state, released_token=None):
+        if not self.mirror or backend is self.fallback:
+            return
+        from grading.tasks import mirror_copy_lock
+
+        payload = None
+        if state is not None:
+            payload = {
+                'owner_id': state.owner_id,
+                'token': state.token,
+                'expires_at': state.expires_at.isoformat(),
+            }
+        try:
+            mirror_copy_lock.delay(copy_id, payload, released_token)
+        except Exception as e:
+            # L'audit ne doit jamais faire échouer la prise de verrou
+            logger.warning(f"Lock mirroring not scheduled for copy {copy_id}: {e}")
+
+
+def get_default_backend():
+    if settings.COPY_LOCK_BACKEND == 'redis':
+        return RedisLockBackend()
+    return DatabaseLockBackend()
+
+
+_manager = None
+
+
+def get_lock_manager():
+    """Gestionnaire partagé par process (une seule connexion Redis)."""
+    global _manager
+    if _manager is None:
+        _manager = CopyLockManager()
+    return _manager
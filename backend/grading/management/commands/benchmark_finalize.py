@@ -0,0 +1,73 @@
+"""
+Benchmark of final PDF composition: raster path vs vector-preserving path.
+
+Runs PDFFlattener.flatten_copy in both modes on copies that have a source PDF
+and reports output size and build time. Nothing is written to the database
+or to storage.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Copy
+from processing.services.pdf_flattener import PDFFlattener
+
+
+class Command(BaseCommand):
+    help = 'Compare final PDF size and build time between raster and vector flatten modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', help='Exam UUID: benchmark its copies')
+        parser.add_argument('--copy', action='append', default=[], help='Copy UUID (repeatable)')
+        parser.add_argument('--limit', type=int, default=10, help='Maximum number of copies (default: 10)')
+
+    def handle(self, *args, **options):
+        copies = Copy.objects.exclude(pdf_source='').exclude(pdf_source__isnull=True)
+        if options['copy']:
+            copies = copies.filter(id__in=options['copy'])
+        elif options['exam']:
+            copies = copies.filter(exam_id=options['exam'])
+        else:
+            raise CommandError('Provide --exam or --copy')
+
+        copies = list(copies.prefetch_related('booklets').order_by('anonymous_id')[:options['limit']])
+        if not copies:
+            self.stdout.write(self.style.WARNING('No copy with a source PDF found'))
+            return
+
+        flattener = PDFFlattener()
+        totals = {PDFFlattener.MODE_RASTER: [0, 0.0, 0], PDFFlattener.MODE_VECTOR: [0, 0.0, 0]}
+
+        self.stdout.write(f"{'copy':<20} {'raster KB':>10} {'raster s':>9} {'vector KB':>10} {'vector s':>9}")
+        for copy in copies:
+            row = {}
+            for mode in (PDFFlattener.MODE_RASTER, PDFFlattener.MODE_VECTOR):
+                started = time.perf_counter()
+                try:
+                    size = len(flattener.flatten_copy(copy, mode=mode))
+                except ValueError as e:
+                    row[mode] = None
+                    self.stderr.write(f"{copy.anonymous_id}: {mode} skipped ({e})")
+                    continue
+                elapsed = time.perf_counter() - started
+                row[mode] = (size, elapsed)
+                totals[mode][0] += size
+                totals[mode][1] += elapsed
+                totals[mode][2] += 1
+
+            def fmt(result):
+                return ('-', '-') if result is None else (f"{result[0] / 1024:.1f}", f"{result[1]:.3f}")
+
+            (rs, rt), (vs, vt) = fmt(row[PDFFlattener.MODE_RASTER]), fmt(row[PDFFlattener.MODE_VECTOR])
+            self.stdout.write(f"{copy.anonymous_id:<20} {rs:>10} {rt:>9} {vs:>10} {vt:>9}")
+
+        raster, vector = totals[PDFFlattener.MODE_RASTER], totals[PDFFlattener.MODE_VECTOR]
+        self.stdout.write(
+            f"TOTAL raster: {raster[0] / 1024:.1f} KB in {raster[1]:.3f}s ({raster[2]} copies) | "
+            f"vector: {vector[0] / 1024:.1f} KB in {vector[1]:.3f}s ({vector[2]} copies)"
+        )
+        if raster[0] and vector[0] and raster[2] == vector[2]:
+            self.stdout.write(self.style.SUCCESS(
+                f"Vector output is {raster[0] / vector[0]:.1f}x smaller and "
+                f"{raster[1] / max(vector[1], 1e-9):.1f}x faster to build"
+            ))
@@ -0,0 +1,91 @@
+"""
+Re-optimize existing final PDFs (garbage collection, deflate, duplicate
+object merging, linearization) with processing.services.pdf_optimizer.
+"""
+import os
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from exams.models import Copy
+from processing.services.pdf_optimizer import PDFOptimizer
+import logging
+
+logger = logging.getLogger('grading')
+
+
+class Command(BaseCommand):
+    help = 'Re-optimize existing Copy.final_pdf files (compression, dedup, linearization)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', help='Only copies of this exam (UUID)')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of copies to process')
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite files that are already linearized',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the gains without replacing any file',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        copies = Copy.objects.exclude(final_pdf='').exclude(final_pdf__isnull=True).order_by('anonymous_id')
+        if options['exam']:
+            copies = copies.filter(exam_id=options['exam'])
+        if options['limit']:
+            copies = copies[:options['limit']]
+
+        optimizer = PDFOptimizer()
+        processed = skipped = failed = 0
+        bytes_before = bytes_after = 0
+
+        for copy in copies.iterator():
+            try:
+                with copy.final_pdf.open('rb') as f:
+                    original = f.read()
+            except (FileNotFoundError, OSError) as e:
+                failed += 1
+                self.stderr.write(f"{copy.anonymous_id}: cannot read final PDF ({e})")
+                continue
+
+            if not options['force'] and PDFOptimizer.is_linearized(original):
+                skipped += 1
+                continue
+
+            optimized, stats = optimizer.optimize(original)
+            if 'skipped' in stats:
+                failed += 1
+                self.stderr.write(f"{copy.anonymous_id}: optimization failed ({stats['skipped']})")
+                continue
+
+            processed += 1
+            bytes_before += stats['input_bytes']
+            bytes_after += stats['output_bytes']
+            self.stdout.write(
+                f"{copy.anonymous_id}: {stats['input_bytes']} -> {stats['output_bytes']} bytes "
+                f"in {stats['duration_ms']} ms"
+            )
+
+            if dry_run:
+                continue
+
+            # Write the new file first, then drop the old one: a failure never
+            # leaves the copy without a final PDF.
+            old_name = copy.final_pdf.name
+            copy.final_pdf.save(os.path.basename(old_name), ContentFile(optimized), save=False)
+            copy.save(update_fields=['final_pdf'])
+            if copy.final_pdf.name != old_name:
+                copy.final_pdf.storage.delete(old_name)
+            logger.info(f"Final PDF re-optimized for copy {copy.id}: {stats}")
+
+        saved = bytes_before - bytes_after
+        self.stdout.write(self.style.SUCCESS(
+            f"{processed} optimized, {skipped} already linearized, {failed} failed; "
+            f"{bytes_before} -> {bytes_after} bytes ({saved} saved)"
+        ))
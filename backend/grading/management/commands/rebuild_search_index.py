@@ -0,0 +1,25 @@
+"""
+Management command to rebuild the suggestions full-text index (grading.search_index).
+
+Needed after restoring a legacy backup or after a migration that rebuilt
+grading_searchdocument on SQLite (table remake drops the FTS5 triggers).
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from grading import search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text index used by contextual annotation suggestions'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search_index.install()
+            count = search_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Search index rebuilt ({search_index.backend()}): {count} entries"
+        ))
@@ -63,6 +63,23 @@ grading_lock_conflicts_total = Counter(
     registry=registry
 )
 
+# Histogram: Final PDF size before/after post-processing
+grading_final_pdf_bytes = Histogram(
+    'grading_final_pdf_bytes',
+    'Final PDF size in bytes, before (raw) and after (optimized) post-processing',
+    ['stage'],
+    buckets=[50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6],
+    registry=registry
+)
+
+# Histogram: Final PDF post-processing duration
+grading_pdf_optimize_duration_seconds = Histogram(
+    'grading_pdf_optimize_duration_seconds',
+    'Final PDF post-processing (garbage/deflate/linearize) duration in seconds',
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    registry=registry
+)
+
 # Gauge: Copies by status (workflow backlog monitoring)
 grading_copies_by_status = Gauge(
     'grading_copies_by_status',
@@ -199,3 +216,23 @@ def track_finalize_duration(retry_attempt, status):
             ).observe(duration)
         except Exception as e:
             logger.warning(f"Failed to record finalize success metric: {e}", exc_info=True)
+
+
+def record_pdf_optimization(stats):
+    """
+    Record final PDF post-processing metrics.
+
+    Args:
+        stats (dict): Metrics returned by PDFOptimizer.optimize()
+
+    Note:
+        Never raises: metrics must not break finalization.
+    """
+    if not stats or 'skipped' in stats:
+        return
+    try:
+        grading_final_pdf_bytes.labels(stage='raw').observe(stats['input_bytes'])
+        grading_final_pdf_bytes.labels(stage='optimized').observe(stats['output_bytes'])
+        grading_pdf_optimize_duration_seconds.observe(stats['duration_ms'] / 1000)
+    except Exception as e:
+        logger.warning(f"Failed to record PDF optimization metric: {e}", exc_info=True)
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0012_annotation_bank_and_documents'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gradingevent',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Horodatage'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def install_search_backend(apps, schema_editor):
+    from grading import search_index
+    search_index.install(schema_editor.connection)
+    search_index.rebuild(apps)
+
+
+def uninstall_search_backend(apps, schema_editor):
+    from grading import search_index
+    search_index.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0023_booklet_pages_formats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('grading', '0013_gradingevent_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('chunk', 'Segment de document'), ('template', 'Annotation officielle'), ('personal', 'Annotation personnelle')], max_length=20, verbose_name='Type de source')),
+                ('exercise_number', models.PositiveIntegerField(blank=True, null=True, verbose_name="Numéro d'exercice")),
+                ('question_label', models.CharField(blank=True, max_length=20, verbose_name='Label de question')),
+                ('text', models.TextField(verbose_name='Texte indexé')),
+                ('chunk', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='exams.documentchunk', verbose_name='Segment de document')),
+                ('document_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.examdocumentset', verbose_name='Lot documentaire')),
+                ('exam', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.exam', verbose_name='Examen')),
+                ('template', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='grading.annotationtemplate', verbose_name='Annotation officielle')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Correcteur')),
+                ('user_annotation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='grading.userannotation', verbose_name='Annotation personnelle')),
+            ],
+            options={
+                'verbose_name': "Entrée d'index de recherche",
+                'verbose_name_plural': "Entrées d'index de recherche",
+                'indexes': [models.Index(fields=['exam', 'kind', 'exercise_number'], name='grading_sea_exam_id_d689bb_idx'), models.Index(fields=['user', 'kind'], name='grading_sea_user_id_fdb262_idx')],
+            },
+        ),
+        migrations.RunPython(install_search_backend, uninstall_search_backend),
+    ]
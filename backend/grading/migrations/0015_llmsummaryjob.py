@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0024_copy_llm_summary_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('grading', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMSummaryJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échoué')], default='pending', max_length=20, verbose_name='Statut')),
+                ('force', models.BooleanField(default=False, help_text='Régénère les bilans existants dont les données de correction ont changé', verbose_name='Régénération')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Nombre de copies')),
+                ('details', models.JSONField(blank=True, default=dict, help_text='{copy_id: {anonymous_id, status: ok|skipped|error, length|detail}}', verbose_name='Résultat par copie')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name="Message d'erreur")),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernière progression')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de fin')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Lancé par')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_summary_jobs', to='exams.exam', verbose_name='Examen')),
+            ],
+            options={
+                'verbose_name': 'Génération de bilans LLM',
+                'verbose_name_plural': 'Générations de bilans LLM',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
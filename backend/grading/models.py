@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 from exams.models import Copy
+from core.signals import post_restore, pre_restore
 from django.utils.translation import gettext_lazy as _
 import uuid
+import copy as copy_module
 
 
 class Annotation(models.Model):
@@ -141,8 +146,10 @@ class GradingEvent(models.Model):
         related_name='grading_actions',
         verbose_name=_("Acteur")
     )
+    # Heure de l'événement (et non de l'écriture, différée par core.utils.audit_writer)
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name=_("Horodatage")
     )
     metadata = models.JSONField(
@@ -492,3 +499,261 @@ class UserAnnotation(models.Model):
 
     def __str__(self):
         return f"{self.user.username}: {self.text[:50]} (×{self.usage_count})"
+
+
+class SearchDocument(models.Model):
+    """
+    Entrée de l'index plein texte des suggestions (grading.search_index) :
+    segments des documents, annotations officielles et personnelles.
+    Le vecteur de recherche (PostgreSQL) ou la table FTS5 (SQLite) sont créés
+    par migration et ne figurent pas dans le modèle.
+    """
+    class Kind(models.TextChoices):
+        CHUNK = 'chunk', _("Segment de document")
+        TEMPLATE = 'template', _("Annotation officielle")
+        PERSONAL = 'personal', _("Annotation personnelle")
+
+    kind = models.CharField(
+        max_length=20,
+        choices=Kind.choices,
+        verbose_name=_("Type de source")
+    )
+    # Une seule source renseignée ; la suppression de la source supprime l'entrée
+    chunk = models.OneToOneField(
+        'exams.DocumentChunk',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_document',
+        verbose_name=_("Segment de document")
+    )
+    template = models.OneToOneField(
+        AnnotationTemplate,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_document',
+        verbose_name=_("Annotation officielle")
+    )
+    user_annotation = models.OneToOneField(
+        UserAnnotation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_document',
+        verbose_name=_("Annotation personnelle")
+    )
+    exam = models.ForeignKey(
+        'exams.Exam',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Examen")
+    )
+    document_set = models.ForeignKey(
+        'exams.ExamDocumentSet',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Lot documentaire")
+    )
+    user = models.ForeignKey(
+        'auth.User',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Correcteur")
+    )
+    exercise_number = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("Numéro d'exercice")
+    )
+    question_label = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name=_("Label de question")
+    )
+    text = models.TextField(
+        verbose_name=_("Texte indexé")
+    )
+
+    class Meta:
+        verbose_name = _("Entrée d'index de recherche")
+        verbose_name_plural = _("Entrées d'index de recherche")
+        indexes = [
+            models.Index(fields=['exam', 'kind', 'exercise_number']),
+            models.Index(fields=['user', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.text[:50]}"
+
+
+class LLMSummaryJob(models.Model):
+    """
+    Génération en tâche de fond des bilans LLM des copies d'un examen
+    (grading.tasks.generate_exam_summaries).
+    Le résultat de chaque copie est enregistré au fil de l'eau dans `details` :
+    un job interrompu est repris sans refaire les copies déjà traitées.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _("En attente")
+        RUNNING = 'running', _("En cours")
+        DONE = 'done', _("Terminé")
+        FAILED = 'failed', _("Échoué")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    exam = models.ForeignKey(
+        'exams.Exam',
+        on_delete=models.CASCADE,
+        related_name='llm_summary_jobs',
+        verbose_name=_("Examen")
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name=_("Statut")
+    )
+    force = models.BooleanField(
+        default=False,
+        verbose_name=_("Régénération"),
+        help_text=_("Régénère les bilans existants dont les données de correction ont changé")
+    )
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Nombre de copies")
+    )
+    details = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_("Résultat par copie"),
+        help_text=_("{copy_id: {anonymous_id, status: ok|skipped|error, length|detail}}")
+    )
+    error_message = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name=_("Message d'erreur")
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Lancé par")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Date de création"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Dernière progression"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Date de fin"))
+
+    class Meta:
+        verbose_name = _("Génération de bilans LLM")
+        verbose_name_plural = _("Générations de bilans LLM")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Bilans LLM {self.get_status_display()} - {self.exam_id}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    def is_stale(self):
+        """Job non terminé sans progression depuis plus d'un appel LLM : worker perdu."""
+        age = (timezone.now() - self.updated_at).total_seconds()
+        return not self.is_finished and age > settings.OLLAMA_TIMEOUT + 60
+
+    def counts(self):
+        statuses = [entry.get('status') for entry in self.details.values()]
+        return {
+            'success': statuses.count('ok'),
+            'skipped': statuses.count('skipped'),
+            'errors': statuses.count('error'),
+        }
+
+
+SEARCH_INDEXED_FIELDS = {
+    AnnotationTemplate: {'text', 'tags', 'exercise_number', 'question_number', 'is_active', 'exam', 'document_set'},
+    UserAnnotation: {'text', 'exercise_context', 'question_context', 'is_active'},
+}
+
+
+def _touches_index(sender, update_fields):
+    return update_fields is None or bool(SEARCH_INDEXED_FIELDS[sender] & set(update_fields))
+
+
+def _on_commit_suggestions(method, instance, **kwargs):
+    """
+    Nouvelle version de l'index de suggestions une fois la transaction validée :
+    sinon un autre process rechargerait l'état d'avant, puis garderait cette
+    version. Copie de l'instance : Django efface la clé primaire après un delete.
+    """
+    from grading.suggestions import get_suggestion_cache
+    instance = copy_module.copy(instance)
+    transaction.on_commit(lambda: getattr(get_suggestion_cache(), method)(instance, **kwargs))
+
+
+@receiver(post_save, sender=AnnotationTemplate)
+def index_annotation_template(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_index(sender, update_fields):
+        return
+    from grading import search_index
+    search_index.index_templates([instance])
+    _on_commit_suggestions('template_changed', instance)
+
+
+@receiver(post_save, sender=UserAnnotation)
+def index_user_annotation(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Le compteur d'usage (update_fields=['usage_count', 'last_used']) ne réindexe pas
+    if raw or not _touches_index(sender, update_fields):
+        return
+    from grading import search_index
+    search_index.index_user_annotations([instance])
+    _on_commit_suggestions('annotation_changed', instance)
+
+
+@receiver(post_delete, sender=AnnotationTemplate)
+def unindex_annotation_template(sender, instance, **kwargs):
+    _on_commit_suggestions('template_changed', instance, deleted=True)
+
+
+@receiver(post_delete, sender=UserAnnotation)
+def unindex_user_annotation(sender, instance, **kwargs):
+    _on_commit_suggestions('annotation_changed', instance, deleted=True)
+
+
+# Périmètre des suggestions avant une restauration (core.signals.pre_restore)
+_scopes_before_restore = {'exam': set(), 'user': set()}
+
+
+@receiver(pre_restore)
+def remember_suggestion_scopes(sender, **kwargs):
+    from grading.suggestions import suggestion_scopes
+    _scopes_before_restore.update(suggestion_scopes())
+
+
+@receiver(post_restore)
+def invalidate_suggestions(sender, **kwargs):
+    # Restauration sans signaux par ligne : nouvelle version pour chaque examen /
+    # correcteur présent avant ou après
+    from grading.suggestions import get_suggestion_cache, suggestion_scopes
+    after = suggestion_scopes()
+    get_suggestion_cache().invalidate(
+        exam_ids=_scopes_before_restore['exam'] | after['exam'],
+        user_ids=_scopes_before_restore['user'] | after['user'],
+    )
+    _scopes_before_restore.update(exam=set(), user=set())
+
+
+@receiver(post_save, sender='exams.DocumentChunk')
+def index_document_chunk(sender, instance, raw=False, **kwargs):
+    # bulk_create n'émet pas post_save : exams.tasks indexe ses segments explicitement
+    if raw:
+        return
+    from grading import search_index
+    search_index.index_chunks([instance])
@@ -0,0 +1,319 @@
+"""
+Search Index - Recherche plein texte des suggestions d'annotations
+
+La boîte de suggestions interroge le serveur à chaque frappe. Un seul index
+(table SearchDocument) couvre les trois sources :
+- les segments extraits des documents (DocumentChunk : barème, corrigé, sujet) ;
+- les annotations officielles actives (AnnotationTemplate) ;
+- les annotations personnelles actives (UserAnnotation).
+
+Chaque entrée porte son périmètre (examen, lot documentaire, correcteur,
+exercice, question) : une recherche = une seule requête, classée par
+pertinence, limitée par type de source.
+
+Backends (selon la base) :
+- PostgreSQL : colonne générée tsvector (configuration french_unaccent :
+  unaccent + racinisation française) et index GIN, classement ts_rank_cd ;
+- SQLite (dev / tests) : table virtuelle FTS5 synchronisée par triggers
+  (tokenizer unicode61 sans accents, pas de racinisation), classement bm25 ;
+- autre base ou SQLite sans FTS5 : repli LIKE, sans classement.
+
+L'index est tenu à jour par les signaux post_save (grading.models) et,
+pour les segments écrits par bulk_create, par exams.tasks. La suppression
+d'une source supprime son entrée (OneToOneField en cascade).
+
+Usage:
+    python manage.py rebuild_search_index
+    search(query, exam_id, user, exercise=2, question='3b')
+"""
+import logging
+import re
+import uuid
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'grading_searchdocument_fts'
+TS_CONFIG = 'french_unaccent'
+MAX_TERMS = 8
+BATCH_SIZE = 1000
+KINDS = ('chunk', 'template', 'personal')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SQLITE_INSTALL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='grading_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='3 5'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS grading_searchdocument_fts_ai AFTER INSERT ON grading_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS grading_searchdocument_fts_ad AFTER DELETE ON grading_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS grading_searchdocument_fts_au AFTER UPDATE ON grading_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+_SQLITE_UNINSTALL = (
+    "DROP TRIGGER IF EXISTS grading_searchdocument_fts_ai",
+    "DROP TRIGGER IF EXISTS grading_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS grading_searchdocument_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+_POSTGRES_INSTALL = (
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"""DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{TS_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {TS_CONFIG} (COPY = french);
+            ALTER TEXT SEARCH CONFIGURATION {TS_CONFIG}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END $$""",
+    f"""ALTER TABLE grading_searchdocument ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}'::regconfig, text)) STORED""",
+    """CREATE INDEX IF NOT EXISTS grading_searchdocument_vector_gin
+        ON grading_searchdocument USING GIN (search_vector)""",
+)
+
+_POSTGRES_UNINSTALL = (
+    "DROP INDEX IF EXISTS grading_searchdocument_vector_gin",
+    "ALTER TABLE grading_searchdocument DROP COLUMN IF EXISTS search_vector",
+)
+
+
+def install(conn=connection):
+    """Crée la colonne tsvector + GIN (PostgreSQL) ou la table FTS5 + triggers (SQLite). Idempotent."""
+    if conn.vendor == 'postgresql':
+        statements = _POSTGRES_INSTALL
+    elif conn.vendor == 'sqlite':
+        statements = _SQLITE_INSTALL
+    else:
+        return
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(statements[0])
+        except Exception as e:
+            if conn.vendor != 'sqlite':
+                raise
+            # SQLite compilé sans FTS5 : repli LIKE
+            logger.warning(f"FTS5 unavailable, suggestions search falls back to LIKE: {e}")
+            return
+        for statement in statements[1:]:
+            cursor.execute(statement)
+
+
+def uninstall(conn=connection):
+    statements = {'postgresql': _POSTGRES_UNINSTALL, 'sqlite': _SQLITE_UNINSTALL}.get(conn.vendor, ())
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def backend():
+    """'postgres', 'fts5' ou 'like'."""
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'fts5'
+    return 'like'
+
+
+# --- Indexation -----------------------------------------------------------
+
+def _replace(SearchDocument, source_field, source_ids, entries):
+    """Remplace les entrées des sources `source_ids` par `entries` (2 requêtes)."""
+    with transaction.atomic():
+        SearchDocument.objects.filter(**{f'{source_field}__in': source_ids}).delete()
+        SearchDocument.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def index_chunks(chunks, apps=global_apps):
+    """Indexe des DocumentChunk (exam / lot déduits de leur extraction)."""
+    SearchDocument = apps.get_model('grading', 'SearchDocument')
+    DocumentTextExtraction = apps.get_model('exams', 'DocumentTextExtraction')
+    chunks = list(chunks)
+    if not chunks:
+        return
+    scopes = {
+        row['id']: row
+        for row in DocumentTextExtraction.objects.filter(
+            id__in={chunk.extraction_id for chunk in chunks}
+        ).values('id', 'document__document_set_id', 'document__document_set__exam_id')
+    }
+    entries = []
+    for chunk in chunks:
+        scope = scopes[chunk.extraction_id]
+        entries.append(SearchDocument(
+            kind='chunk',
+            chunk_id=chunk.pk,
+            exam_id=scope['document__document_set__exam_id'],
+            document_set_id=scope['document__document_set_id'],
+            exercise_number=chunk.exercise_number,
+            question_label=chunk.question_label or '',
+            text=chunk.chunk_text,
+        ))
+    _replace(SearchDocument, 'chunk', [chunk.pk for chunk in chunks], entries)
+
+
+def index_templates(templates, apps=global_apps):
+    """Indexe des AnnotationTemplate ; les templates inactifs sont retirés de l'index."""
+    SearchDocument = apps.get_model('grading', 'SearchDocument')
+    templates = list(templates)
+    entries = [
+        SearchDocument(
+            kind='template',
+            template_id=template.pk,
+            exam_id=template.exam_id,
+            document_set_id=template.document_set_id,
+            exercise_number=template.exercise_number,
+            question_label=template.question_number,
+            text=' '.join([template.text, *map(str, template.tags or [])]),
+        )
+        for template in templates if template.is_active
+    ]
+    _replace(SearchDocument, 'template', [template.pk for template in templates], entries)
+
+
+def index_user_annotations(annotations, apps=global_apps):
+    """Indexe des UserAnnotation ; les annotations inactives sont retirées de l'index."""
+    SearchDocument = apps.get_model('grading', 'SearchDocument')
+    annotations = list(annotations)
+    entries = [
+        SearchDocument(
+            kind='personal',
+            user_annotation_id=annotation.pk,
+            user_id=annotation.user_id,
+            exercise_number=annotation.exercise_context,
+            question_label=annotation.question_context or '',
+            text=annotation.text,
+        )
+        for annotation in annotations if annotation.is_active
+    ]
+    _replace(SearchDocument, 'user_annotation', [annotation.pk for annotation in annotations], entries)
+
+
+def _in_batches(queryset, indexer, apps):
+    batch = []
+    for item in queryset.iterator(chunk_size=BATCH_SIZE):
+        batch.append(item)
+        if len(batch) >= BATCH_SIZE:
+            indexer(batch, apps=apps)
+            batch = []
+    if batch:
+        indexer(batch, apps=apps)
+
+
+def rebuild(apps=global_apps):
+    """Reconstruit tout l'index ; retourne le nombre d'entrées."""
+    SearchDocument = apps.get_model('grading', 'SearchDocument')
+    SearchDocument.objects.all().delete()
+    _in_batches(apps.get_model('exams', 'DocumentChunk').objects.all(), index_chunks, apps)
+    _in_batches(apps.get_model('grading', 'AnnotationTemplate').objects.filter(is_active=True),
+                index_templates, apps)
+    _in_batches(apps.get_model('grading', 'UserAnnotation').objects.filter(is_active=True),
+                index_user_annotations, apps)
+    return SearchDocument.objects.count()
+
+
+# --- Recherche --------------------------------------------------------------
+
+def terms(query):
+    return _TOKEN_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def _scope_sql(exam_id, user_id, exercise, question, kinds):
+    """Périmètre : mêmes règles que les filtres exercice / question sans recherche."""
+    exact = ''
+    loose = ''
+    if exercise is not None:
+        exact += ' AND s.exercise_number = %s'
+        loose += ' AND (s.exercise_number = %s OR s.exercise_number IS NULL)'
+    if question:
+        exact += ' AND s.question_label = %s'
+        loose += " AND (s.question_label = %s OR s.question_label = '')"
+    context = [value for value in (exercise, question) if value is not None and value != '']
+
+    branches = {
+        'template': (f"(s.kind = 'template' AND s.exam_id = %s{exact})", [exam_id, *context]),
+        'personal': (f"(s.kind = 'personal' AND s.user_id = %s{loose})", [user_id, *context]),
+        'chunk': (
+            f"(s.kind = 'chunk' AND s.exam_id = %s AND s.document_set_id IN"
+            f" (SELECT id FROM exams_examdocumentset WHERE exam_id = %s AND is_active = %s){loose})",
+            [exam_id, exam_id, True, *context],
+        ),
+    }
+    selected = [branches[kind] for kind in KINDS if kind in kinds]
+    return (
+        '(' + ' OR '.join(sql for sql, _params in selected) + ')',
+        [param for _sql, params in selected for param in params],
+    )
+
+
+def search(query, exam_id, user, exercise=None, question=None, limit=30, kinds=KINDS):
+    """
+    Recherche dans les trois sources en une requête.
+
+    Args:
+        exercise (int|None), question (str|None): périmètre, comme les filtres de suggestions
+        limit: nombre maximum de résultats par type de source
+        kinds: types de source interrogés (sous-ensemble de KINDS)
+
+    Returns:
+        dict: {'chunk': [ids], 'template': [ids], 'personal': [ids]}, du plus pertinent au moins pertinent
+    """
+    results = {kind: [] for kind in KINDS}
+    words = terms(query)
+    if not words:
+        return results
+
+    exam_field = global_apps.get_model('exams', 'Exam')._meta.pk
+    scope, scope_params = _scope_sql(
+        exam_field.get_db_prep_value(exam_id, connection), user.pk, exercise, question, kinds
+    )
+    engine = backend()
+    if engine == 'postgres':
+        match_from = f", to_tsquery('{TS_CONFIG}', %s) AS q(query)"
+        match_where = 's.search_vector @@ q.query'
+        score = 'ts_rank_cd(s.search_vector, q.query)'
+        match_params = [' & '.join(f'{word}:*' for word in words)]
+    elif engine == 'fts5':
+        match_from = f' JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = s.id'
+        match_where = f'{FTS_TABLE} MATCH %s'
+        score = f'-bm25({FTS_TABLE})'
+        match_params = [' '.join(f'"{word}"*' for word in words)]
+    else:
+        match_from = ''
+        match_where = ' AND '.join(['LOWER(s.text) LIKE %s'] * len(words))
+        score = '0'
+        match_params = [f'%{word}%' for word in words]
+
+    sql = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT s.kind, s.chunk_id, s.template_id, s.user_annotation_id,
+                   (CASE WHEN s.exercise_number IS NULL THEN 0 ELSE 1 END
+                    + CASE WHEN s.question_label = '' THEN 0 ELSE 1 END) AS specificity,
+                   {score} AS score
+            FROM grading_searchdocument s{match_from}
+            WHERE {match_where} AND {scope}
+        )
+        SELECT kind, chunk_id, template_id, user_annotation_id FROM (
+            SELECT hits.*, ROW_NUMBER() OVER (
+                PARTITION BY kind ORDER BY specificity DESC, score DESC
+            ) AS position
+            FROM hits
+        ) ranked
+        WHERE position <= %s
+        ORDER BY kind, position
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*match_params, *scope_params, limit])
+        for kind, chunk_id, template_id, user_annotation_id in cursor.fetchall():
+            results[kind].append(uuid.UUID(str(chunk_id or template_id or user_annotation_id)))
+    return results
@@ -2,7 +2,10 @@
 Serializers pour l'app grading.
 """
 from rest_framework import serializers
-from grading.models import Annotation, GradingEvent, QuestionRemark, AnnotationTemplate, UserAnnotation
+from grading.models import (
+    Annotation, GradingEvent, QuestionRemark, AnnotationTemplate, UserAnnotation, LLMSummaryJob,
+)
+from exams.models import DocumentChunk
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -110,3 +113,53 @@ class UserAnnotationSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'usage_count', 'last_used', 'created_at', 'updated_at']
+
+
+class DocumentChunkSuggestionSerializer(serializers.ModelSerializer):
+    """
+    Segment de barème / corrigé / sujet proposé dans les suggestions contextuelles.
+    """
+    class Meta:
+        model = DocumentChunk
+        fields = [
+            'id', 'doc_type',
+            'exercise_number', 'question_label',
+            'page_start', 'page_end',
+            'chunk_text', 'tags',
+        ]
+        read_only_fields = fields
+
+
+class LLMSummaryJobSerializer(serializers.ModelSerializer):
+    """
+    Avancement d'une génération de bilans LLM (détail par copie, compteurs).
+    """
+    processed = serializers.SerializerMethodField()
+    success = serializers.SerializerMethodField()
+    skipped = serializers.SerializerMethodField()
+    errors = serializers.SerializerMethodField()
+    details = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LLMSummaryJob
+        fields = [
+            'id', 'exam', 'status', 'force',
+            'total', 'processed', 'success', 'skipped', 'errors', 'details',
+            'error_message', 'created_at', 'updated_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_processed(self, obj):
+        return len(obj.details)
+
+    def get_success(self, obj):
+        return obj.counts()['success']
+
+    def get_skipped(self, obj):
+        return obj.counts()['skipped']
+
+    def get_errors(self, obj):
+        return obj.counts()['errors']
+
+    def get_details(self, obj):
+        return list(obj.details.values())
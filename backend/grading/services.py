@@ -12,6 +12,9 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from grading.models import Annotation, GradingEvent
 from exams.models import Copy, Booklet, Exam
+from processing.services.page_encoding import page_formats_for, save_page_pixmap
+from grading.locks import LockConflictError, get_lock_manager
+from core.utils.audit_writer import submit_audit
 import logging
 import datetime
 
@@ -20,14 +23,21 @@ from grading.metrics import (
     track_finalize_duration,
     grading_ocr_errors_total,
     grading_lock_conflicts_total,
+    record_pdf_optimization,
 )
 
 logger = logging.getLogger(__name__)
 
 
-class LockConflictError(Exception):
-    """Kept for backward compatibility with async tasks."""
-    pass
+class AnnotationBatchError(ValueError):
+    """
+    Lot d'annotations rejeté. `errors` : [{'index', 'code', 'detail'}], un par
+    opération fautive (code : invalid, not_found, forbidden, conflict).
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid operation(s) in batch")
 
 
 class AnnotationService:
@@ -93,12 +103,12 @@ class AnnotationService:
         )
 
         # AUDIT
-        GradingEvent.objects.create(
+        submit_audit(GradingEvent(
             copy=copy,
             action=GradingEvent.Action.CREATE_ANN,
             actor=user,
             metadata={'annotation_id': str(annotation.id), 'page': payload['page_index']}
-        )
+        ))
         return annotation
 
     @staticmethod
@@ -141,12 +151,12 @@ class AnnotationService:
         annotation.refresh_from_db()  # Refresh to get actual version value
 
         # AUDIT
-        GradingEvent.objects.create(
+        submit_audit(GradingEvent(
             copy=annotation.copy,
             action=GradingEvent.Action.UPDATE_ANN,
             actor=user,
             metadata={'annotation_id': str(annotation.id), 'changes': changes}
-        )
+        ))
         return annotation
 
     @staticmethod
@@ -160,12 +170,216 @@ class AnnotationService:
         annotation.delete()
 
         # AUDIT
-        GradingEvent.objects.create(
+        submit_audit(GradingEvent(
             copy=copy,
             action=GradingEvent.Action.DELETE_ANN,
             actor=user,
             metadata={'annotation_id': ann_id}
+        ))
+
+    BATCH_MAX_OPERATIONS = 500
+    BATCH_UPDATE_FIELDS = ('x', 'y', 'w', 'h', 'content', 'score_delta', 'type')
+
+    @staticmethod
+    def _coordinate_errors(coords):
+        """
+        Version vectorisée de validate_coordinates : un message (ou None) par ligne
+        du tableau (n, 4) [x, y, w, h]. NaN est rejeté par les comparaisons.
+        """
+        import numpy as np
+
+        x, y, w, h = np.asarray(coords, dtype=float).reshape(-1, 4).T
+        bad_xy = ~((x >= 0.0) & (x <= 1.0) & (y >= 0.0) & (y <= 1.0))
+        bad_wh = ~((w > 0.0) & (w <= 1.0) & (h > 0.0) & (h <= 1.0))
+        bad_xw = x + w > 1.0 + 1e-9
+        bad_yh = y + h > 1.0 + 1e-9
+        messages = np.select(
+            [bad_xy, bad_wh, bad_xw, bad_yh],
+            ["x and y must be in [0, 1]", "w and h must be in (0, 1]",
+             "x + w must not exceed 1", "y + h must not exceed 1"],
+            default="",
         )
+        return [str(m) or None for m in messages]
+
+    @staticmethod
+    @transaction.atomic
+    def apply_batch(copy: Copy, operations, user):
+        """
+        Applique un lot de créations / modifications / suppressions d'annotations
+        sur une copie, en une transaction : tout passe ou rien n'est écrit.
+
+        operations : [{'op': 'create', 'page_index', 'x', 'y', 'w', 'h', ...},
+                      {'op': 'update', 'id', 'version'?, <champs>},
+                      {'op': 'delete', 'id', 'version'?}]
+
+        Le nombre de pages est calculé une fois, les coordonnées sont validées en
+        une passe NumPy, les annotations visées sont lues (et verrouillées) en une
+        requête ; les écritures passent par bulk_create / bulk_update / un seul
+        DELETE, et les GradingEvent par un bulk_create.
+        Le contrôle de version (P0-DI-008) s'applique à chaque opération qui fournit
+        'version'.
+
+        Returns:
+            list[tuple[str, Annotation | str]] : (op, annotation) ou ('delete', id),
+            dans l'ordre du lot.
+
+        Raises:
+            ValueError: copie non READY ou lot mal formé.
+            AnnotationBatchError: opérations invalides (toutes listées).
+        """
+        import numpy as np
+
+        if copy.status not in (Copy.Status.READY,):
+            raise ValueError(f"Impossible d'annoter une copie en statut {copy.status}")
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("operations must be a non-empty list")
+        if len(operations) > AnnotationService.BATCH_MAX_OPERATIONS:
+            raise ValueError(f"A batch accepts at most {AnnotationService.BATCH_MAX_OPERATIONS} operations")
+
+        errors = {}
+
+        def fail(index, code, detail):
+            errors.setdefault(index, {'index': index, 'code': code, 'detail': detail})
+
+        # 1. Lecture du lot
+        target_ids = {}
+        for i, item in enumerate(operations):
+            op = item.get('op') if isinstance(item, dict) else None
+            if op not in ('create', 'update', 'delete'):
+                fail(i, 'invalid', "op must be one of create, update, delete")
+            elif op == 'create':
+                missing = [k for k in ('page_index', 'x', 'y', 'w', 'h') if item.get(k) is None]
+                if missing:
+                    fail(i, 'invalid', f"missing field(s): {', '.join(missing)}")
+            else:
+                try:
+                    ann_id = str(uuid.UUID(str(item.get('id'))))
+                except ValueError:
+                    fail(i, 'invalid', "id must be an annotation UUID")
+                    continue
+                if ann_id in target_ids:
+                    fail(i, 'invalid', f"annotation {ann_id} appears more than once in the batch")
+                else:
+                    target_ids[ann_id] = i
+
+        # 2. Annotations visées : une requête, verrouillées jusqu'au commit
+        annotations = {
+            str(pk): ann for pk, ann in
+            Annotation.objects.select_for_update().filter(copy=copy, id__in=list(target_ids)).in_bulk().items()
+        }
+        is_admin = user.is_superuser or getattr(user, 'role', '') == 'Admin'
+        for ann_id, i in target_ids.items():
+            annotation = annotations.get(ann_id)
+            expected_version = operations[i].get('version')
+            if annotation is None:
+                fail(i, 'not_found', f"annotation {ann_id} not found on this copy")
+            elif not is_admin and annotation.created_by_id != user.id:
+                fail(i, 'forbidden', "Vous ne pouvez pas modifier cette annotation.")
+            elif expected_version is not None and str(expected_version) != str(annotation.version):
+                fail(i, 'conflict',
+                     f"Version mismatch - concurrent edit detected. "
+                     f"Expected version {expected_version}, current version {annotation.version}. "
+                     f"Please refresh and try again.")
+
+        # 3. Coordonnées et pages, en une passe
+        rows, coords, pages = [], [], []
+        for i, item in enumerate(operations):
+            if i in errors or item['op'] == 'delete':
+                continue
+            if item['op'] == 'update':
+                current = annotations[str(uuid.UUID(str(item['id'])))]
+                if not any(k in item for k in ('x', 'y', 'w', 'h')):
+                    continue
+                values = [item.get(k, getattr(current, k)) for k in ('x', 'y', 'w', 'h')]
+            else:
+                values = [item[k] for k in ('x', 'y', 'w', 'h')]
+                try:
+                    pages.append((i, int(item['page_index'])))
+                except (TypeError, ValueError):
+                    fail(i, 'invalid', "page_index must be an integer")
+                    continue
+            try:
+                coords.append([float(v) for v in values])
+            except (TypeError, ValueError):
+                fail(i, 'invalid', "x, y, w and h must be numbers")
+                continue
+            rows.append(i)
+
+        if rows:
+            for i, message in zip(rows, AnnotationService._coordinate_errors(coords)):
+                if message:
+                    fail(i, 'invalid', message)
+        if pages:
+            total_pages = AnnotationService._count_total_pages(copy)
+            indexes = np.array([p for _, p in pages])
+            out_of_range = (indexes < 0) | (indexes >= total_pages)
+            for (i, _page), bad in zip(pages, out_of_range):
+                if bad:
+                    fail(i, 'invalid', "copy has no pages" if total_pages <= 0
+                         else f"page_index must be in [0, {total_pages - 1}]")
+
+        if errors:
+            raise AnnotationBatchError([errors[i] for i in sorted(errors)])
+
+        # 4. Écritures groupées
+        now = timezone.now()
+        results, to_create, to_update, to_delete, events = [], [], [], [], []
+        updated_fields = {'version', 'updated_at'}
+        for item in operations:
+            op = item['op']
+            if op == 'create':
+                annotation = Annotation(
+                    copy=copy,
+                    page_index=int(item['page_index']),
+                    x=item['x'], y=item['y'], w=item['w'], h=item['h'],
+                    content=item.get('content', ''),
+                    type=item.get('type', Annotation.Type.COMMENT),
+                    score_delta=item.get('score_delta'),
+                    created_by=user,
+                )
+                to_create.append(annotation)
+                events.append(GradingEvent(
+                    copy=copy, action=GradingEvent.Action.CREATE_ANN, actor=user,
+                    metadata={'annotation_id': str(annotation.id), 'page': annotation.page_index},
+                ))
+                results.append((op, annotation))
+                continue
+
+            annotation = annotations[str(uuid.UUID(str(item['id'])))]
+            if op == 'delete':
+                to_delete.append(annotation.id)
+                events.append(GradingEvent(
+                    copy=copy, action=GradingEvent.Action.DELETE_ANN, actor=user,
+                    metadata={'annotation_id': str(annotation.id)},
+                ))
+                results.append((op, str(annotation.id)))
+                continue
+
+            changes = {}
+            for field in AnnotationService.BATCH_UPDATE_FIELDS:
+                if field in item and getattr(annotation, field) != item[field]:
+                    changes[field] = str(item[field])
+                    setattr(annotation, field, item[field])
+                    updated_fields.add(field)
+            # Ligne verrouillée (select_for_update) : l'incrément en Python est sûr
+            annotation.version += 1
+            annotation.updated_at = now
+            to_update.append(annotation)
+            events.append(GradingEvent(
+                copy=copy, action=GradingEvent.Action.UPDATE_ANN, actor=user,
+                metadata={'annotation_id': str(annotation.id), 'changes': changes},
+            ))
+            results.append((op, annotation))
+
+        if to_create:
+            Annotation.objects.bulk_create(to_create)
+        if to_update:
+            Annotation.objects.bulk_update(to_update, sorted(updated_fields))
+        if to_delete:
+            Annotation.objects.filter(id__in=to_delete).delete()
+        # AUDIT
+        submit_audit(*events)
+        return results
 
     @staticmethod
     def list_annotations(copy: Copy):
@@ -178,6 +392,46 @@ class GradingService:
     IMPORT -> STAGING -> READY -> GRADED -> EXPORT
     """
 
+    @staticmethod
+    def _lock_ttl(ttl_seconds):
+        return min(int(ttl_seconds), settings.COPY_LOCK_MAX_TTL_SECONDS)
+
+    @staticmethod
+    def acquire_lock(copy, user, ttl_seconds=1800):
+        """
+        Take (or extend, for the same user) the edit lock of a copy.
+        Backend: settings.COPY_LOCK_BACKEND (Redis, with CopyLock as fallback), see grading.locks.
+
+        Returns:
+            tuple[LockState, bool]: (lock, created)
+
+        Raises:
+            LockConflictError: locked by another user.
+        """
+        return get_lock_manager().acquire(copy.id, user.id, GradingService._lock_ttl(ttl_seconds))
+
+    @staticmethod
+    def heartbeat_lock(copy, user, lock_token, ttl_seconds=1800):
+        """
+        Extend a held lock. `copy` may be a Copy or its id (no DB read needed).
+
+        Raises:
+            LockConflictError: lock missing, expired or held by another user.
+            PermissionError: token mismatch.
+        """
+        copy_id = getattr(copy, 'id', copy)
+        return get_lock_manager().heartbeat(copy_id, user.id, lock_token, GradingService._lock_ttl(ttl_seconds))
+
+    @staticmethod
+    def release_lock(copy, user, lock_token) -> bool:
+        copy_id = getattr(copy, 'id', copy)
+        return get_lock_manager().release(copy_id, user.id, lock_token)
+
+    @staticmethod
+    def get_lock_status(copy):
+        """Active lock (LockState) or None."""
+        return get_lock_manager().status(getattr(copy, 'id', copy))
+
     @staticmethod
     def compute_score(copy: Copy) -> float:
         from grading.models import Score
@@ -229,7 +483,8 @@ class GradingService:
                     # 1-indexed to match BookletHeaderView (start_page - 1)
                     start_page=1,
                     end_page=len(pages_images),
-                    pages_images=pages_images
+                    pages_images=pages_images,
+                    pages_formats=page_formats_for(pages_images)
                 )
                 # Link via ManyToMany
                 copy.booklets.add(booklet)
@@ -264,7 +519,19 @@ class GradingService:
     def _rasterize_pdf(copy) -> list:
         """
         Internal: Uses PyMuPDF to convert copy.pdf_source into images in media/copies/pages/<id>
+
+        Each page is stored in its most compact lossless form (RGB, 8-bit gray
+        or 1-bit), see processing.services.page_encoding.
+
+        With settings.LAZY_PAGE_RENDERING, only the page count is read and
+        (source PDF, page index) references are returned; pages are rendered
+        on first access by processing.services.page_cache.
         """
+        if settings.LAZY_PAGE_RENDERING:
+            from processing.services.page_cache import lazy_page_refs
+            with fitz.open(copy.pdf_source.path) as doc:
+                return lazy_page_refs(copy.pdf_source.name, range(doc.page_count))
+
         copy.pdf_source.open()
         try:
             pdf_bytes = copy.pdf_source.read()
@@ -282,10 +549,8 @@ class GradingService:
                  # Matrix 1.5 ~ 108 DPI, 2.0 ~ 144 DPI. 
                  # Use 2.0 for Prod Quality
                  pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
-                 filename = f"p{i:03d}.png"
-                 filepath = os.path.join(path_abs, filename)
-                 pix.save(filepath)
-                 images.append(f"{path_rel}/{filename}")
+                 saved = save_page_pixmap(pix, os.path.join(path_abs, f"p{i:03d}"))
+                 images.append(f"{path_rel}/{os.path.basename(saved.path)}")
              
         return images
 
@@ -355,18 +620,33 @@ class GradingService:
         copy.grading_retries = retry_attempt
         copy.save(update_fields=["status", "grading_retries"])
 
+        # Write-behind drafts: persist and drop the hot copies before grading
+        try:
+            from grading.drafts import get_draft_store
+            get_draft_store().flush_copy(copy.id, evict=True)
+        except Exception as e:
+            logger.warning(f"Draft flush before finalize failed for copy {copy.id}: {e}")
+
         # Generate Final PDF with comprehensive error handling
         from processing.services.pdf_flattener import PDFFlattener
+        from processing.services.pdf_optimizer import PDFOptimizer
         flattener = PDFFlattener()
         
         # Track finalization duration
         with track_finalize_duration(retry_attempt=retry_attempt, status='success'):
             try:
                 # Check if PDF already exists (additional idempotency check)
+                pdf_optimization = None
                 if not copy.final_pdf:
                     pdf_bytes = flattener.flatten_copy(copy)
                     if pdf_bytes is None:
                         pdf_bytes = b""
+
+                    # Post-processing: garbage collection, deflate, dedup, linearization
+                    if PDFOptimizer.is_enabled():
+                        pdf_bytes, pdf_optimization = PDFOptimizer().optimize(pdf_bytes)
+                        record_pdf_optimization(pdf_optimization)
+
                     output_filename = f"copy_{copy.id}_corrected.pdf"
                     
                     # Save PDF first
@@ -379,11 +659,14 @@ class GradingService:
                 copy.save(update_fields=["status", "graded_at", "grading_error_message", "final_pdf"])
                 
                 # P0-DI-007 FIX: Audit event for success (idempotent with get_or_create)
+                finalize_metadata = {'final_score': final_score, 'retries': retry_attempt}
+                if pdf_optimization:
+                    finalize_metadata['pdf_optimization'] = pdf_optimization
                 GradingEvent.objects.get_or_create(
                     copy=copy,
                     action=GradingEvent.Action.FINALIZE,
                     actor=user,
-                    defaults={'metadata': {'final_score': final_score, 'retries': retry_attempt}}
+                    defaults={'metadata': finalize_metadata}
                 )
                 
             except OperationalError:
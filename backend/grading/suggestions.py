@@ -0,0 +1,381 @@
+"""
+Suggestion Cache - Index mémoire des suggestions d'annotations par examen et par correcteur
+
+Un correcteur réutilise la même dizaine de remarques des centaines de fois
+par examen. Plutôt que d'interroger la base à chaque frappe :
+- les annotations officielles actives d'un examen (AnnotationTemplate) et
+  les annotations personnelles actives d'un correcteur (UserAnnotation) sont
+  chargées une fois dans un index mémoire du process ;
+- chaque index est un tableau trié de clés normalisées (minuscules, sans
+  accents), une par début de mot : la complétion par préfixe est une
+  recherche dichotomique (bisect) ;
+- les annotations personnelles sont classées par usage_count puis last_used.
+
+Cohérence entre process : chaque index porte un numéro de version stocké
+dans le cache Django partagé (Redis en production). Toute modification
+(signaux post_save / post_delete, flush des compteurs) incrémente la
+version ; un process dont l'index n'est plus à jour le recharge. Le process
+qui fait la modification met son index à jour en place (auto-save, usage).
+
+Compteurs d'usage : chaque utilisation met à jour l'index immédiatement et
+est ajoutée à un tampon ; le tampon est écrit en base par lots (une seule
+requête UPDATE) par un thread de fond toutes les
+SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS secondes, dès
+SUGGESTION_USAGE_FLUSH_BATCH_SIZE annotations, et à l'arrêt du process.
+"""
+import atexit
+import bisect
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from grading.models import AnnotationTemplate, UserAnnotation
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'suggestions:v:{kind}:{key}'
+
+
+def fold(text):
+    """Minuscules, sans accents, espaces normalisés."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+class PrefixIndex:
+    """Entrées (pk -> objet) et tableau trié (clé, pk), une clé par début de mot du texte."""
+
+    def __init__(self, version, items=()):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.entries = {}
+        self.folded = {}
+        self.keys = []
+        for item in items:
+            self.entries[item.pk] = item
+            self.folded[item.pk] = fold(item.text)
+            self.keys.extend(self._keys(item))
+        self.keys.sort()
+
+    @staticmethod
+    def _keys(item):
+        words = fold(item.text).split(' ')
+        return [(' '.join(words[i:]), item.pk) for i in range(len(words)) if words[i]]
+
+    def upsert(self, item):
+        self.remove(item.pk)
+        self.entries[item.pk] = item
+        self.folded[item.pk] = fold(item.text)
+        for key in self._keys(item):
+            bisect.insort(self.keys, key)
+
+    def remove(self, pk):
+        item = self.entries.pop(pk, None)
+        self.folded.pop(pk, None)
+        if item is not None:
+            stale = set(self._keys(item))
+            self.keys = [key for key in self.keys if key not in stale]
+
+    def match(self, query):
+        """{pk: le texte commence par `query` ?} des entrées dont un mot commence par `query`."""
+        prefix = fold(query)
+        if not prefix:
+            return {pk: False for pk in self.entries}
+        matches = {}
+        for key, pk in self.keys[bisect.bisect_left(self.keys, (prefix,)):]:
+            if not key.startswith(prefix):
+                break
+            matches[pk] = matches.get(pk, False) or key == self.folded[pk]
+        return matches
+
+
+class UsageBuffer:
+    """Incréments de usage_count en attente : {pk: [incrément, last_used, user_id]}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def record(self, annotation, when):
+        """Ajoute une utilisation ; True si le tampon est plein (à écrire tout de suite)."""
+        with self.lock:
+            entry = self.pending.setdefault(annotation.pk, [0, when, annotation.user_id])
+            entry[0] += 1
+            entry[1] = when
+            return len(self.pending) >= settings.SUGGESTION_USAGE_FLUSH_BATCH_SIZE
+
+    def flush(self):
+        """Écrit les compteurs en attente (une requête UPDATE) ; retourne les user_id concernés."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return set()
+        try:
+            UserAnnotation.objects.filter(pk__in=list(pending)).update(
+                usage_count=F('usage_count') + Case(
+                    *[When(pk=pk, then=count) for pk, (count, _when, _user) in pending.items()]
+                ),
+                last_used=Case(*[When(pk=pk, then=when) for pk, (_count, when, _user) in pending.items()]),
+                updated_at=timezone.now(),
+            )
+        except Exception:
+            # Remis en attente : retenté au prochain flush
+            with self.lock:
+                for pk, (count, when, user_id) in pending.items():
+                    entry = self.pending.setdefault(pk, [0, when, user_id])
+                    entry[0] += count
+            logger.exception("Suggestion usage flush failed")
+            return set()
+        logger.debug(f"Suggestion usage flush: {len(pending)} annotations")
+        return {user_id for _count, _when, user_id in pending.values()}
+
+
+class SuggestionCache:
+    """Index par examen (templates) et par correcteur (annotations personnelles), LRU par process."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.indexes = OrderedDict()
+        self.usage = UsageBuffer()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # --- Versions partagées ---------------------------------------------------
+
+    def _version_key(self, kind, key):
+        return VERSION_KEY.format(kind=kind, key=key)
+
+    def _versions(self, *scopes):
+        keys = [self._version_key(kind, key) for kind, key in scopes]
+        values = cache.get_many(keys)
+        return [values.get(key, 0) for key in keys]
+
+    def _bump(self, kind, key, apply=None):
+        """Nouvelle version ; l'index local, s'il était à jour, est modifié en place par `apply`."""
+        version_key = self._version_key(kind, key)
+        try:
+            version = cache.incr(version_key)
+        except ValueError:
+            cache.add(version_key, 0, timeout=None)
+            version = cache.incr(version_key)
+        with self.lock:
+            index = self.indexes.get((kind, key))
+            if index is None:
+                return
+            if index.version == version - 1 and apply is not None:
+                apply(index)
+                index.version = version
+            else:
+                del self.indexes[(kind, key)]
+
+    # --- Chargement -----------------------------------------------------------
+
+    def _load(self, kind, key, version):
+        if kind == 'exam':
+            items = AnnotationTemplate.objects.filter(exam_id=key, is_active=True)
+        else:
+            items = UserAnnotation.objects.filter(user_id=key, is_active=True)
+        return PrefixIndex(version, list(items))
+
+    def _index(self, kind, key, version):
+        scope = (kind, key)
+        with self.lock:
+            index = self.indexes.get(scope)
+            fresh = (
+                index is not None and index.version == version
+                and time.monotonic() - index.loaded_at < settings.SUGGESTION_CACHE_TTL_SECONDS
+            )
+            if fresh:
+                self.indexes.move_to_end(scope)
+                return index
+        index = self._load(kind, key, version)
+        with self.lock:
+            self.indexes[scope] = index
+            self.indexes.move_to_end(scope)
+            while len(self.indexes) > settings.SUGGESTION_CACHE_MAX_INDEXES:
+                self.indexes.popitem(last=False)
+        return index
+
+    def exam_index(self, exam_id):
+        return self._index('exam', str(exam_id), *self._versions(('exam', str(exam_id))))
+
+    def user_index(self, user_id):
+        return self._index('user', user_id, *self._versions(('user', user_id)))
+
+    # --- Requêtes -------------------------------------------------------------
+
+    def suggest(self, exam_id, user_id, query='', exercise=None, question=None,
+                official_limit=30, personal_limit=20):
+        """
+        Annotations officielles et personnelles pour la boîte de suggestions.
+
+        Returns:
+            tuple: (liste d'AnnotationTemplate, liste d'UserAnnotation), classées
+        """
+        exam_version, user_version = self._versions(('exam', str(exam_id)), ('user', user_id))
+        templates = self._index('exam', str(exam_id), exam_version)
+        personal = self._index('user', user_id, user_version)
+
+        official = []
+        for pk, at_start in templates.match(query).items():
+            template = templates.entries[pk]
+            if exercise is not None and template.exercise_number != exercise:
+                continue
+            if question and template.question_number != question:
+                continue
+            official.append((not at_start, template.exercise_number, template.question_number,
+                             template.criterion_type, template))
+        official.sort(key=lambda row: row[:4])
+
+        mine = []
+        for pk, at_start in personal.match(query).items():
+            annotation = personal.entries[pk]
+            if exercise is not None and annotation.exercise_context not in (exercise, None):
+                continue
+            if question and annotation.question_context not in (question, ''):
+                continue
+            last_used = annotation.last_used.timestamp() if annotation.last_used else 0
+            mine.append((-annotation.usage_count, -last_used, not at_start, annotation))
+        mine.sort(key=lambda row: row[:3])
+
+        return [row[-1] for row in official[:official_limit]], [row[-1] for row in mine[:personal_limit]]
+
+    def find_personal(self, user_id, text):
+        """Annotation personnelle active au texte exact, ou None (sans requête si l'index est chargé)."""
+        index = self.user_index(user_id)
+        folded = fold(text)
+        for key, pk in index.keys[bisect.bisect_left(index.keys, (folded,)):]:
+            if key != folded:
+                break
+            if index.entries[pk].text == text:
+                return index.entries[pk]
+        return None
+
+    def get_personal(self, user_id, pk):
+        return self.user_index(user_id).entries.get(pk)
+
+    # --- Mises à jour ---------------------------------------------------------
+
+    def record_use(self, annotation):
+        """Utilisation d'une annotation personnelle : index à jour immédiatement, base par lots."""
+        now = timezone.now()
+        with self.lock:
+            index = self.indexes.get(('user', annotation.user_id))
+            cached = index.entries.get(annotation.pk) if index else None
+            for target in {id(annotation): annotation, id(cached): cached}.values():
+                if target is not None:
+                    target.usage_count += 1
+                    target.last_used = now
+        if self.usage.record(annotation, now):
+            self.flush_usage()
+        self._ensure_flusher()
+
+    def flush_usage(self):
+        for user_id in self.usage.flush():
+            # Les compteurs de cet index sont déjà à jour ; les autres process rechargent
+            self._bump('user', user_id, apply=lambda index: None)
+
+    def _ensure_flusher(self):
+        """Thread d'écriture périodique des compteurs, redémarré après un fork (workers Gunicorn)."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self.lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run_flusher, name='suggestion-usage-flush', daemon=True)
+            self._thread.start()
+
+    def _run_flusher(self):
+        while not self._stop.wait(settings.SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS):
+            if not self.usage.pending:
+                continue
+            try:
+                self.flush_usage()
+            except Exception:
+                logger.exception("Suggestion usage flush loop error")
+            finally:
+                close_old_connections()
+
+    def close(self):
+        """Arrêt du process : arrête le thread et écrit les compteurs en attente."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush_usage()
+
+    def template_changed(self, template, deleted=False):
+        def apply(index):
+            if deleted or not template.is_active:
+                index.remove(template.pk)
+            else:
+                index.upsert(template)
+        self._bump('exam', str(template.exam_id), apply)
+
+    def annotation_changed(self, annotation, deleted=False):
+        def apply(index):
+            previous = index.entries.get(annotation.pk)
+            if deleted or not annotation.is_active:
+                index.remove(annotation.pk)
+                return
+            if previous is not None and previous.usage_count > annotation.usage_count:
+                # Utilisations encore dans le tampon
+                annotation.usage_count = previous.usage_count
+                annotation.last_used = previous.last_used
+            index.upsert(annotation)
+
+        if not isinstance(annotation.usage_count, int):
+            # Sauvegarde avec F('usage_count') : valeur inconnue, l'index sera rechargé
+            apply = None
+        self._bump('user', annotation.user_id, apply)
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+        with self.usage.lock:
+            self.usage.pending.clear()
+
+    def invalidate(self, exam_ids=(), user_ids=()):
+        """
+        Après un remplacement des données hors signaux (restauration) : index et
+        compteurs en attente du process abandonnés, une nouvelle version par
+        examen / correcteur pour que les autres process rechargent.
+        """
+        self.clear()
+        for exam_id in exam_ids:
+            self._bump('exam', str(exam_id))
+        for user_id in user_ids:
+            self._bump('user', user_id)
+
+
+def suggestion_scopes():
+    """Examens et correcteurs ayant des suggestions d'annotations : {'exam': ids, 'user': ids}."""
+    from grading.models import AnnotationTemplate, UserAnnotation
+
+    return {
+        'exam': set(AnnotationTemplate.objects.values_list('exam_id', flat=True).distinct()),
+        'user': set(UserAnnotation.objects.values_list('user_id', flat=True).distinct()),
+    }
+
+
+_cache = None
+
+
+def get_suggestion_cache():
+    """Index partagé par process."""
+    global _cache
+    if _cache is None:
+        _cache = SuggestionCache()
+        atexit.register(_cache.close)
+    return _cache
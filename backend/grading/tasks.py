@@ -3,6 +3,7 @@ P0-OP-03: Async Celery tasks for heavy PDF operations
 Prevents worker starvation and request timeouts
 """
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.contrib.auth import get_user_model
 from django.db import transaction
 import os
@@ -170,9 +171,8 @@ def cleanup_orphaned_files():
     Should be run periodically (e.g., daily via Celery Beat)
     """
     from django.conf import settings
-    from exams.models import Copy
     import os
-    from datetime import datetime, timedelta
+    from datetime import datetime
     
     logger.info("Starting orphaned file cleanup")
     
@@ -194,9 +194,20 @@ def cleanup_orphaned_files():
         
         logger.info(f"Cleaned up {removed_count} orphaned temp files")
     
-    # TODO: Clean up orphaned page images (pages with no corresponding Copy)
-    
-    return {'removed_count': removed_count}
+    # Orphaned media of every class (page images, PDFs, documents...)
+    from core.orphan_scanner import scan_orphans
+    report = scan_orphans(
+        delete=True,
+        older_than_days=settings.ORPHAN_CLEANUP_MIN_AGE_DAYS,
+        delete_rate=settings.ORPHAN_DELETE_RATE,
+    )
+
+    return {
+        'removed_count': removed_count,
+        'orphans_deleted': report['deleted'],
+        'orphan_bytes_deleted': report['deleted_bytes'],
+        'missing_references': report['missing'],
+    }
 
 
 @shared_task
@@ -233,3 +244,141 @@ def update_copy_status_metrics():
     except Exception as exc:
         logger.error(f"Failed to update copy status metrics: {exc}", exc_info=True)
         return {'detail': str(exc)}
+
+
+@shared_task(ignore_result=True)
+def prefetch_page_images(refs):
+    """
+    Préchauffe le cache de pages (mode LAZY_PAGE_RENDERING) pour les pages
+    que le correcteur va ouvrir ensuite.
+
+    Args:
+        refs: Références paresseuses "pdf:<source>#<index>"
+
+    Returns:
+        int: Nombre de pages effectivement rendues
+    """
+    from processing.services.page_cache import PageCache
+
+    cache = PageCache()
+    rendered = 0
+    for ref in refs:
+        if cache.get(ref) is not None:
+            continue
+        try:
+            cache.render(ref)
+            rendered += 1
+        except (ValueError, FileNotFoundError) as e:
+            logger.warning(f"Page prefetch skipped for {ref}: {e}")
+    return rendered
+
+
+@shared_task(ignore_result=True)
+def mirror_copy_lock(copy_id, state=None, released_token=None):
+    """
+    Recopie dans CopyLock (audit) l'état d'un verrou tenu par le backend Redis
+    de grading.locks.
+
+    Args:
+        copy_id: UUID de la copie
+        state: {'owner_id', 'token', 'expires_at' (ISO 8601)} ou None si le
+            verrou a été libéré
+        released_token: Jeton du verrou libéré (une ligne recopiée depuis
+            par une nouvelle acquisition n'est pas supprimée)
+    """
+    from django.utils.dateparse import parse_datetime
+    from grading.models import CopyLock
+
+    if state is None:
+        locks = CopyLock.objects.filter(copy_id=copy_id)
+        if released_token:
+            locks = locks.filter(token=released_token)
+        locks.delete()
+        return
+
+    if not Copy.objects.filter(id=copy_id).exists():
+        logger.warning(f"Lock mirror skipped: copy {copy_id} not found")
+        return
+
+    CopyLock.objects.update_or_create(
+        copy_id=copy_id,
+        defaults={
+            'owner_id': state['owner_id'],
+            'token': state['token'],
+            'expires_at': parse_datetime(state['expires_at']),
+        },
+    )
+
+
+@shared_task(ignore_result=True)
+def flush_draft_store():
+    """
+    Recopie par lots dans DraftState les brouillons modifiés dans le store
+    Redis (grading.drafts). Sans effet avec le backend 'db'.
+
+    Returns:
+        int: Nombre de brouillons recopiés
+    """
+    from grading.drafts import get_draft_store
+
+    return get_draft_store().flush()
+
+
+@shared_task(bind=True, acks_late=True)
+def generate_exam_summaries(self, job_id):
+    """
+    Génère les bilans LLM d'un examen pour un LLMSummaryJob (file 'llm').
+
+    Le détail de chaque copie est enregistré dès qu'il est connu ; relancé
+    sur un job interrompu, la tâche ne refait pas les copies déjà réussies.
+    À la limite de temps souple de la file, les appels en attente sont annulés
+    et la tâche se relance pour les copies restantes, après le délai d'un
+    appel Ollama (les appels en cours s'enregistrent entre-temps).
+
+    Returns:
+        dict: statut du job et compteurs success/skipped/errors
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from grading.models import LLMSummaryJob
+    from processing.services.llm_summary import LLMSummaryService
+
+    try:
+        job = LLMSummaryJob.objects.get(id=job_id)
+    except LLMSummaryJob.DoesNotExist:
+        logger.error(f"LLM summary job {job_id} not found")
+        return {'status': 'error', 'detail': 'Job introuvable'}
+
+    if job.status == LLMSummaryJob.Status.DONE:
+        return {'status': job.status, **job.counts()}
+
+    done = [copy_id for copy_id, entry in job.details.items() if entry.get('status') == 'ok']
+    job.status = LLMSummaryJob.Status.RUNNING
+    job.total = Copy.objects.filter(exam_id=job.exam_id, status=Copy.Status.GRADED).count()
+    job.save(update_fields=['status', 'total', 'updated_at'])
+
+    def progress(entry):
+        job.details[entry['copy_id']] = entry
+        job.save(update_fields=['details', 'updated_at'])
+
+    try:
+        LLMSummaryService.generate_batch(str(job.exam_id), force=job.force, exclude=done, on_progress=progress)
+    except SoftTimeLimitExceeded:
+        logger.warning(f"LLM summary job {job_id} hit the soft time limit, re-dispatching the remaining copies")
+        job.status = LLMSummaryJob.Status.PENDING
+        job.save(update_fields=['status', 'updated_at'])
+        generate_exam_summaries.apply_async(args=[job_id], countdown=settings.OLLAMA_TIMEOUT)
+        return {'status': job.status}
+    except Exception as exc:
+        logger.error(f"LLM summary job {job_id} failed: {exc}", exc_info=True)
+        job.status = LLMSummaryJob.Status.FAILED
+        job.error_message = str(exc)[:500]
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+        return {'status': job.status, 'detail': job.error_message}
+
+    job.status = LLMSummaryJob.Status.DONE
+    job.error_message = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+    return {'status': job.status, **job.counts()}
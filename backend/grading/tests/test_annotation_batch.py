@@ -0,0 +1,113 @@
+"""Batch annotation endpoint: one transaction, bulk writes, per-item version checks."""
+from datetime import date
+
+import pytest
+
+from exams.models import Booklet, Copy, Exam
+from grading.models import Annotation, GradingEvent
+from grading.services import AnnotationBatchError, AnnotationService
+
+
+@pytest.fixture
+def copy(db):
+    exam = Exam.objects.create(name="Batch Exam", date=date.today())
+    copy = Copy.objects.create(exam=exam, anonymous_id="BATCH-01", status=Copy.Status.READY)
+    booklet = Booklet.objects.create(exam=exam, start_page=1, end_page=3,
+                                     pages_images=['p1.png', 'p2.png', 'p3.png'])
+    copy.booklets.add(booklet)
+    return copy
+
+
+def _annotation(copy, user, **kwargs):
+    fields = dict(copy=copy, page_index=0, x=0.1, y=0.1, w=0.2, h=0.2, created_by=user)
+    fields.update(kwargs)
+    return Annotation.objects.create(**fields)
+
+
+def _url(copy):
+    return f'/api/grading/copies/{copy.id}/annotations/batch/'
+
+
+@pytest.mark.django_db
+def test_batch_applies_all_operations(copy, teacher_user, django_assert_max_num_queries):
+    to_update = _annotation(copy, teacher_user, content='old')
+    to_delete = _annotation(copy, teacher_user, page_index=1)
+    creates = [
+        {'op': 'create', 'page_index': i % 3, 'x': 0.1, 'y': 0.05 * i, 'w': 0.1, 'h': 0.05, 'content': f'c{i}'}
+        for i in range(10)
+    ]
+
+    # Constant number of queries whatever the batch size
+    with django_assert_max_num_queries(12):
+        results = AnnotationService.apply_batch(copy, creates + [
+            {'op': 'update', 'id': str(to_update.id), 'version': 0, 'content': 'new', 'x': 0.5},
+            {'op': 'delete', 'id': str(to_delete.id), 'version': 0},
+        ], teacher_user)
+
+    assert [op for op, _ in results] == ['create'] * 10 + ['update', 'delete']
+    assert copy.annotations.count() == 11
+    to_update.refresh_from_db()
+    assert (to_update.content, to_update.x, to_update.version) == ('new', 0.5, 1)
+    assert not Annotation.objects.filter(id=to_delete.id).exists()
+
+    actions = list(GradingEvent.objects.filter(copy=copy).values_list('action', flat=True))
+    assert actions.count(GradingEvent.Action.CREATE_ANN) == 10
+    update_event = GradingEvent.objects.get(copy=copy, action=GradingEvent.Action.UPDATE_ANN)
+    assert update_event.metadata['changes'] == {'x': '0.5', 'content': 'new'}
+
+
+@pytest.mark.django_db
+def test_batch_is_all_or_nothing(copy, teacher_user):
+    existing = _annotation(copy, teacher_user)
+
+    with pytest.raises(AnnotationBatchError) as excinfo:
+        AnnotationService.apply_batch(copy, [
+            {'op': 'create', 'page_index': 0, 'x': 0.1, 'y': 0.1, 'w': 0.1, 'h': 0.1},
+            {'op': 'create', 'page_index': 3, 'x': 0.1, 'y': 0.1, 'w': 0.1, 'h': 0.1},
+            {'op': 'create', 'page_index': 0, 'x': 0.95, 'y': 0.1, 'w': 0.1, 'h': 0.1},
+            {'op': 'update', 'id': str(existing.id), 'version': 7, 'content': 'x'},
+            {'op': 'delete', 'id': '00000000-0000-0000-0000-000000000000'},
+        ], teacher_user)
+
+    errors = {err['index']: err for err in excinfo.value.errors}
+    assert sorted(errors) == [1, 2, 3, 4]
+    assert errors[1]['detail'] == "page_index must be in [0, 2]"
+    assert errors[2]['detail'] == "x + w must not exceed 1"
+    assert errors[3]['code'] == 'conflict'
+    assert errors[4]['code'] == 'not_found'
+    assert copy.annotations.count() == 1
+    assert not GradingEvent.objects.filter(copy=copy).exists()
+
+
+@pytest.mark.django_db
+def test_batch_api_status_codes(api_client, copy, teacher_user, admin_user):
+    other = _annotation(copy, admin_user)
+    own = _annotation(copy, teacher_user)
+    api_client.force_authenticate(teacher_user)
+
+    response = api_client.post(_url(copy), {'operations': [
+        {'op': 'delete', 'id': str(other.id)},
+    ]}, format='json')
+    assert response.status_code == 403
+
+    response = api_client.post(_url(copy), {'operations': [
+        {'op': 'update', 'id': str(own.id), 'version': 3, 'content': 'late'},
+    ]}, format='json')
+    assert response.status_code == 409
+    assert response.data['errors'][0]['index'] == 0
+
+    response = api_client.post(_url(copy), {'operations': [
+        {'op': 'update', 'id': str(own.id), 'version': 0, 'content': 'ok'},
+        {'op': 'create', 'page_index': 2, 'x': 0.2, 'y': 0.2, 'w': 0.3, 'h': 0.1},
+    ]}, format='json')
+    assert response.status_code == 200
+    assert response.data['results'][0]['version'] == 1
+    assert response.data['results'][1]['page_index'] == 2
+
+    assert api_client.post(_url(copy), {'operations': []}, format='json').status_code == 400
+
+    Copy.objects.filter(id=copy.id).update(status=Copy.Status.GRADED)
+    response = api_client.post(_url(copy), {'operations': [
+        {'op': 'delete', 'id': str(own.id)},
+    ]}, format='json')
+    assert response.status_code == 400
@@ -52,6 +52,21 @@ class TaskStatusViewTests(TestCase):
         self.assertEqual(response.data['status'], 'SUCCESS')
         self.assertEqual(response.data['result']['copy_id'], '123')
 
+    @patch('grading.views_async.AsyncResult')
+    def test_task_status_progress(self, mock_async_result):
+        """GET task status returns PROGRESS with the reported counters"""
+        mock_result = Mock()
+        mock_result.state = 'PROGRESS'
+        mock_result.info = {'total': 40, 'processed': 10, 'detected': 9, 'failed': 1}
+        mock_async_result.return_value = mock_result
+        
+        response = self.client.get('/api/grading/tasks/fake-task-id/')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'PROGRESS')
+        self.assertEqual(response.data['progress'], 25)
+        self.assertEqual(response.data['result']['detected'], 9)
+
     @patch('grading.views_async.AsyncResult')
     def test_task_status_failure(self, mock_async_result):
         """GET task status returns FAILURE with error"""
@@ -0,0 +1,134 @@
+"""Copy lock manager: Redis backend (fakeredis), DB fallback and CopyLock mirroring."""
+import time
+from datetime import date
+
+import fakeredis
+import pytest
+
+from exams.models import Copy, Exam
+from grading import locks
+from grading.locks import (
+    CopyLockManager, DatabaseLockBackend, LockConflictError, RedisLockBackend,
+)
+from grading.models import CopyLock
+from grading.services import GradingService
+
+
+@pytest.fixture
+def copy(db):
+    exam = Exam.objects.create(name="Lock Exam", date=date.today())
+    return Copy.objects.create(exam=exam, anonymous_id="LOCK-01", status=Copy.Status.READY)
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def manager(redis_server):
+    return CopyLockManager(backend=RedisLockBackend(fakeredis.FakeRedis(server=redis_server)))
+
+
+@pytest.mark.django_db
+def test_contention_and_reacquire_by_owner(manager, copy, teacher_user, admin_user):
+    lock, created = manager.acquire(copy.id, teacher_user.id, 60)
+    assert created
+
+    with pytest.raises(LockConflictError):
+        manager.acquire(copy.id, admin_user.id, 60)
+
+    # Second tab of the same corrector: same lock, extended
+    again, created = manager.acquire(copy.id, teacher_user.id, 120)
+    assert not created
+    assert again.token == lock.token
+    assert again.expires_at > lock.expires_at
+
+
+@pytest.mark.django_db
+def test_heartbeat_checks_owner_and_token(manager, redis_server, copy, teacher_user, admin_user):
+    lock, _ = manager.acquire(copy.id, teacher_user.id, 1)
+
+    with pytest.raises(PermissionError):
+        manager.heartbeat(copy.id, teacher_user.id, 'not-the-token', 60)
+    with pytest.raises(LockConflictError):
+        manager.heartbeat(copy.id, admin_user.id, lock.token, 60)
+
+    manager.heartbeat(copy.id, teacher_user.id, lock.token, 60)
+    client = fakeredis.FakeRedis(server=redis_server)
+    assert client.pttl(f"{RedisLockBackend.KEY_PREFIX}{copy.id}") > 1000
+
+
+@pytest.mark.django_db
+def test_expired_lock_cannot_be_renewed_and_is_free(manager, copy, teacher_user, admin_user):
+    lock, _ = manager.acquire(copy.id, teacher_user.id, 0.05)
+    time.sleep(0.1)
+
+    assert manager.status(copy.id) is None
+    with pytest.raises(LockConflictError, match="expired"):
+        manager.heartbeat(copy.id, teacher_user.id, lock.token, 60)
+
+    other, created = manager.acquire(copy.id, admin_user.id, 60)
+    assert created
+    # The late release of the previous owner must not drop the new lock
+    with pytest.raises(LockConflictError):
+        manager.release(copy.id, teacher_user.id, lock.token)
+    assert manager.status(copy.id).owner_id == admin_user.id
+
+
+@pytest.mark.django_db
+def test_release_requires_token(manager, copy, teacher_user):
+    lock, _ = manager.acquire(copy.id, teacher_user.id, 60)
+
+    with pytest.raises(PermissionError):
+        manager.release(copy.id, teacher_user.id, 'not-the-token')
+    assert manager.release(copy.id, teacher_user.id, lock.token)
+    assert manager.status(copy.id) is None
+    assert not manager.release(copy.id, teacher_user.id, lock.token)
+
+
+@pytest.mark.django_db
+def test_state_changes_are_mirrored_to_copylock(manager, copy, teacher_user):
+    lock, _ = manager.acquire(copy.id, teacher_user.id, 60)
+
+    mirrored = CopyLock.objects.get(copy=copy)
+    assert str(mirrored.token) == lock.token
+    assert mirrored.owner == teacher_user
+
+    # Heartbeats stay in Redis
+    manager.heartbeat(copy.id, teacher_user.id, lock.token, 600)
+    assert CopyLock.objects.get(copy=copy).expires_at == mirrored.expires_at
+
+    manager.release(copy.id, teacher_user.id, lock.token)
+    assert not CopyLock.objects.filter(copy=copy).exists()
+
+
+@pytest.mark.django_db
+def test_falls_back_to_database_when_redis_is_down(redis_server, copy, teacher_user, admin_user):
+    redis_server.connected = False
+    manager = CopyLockManager(backend=RedisLockBackend(fakeredis.FakeRedis(server=redis_server)))
+
+    lock, created = manager.acquire(copy.id, teacher_user.id, 60)
+    assert created
+    assert str(CopyLock.objects.get(copy=copy).token) == lock.token
+    with pytest.raises(LockConflictError):
+        manager.acquire(copy.id, admin_user.id, 60)
+    assert manager.release(copy.id, teacher_user.id, lock.token)
+
+
+@pytest.mark.django_db
+def test_grading_service_uses_database_backend(settings, monkeypatch, copy, teacher_user):
+    settings.COPY_LOCK_BACKEND = 'db'
+    settings.COPY_LOCK_MAX_TTL_SECONDS = 300
+    monkeypatch.setattr(locks, '_manager', None)
+
+    lock, created = GradingService.acquire_lock(copy=copy, user=teacher_user, ttl_seconds=3600)
+    assert created
+    assert isinstance(locks.get_lock_manager().backend, DatabaseLockBackend)
+    assert (lock.expires_at - CopyLock.objects.get(copy=copy).locked_at).total_seconds() <= 301
+
+    status = GradingService.get_lock_status(copy=copy)
+    assert status.owner == teacher_user
+    assert GradingService.heartbeat_lock(copy=copy.id, user=teacher_user, lock_token=lock.token).token == lock.token
+    assert GradingService.release_lock(copy=copy, user=teacher_user, lock_token=lock.token)
+    assert GradingService.get_lock_status(copy=copy) is None
@@ -0,0 +1,259 @@
+"""Write-behind draft store (grading.drafts): JSON patches, Redis hot path, batched flush."""
+import uuid
+from datetime import date
+
+import fakeredis
+import pytest
+
+from exams.models import Copy, Exam
+from grading import drafts
+from grading.drafts import (
+    DatabaseDraftStore, DraftConflictError, JsonPatchError, RedisDraftStore, apply_patch,
+)
+from grading.models import DraftState
+
+
+@pytest.fixture
+def copy(db):
+    exam = Exam.objects.create(name="Draft Exam", date=date.today())
+    return Copy.objects.create(exam=exam, anonymous_id="DRAFT-01", status=Copy.Status.READY)
+
+
+@pytest.fixture
+def store():
+    return RedisDraftStore(fakeredis.FakeRedis())
+
+
+def test_apply_patch_operations():
+    doc = {"content": "a", "rects": [[0, 0], [1, 1]], "meta": {"tags": []}}
+    patched = apply_patch(doc, [
+        {"op": "replace", "path": "/content", "value": "b"},
+        {"op": "add", "path": "/rects/-", "value": [2, 2]},
+        {"op": "remove", "path": "/rects/0"},
+        {"op": "copy", "from": "/content", "path": "/meta/title"},
+        {"op": "move", "from": "/meta/title", "path": "/title"},
+        {"op": "add", "path": "/meta/tags/0", "value": "x"},
+        {"op": "test", "path": "/title", "value": "b"},
+    ])
+    assert patched == {"content": "b", "rects": [[1, 1], [2, 2]], "meta": {"tags": ["x"]}, "title": "b"}
+    # The input document is never modified
+    assert doc["content"] == "a"
+
+
+def test_apply_patch_is_atomic_on_failure():
+    doc = {"content": "a"}
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [
+            {"op": "replace", "path": "/content", "value": "b"},
+            {"op": "remove", "path": "/missing"},
+        ])
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [{"op": "replace", "path": "content", "value": 1}])
+    assert doc == {"content": "a"}
+
+
+@pytest.mark.django_db
+def test_hot_saves_skip_the_database(store, copy, teacher_user, django_assert_num_queries):
+    client_id = str(uuid.uuid4())
+    first = store.save(copy.id, teacher_user, client_id, payload={"content": "a", "rects": []})
+    assert first["version"] == 1
+    assert DraftState.objects.get(copy=copy).payload == {"content": "a", "rects": []}
+
+    # The first save seeded the hot draft: later saves never touch the database
+    with django_assert_num_queries(0):
+        store.save(copy.id, teacher_user, client_id,
+                   patch=[{"op": "add", "path": "/rects/-", "value": 1}], base_version=1)
+        saved = store.save(
+            copy.id, teacher_user, client_id,
+            patch=[{"op": "replace", "path": "/content", "value": "ab"}], base_version=2,
+        )
+    assert saved["version"] == 3
+
+    draft = store.get(copy.id, teacher_user)
+    assert draft["payload"] == {"content": "ab", "rects": [1]}
+    assert draft["version"] == 3
+    # Not flushed yet
+    assert DraftState.objects.get(copy=copy).version == 1
+
+
+@pytest.mark.django_db
+def test_patch_save_is_one_redis_round_trip(store, copy, teacher_user, monkeypatch):
+    client_id = str(uuid.uuid4())
+    store.save(copy.id, teacher_user, client_id, payload={"content": "a", "rects": []})
+    # Script already loaded on the server
+    store.save(copy.id, teacher_user, client_id, patch=[{"op": "add", "path": "/rects/-", "value": 0}], base_version=1)
+
+    connection_class = store.client.connection_pool.connection_class
+    sent = []
+    original = connection_class.send_packed_command
+
+    def counting(self, command, *args, **kwargs):
+        sent.append(command)
+        return original(self, command, *args, **kwargs)
+
+    monkeypatch.setattr(connection_class, 'send_packed_command', counting)
+    for version in range(2, 7):
+        store.save(copy.id, teacher_user, client_id,
+                   patch=[{"op": "add", "path": "/rects/-", "value": version}], base_version=version)
+    assert len(sent) == 5
+
+    # Another process (empty document cache) reads the state once, then appends
+    other = RedisDraftStore(store.client)
+    sent.clear()
+    other.save(copy.id, teacher_user, client_id, patch=[{"op": "add", "path": "/rects/-", "value": 7}], base_version=7)
+    assert len(sent) == 2
+    assert store.get(copy.id, teacher_user)["payload"] == {"content": "a", "rects": [0, 2, 3, 4, 5, 6, 7]}
+
+
+@pytest.mark.django_db
+def test_redis_unavailable_falls_back_to_database(copy, teacher_user):
+    server = fakeredis.FakeServer()
+    store = RedisDraftStore(fakeredis.FakeRedis(server=server))
+    client_id = str(uuid.uuid4())
+    store.save(copy.id, teacher_user, client_id, payload={"content": "a"})
+    store.save(copy.id, teacher_user, client_id, patch=[{"op": "replace", "path": "/content", "value": "ab"}],
+               base_version=1)
+
+    server.connected = False
+    saved = store.save(copy.id, teacher_user, client_id, payload={"content": "db"})
+    assert saved["version"] == 2
+    assert store.get(copy.id, teacher_user)["payload"] == {"content": "db"}
+
+    # Back online: the stale hot copy is dropped, never flushed over the database
+    server.connected = True
+    assert store.get(copy.id, teacher_user)["payload"] == {"content": "db"}
+    assert store.flush() == 0
+    assert DraftState.objects.get(copy=copy).payload == {"content": "db"}
+
+
+@pytest.mark.django_db
+def test_flush_skips_hot_state_older_than_database(store, copy, teacher_user):
+    client_id = str(uuid.uuid4())
+    store.save(copy.id, teacher_user, client_id, payload={"content": "a"})
+    store.save(copy.id, teacher_user, client_id, patch=[{"op": "replace", "path": "/content", "value": "ab"}],
+               base_version=1)
+    # Written by another process while it could not reach Redis
+    DatabaseDraftStore().save(copy.id, teacher_user, client_id, payload={"content": "db"})
+
+    assert store.flush() == 0
+    assert DraftState.objects.get(copy=copy).payload == {"content": "db"}
+    assert store.get(copy.id, teacher_user)["payload"] == {"content": "db"}
+
+
+@pytest.mark.django_db
+def test_conflicts(store, copy, teacher_user):
+    client_id = str(uuid.uuid4())
+    store.save(copy.id, teacher_user, client_id, payload={"content": "a"})
+
+    with pytest.raises(DraftConflictError):
+        store.save(copy.id, teacher_user, str(uuid.uuid4()), payload={"content": "other tab"})
+
+    with pytest.raises(DraftConflictError) as excinfo:
+        store.save(copy.id, teacher_user, client_id,
+                   patch=[{"op": "replace", "path": "/content", "value": "b"}], base_version=5)
+    assert excinfo.value.version == 1
+
+
+@pytest.mark.django_db
+def test_cold_draft_from_database_keeps_client_semantics(store, copy, teacher_user):
+    owner_client = uuid.uuid4()
+    DraftState.objects.create(copy=copy, owner=teacher_user, payload={"content": "db"},
+                              client_id=owner_client, version=4)
+
+    with pytest.raises(DraftConflictError):
+        store.save(copy.id, teacher_user, str(uuid.uuid4()), payload={"content": "x"})
+
+    saved = store.save(copy.id, teacher_user, str(owner_client),
+                       patch=[{"op": "replace", "path": "/content", "value": "hot"}], base_version=4)
+    assert saved["version"] == 5
+    assert store.get(copy.id, teacher_user)["payload"] == {"content": "hot"}
+
+
+@pytest.mark.django_db
+def test_flush_writes_batches_and_compacts(store, copy, teacher_user, admin_user):
+    teacher_client, admin_client = str(uuid.uuid4()), str(uuid.uuid4())
+    store.save(copy.id, teacher_user, teacher_client, payload={"n": 0})
+    store.save(copy.id, admin_user, admin_client, payload={"n": 0})
+    for version in range(1, 4):
+        store.save(copy.id, teacher_user, teacher_client,
+                   patch=[{"op": "replace", "path": "/n", "value": version}], base_version=version)
+    store.save(copy.id, admin_user, admin_client, payload={"n": 42})
+
+    assert store.flush(batch_size=1) == 2
+    teacher_draft = DraftState.objects.get(copy=copy, owner=teacher_user)
+    assert (teacher_draft.payload, teacher_draft.version) == ({"n": 3}, 4)
+    assert DraftState.objects.get(copy=copy, owner=admin_user).payload == {"n": 42}
+    assert store.client.scard(RedisDraftStore.DIRTY_KEY) == 0
+    assert store.client.llen(f"draft:{copy.id}:{teacher_user.id}:ops") == 0
+
+    # Nothing left to write; new edits continue from the flushed version
+    assert store.flush() == 0
+    store.save(copy.id, teacher_user, teacher_client,
+               patch=[{"op": "replace", "path": "/n", "value": 4}], base_version=4)
+    assert store.flush() == 1
+    assert DraftState.objects.get(copy=copy, owner=teacher_user).version == 5
+
+
+@pytest.mark.django_db
+def test_flush_copy_evicts_before_finalize(store, copy, teacher_user):
+    client_id = str(uuid.uuid4())
+    store.save(copy.id, teacher_user, client_id, payload={"content": "a"})
+    store.save(copy.id, teacher_user, client_id,
+               patch=[{"op": "replace", "path": "/content", "value": "final"}], base_version=1)
+
+    assert store.flush_copy(copy.id, evict=True) == 1
+    assert DraftState.objects.get(copy=copy).payload == {"content": "final"}
+    assert not store.client.exists(f"draft:{copy.id}:{teacher_user.id}")
+
+    # Graded copies no longer accept drafts, even from a previously hot session
+    Copy.objects.filter(id=copy.id).update(status=Copy.Status.GRADED)
+    with pytest.raises(ValueError):
+        store.save(copy.id, teacher_user, client_id, payload={"content": "late"})
+
+
+@pytest.mark.django_db
+def test_put_patch_through_api(api_client, teacher_user, copy):
+    api_client.force_authenticate(teacher_user)
+    url = f'/api/grading/copies/{copy.id}/draft/'
+    client_id = str(uuid.uuid4())
+
+    response = api_client.put(url, {'payload': {'content': 'a'}, 'client_id': client_id}, format='json')
+    assert response.data['version'] == 1
+
+    patch = [{'op': 'replace', 'path': '/content', 'value': 'ab'}]
+    response = api_client.put(url, {'patch': patch, 'version': 1, 'client_id': client_id}, format='json')
+    assert response.status_code == 200
+    assert response.data['version'] == 2
+
+    response = api_client.put(url, {'patch': patch, 'version': 1, 'client_id': client_id}, format='json')
+    assert response.status_code == 409
+    assert response.data['version'] == 2
+
+    response = api_client.put(url, {'patch': [{'op': 'nope'}], 'version': 2, 'client_id': client_id}, format='json')
+    assert response.status_code == 400
+
+    assert api_client.get(url).data['payload'] == {'content': 'ab'}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['db', 'redis'])
+def test_inapplicable_patch_is_rejected_by_both_backends(backend, api_client, teacher_user, copy, monkeypatch):
+    monkeypatch.setattr(drafts, '_store', RedisDraftStore(fakeredis.FakeRedis()) if backend == 'redis'
+                        else DatabaseDraftStore())
+    api_client.force_authenticate(teacher_user)
+    url = f'/api/grading/copies/{copy.id}/draft/'
+    client_id = str(uuid.uuid4())
+    api_client.put(url, {'payload': {'content': 'a'}, 'client_id': client_id}, format='json')
+
+    # Syntaxe valide, mais le chemin n'existe pas dans le brouillon
+    bad = [{'op': 'replace', 'path': '/content', 'value': 'b'}, {'op': 'remove', 'path': '/rects/0'}]
+    response = api_client.put(url, {'patch': bad, 'version': 1, 'client_id': client_id}, format='json')
+    assert response.status_code == 400
+
+    # Rien n'a été accepté : la version et le contenu sont inchangés
+    patch = [{'op': 'replace', 'path': '/content', 'value': 'ab'}]
+    response = api_client.put(url, {'patch': patch, 'version': 1, 'client_id': client_id}, format='json')
+    assert response.status_code == 200
+    assert response.data['version'] == 2
+    drafts.get_draft_store().flush()
+    assert DraftState.objects.get(copy=copy).payload == {'content': 'ab'}
@@ -0,0 +1,121 @@
+"""
+Tests for final PDF post-processing (compression, dedup, linearization).
+"""
+import fitz
+import pytest
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.utils import timezone
+
+from exams.models import Exam, Copy
+from grading.models import GradingEvent
+from processing.services.pdf_optimizer import PDFOptimizer
+
+
+def _bloated_pdf(pages=4):
+    """Uncompressed PDF embedding the same image on every page."""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 200), False)
+    pix.set_rect(pix.irect, (240, 240, 240))
+    png = pix.tobytes("png")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(fitz.Rect(50, 50, 250, 250), stream=png)
+        page.insert_text((72, 400), f"Page {i + 1}")
+    data = doc.tobytes(garbage=0, deflate=False)
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def graded_copy(db):
+    exam = Exam.objects.create(name="Optim")
+    copy = Copy.objects.create(
+        exam=exam, anonymous_id="OPT-001", status=Copy.Status.GRADED, graded_at=timezone.now()
+    )
+    copy.final_pdf.save("copy_opt.pdf", ContentFile(_bloated_pdf()), save=True)
+    return copy
+
+
+@pytest.mark.unit
+def test_optimizer_compresses_and_linearizes():
+    raw = _bloated_pdf()
+    optimized, stats = PDFOptimizer(garbage=4, deflate=True, linear=True).optimize(raw)
+
+    assert stats['output_bytes'] < stats['input_bytes']
+    assert stats['linearized'] is True
+    assert PDFOptimizer.is_linearized(optimized)
+    with fitz.open("pdf", optimized) as doc:
+        assert doc.page_count == 4
+        assert "Page 3" in doc[2].get_text()
+
+
+@pytest.mark.unit
+def test_optimizer_passes_through_invalid_input():
+    data, stats = PDFOptimizer().optimize(b"not a pdf")
+    assert data == b"not a pdf"
+    assert stats == {'skipped': 'not_a_pdf'}
+
+
+@pytest.mark.django_db
+def test_finalize_records_optimization_metrics(authenticated_client, admin_user):
+    from unittest.mock import patch
+
+    exam = Exam.objects.create(name="Optim finalize")
+    copy = Copy.objects.create(exam=exam, anonymous_id="OPT-002", status=Copy.Status.READY)
+
+    with patch("processing.services.pdf_flattener.PDFFlattener.flatten_copy", return_value=_bloated_pdf()):
+        response = authenticated_client.post(f"/api/grading/copies/{copy.id}/finalize/", {}, format="json")
+
+    assert response.status_code == 200
+    copy.refresh_from_db()
+    with copy.final_pdf.open('rb') as f:
+        assert PDFOptimizer.is_linearized(f.read())
+    event = GradingEvent.objects.get(copy=copy, action=GradingEvent.Action.FINALIZE)
+    stats = event.metadata['pdf_optimization']
+    assert stats['output_bytes'] < stats['input_bytes']
+
+
+@pytest.mark.django_db
+def test_final_pdf_endpoint_serves_byte_ranges(authenticated_client, graded_copy):
+    url = f"/api/grading/copies/{graded_copy.id}/final-pdf/"
+
+    response = authenticated_client.get(url, HTTP_RANGE="bytes=0-99")
+
+    assert response.status_code == 206
+    assert response["Accept-Ranges"] == "bytes"
+    assert response["Content-Range"] == f"bytes 0-99/{graded_copy.final_pdf.size}"
+    assert len(response.content) == 100
+
+
+@pytest.mark.django_db
+def test_optimize_command_rewrites_existing_pdfs(graded_copy):
+    size_before = graded_copy.final_pdf.size
+
+    out = StringIO()
+    call_command('optimize_final_pdfs', stdout=out)
+
+    graded_copy.refresh_from_db()
+    with graded_copy.final_pdf.open('rb') as f:
+        data = f.read()
+    assert PDFOptimizer.is_linearized(data)
+    assert len(data) < size_before
+    assert "1 optimized" in out.getvalue()
+
+    # Second run: already linearized files are skipped
+    out = StringIO()
+    call_command('optimize_final_pdfs', stdout=out)
+    assert "0 optimized, 1 already linearized" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_optimize_command_dry_run_keeps_files(graded_copy):
+    name_before = graded_copy.final_pdf.name
+
+    call_command('optimize_final_pdfs', '--dry-run', stdout=StringIO())
+
+    graded_copy.refresh_from_db()
+    assert graded_copy.final_pdf.name == name_before
+    with graded_copy.final_pdf.open('rb') as f:
+        assert not PDFOptimizer.is_linearized(f.read())
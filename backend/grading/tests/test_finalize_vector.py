@@ -0,0 +1,91 @@
+"""
+Tests for vector-preserving final PDF composition (PDFFlattener).
+"""
+import fitz
+import pytest
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from exams.models import Exam, Copy
+from grading.models import Annotation
+from grading.services import GradingService
+from processing.services.pdf_flattener import PDFFlattener
+
+
+def _text_pdf(pages=3):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 100), f"Copie vectorielle page {i + 1}", fontsize=14)
+        page.draw_line((72, 120), (520, 120))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def imported_copy(db, admin_user):
+    exam = Exam.objects.create(name="Vector", upload_mode=Exam.UploadMode.INDIVIDUAL_A4)
+    copy = GradingService.import_pdf(
+        exam, SimpleUploadedFile("copy.pdf", _text_pdf(), content_type="application/pdf"), admin_user
+    )
+    Annotation.objects.create(
+        copy=copy, page_index=1, x=0.1, y=0.2, w=0.3, h=0.1,
+        type=Annotation.Type.ERROR, content="Signe", score_delta=-1, created_by=admin_user,
+    )
+    return copy
+
+
+@pytest.mark.django_db
+class TestVectorFinalize:
+
+    def test_vector_mode_keeps_source_pages(self, imported_copy):
+        pdf_bytes = PDFFlattener(mode='auto').flatten_copy(imported_copy)
+
+        with fitz.open("pdf", pdf_bytes) as doc:
+            assert doc.page_count == 3 + 1  # source pages + summary
+            assert doc[1].rect == fitz.Rect(0, 0, 595, 842)
+            assert "Copie vectorielle page 2" in doc[1].get_text()
+            assert "Signe" in doc[1].get_text()
+            assert not doc[1].get_images()
+
+    def test_vector_output_smaller_than_raster(self, imported_copy):
+        flattener = PDFFlattener()
+        raster = flattener.flatten_copy(imported_copy, mode='raster')
+        vector = flattener.flatten_copy(imported_copy, mode='vector')
+
+        assert len(vector) < len(raster)
+        with fitz.open("pdf", raster) as doc:
+            assert doc[0].get_images()
+
+    def test_batch_booklets_fall_back_to_raster(self, db, imported_copy):
+        booklet_copy = Copy.objects.create(
+            exam=imported_copy.exam, anonymous_id="BATCH-1", status=Copy.Status.READY
+        )
+        booklet_copy.booklets.add(*imported_copy.booklets.all())
+
+        pdf_bytes = PDFFlattener(mode='auto').flatten_copy(booklet_copy)
+        with fitz.open("pdf", pdf_bytes) as doc:
+            assert doc[0].get_images()
+
+        with pytest.raises(ValueError):
+            PDFFlattener(mode='vector').flatten_copy(booklet_copy)
+
+    def test_page_count_mismatch_falls_back_to_raster(self, imported_copy):
+        booklet = imported_copy.booklets.get()
+        booklet.pages_images = booklet.pages_images[:2]
+        booklet.save()
+
+        pdf_bytes = PDFFlattener(mode='auto').flatten_copy(imported_copy)
+        with fitz.open("pdf", pdf_bytes) as doc:
+            assert doc.page_count == 2 + 1
+            assert doc[0].get_images()
+
+    def test_benchmark_command_reports_both_modes(self, imported_copy):
+        out = StringIO()
+        call_command('benchmark_finalize', '--copy', str(imported_copy.id), stdout=out)
+
+        output = out.getvalue()
+        assert imported_copy.anonymous_id in output
+        assert "smaller" in output
@@ -0,0 +1,211 @@
+"""
+Tests de la génération des bilans LLM en tâche de fond (grading.tasks.generate_exam_summaries),
+contre un faux serveur Ollama local.
+"""
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+
+from exams.models import Copy, Exam
+from grading.models import LLMSummaryJob, QuestionRemark, Score
+from grading.tasks import generate_exam_summaries
+from processing.services import llm_summary
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.prompts.append(payload['prompt'])
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            gated = self.server.gate is not None and len(self.server.prompts) > 1
+        if gated:
+            self.server.gate.wait(5)
+        time.sleep(0.02)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        if 'ECHEC' in payload['prompt']:
+            status, body = 500, {'error': 'model crashed'}
+        else:
+            status, body = 200, {'response': f"Bilan {len(self.server.prompts)}"}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama(settings):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.prompts, server.connections, server.in_flight, server.max_in_flight = [], 0, 0, 0
+    # Event optionnel : bloque les appels à partir du deuxième
+    server.gate = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.OLLAMA_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.LLM_SUMMARY_CONCURRENCY = 2
+    yield server
+    from processing.services.llm_summary import get_ollama_client
+    get_ollama_client().close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def copies(db, teacher_user):
+    exam = Exam.objects.create(name="Bilans", date=datetime.date(2026, 6, 1))
+    copies = []
+    for i in range(5):
+        copy = Copy.objects.create(exam=exam, anonymous_id=f"BIL-{i}", status=Copy.Status.GRADED)
+        Score.objects.create(copy=copy, scores_data={'1.1': i, '1.2': 2})
+        QuestionRemark.objects.create(copy=copy, question_id='1.1', remark="Bien", created_by=teacher_user)
+        copies.append(copy)
+    Copy.objects.create(exam=exam, anonymous_id="BIL-LOCKED", status=Copy.Status.LOCKED)
+    return copies
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_generates_concurrently_over_keep_alive_connections(ollama, copies, teacher_client):
+    url = f"/api/grading/exams/{copies[0].exam_id}/generate-summaries/"
+
+    resp = teacher_client.post(url)
+
+    assert resp.status_code == 202
+    assert resp.data['status'] == 'done'
+    assert (resp.data['total'], resp.data['processed'], resp.data['success']) == (5, 5, 5)
+    assert len(ollama.prompts) == 5
+    assert ollama.max_in_flight <= 2
+    assert ollama.connections <= 2
+    for copy in copies:
+        copy.refresh_from_db()
+        assert copy.llm_summary.startswith("Bilan ")
+        assert len(copy.llm_summary_hash) == 64
+
+    # Les connexions restent ouvertes d'un job à l'autre
+    remark = QuestionRemark.objects.get(copy=copies[0])
+    remark.remark = "ECHEC de méthode"
+    remark.save()
+    teacher_client.post(url + "?force=true")
+    assert ollama.connections <= 2
+
+    resp = teacher_client.get(url)
+    assert resp.status_code == 200
+    assert (resp.data['success'], resp.data['skipped'], resp.data['errors']) == (0, 4, 1)
+    error = next(d for d in resp.data['details'] if d['status'] == 'error')
+    assert error['anonymous_id'] == "BIL-0" and 'HTTP 500' in error['detail']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_force_regenerates_only_changed_contexts(ollama, copies, teacher_client):
+    url = f"/api/grading/exams/{copies[0].exam_id}/generate-summaries/"
+    teacher_client.post(url)
+    ollama.prompts.clear()
+
+    assert teacher_client.post(url).data['skipped'] == 5
+    assert teacher_client.post(url + "?force=true").data['skipped'] == 5
+    assert ollama.prompts == []
+
+    changed = copies[3]
+    changed.refresh_from_db()
+    previous_hash = changed.llm_summary_hash
+    Score.objects.filter(copy=changed).update(scores_data={'1.1': 0, '1.2': 0})
+    resp = teacher_client.post(url + "?force=true")
+    assert (resp.data['success'], resp.data['skipped']) == (1, 4)
+    assert [d['anonymous_id'] for d in resp.data['details'] if d['status'] == 'ok'] == ["BIL-3"]
+    assert len(ollama.prompts) == 1
+    changed.refresh_from_db()
+    assert changed.llm_summary_hash != previous_hash
+
+
+@pytest.mark.django_db(transaction=True)
+def test_interrupted_job_is_resumed(ollama, copies, teacher_client, teacher_user):
+    done = copies[0]
+    done.llm_summary = "Bilan déjà rédigé"
+    done.save(update_fields=['llm_summary'])
+    job = LLMSummaryJob.objects.create(
+        exam=done.exam, force=True, status=LLMSummaryJob.Status.RUNNING, created_by=teacher_user,
+        details={str(done.id): {'copy_id': str(done.id), 'anonymous_id': done.anonymous_id, 'status': 'ok'}},
+    )
+    url = f"/api/grading/exams/{done.exam_id}/generate-summaries/"
+
+    # Job encore actif : renvoyé sans nouvel envoi
+    assert teacher_client.post(url).data['id'] == str(job.id)
+    assert ollama.prompts == []
+
+    LLMSummaryJob.objects.filter(id=job.id).update(
+        updated_at=job.updated_at - datetime.timedelta(hours=1)
+    )
+    resp = teacher_client.post(url)
+
+    assert resp.data['id'] == str(job.id)
+    assert (resp.data['status'], resp.data['success'], resp.data['processed']) == ('done', 5, 5)
+    assert len(ollama.prompts) == 4
+    done.refresh_from_db()
+    assert done.llm_summary == "Bilan déjà rédigé"
+
+
+def _wait_for_pool_threads():
+    deadline = time.monotonic() + 5
+    while any(t.name.startswith('llm-summary') for t in threading.enumerate()):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_soft_time_limit_cancels_queued_calls_and_redispatches(ollama, copies, teacher_user, settings, monkeypatch):
+    settings.LLM_SUMMARY_CONCURRENCY = 1
+    ollama.gate = threading.Event()
+    as_completed = llm_summary.as_completed
+
+    def interrupted(futures):
+        # Limite souple atteinte après le premier bilan, pendant le deuxième appel
+        yield next(as_completed(futures))
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(llm_summary, 'as_completed', interrupted)
+    dispatched = []
+    monkeypatch.setattr(generate_exam_summaries, 'apply_async',
+                        lambda args, countdown: dispatched.append((args, countdown)))
+    job = LLMSummaryJob.objects.create(exam=copies[0].exam, created_by=teacher_user)
+
+    started = time.monotonic()
+    result = generate_exam_summaries.apply(args=[str(job.id)]).get()
+
+    # Pas d'attente de l'appel en cours ni des appels en file
+    assert time.monotonic() - started < 2
+    assert result == {'status': 'pending'}
+    assert dispatched == [([str(job.id)], settings.OLLAMA_TIMEOUT)]
+
+    # L'appel en cours s'enregistre seul ; les autres sont annulés
+    ollama.gate.set()
+    _wait_for_pool_threads()
+    assert len(ollama.prompts) == 2
+    job.refresh_from_db()
+    assert (job.status, job.counts()['success']) == ('pending', 2)
+    assert Copy.objects.filter(exam=job.exam, llm_summary__startswith="Bilan ").count() == 2
+
+    # Relance : seules les copies restantes sont générées
+    monkeypatch.setattr(llm_summary, 'as_completed', as_completed)
+    result = generate_exam_summaries.apply(args=[str(job.id)]).get()
+    assert (result['status'], result['success']) == ('done', 5)
+    assert len(ollama.prompts) == 5
@@ -0,0 +1,129 @@
+"""
+Tests de l'index plein texte des suggestions (grading.search_index, ContextualSuggestionsView)
+"""
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from exams.models import DocumentChunk, DocumentTextExtraction, Exam, ExamDocument, ExamDocumentSet
+from grading import search_index
+from grading.models import AnnotationTemplate, SearchDocument, UserAnnotation
+
+
+def _chunks(exam, texts, is_active=True, version=1):
+    doc_set = ExamDocumentSet.objects.create(exam=exam, version=version, is_active=is_active)
+    document = ExamDocument.objects.create(
+        document_set=doc_set, doc_type='bareme', original_filename='bareme.pdf',
+        storage_path='exams/documents/bareme.pdf', sha256='0' * 64, file_size=1,
+    )
+    extraction = DocumentTextExtraction.objects.create(document=document, status='done')
+    created = DocumentChunk.objects.bulk_create([
+        DocumentChunk(extraction=extraction, doc_type='bareme', chunk_index=i,
+                      exercise_number=exercise, question_label=question, chunk_text=text)
+        for i, (exercise, question, text) in enumerate(texts)
+    ])
+    search_index.index_chunks(created)
+    return created
+
+
+@pytest.fixture
+def exam(db):
+    return Exam.objects.create(name="Recherche", date=datetime.date(2026, 6, 1))
+
+
+@pytest.mark.django_db
+def test_search_covers_all_sources_with_scope(exam, teacher_user, admin_user):
+    other_exam = Exam.objects.create(name="Autre", date=datetime.date(2026, 6, 2))
+    template = AnnotationTemplate.objects.create(
+        exam=exam, exercise_number=2, question_number='3b', criterion_type='justification',
+        text="Dérivée correcte mais justification absente.",
+    )
+    AnnotationTemplate.objects.create(
+        exam=other_exam, exercise_number=2, question_number='3b', criterion_type='justification',
+        text="Dérivée d'un autre examen.",
+    )
+    mine = UserAnnotation.objects.create(user=teacher_user, text="Revoir le calcul de la dérivée")
+    UserAnnotation.objects.create(user=admin_user, text="Dérivée : remarque d'un autre correcteur")
+    chunk, generic = _chunks(exam, [
+        (2, '3b', "3b Calcul de la dérivée : 1 pt"),
+        (None, '', "Dérivées : barème général"),
+    ])
+    _chunks(exam, [(2, '3b', "Dérivée (ancienne version)")], is_active=False, version=2)
+
+    hits = search_index.search("deriv", exam.id, teacher_user, exercise=2, question='3b')
+
+    assert hits == {'template': [template.id], 'personal': [mine.id], 'chunk': [chunk.id, generic.id]}
+    assert search_index.search("deriv", exam.id, teacher_user, exercise=1)['template'] == []
+    assert search_index.search("justification absente", exam.id, teacher_user)['template'] == [template.id]
+    assert search_index.search("   ", exam.id, teacher_user) == {'chunk': [], 'template': [], 'personal': []}
+
+
+@pytest.mark.django_db
+def test_index_follows_source_changes(exam, teacher_user):
+    template = AnnotationTemplate.objects.create(
+        exam=exam, exercise_number=1, question_number='1', criterion_type='method', text="Tableau de variations",
+    )
+    annotation = UserAnnotation.objects.create(user=teacher_user, text="Tableau incomplet")
+    assert SearchDocument.objects.count() == 2
+
+    template.text = "Étude de signe"
+    template.save()
+    assert search_index.search("tableau", exam.id, teacher_user)['template'] == []
+    assert search_index.search("etude", exam.id, teacher_user)['template'] == [template.id]
+
+    annotation.is_active = False
+    annotation.save(update_fields=['is_active', 'updated_at'])
+    template.delete()
+    assert not SearchDocument.objects.exists()
+
+    out = StringIO()
+    call_command('rebuild_search_index', stdout=out)
+    assert 'fts5' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_suggestions_view_returns_ranked_documents(exam, teacher_user, api_client):
+    AnnotationTemplate.objects.create(
+        exam=exam, exercise_number=1, question_number='2', criterion_type='result', text="Limite exacte",
+    )
+    chunk = _chunks(exam, [(1, '2', "Limite en +infini : 2 pts")])[0]
+    api_client.force_authenticate(user=teacher_user)
+    url = f"/api/grading/exams/{exam.id}/suggestions/"
+
+    resp = api_client.get(url, {'q': 'limi', 'exercise': 1})
+    assert resp.status_code == 200
+    assert [o['text'] for o in resp.data['official']] == ["Limite exacte"]
+    assert [d['id'] for d in resp.data['documents']] == [str(chunk.id)]
+
+    resp = api_client.get(url, {'exercise': 1, 'question': '2'})
+    assert [d['chunk_text'] for d in resp.data['documents']] == ["Limite en +infini : 2 pts"]
+
+    assert api_client.get(url, {'exercise': 'abc'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_suggestions_view_searches_all_sources_beyond_prefix_completion(exam, teacher_user, api_client):
+    template = AnnotationTemplate.objects.create(
+        exam=exam, exercise_number=2, question_number='3b', criterion_type='method', text="Calcul de dérivée correct",
+    )
+    AnnotationTemplate.objects.create(
+        exam=exam, exercise_number=2, question_number='3b', criterion_type='method', text="Dérivée absente",
+    )
+    used = UserAnnotation.objects.create(user=teacher_user, text="Dérivée fausse", usage_count=9)
+    mine = UserAnnotation.objects.create(user=teacher_user, text="Revoir le calcul des dérivées", usage_count=1)
+    chunk = _chunks(exam, [(2, '3b', "3b Calcul de la dérivée : 1 pt")])[0]
+    api_client.force_authenticate(user=teacher_user)
+    url = f"/api/grading/exams/{exam.id}/suggestions/"
+
+    # Un mot : complétion par l'index mémoire, personnelles classées par usage
+    resp = api_client.get(url, {'q': 'deriv', 'exercise': 2})
+    assert [a['id'] for a in resp.data['personal']] == [str(used.id), str(mine.id)]
+    assert [d['id'] for d in resp.data['documents']] == [str(chunk.id)]
+
+    # Plusieurs mots : une requête plein texte classée sur les trois sources
+    resp = api_client.get(url, {'q': 'calcul deriv', 'exercise': 2, 'question': '3b'})
+    assert [o['id'] for o in resp.data['official']] == [str(template.id)]
+    assert [a['id'] for a in resp.data['personal']] == [str(mine.id)]
+    assert [d['id'] for d in resp.data['documents']] == [str(chunk.id)]
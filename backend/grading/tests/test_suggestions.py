@@ -0,0 +1,117 @@
+"""
+Tests de l'index mémoire des suggestions (grading.suggestions)
+"""
+import datetime
+import time
+
+import pytest
+from django.utils import timezone
+
+from exams.models import Exam
+from grading.models import AnnotationTemplate, UserAnnotation
+from grading.suggestions import SuggestionCache, fold, get_suggestion_cache
+
+
+@pytest.fixture
+def exam(db):
+    exam = Exam.objects.create(name="Suggestions", date=datetime.date(2026, 6, 1))
+    AnnotationTemplate.objects.create(exam=exam, exercise_number=1, question_number='1',
+                                      criterion_type='method', text="Méthode correcte")
+    AnnotationTemplate.objects.create(exam=exam, exercise_number=2, question_number='3b',
+                                      criterion_type='error_typique', text="Confusion entre méthode et résultat")
+    return exam
+
+
+def test_fold_removes_case_and_accents():
+    assert fold("  Étude   de la CONVEXITÉ ") == "etude de la convexite"
+
+
+@pytest.mark.django_db
+def test_prefix_completion_is_ranked_and_served_from_memory(exam, teacher_user, django_assert_num_queries):
+    now = timezone.now()
+    UserAnnotation.objects.create(user=teacher_user, text="Méthode à détailler", usage_count=2, last_used=now)
+    UserAnnotation.objects.create(user=teacher_user, text="Revoir la méthode", usage_count=9, last_used=now)
+    UserAnnotation.objects.create(user=teacher_user, text="Mesure d'angle", usage_count=50,
+                                  exercise_context=3)
+    suggestions = get_suggestion_cache()
+
+    official, personal = suggestions.suggest(exam.id, teacher_user.pk, "METH")
+    assert [t.text for t in official] == ["Méthode correcte", "Confusion entre méthode et résultat"]
+    assert [a.text for a in personal] == ["Revoir la méthode", "Méthode à détailler"]
+
+    with django_assert_num_queries(0):
+        official, personal = suggestions.suggest(exam.id, teacher_user.pk, "me", exercise=2)
+    assert [t.text for t in official] == ["Confusion entre méthode et résultat"]
+    assert [a.text for a in personal] == ["Revoir la méthode", "Méthode à détailler"]
+
+
+@pytest.mark.django_db
+def test_auto_save_updates_index_and_batches_usage(teacher_client, teacher_user, exam, settings,
+                                                   django_assert_num_queries, django_capture_on_commit_callbacks):
+    settings.SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS = 3600
+    existing = UserAnnotation.objects.create(user=teacher_user, text="Déjà existante", usage_count=5)
+    url = "/api/grading/my-annotations/auto-save/"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert teacher_client.post(url, {"text": "Déjà existante"}, format='json').data['usage_count'] == 6
+        resp = teacher_client.post(url, {"text": "Nouvelle remarque"}, format='json')
+        assert resp.status_code == 201
+        assert teacher_client.post(f"/api/grading/my-annotations/{existing.id}/use/").data['usage_count'] == 7
+
+    # Index à jour en place, base pas encore écrite
+    official, personal = get_suggestion_cache().suggest(exam.id, teacher_user.pk, "nouv")
+    assert [a.text for a in personal] == ["Nouvelle remarque"]
+    existing.refresh_from_db()
+    assert existing.usage_count == 5
+
+    with django_assert_num_queries(1):
+        get_suggestion_cache().flush_usage()
+    existing.refresh_from_db()
+    assert existing.usage_count == 7
+    assert existing.last_used is not None
+
+    settings.SUGGESTION_USAGE_FLUSH_BATCH_SIZE = 1
+    teacher_client.post(url, {"text": "Déjà existante"}, format='json')
+    existing.refresh_from_db()
+    assert existing.usage_count == 8
+
+
+@pytest.mark.django_db
+def test_other_processes_reload_after_a_change(exam, teacher_user, django_capture_on_commit_callbacks):
+    other_process = SuggestionCache()
+    assert other_process.suggest(exam.id, teacher_user.pk, "cor")[0][0].text == "Méthode correcte"
+
+    template = AnnotationTemplate.objects.get(text="Méthode correcte")
+    template.text = "Méthode rigoureuse"
+    with django_capture_on_commit_callbacks() as callbacks:
+        template.save()
+    # Pas de nouvelle version avant la validation de la transaction
+    assert other_process.suggest(exam.id, teacher_user.pk, "cor")[0][0].text == "Méthode correcte"
+    for callback in callbacks:
+        callback()
+
+    assert other_process.suggest(exam.id, teacher_user.pk, "cor")[0] == []
+    assert [t.text for t in other_process.suggest(exam.id, teacher_user.pk, "rigou")[0]] == ["Méthode rigoureuse"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        template.delete()
+    assert [t.text for t in get_suggestion_cache().suggest(exam.id, teacher_user.pk, "meth")[0]] == \
+        ["Confusion entre méthode et résultat"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_usage_is_flushed_by_the_background_thread(teacher_user, settings):
+    settings.SUGGESTION_USAGE_FLUSH_INTERVAL_SECONDS = 0.05
+    annotation = UserAnnotation.objects.create(user=teacher_user, text="Unité manquante", usage_count=1)
+    suggestions = SuggestionCache()
+
+    suggestions.record_use(annotation)
+
+    # Aucune autre utilisation : le thread écrit le compteur seul
+    deadline = time.monotonic() + 5
+    while UserAnnotation.objects.get(pk=annotation.pk).usage_count != 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert UserAnnotation.objects.get(pk=annotation.pk).usage_count == 2
+    assert suggestions.usage.pending == {}
+    suggestions.close()
+    assert not suggestions._thread.is_alive()
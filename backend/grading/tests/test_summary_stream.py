@@ -0,0 +1,157 @@
+"""
+Tests du bilan LLM en flux (grading.views_stream) servi par core.asgi,
+contre un faux serveur Ollama local qui envoie du NDJSON en chunked.
+"""
+import asyncio
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings as django_settings
+from django.test import Client
+
+from core.asgi import application
+from exams.models import Copy, Exam
+from grading.models import Score
+
+
+class StreamingOllama(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        assert payload['stream'] is True
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        tokens = self.server.tokens
+        try:
+            for i, token in enumerate(tokens):
+                line = json.dumps({'response': token, 'done': False}) + '\n'
+                # Une ligne NDJSON coupée entre deux chunks
+                for part in (line[:5], line[5:]):
+                    data = part.encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.server.delay)
+            data = (json.dumps({'response': '', 'done': True}) + '\n').encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.aborted.set()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama(settings):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StreamingOllama)
+    server.daemon_threads = True
+    server.tokens, server.delay, server.aborted = ["Tu as ", "bien ", "travaillé."], 0, threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.OLLAMA_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def graded_copy(db):
+    exam = Exam.objects.create(name="Flux", date=datetime.date(2026, 6, 1))
+    copy = Copy.objects.create(exam=exam, anonymous_id="FLUX-1", status=Copy.Status.GRADED)
+    Score.objects.create(copy=copy, scores_data={'1.1': 2})
+    return copy
+
+
+def _session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    name = django_settings.SESSION_COOKIE_NAME
+    return f"{name}={client.cookies[name].value}"
+
+
+def _stream(path, cookie, disconnect_after=None):
+    """Appelle core.asgi ; le client se déconnecte après `disconnect_after` fragments."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    result = {'status': None, 'body': b''}
+
+    async def run():
+        disconnected = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+            else:
+                result['body'] += message.get('body', b'')
+            if disconnect_after is not None and result['body'].count(b'event: token') >= disconnect_after:
+                disconnected.set()
+
+        await asyncio.wait_for(application(scope, receive, send), timeout=10)
+
+    async_to_sync(run)()
+    events = [
+        (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+        for block in result['body'].decode().split('\n\n') if block.startswith('event: ')
+    ]
+    return result['status'], events
+
+
+@pytest.mark.django_db(transaction=True)
+def test_summary_is_streamed_then_saved(ollama, graded_copy, teacher_user):
+    status, events = _stream(
+        f"/api/grading/copies/{graded_copy.id}/generate-summary/stream/", _session_cookie(teacher_user)
+    )
+
+    assert status == 200
+    assert [data['text'] for event, data in events if event == 'token'] == ["Tu as ", "bien ", "travaillé."]
+    assert events[-1] == ('done', {'copy_id': str(graded_copy.id), 'length': len("Tu as bien travaillé.")})
+    graded_copy.refresh_from_db()
+    assert graded_copy.llm_summary == "Tu as bien travaillé."
+    assert len(graded_copy.llm_summary_hash) == 64
+
+
+@pytest.mark.django_db(transaction=True)
+def test_client_disconnect_cancels_generation(ollama, graded_copy, teacher_user):
+    ollama.tokens, ollama.delay = [f"mot{i} " for i in range(200)], 0.02
+
+    status, events = _stream(
+        f"/api/grading/copies/{graded_copy.id}/generate-summary/stream/", _session_cookie(teacher_user),
+        disconnect_after=2,
+    )
+
+    assert status == 200
+    assert 2 <= len(events) < 200
+    assert ollama.aborted.wait(timeout=5)
+    graded_copy.refresh_from_db()
+    assert not graded_copy.llm_summary
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stream_requires_teacher_and_graded_copy(ollama, graded_copy, teacher_user, django_user_model):
+    url = f"/api/grading/copies/{graded_copy.id}/generate-summary/stream/"
+    student = django_user_model.objects.create_user(username="eleve", password="x")  # nosec B106
+    assert _stream(url, _session_cookie(student))[0] == 403
+    assert _stream(url, "")[0] == 401
+
+    Copy.objects.filter(id=graded_copy.id).update(status=Copy.Status.LOCKED)
+    assert _stream(url, _session_cookie(teacher_user))[0] == 400
@@ -4,6 +4,7 @@ URL configuration pour l'app grading.
 from django.urls import path
 from grading.views import (
     AnnotationListCreateView,
+    AnnotationBatchView,
     AnnotationDetailView,
     CopyFinalizeView,
     CopyReadyView,
@@ -21,6 +22,7 @@ from grading.views import (
 )
 from grading.views_draft import DraftReturnView
 from grading.views_async import task_status, cancel_task
+from grading.views_stream import copy_summary_stream
 from grading.views_annotation_bank import (
     ContextualSuggestionsView,
     UserAnnotationListCreateView,
@@ -36,6 +38,7 @@ urlpatterns = [
 
     # Annotations
     path('copies/<uuid:copy_id>/annotations/', AnnotationListCreateView.as_view(), name='annotation-list-create'),
+    path('copies/<uuid:copy_id>/annotations/batch/', AnnotationBatchView.as_view(), name='annotation-batch'),
     path('annotations/<uuid:pk>/', AnnotationDetailView.as_view(), name='annotation-detail'),
 
     # Workflow Copy
@@ -70,6 +73,7 @@ urlpatterns = [
     # LLM Summary Generation
     path('exams/<uuid:exam_id>/generate-summaries/', ExamLLMSummaryView.as_view(), name='exam-llm-summaries'),
     path('copies/<uuid:copy_id>/generate-summary/', CopyLLMSummaryView.as_view(), name='copy-llm-summary'),
+    path('copies/<uuid:copy_id>/generate-summary/stream/', copy_summary_stream, name='copy-llm-summary-stream'),
 
     # Banque d'annotations — Suggestions contextuelles
     path('exams/<uuid:exam_id>/suggestions/', ContextualSuggestionsView.as_view(), name='contextual-suggestions'),
@@ -2,14 +2,14 @@ from rest_framework import generics, status
 from rest_framework import renderers
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse
 from rest_framework.permissions import IsAuthenticated
 from .models import Annotation, GradingEvent, QuestionRemark, Score
 from exams.models import Copy, Exam
 from .serializers import AnnotationSerializer, GradingEventSerializer, QuestionRemarkSerializer
 from exams.permissions import IsTeacherOrAdmin
 from django.shortcuts import get_object_or_404
-from grading.services import AnnotationService, GradingService, LockConflictError
+from grading.services import AnnotationBatchError, AnnotationService, GradingService, LockConflictError
 from core.auth import UserRole
 from django.db.models import Avg, StdDev, Min, Max, Count
 import statistics
@@ -136,6 +136,54 @@ class AnnotationDetailView(generics.RetrieveUpdateDestroyAPIView):
             return _handle_unexpected_error(e, context="AnnotationDetailView.destroy")
 
 
+class AnnotationBatchView(APIView):
+    """
+    POST /api/grading/copies/<copy_id>/annotations/batch/
+    Applique un lot de créations / modifications / suppressions en une transaction.
+
+    Corps : {"operations": [{"op": "create"|"update"|"delete", ...}, ...]}
+    Réponse 200 : {"results": [...]} dans l'ordre du lot (annotation sérialisée,
+    ou {"op": "delete", "id": ...}).
+    Lot rejeté : aucune écriture ; "errors" liste chaque opération fautive
+    (403 si une annotation d'un autre correcteur est visée, 409 sur conflit de
+    version, 400 sinon).
+
+    Permission : IsTeacherOrAdmin
+    """
+    permission_classes = [IsTeacherOrAdmin]
+
+    def post(self, request, copy_id):
+        copy = get_object_or_404(Copy, id=copy_id)
+        try:
+            results = AnnotationService.apply_batch(
+                copy=copy,
+                operations=request.data.get('operations'),
+                user=request.user,
+            )
+        except AnnotationBatchError as e:
+            codes = {err['code'] for err in e.errors}
+            if 'forbidden' in codes:
+                http_status = status.HTTP_403_FORBIDDEN
+            elif 'conflict' in codes:
+                http_status = status.HTTP_409_CONFLICT
+            else:
+                http_status = status.HTTP_400_BAD_REQUEST
+            logger.warning(f"AnnotationBatchView.post rejected batch: {e.errors}")
+            return Response({"detail": str(e), "errors": e.errors}, status=http_status)
+        except (ValueError, KeyError, PermissionError) as e:
+            return _handle_service_error(e, context="AnnotationBatchView.post")
+        except Exception as e:
+            return _handle_unexpected_error(e, context="AnnotationBatchView.post")
+
+        payload = []
+        for op, result in results:
+            if op == 'delete':
+                payload.append({"op": op, "id": result})
+            else:
+                payload.append({"op": op, **AnnotationSerializer(result).data, "version": result.version})
+        return Response({"results": payload})
+
+
 class CopyReadyView(APIView):
     permission_classes = [IsTeacherOrAdmin]
     def post(self, request, id):
@@ -161,6 +209,30 @@ class CopyFinalizeView(APIView):
             return _handle_service_error(e)
 
 
+def _parse_byte_range(header, size):
+    """
+    Parse a single-range "bytes=start-end" header.
+    Returns (start, end) inclusive, or None for a full response
+    (no header, multi-range or unsatisfiable range).
+    """
+    if not header or not header.startswith('bytes=') or ',' in header or size <= 0:
+        return None
+    start_str, _, end_str = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(size - int(end_str), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
 class CopyFinalPdfView(APIView):
     """
     GET /api/copies/<uuid>/final-pdf/
@@ -243,11 +315,24 @@ class CopyFinalPdfView(APIView):
         if not copy.final_pdf:
             return Response({"detail": "PDF final non disponible."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Audit trail: Téléchargement PDF final
-        from core.utils.audit import log_data_access
-        log_data_access(request, 'Copy', copy.id, action_detail='download')
-
-        response = FileResponse(copy.final_pdf.open("rb"), content_type="application/pdf")
+        # Linearized PDFs let pdf.js show page 1 from a few Range requests
+        byte_range = _parse_byte_range(request.headers.get('Range'), copy.final_pdf.size)
+
+        # Audit trail: Téléchargement PDF final (once per download, not per chunk)
+        if byte_range is None or byte_range[0] == 0:
+            from core.utils.audit import log_data_access
+            log_data_access(request, 'Copy', copy.id, action_detail='download')
+
+        if byte_range is not None:
+            start, end = byte_range
+            with copy.final_pdf.open("rb") as f:
+                f.seek(start)
+                chunk = f.read(end - start + 1)
+            response = HttpResponse(chunk, status=status.HTTP_206_PARTIAL_CONTENT, content_type="application/pdf")
+            response["Content-Range"] = f"bytes {start}-{end}/{copy.final_pdf.size}"
+        else:
+            response = FileResponse(copy.final_pdf.open("rb"), content_type="application/pdf")
+        response["Accept-Ranges"] = "bytes"
         filename = f'copy_{copy.anonymous_id}_corrected.pdf'
         disposition = 'attachment' if request.query_params.get('download') == '1' else 'inline'
         response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
@@ -613,32 +698,59 @@ class ExamUnreleaseResultsView(APIView):
 class ExamLLMSummaryView(APIView):
     """
     POST /api/grading/exams/<uuid>/generate-summaries/
-    Génère les bilans LLM pour toutes les copies GRADED d'un examen.
-    Query param ?force=true pour régénérer les bilans existants.
+    Lance en tâche de fond la génération des bilans LLM des copies GRADED
+    d'un examen (202 + job). Query param ?force=true pour régénérer les bilans
+    dont les données de correction ont changé.
+    Un job déjà en cours est renvoyé tel quel ; un job interrompu (sans
+    progression depuis OLLAMA_TIMEOUT) est relancé là où il s'est arrêté.
+
+    GET : avancement du dernier job de l'examen.
     """
     permission_classes = [IsTeacherOrAdmin]
 
+    def get(self, request, exam_id):
+        from grading.models import LLMSummaryJob
+        from grading.serializers import LLMSummaryJobSerializer
+
+        exam = get_object_or_404(Exam, id=exam_id)
+        job = LLMSummaryJob.objects.filter(exam=exam).first()
+        if job is None:
+            return Response(
+                {'detail': 'Aucune génération de bilans pour cet examen.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(LLMSummaryJobSerializer(job).data)
+
     def post(self, request, exam_id):
+        from grading.models import LLMSummaryJob
+        from grading.serializers import LLMSummaryJobSerializer
+        from grading.tasks import generate_exam_summaries
+
         exam = get_object_or_404(Exam, id=exam_id)
         force = request.query_params.get('force', 'false').lower() == 'true'
 
-        from processing.services.llm_summary import LLMSummaryService
+        job = LLMSummaryJob.objects.filter(
+            exam=exam, status__in=[LLMSummaryJob.Status.PENDING, LLMSummaryJob.Status.RUNNING]
+        ).first()
+        if job is not None and not job.is_stale():
+            return Response(LLMSummaryJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        if job is None:
+            job = LLMSummaryJob.objects.create(exam=exam, force=force, created_by=request.user)
+        else:
+            # Reprise : la date de progression évite un second envoi pendant l'attente du worker
+            job.save(update_fields=['updated_at'])
+
         try:
-            stats = LLMSummaryService.generate_batch(str(exam.id), force=force)
+            generate_exam_summaries.delay(str(job.id))
         except Exception as e:
+            logger.error(f"Impossible de lancer la génération des bilans: {e}")
             return Response(
-                {'detail': f'Erreur lors de la génération des bilans: {str(e)[:300]}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'detail': f'Erreur lors du lancement de la génération des bilans: {str(e)[:300]}'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        return Response({
-            'exam_id': str(exam.id),
-            'exam_name': exam.name,
-            'success': stats['success'],
-            'skipped': stats['skipped'],
-            'errors': stats['errors'],
-            'details': stats['details'],
-        })
+        job.refresh_from_db()
+        return Response(LLMSummaryJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 class CopyLLMSummaryView(APIView):
@@ -7,11 +7,16 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, F
+from django.db.models import Q
 from django.utils import timezone
+from exams.models import DocumentChunk
 from exams.permissions import IsTeacherOrAdmin
+from grading import search_index
+from grading.suggestions import get_suggestion_cache
 from grading.models import AnnotationTemplate, UserAnnotation
-from grading.serializers import AnnotationTemplateSerializer, UserAnnotationSerializer
+from grading.serializers import (
+    AnnotationTemplateSerializer, DocumentChunkSuggestionSerializer, UserAnnotationSerializer,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,54 +26,81 @@ class ContextualSuggestionsView(APIView):
     """
     GET /api/grading/exams/<exam_id>/suggestions/
     
-    Retourne les annotations suggérées (officielles + personnelles)
-    filtrées par exercice, question et recherche textuelle.
+    Retourne les annotations suggérées (officielles + personnelles) et les
+    segments du barème / corrigé / sujet (lot documentaire actif),
+    filtrés par exercice, question et recherche textuelle.
+    
+    Sans recherche, et pour la complétion d'un seul mot, les annotations
+    viennent de l'index mémoire (grading.suggestions) : préfixe de mot sans
+    accents, personnelles classées par usage, aucune requête.
+    Sinon (plusieurs mots, ou aucun résultat par préfixe), segments,
+    annotations officielles et personnelles viennent d'une seule requête
+    classée sur l'index plein texte (grading.search_index : racinisation
+    française, sans accents). Les segments en viennent toujours.
     
     Query params:
         exercise (int) : numéro d'exercice
         question (str) : numéro de question (ex: '3b')
-        q (str) : recherche textuelle libre (fuzzy)
+        q (str) : début de mot(s) recherché
     """
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
 
+    OFFICIAL_LIMIT = 30
+    PERSONAL_LIMIT = 20
+    DOCUMENTS_LIMIT = 10
+
     def get(self, request, exam_id):
         exercise = request.query_params.get('exercise')
         question = request.query_params.get('question')
         search_query = request.query_params.get('q', '').strip()
 
-        # --- 1. Annotations officielles ---
-        official_qs = AnnotationTemplate.objects.filter(
-            exam_id=exam_id,
-            is_active=True
-        )
-        if exercise:
-            official_qs = official_qs.filter(exercise_number=exercise)
-        if question:
-            official_qs = official_qs.filter(question_number=question)
-        if search_query:
-            official_qs = official_qs.filter(text__icontains=search_query)
-        official_qs = official_qs[:30]
+        if exercise and not exercise.isdigit():
+            return Response({'detail': "Le paramètre 'exercise' doit être un entier."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        exercise = int(exercise) if exercise else None
+
+        suggestions = get_suggestion_cache()
+        official = personal = None
+        if not search_query or len(search_index.terms(search_query)) == 1:
+            # Sans recherche ou complétion d'un mot : index mémoire, classé par usage
+            official, personal = suggestions.suggest(
+                exam_id, request.user.pk, search_query, exercise=exercise, question=question,
+                official_limit=self.OFFICIAL_LIMIT, personal_limit=self.PERSONAL_LIMIT,
+            )
+            if search_query and not (official or personal):
+                official = personal = None  # rien par préfixe : recherche plein texte
 
-        # --- 2. Annotations personnelles ---
-        personal_qs = UserAnnotation.objects.filter(
-            user=request.user,
-            is_active=True
-        )
-        if exercise:
-            personal_qs = personal_qs.filter(
-                Q(exercise_context=exercise) | Q(exercise_context__isnull=True)
+        if search_query:
+            # Une requête classée ; les annotations seulement si l'index mémoire n'a pas répondu
+            hits = search_index.search(
+                search_query, exam_id, request.user, exercise=exercise, question=question,
+                limit=max(self.OFFICIAL_LIMIT, self.PERSONAL_LIMIT, self.DOCUMENTS_LIMIT),
+                kinds=search_index.KINDS if official is None else ('chunk',),
             )
-        if question:
-            personal_qs = personal_qs.filter(
-                Q(question_context=question) | Q(question_context='')
+            if official is None:
+                templates = suggestions.exam_index(exam_id).entries
+                mine = suggestions.user_index(request.user.pk).entries
+                official = [templates[pk] for pk in hits['template'] if pk in templates][:self.OFFICIAL_LIMIT]
+                personal = [mine[pk] for pk in hits['personal'] if pk in mine][:self.PERSONAL_LIMIT]
+            chunks = DocumentChunk.objects.in_bulk(hits['chunk'][:self.DOCUMENTS_LIMIT])
+            documents = [chunks[pk] for pk in hits['chunk'][:self.DOCUMENTS_LIMIT] if pk in chunks]
+        elif exercise is not None:
+            # Sans recherche : segments de l'exercice (et de la question)
+            documents = DocumentChunk.objects.filter(
+                extraction__document__document_set__exam_id=exam_id,
+                extraction__document__document_set__is_active=True,
+                exercise_number=exercise,
             )
-        if search_query:
-            personal_qs = personal_qs.filter(text__icontains=search_query)
-        personal_qs = personal_qs.order_by('-usage_count', '-last_used')[:20]
+            if question:
+                documents = documents.filter(Q(question_label=question) | Q(question_label=''))
+            documents = documents.order_by('doc_type', 'chunk_index')[:self.DOCUMENTS_LIMIT]
+        else:
+            documents = []
 
         return Response({
-            'official': AnnotationTemplateSerializer(official_qs, many=True).data,
-            'personal': UserAnnotationSerializer(personal_qs, many=True).data,
+            'official': AnnotationTemplateSerializer(official, many=True).data,
+            'personal': UserAnnotationSerializer(personal, many=True).data,
+            'documents': DocumentChunkSuggestionSerializer(documents, many=True).data,
         })
 
 
@@ -85,6 +117,8 @@ class UserAnnotationListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
 
     def get_queryset(self):
+        # Classement par usage : écrire d'abord les compteurs en attente
+        get_suggestion_cache().flush_usage()
         qs = UserAnnotation.objects.filter(user=self.request.user, is_active=True)
         search_query = self.request.query_params.get('q', '').strip()
         exercise = self.request.query_params.get('exercise')
@@ -123,17 +157,18 @@ class UserAnnotationUseView(APIView):
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
 
     def post(self, request, pk):
-        try:
-            ann = UserAnnotation.objects.get(pk=pk, user=request.user)
-        except UserAnnotation.DoesNotExist:
-            return Response(
-                {"detail": "Annotation personnelle introuvable."},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        ann.usage_count = F('usage_count') + 1
-        ann.last_used = timezone.now()
-        ann.save(update_fields=['usage_count', 'last_used', 'updated_at'])
-        ann.refresh_from_db()
+        suggestions = get_suggestion_cache()
+        ann = suggestions.get_personal(request.user.pk, pk)
+        if ann is None:
+            try:
+                ann = UserAnnotation.objects.get(pk=pk, user=request.user)
+            except UserAnnotation.DoesNotExist:
+                return Response(
+                    {"detail": "Annotation personnelle introuvable."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        # Compteur écrit en base par lots (grading.suggestions.UsageBuffer)
+        suggestions.record_use(ann)
         return Response(UserAnnotationSerializer(ann).data)
 
 
@@ -163,17 +198,11 @@ class AutoSaveAnnotationView(APIView):
         exercise_context = request.data.get('exercise_context')
         question_context = request.data.get('question_context', '')
 
-        existing = UserAnnotation.objects.filter(
-            user=request.user,
-            text=text,
-            is_active=True
-        ).first()
+        suggestions = get_suggestion_cache()
+        existing = suggestions.find_personal(request.user.pk, text)
 
         if existing:
-            existing.usage_count = F('usage_count') + 1
-            existing.last_used = timezone.now()
-            existing.save(update_fields=['usage_count', 'last_used', 'updated_at'])
-            existing.refresh_from_db()
+            suggestions.record_use(existing)
             return Response(UserAnnotationSerializer(existing).data)
 
         ann = UserAnnotation.objects.create(
@@ -3,7 +3,7 @@ P0-OP-03: Async task status endpoints
 Allows clients to poll for task completion
 """
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.authentication import BasicAuthentication
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status as http_status
@@ -12,7 +12,7 @@ from django.conf import settings
 
 
 @api_view(['GET'])
-@authentication_classes([BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication])
 @permission_classes([AllowAny])
 def task_status(request, task_id):
     """
@@ -25,6 +25,7 @@ def task_status(request, task_id):
     Response states:
     - PENDING: Task waiting to be executed
     - STARTED: Task has begun execution
+    - PROGRESS: Task reports its progress (result: {"total": n, "processed": k, ...})
     - SUCCESS: Task completed successfully
     - FAILURE: Task failed (includes error info)
     - RETRY: Task is being retried
@@ -64,6 +65,13 @@ def task_status(request, task_id):
     elif result.state == 'STARTED':
         response_data['progress'] = 50
         response_data['message'] = 'Task is processing'
+
+    elif result.state == 'PROGRESS':
+        meta = result.info if isinstance(result.info, dict) else {}
+        total = meta.get('total') or 0
+        response_data['progress'] = int(100 * meta.get('processed', 0) / total) if total else 0
+        response_data['result'] = meta
+        response_data['message'] = 'Task is processing'
         
     elif result.state == 'SUCCESS':
         response_data['progress'] = 100
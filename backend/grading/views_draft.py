@@ -1,11 +1,7 @@
 from rest_framework import views, status, permissions
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-from django.db.models import F
-from django.db import transaction
-from .models import DraftState
 from exams.models import Copy
-import uuid
+from grading.drafts import DraftConflictError, get_draft_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,78 +26,53 @@ class DraftReturnView(views.APIView):
 
     Gère le brouillon (Autosave). Pas de lock requis — l'assigned_corrector
     garantit qu'un seul correcteur accède à une copie.
+
+    PUT accepte soit le brouillon complet ({"payload", "client_id"}), soit un
+    patch JSON RFC 6902 calculé contre la version connue du client
+    ({"patch", "version", "client_id"}). Stockage : grading.drafts
+    (write-behind Redis, ou DraftState directement).
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, copy_id):
-        try:
-            draft = DraftState.objects.get(copy_id=copy_id, owner=request.user)
-            return Response({
-                "id": str(draft.id),
-                "payload": draft.payload,
-                "version": draft.version,
-                "updated_at": draft.updated_at,
-                "client_id": str(draft.client_id) if draft.client_id else None
-            })
-        except DraftState.DoesNotExist:
-             return Response(status=status.HTTP_204_NO_CONTENT)
+        draft = get_draft_store().get(copy_id, request.user)
+        if draft is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(draft)
 
     def put(self, request, copy_id):
         context = "DraftReturnView.put"
         try:
-            copy = get_object_or_404(Copy, id=copy_id)
-
-            if copy.status == Copy.Status.GRADED:
-                return Response({"detail": "Impossible de sauvegarder un brouillon sur une copie corrigée."}, status=status.HTTP_400_BAD_REQUEST)
-
-            payload = request.data.get('payload', {})
             client_id = request.data.get('client_id')
-
             if not client_id:
                 return _handle_value_error("client_id is required", context=context)
 
-            try:
-                existing_draft = DraftState.objects.get(copy=copy, owner=request.user)
-                if existing_draft.client_id and str(existing_draft.client_id) != str(client_id):
-                    return Response(
-                        {"detail": "Conflit de brouillon : modifié par une autre session."},
-                        status=status.HTTP_409_CONFLICT,
-                    )
-            except DraftState.DoesNotExist:
-                pass
-
-            draft, created = DraftState.objects.get_or_create(
-                copy=copy,
-                owner=request.user,
-                defaults={
-                    "payload": payload,
-                    "client_id": client_id,
-                    "version": 1,
-                },
+            patch = request.data.get('patch')
+            base_version = request.data.get('version')
+            if patch is not None and base_version is not None:
+                base_version = int(base_version)
+
+            saved = get_draft_store().save(
+                copy_id,
+                request.user,
+                client_id,
+                payload=request.data.get('payload', {}) if patch is None else None,
+                patch=patch,
+                base_version=base_version,
             )
 
-            if not created:
-                updated_count = DraftState.objects.filter(
-                    id=draft.id,
-                    client_id=draft.client_id
-                ).update(
-                    payload=payload,
-                    version=F('version') + 1
-                )
-
-                if updated_count == 0:
-                    return Response(
-                        {"detail": "Conflit de brouillon : modifié par une autre session."},
-                        status=status.HTTP_409_CONFLICT,
-                    )
-
-                draft.refresh_from_db()
-
             return Response({
                 "status": "SAVED",
-                "version": draft.version,
-                "updated_at": draft.updated_at
+                "version": saved["version"],
+                "updated_at": saved["updated_at"]
             })
+        except Copy.DoesNotExist:
+            return Response({"detail": "Copie introuvable."}, status=status.HTTP_404_NOT_FOUND)
+        except DraftConflictError as e:
+            body = {"detail": str(e)}
+            if e.version is not None:
+                body["version"] = e.version
+            return Response(body, status=status.HTTP_409_CONFLICT)
         except (ValueError, KeyError) as e:
             return _handle_value_error(str(e), context=context)
         except Exception as e:
@@ -111,5 +82,5 @@ class DraftReturnView(views.APIView):
         """
         Supprime le brouillon (ex: après une sauvegarde réussie).
         """
-        DraftState.objects.filter(copy_id=copy_id, owner=request.user).delete()
+        get_draft_store().delete(copy_id, request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -52,16 +52,13 @@ class LockHeartbeatView(views.APIView):
     permission_classes = [permissions.IsAuthenticated, IsTeacherOrAdmin]
 
     def post(self, request, copy_id):
-        # We don't check Copy existence first to avoid double DB hit usually, 
-        # but for robustness let's follow standard flow.
-        # Actually, faster to query Lock directly.
         token = request.headers.get("X-Lock-Token") or request.data.get('token')
         if not token:
             return Response({"detail": "Missing lock token."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            copy = get_object_or_404(Copy, id=copy_id)
-            lock = GradingService.heartbeat_lock(copy=copy, user=request.user, lock_token=str(token), ttl_seconds=1800)
+            # Heartbeats only touch the lock backend: no Copy read
+            lock = GradingService.heartbeat_lock(copy=copy_id, user=request.user, lock_token=str(token), ttl_seconds=1800)
         except LockConflictError as e:
             message = str(e)
             status_code = status.HTTP_404_NOT_FOUND if "not found" in message.lower() or "expired" in message.lower() else status.HTTP_409_CONFLICT
@@ -83,8 +80,7 @@ class LockReleaseView(views.APIView):
             return Response({"detail": "Missing lock token."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            copy = get_object_or_404(Copy, id=copy_id)
-            released = GradingService.release_lock(copy=copy, user=request.user, lock_token=str(token))
+            released = GradingService.release_lock(copy=copy_id, user=request.user, lock_token=str(token))
         except LockConflictError as e:
             return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
         except PermissionError as e:
@@ -117,6 +113,6 @@ class LockStatusView(views.APIView):
                 "owner": {"id": lock.owner.id, "username": lock.owner.username},
                 "expires_at": lock.expires_at,
                 "server_time": now,
-                "is_active_user": (lock.owner == request.user),
+                "is_active_user": (lock.owner_id == request.user.id),
             }
         )
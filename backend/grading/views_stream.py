@@ -0,0 +1,92 @@
+"""
+Génération en flux du bilan LLM d'une copie (server-sent events).
+
+Vue asynchrone : servie par le serveur ASGI (core.asgi, service backend-stream),
+elle attend les fragments d'Ollama sur la boucle d'événements sans occuper de
+worker gunicorn. Le bilan n'est enregistré qu'en fin de génération ; si le
+navigateur se déconnecte, core.asgi annule la réponse et la connexion à Ollama
+est fermée (génération interrompue, rien n'est enregistré).
+
+Événements :
+    token  {"text": "..."}                 fragment du bilan
+    done   {"copy_id": "...", "length": n} bilan complet enregistré
+    error  {"detail": "..."}               échec (rien n'est enregistré)
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from exams.models import Copy
+from exams.permissions import IsTeacherOrAdmin
+
+logger = logging.getLogger(__name__)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _prepare(request, copy_id):
+    """Authentification, copie et prompt (ORM, synchrone) ; (copie, contexte, prompt) ou réponse d'erreur."""
+    from processing.services.llm_summary import LLMSummaryService
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    if not IsTeacherOrAdmin().has_permission(request, None):
+        return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+
+    copy = Copy.objects.select_related('exam').filter(id=copy_id).first()
+    if copy is None:
+        return JsonResponse({'detail': 'Copie introuvable.'}, status=404)
+    if copy.status != Copy.Status.GRADED:
+        return JsonResponse(
+            {'detail': 'Seules les copies finalisées (GRADED) peuvent avoir un bilan LLM.'}, status=400
+        )
+
+    context = LLMSummaryService._build_context(copy)
+    return copy, context, LLMSummaryService._build_prompt(context)
+
+
+async def _events(copy, context, prompt):
+    from processing.services.llm_summary import LLMSummaryService, get_ollama_client
+
+    # Commentaire SSE : en-têtes envoyés avant le premier fragment (chargement du modèle)
+    yield ": generation\n\n"
+    parts = []
+    try:
+        async for fragment in get_ollama_client().stream(prompt):
+            parts.append(fragment)
+            yield _sse('token', {'text': fragment})
+        summary = ''.join(parts).strip()
+        if not summary:
+            raise ValueError("Réponse LLM vide")
+        await sync_to_async(LLMSummaryService.save_summary)(copy, summary, context)
+    except (asyncio.CancelledError, GeneratorExit):
+        logger.info(f"Bilan LLM en flux annulé pour copie {copy.id} ({len(parts)} fragments reçus)")
+        raise
+    except Exception as e:
+        logger.error(f"Erreur LLM (flux) pour copie {copy.id}: {e}")
+        yield _sse('error', {'detail': f'Erreur LLM: {str(e)[:300]}'})
+        return
+    yield _sse('done', {'copy_id': str(copy.id), 'length': len(summary)})
+
+
+async def copy_summary_stream(request, copy_id):
+    """
+    GET /api/grading/copies/<uuid>/generate-summary/stream/
+    Génère le bilan LLM d'une copie GRADED et le relaie en server-sent events.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    prepared = await sync_to_async(_prepare)(request, copy_id)
+    if isinstance(prepared, JsonResponse):
+        return prepared
+
+    response = StreamingHttpResponse(_events(*prepared), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,4 +1,6 @@
 import multiprocessing
+import os
+import shutil
 
 bind = "0.0.0.0:8000"
 workers = multiprocessing.cpu_count() * 2 + 1
@@ -6,3 +8,12 @@ threads = 2
 # Timeout set to 120s to allow for heavy PDF flattening operations
 timeout = 120
 forwarded_allow_ips = '*'
+
+# /api/metrics/ merges the metrics of all workers through this directory
+# (core.middleware.metrics.MetricsCollector). Inherited by the workers.
+os.environ.setdefault("METRICS_SHARED_DIR", "/tmp/korrigo-metrics")  # nosec B108 - per-container scratch dir
+
+
+def on_starting(server):
+    # Fresh metrics on each (re)start of the master
+    shutil.rmtree(os.environ["METRICS_SHARED_DIR"], ignore_errors=True)
@@ -3,7 +3,6 @@ import base64
 import logging
 from io import BytesIO
 from PIL import Image
-from django.conf import settings
 from students.models import Student
 
 logger = logging.getLogger(__name__)
@@ -42,12 +41,14 @@ class OCRService:
 
         # Crop top 25% of first page
         if booklet.pages_images:
-            first_page = booklet.pages_images[0]
-            full_path = os.path.join(settings.MEDIA_ROOT, first_page)
-            if not os.path.exists(full_path):
-                full_path = first_page
-
-            if os.path.exists(full_path):
+            from processing.services.page_cache import resolve_page_path
+            try:
+                full_path = resolve_page_path(booklet.pages_images[0])
+            except (ValueError, FileNotFoundError) as e:
+                logger.error(f"Header page render failed: {e}")
+                full_path = None
+
+            if full_path and os.path.exists(full_path):
                 try:
                     with Image.open(full_path) as img:
                         w, h = img.size
@@ -0,0 +1,170 @@
+"""
+Booklet Boundary Detector - Propose les coupures entre fascicules d'un scan par lots.
+
+PDFSplitter découpe à pas fixe (exam.pages_per_booklet) : une feuille manquante
+ou doublée décale tous les fascicules suivants. Ce service rend chaque page à très
+basse résolution, détecte l'en-tête (cadre de la zone nom) sur toutes les pages en
+une seule passe NumPy vectorisée, et propose une coupure devant chaque page à en-tête.
+
+Seules les plages confirmées sont ensuite rendues en pleine résolution par
+PDFSplitter.split_exam(exam, boundaries=...).
+"""
+import logging
+import time
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class BookletBoundaryDetector:
+    """
+    Détection des débuts de fascicules sur un PDF entier.
+
+    Critère (équivalent basse résolution de HeaderDetector.detect_header) :
+    dans les `header_band` premiers pourcents de la page, on cherche au moins
+    deux lignes horizontales sombres couvrant `min_rule_fraction` de la largeur
+    et espacées d'au moins `min_box_height` (bords haut/bas du cadre d'en-tête).
+    """
+
+    def __init__(self, dpi=12, header_band=0.2, dark_threshold=200,
+                 min_rule_fraction=0.3, min_box_height=0.02):
+        """
+        Args:
+            dpi (int): Résolution de rendu de la passe de détection.
+            header_band (float): Fraction haute de la page analysée.
+            dark_threshold (int): Niveau de gris sous lequel un pixel est "encre".
+            min_rule_fraction (float): Couverture minimale d'une ligne du cadre.
+            min_box_height (float): Hauteur minimale du cadre (fraction de page).
+        """
+        self.dpi = dpi
+        self.header_band = header_band
+        self.dark_threshold = dark_threshold
+        self.min_rule_fraction = min_rule_fraction
+        self.min_box_height = min_box_height
+
+    def render_thumbnails(self, doc: fitz.Document) -> np.ndarray:
+        """
+        Rend toutes les pages en niveaux de gris à self.dpi.
+
+        Returns:
+            numpy.ndarray: Pile (N, H, W) uint8, toutes les pages ramenées
+            à la taille de la première.
+        """
+        if doc.page_count == 0:
+            return np.empty((0, 0, 0), dtype=np.uint8)
+
+        thumbs = None
+        for index in range(doc.page_count):
+            pix = doc.load_page(index).get_pixmap(dpi=self.dpi, colorspace=fitz.csGRAY, alpha=False)
+            thumb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+            if thumbs is None:
+                thumbs = np.empty((doc.page_count, pix.height, pix.width), dtype=np.uint8)
+            if thumb.shape != thumbs.shape[1:]:
+                thumb = cv2.resize(thumb, (thumbs.shape[2], thumbs.shape[1]), interpolation=cv2.INTER_AREA)
+            thumbs[index] = thumb
+        return thumbs
+
+    def detect_headers(self, thumbs: np.ndarray) -> np.ndarray:
+        """
+        Détection vectorisée de l'en-tête sur une pile de vignettes.
+
+        Args:
+            thumbs (numpy.ndarray): Pile (N, H, W) en niveaux de gris.
+
+        Returns:
+            numpy.ndarray: Booléens (N,), True si la page porte un en-tête.
+        """
+        if thumbs.size == 0:
+            return np.zeros(thumbs.shape[0], dtype=bool)
+
+        height = thumbs.shape[1]
+        band = thumbs[:, :max(1, int(height * self.header_band)), :]
+
+        # Couverture d'encre par ligne de pixels : (N, band_h)
+        row_fill = (band < self.dark_threshold).mean(axis=2)
+        rules = row_fill >= self.min_rule_fraction
+
+        # Un cadre = au moins deux lignes "règle" suffisamment espacées
+        first = np.where(rules.any(axis=1), np.argmax(rules, axis=1), -1)
+        last = np.where(rules.any(axis=1), band.shape[1] - 1 - np.argmax(rules[:, ::-1], axis=1), -1)
+        min_gap = max(1, int(round(height * self.min_box_height)))
+
+        return (first >= 0) & ((last - first) >= min_gap)
+
+    def propose(self, header_flags, expected_pages=None) -> dict:
+        """
+        Construit les fascicules proposés à partir des drapeaux d'en-tête.
+
+        Args:
+            header_flags (Sequence[bool]): En-tête détecté par page (0-based).
+            expected_pages (int | None): Pages attendues par fascicule, pour
+                signaler les fascicules anormaux.
+
+        Returns:
+            dict: {
+                'page_count': int,
+                'header_pages': [int],            # 1-based
+                'booklets': [[start, end], ...],   # 1-based, inclusifs
+                'anomalies': [{'start_page', 'end_page', 'reason'}]
+            }
+        """
+        flags = np.asarray(header_flags, dtype=bool)
+        page_count = int(flags.shape[0])
+        header_pages = (np.flatnonzero(flags) + 1).tolist()
+
+        starts = list(header_pages)
+        anomalies = []
+        if page_count and (not starts or starts[0] != 1):
+            # Pages de tête sans en-tête : on les conserve dans un fascicule
+            # à part plutôt que de les perdre.
+            starts.insert(0, 1)
+            anomalies.append({
+                'start_page': 1,
+                'end_page': (starts[1] - 1) if len(starts) > 1 else page_count,
+                'reason': 'no_header_on_first_page',
+            })
+
+        booklets = []
+        for i, start in enumerate(starts):
+            end = (starts[i + 1] - 1) if i + 1 < len(starts) else page_count
+            booklets.append([start, end])
+            if expected_pages and (end - start + 1) != expected_pages:
+                anomalies.append({
+                    'start_page': start,
+                    'end_page': end,
+                    'reason': 'unexpected_page_count',
+                })
+
+        return {
+            'page_count': page_count,
+            'header_pages': header_pages,
+            'booklets': booklets,
+            'anomalies': anomalies,
+        }
+
+    def detect(self, pdf_path: str, expected_pages=None) -> dict:
+        """
+        Passe complète : rendu basse résolution + détection + proposition.
+
+        Returns:
+            dict: voir propose(), plus 'elapsed_ms'.
+        """
+        started = time.monotonic()
+        doc = fitz.open(pdf_path)
+        try:
+            thumbs = self.render_thumbnails(doc)
+        finally:
+            doc.close()
+
+        proposal = self.propose(self.detect_headers(thumbs), expected_pages=expected_pages)
+        proposal['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+
+        logger.info(
+            f"Boundary detection on {pdf_path}: {proposal['page_count']} pages, "
+            f"{len(proposal['booklets'])} booklets proposed, "
+            f"{len(proposal['anomalies'])} anomalies in {proposal['elapsed_ms']} ms"
+        )
+        return proposal
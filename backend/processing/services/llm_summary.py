@@ -6,26 +6,220 @@ Utilise qwen2.5:32b pour produire un résumé personnalisé à partir de :
 - Annotations visuelles (Annotation)
 - Appréciation générale (Copy.global_appreciation)
 - Note finale
+
+Les appels à Ollama passent par un client HTTP keep-alive : les connexions
+sont réutilisées d'un appel à l'autre. Un lot d'examen appelle le serveur
+avec au plus LLM_SUMMARY_CONCURRENCY générations simultanées ; chaque bilan est
+enregistré par le thread qui l'a obtenu, avec l'empreinte (SHA-256) de son contexte : une régénération forcée ne
+rappelle le LLM que pour les copies dont notes, remarques ou annotations ont
+changé.
 """
+import asyncio
+import hashlib
+import http.client
 import json
 import logging
-import urllib.request
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from django.conf import settings
+from django.db import connections
 from exams.models import Copy
 from grading.models import Score, QuestionRemark, Annotation
 
 logger = logging.getLogger(__name__)
 
-# Configuration Ollama — accessible via Docker network alias
-OLLAMA_URL = getattr(settings, 'OLLAMA_URL', 'http://ollama:11434')
-OLLAMA_MODEL = getattr(settings, 'OLLAMA_MODEL', 'llama3.2:latest')
-OLLAMA_TIMEOUT = getattr(settings, 'OLLAMA_TIMEOUT', 300)
+
+class OllamaClient:
+    """
+    Client de l'API Ollama (/api/generate) à connexions persistantes.
+
+    Les connexions HTTP/1.1 restent ouvertes d'un appel à l'autre dans un pool
+    partagé par les threads ; une connexion réutilisée que le serveur a fermée
+    entre-temps est remplacée une fois.
+    """
+
+    def __init__(self, base_url=None, model=None, timeout=None):
+        self.base_url = (base_url or settings.OLLAMA_URL).rstrip('/')
+        self.model = model or settings.OLLAMA_MODEL
+        self.timeout = timeout or settings.OLLAMA_TIMEOUT
+        parsed = urllib.parse.urlsplit(self.base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parsed.netloc
+        self.path = f"{parsed.path}/api/generate"
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def _post(self, body):
+        while True:
+            with self.lock:
+                reused = bool(self.idle)
+                connection = self.idle.pop() if reused else None
+            if connection is None:
+                connection = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                connection.request('POST', self.path, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                result = response.status, response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused:
+                    # Connexion keep-alive fermée par le serveur entre deux appels
+                    continue
+                raise ConnectionError(f"Impossible de contacter Ollama ({self.base_url}): {e}")
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise ConnectionError(f"Impossible de contacter Ollama ({self.base_url}): {e}")
+            with self.lock:
+                self.idle.append(connection)
+            return result
+
+    def _body(self, prompt, stream=False):
+        return json.dumps({
+            'model': self.model,
+            'prompt': prompt,
+            'stream': stream,
+            'options': {
+                'temperature': 0.7,
+                'top_p': 0.9,
+                'num_predict': 1024,
+            }
+        }).encode('utf-8')
+
+    def generate(self, prompt: str) -> str:
+        """Appelle l'API Ollama et retourne la réponse textuelle."""
+        status, raw = self._post(self._body(prompt))
+        if status != 200:
+            raise ConnectionError(f"Ollama a répondu HTTP {status}: {raw[:200].decode('utf-8', 'replace')}")
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Réponse Ollama invalide: {e}")
+        response_text = data.get('response', '').strip()
+        if not response_text:
+            raise ValueError("Réponse LLM vide")
+        return response_text
+
+    async def stream(self, prompt: str):
+        """
+        Génère en flux ('stream': True) : produit les fragments de texte au fil
+        des lignes NDJSON envoyées par Ollama, sur une connexion asyncio dédiée.
+
+        Fermer le générateur (client parti) ferme la connexion, ce qui arrête
+        la génération côté Ollama.
+        """
+        parsed = urllib.parse.urlsplit(self.base_url)
+        secure = parsed.scheme == 'https'
+        port = parsed.port or (443 if secure else 80)
+        body = self._body(prompt, stream=True)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(parsed.hostname, port, ssl=secure or None), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectionError(f"Impossible de contacter Ollama ({self.base_url}): {e}")
+
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\nHost: {self.netloc}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+            status, headers = await self._read_head(reader)
+            chunks = self._read_body(reader, headers)
+            if status != 200:
+                raw = b''.join([chunk async for chunk in chunks])
+                raise ConnectionError(f"Ollama a répondu HTTP {status}: {raw[:200].decode('utf-8', 'replace')}")
+
+            pending = b''
+            async for chunk in chunks:
+                pending += chunk
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Réponse Ollama invalide: {e}")
+                    if data.get('error'):
+                        raise ValueError(f"Erreur Ollama: {data['error']}")
+                    if data.get('response'):
+                        yield data['response']
+                    if data.get('done'):
+                        return
+            raise ConnectionError("Flux Ollama interrompu avant la fin de la génération")
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            raise ConnectionError(f"Flux Ollama interrompu ({self.base_url}): {e}")
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        status_line = await asyncio.wait_for(reader.readline(), self.timeout)
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ValueError(f"Réponse Ollama invalide: {status_line[:100]!r}")
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if line in (b'\r\n', b'\n', b''):
+                return status, headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_body(self, reader, headers):
+        """Corps de la réponse : chunked, Content-Length ou jusqu'à la fermeture."""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await asyncio.wait_for(reader.readline(), self.timeout)).split(b';')[0], 16)
+                if size == 0:
+                    return
+                chunk = await asyncio.wait_for(reader.readexactly(size + 2), self.timeout)
+                yield chunk[:-2]
+        elif 'content-length' in headers:
+            yield await asyncio.wait_for(reader.readexactly(int(headers['content-length'])), self.timeout)
+        else:
+            while chunk := await asyncio.wait_for(reader.read(65536), self.timeout):
+                yield chunk
+
+    def close(self):
+        with self.lock:
+            connections, self.idle = self.idle, []
+        for connection in connections:
+            connection.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client():
+    """Client partagé par process (recréé si la configuration Ollama change)."""
+    global _client
+    with _client_lock:
+        config = (settings.OLLAMA_URL.rstrip('/'), settings.OLLAMA_MODEL, settings.OLLAMA_TIMEOUT)
+        if _client is None or (_client.base_url, _client.model, _client.timeout) != config:
+            if _client is not None:
+                _client.close()
+            _client = OllamaClient()
+        return _client
+
+
+def context_hash(context: dict) -> str:
+    """Empreinte du contexte d'un bilan (et du modèle qui l'a rédigé)."""
+    payload = json.dumps({'model': settings.OLLAMA_MODEL, 'context': context}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
 
 class LLMSummaryService:
     """
     Génère un bilan personnalisé pour une copie finalisée.
-    Lecture seule sur la DB sauf pour Copy.llm_summary.
+    Lecture seule sur la DB sauf pour Copy.llm_summary et Copy.llm_summary_hash.
     """
 
     @staticmethod
@@ -44,17 +238,21 @@ class LLMSummaryService:
 
         # --- Appel Ollama ---
         try:
-            summary = LLMSummaryService._call_ollama(prompt)
+            summary = get_ollama_client().generate(prompt)
         except Exception as e:
             logger.error(f"Erreur LLM pour copie {copy.id}: {e}")
             raise
 
-        # --- Persister le bilan (seul champ modifié) ---
-        copy.llm_summary = summary
-        copy.save(update_fields=['llm_summary'])
+        LLMSummaryService.save_summary(copy, summary, context)
+        return summary
 
+    @staticmethod
+    def save_summary(copy: Copy, summary: str, context: dict):
+        """Persiste le bilan et l'empreinte de son contexte (seuls champs modifiés)."""
+        copy.llm_summary = summary
+        copy.llm_summary_hash = context_hash(context)
+        copy.save(update_fields=['llm_summary', 'llm_summary_hash'])
         logger.info(f"Bilan LLM généré pour copie {copy.id} ({len(summary)} chars)")
-        return summary
 
     @staticmethod
     def _build_context(copy: Copy) -> dict:
@@ -195,74 +393,83 @@ class LLMSummaryService:
         return prompt
 
     @staticmethod
-    def _call_ollama(prompt: str) -> str:
-        """Appelle l'API Ollama et retourne la réponse textuelle."""
-        payload = json.dumps({
-            'model': OLLAMA_MODEL,
-            'prompt': prompt,
-            'stream': False,
-            'options': {
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'num_predict': 1024,
-            }
-        }).encode('utf-8')
+    def generate_batch(exam_id: str, force: bool = False, exclude=(), on_progress=None) -> dict:
+        """
+        Génère les bilans LLM pour toutes les copies GRADED d'un examen.
 
-        url = f"{OLLAMA_URL}/api/generate"
-        req = urllib.request.Request(
-            url,
-            data=payload,
-            headers={'Content-Type': 'application/json'}
-        )
+        Si force=False, ne régénère pas les bilans déjà existants. Si
+        force=True, ne régénère que les bilans dont le contexte a changé
+        (empreinte différente de Copy.llm_summary_hash).
+        Les contextes sont construits dans le thread appelant ; les appels
+        Ollama sont parallélisés (LLM_SUMMARY_CONCURRENCY) et chaque bilan est
+        enregistré dans le thread qui l'a obtenu. Si le thread appelant est
+        interrompu (SoftTimeLimitExceeded), les appels en attente sont annulés
+        et l'exception est propagée : les bilans déjà obtenus sont enregistrés.
 
-        try:
-            resp = urllib.request.urlopen(req, timeout=OLLAMA_TIMEOUT)
-            data = json.loads(resp.read())
-            response_text = data.get('response', '').strip()
-            if not response_text:
-                raise ValueError("Réponse LLM vide")
-            return response_text
-        except urllib.error.URLError as e:
-            raise ConnectionError(f"Impossible de contacter Ollama ({OLLAMA_URL}): {e}")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Réponse Ollama invalide: {e}")
+        Args:
+            exclude: ids de copies à ne pas traiter (reprise d'un job)
+            on_progress: appelé avec le détail de chaque copie traitée, dès
+                qu'il est connu (sous verrou, depuis les threads du pool)
 
-    @staticmethod
-    def generate_batch(exam_id: str, force: bool = False) -> dict:
-        """
-        Génère les bilans LLM pour toutes les copies GRADED d'un examen.
-        Si force=False, ne régénère pas les bilans déjà existants.
         Retourne un dict avec les compteurs success/skip/error.
         """
         from exams.models import Exam
         exam = Exam.objects.get(id=exam_id)
-        copies = Copy.objects.filter(exam=exam, status=Copy.Status.GRADED)
+        copies = Copy.objects.filter(exam=exam, status=Copy.Status.GRADED).select_related('exam')
+        if exclude:
+            copies = copies.exclude(id__in=list(exclude))
 
         stats = {'success': 0, 'skipped': 0, 'errors': 0, 'details': []}
-
+        counters = {'ok': 'success', 'skipped': 'skipped', 'error': 'errors'}
+        lock = threading.Lock()
+
+        def record(copy, status, **extra):
+            entry = {'copy_id': str(copy.id), 'anonymous_id': copy.anonymous_id, 'status': status, **extra}
+            with lock:
+                stats[counters[status]] += 1
+                stats['details'].append(entry)
+                if on_progress is not None:
+                    on_progress(entry)
+
+        pending = []
         for copy in copies:
             if not force and copy.llm_summary:
-                stats['skipped'] += 1
+                record(copy, 'skipped')
+                continue
+            context = LLMSummaryService._build_context(copy)
+            digest = context_hash(context)
+            if copy.llm_summary and copy.llm_summary_hash == digest:
+                record(copy, 'skipped')
                 continue
+            pending.append((copy, digest, LLMSummaryService._build_prompt(context)))
 
+        def summarize(client, copy, digest, prompt):
             try:
-                summary = LLMSummaryService.generate_summary(copy)
-                stats['success'] += 1
-                stats['details'].append({
-                    'copy_id': str(copy.id),
-                    'anonymous_id': copy.anonymous_id,
-                    'status': 'ok',
-                    'length': len(summary),
-                })
+                summary = client.generate(prompt)
+                # Écritures sérialisées (SQLite n'accepte qu'un écrivain à la fois)
+                with lock:
+                    Copy.objects.filter(pk=copy.pk).update(llm_summary=summary, llm_summary_hash=digest)
+                record(copy, 'ok', length=len(summary))
             except Exception as e:
-                stats['errors'] += 1
-                stats['details'].append({
-                    'copy_id': str(copy.id),
-                    'anonymous_id': copy.anonymous_id,
-                    'status': 'error',
-                    'error': str(e)[:200],
-                })
                 logger.error(f"Bilan LLM échoué pour {copy.id}: {e}")
+                record(copy, 'error', detail=str(e)[:200])
+            finally:
+                # Connexion ouverte par ce thread du pool
+                connections.close_all()
+
+        if pending:
+            client = get_ollama_client()
+            workers = max(1, min(settings.LLM_SUMMARY_CONCURRENCY, len(pending)))
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-summary')
+            try:
+                futures = [pool.submit(summarize, client, *item) for item in pending]
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Pas d'attente des appels restants : ceux en cours s'enregistrent seuls
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            pool.shutdown()
 
         logger.info(
             f"Batch LLM terminé pour {exam.name}: "
@@ -0,0 +1,231 @@
+"""
+Page Cache Service - Rendu des pages à la demande (render-on-read).
+
+En mode paresseux (settings.LAZY_PAGE_RENDERING), les rasteriseurs
+(PDFSplitter._extract_pages, GradingService._rasterize_pdf) n'écrivent plus de
+PNG : Booklet.pages_images contient des références "pdf:<source>#<index>"
+(chemin du PDF source relatif à MEDIA_ROOT + index de page 0-based).
+
+La page est rendue la première fois qu'elle est demandée, puis conservée dans
+un cache disque borné (settings.PAGE_CACHE_MAX_BYTES) avec éviction LRU
+(horodatage mtime rafraîchi à chaque lecture).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LAZY_REF_PREFIX = 'pdf:'
+
+# Taille approximative par racine de cache, maintenue par process pour éviter
+# un parcours complet du répertoire à chaque rendu.
+_approx_sizes = {}
+_sizes_lock = threading.Lock()
+
+
+def make_page_ref(source_name: str, page_index: int) -> str:
+    """Construit une référence paresseuse vers une page d'un PDF source."""
+    return f"{LAZY_REF_PREFIX}{source_name}#{page_index}"
+
+
+def is_lazy_ref(ref) -> bool:
+    return isinstance(ref, str) and ref.startswith(LAZY_REF_PREFIX)
+
+
+def parse_page_ref(ref: str):
+    """
+    Returns:
+        tuple[str, int]: (source relative à MEDIA_ROOT, index 0-based)
+
+    Raises:
+        ValueError: référence mal formée.
+    """
+    if not is_lazy_ref(ref):
+        raise ValueError(f"Not a lazy page reference: {ref!r}")
+    source_name, sep, index = ref[len(LAZY_REF_PREFIX):].rpartition('#')
+    if not sep or not source_name or not index.isdigit():
+        raise ValueError(f"Malformed page reference: {ref!r}")
+    return source_name, int(index)
+
+
+def lazy_page_refs(source_name: str, page_indices) -> list:
+    """Références paresseuses pour une série de pages d'un même PDF."""
+    return [make_page_ref(source_name, i) for i in page_indices]
+
+
+def resolve_page_path(ref: str) -> str:
+    """
+    Chemin absolu d'une image de page, quelle que soit sa forme de stockage.
+
+    - Référence paresseuse : rendue via PageCache si nécessaire.
+    - Chemin relatif à MEDIA_ROOT (mode historique), ou chemin absolu.
+    """
+    if is_lazy_ref(ref):
+        return PageCache().get_or_render(ref)
+    full_path = os.path.join(settings.MEDIA_ROOT, ref)
+    if not os.path.exists(full_path):
+        full_path = ref  # absolute path fallback
+    return full_path
+
+
+def upcoming_page_refs(booklet, index: int, user, count: int) -> list:
+    """
+    Références paresseuses des `count` pages qui suivent `index` dans le lot
+    du correcteur : fin du fascicule, fascicules suivants de la copie, puis
+    copies suivantes qui lui sont assignées (ordre d'anonymat).
+    """
+    from exams.models import Copy
+
+    if count <= 0:
+        return []
+
+    upcoming = list((booklet.pages_images or [])[index + 1:index + 1 + count])
+
+    copy = booklet.assigned_copy.select_related('exam').first()
+    if copy is not None and len(upcoming) < count:
+        for other in copy.booklets.filter(start_page__gt=booklet.start_page).order_by('start_page'):
+            upcoming.extend(other.pages_images or [])
+            if len(upcoming) >= count:
+                break
+
+        if len(upcoming) < count and user is not None:
+            next_copies = Copy.objects.filter(
+                exam=copy.exam,
+                assigned_corrector=user,
+                status=Copy.Status.READY,
+                anonymous_id__gt=copy.anonymous_id,
+            ).order_by('anonymous_id').prefetch_related('booklets')
+            for next_copy in next_copies[:count]:
+                for other in sorted(next_copy.booklets.all(), key=lambda b: b.start_page):
+                    upcoming.extend(other.pages_images or [])
+                if len(upcoming) >= count:
+                    break
+
+    return [ref for ref in upcoming[:count] if is_lazy_ref(ref)]
+
+
+class PageCache:
+    """
+    Cache disque des pages rendues, borné en taille, éviction LRU.
+    """
+
+    # Après éviction, on redescend à cette fraction du plafond pour ne pas
+    # ré-évincer à chaque rendu suivant.
+    EVICTION_LOW_WATERMARK = 0.9
+
+    def __init__(self, root=None, max_bytes=None, dpi=None):
+        self.root = root or getattr(settings, 'PAGE_CACHE_ROOT', None) \
+            or os.path.join(settings.MEDIA_ROOT, 'page_cache')
+        self.max_bytes = max_bytes if max_bytes is not None else settings.PAGE_CACHE_MAX_BYTES
+        self.dpi = dpi or settings.PAGE_RENDER_DPI
+
+    def path_for(self, ref: str) -> str:
+        key = hashlib.sha256(f"{ref}@{self.dpi}".encode()).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def get(self, ref: str):
+        """Chemin de la page en cache (et rafraîchit son rang LRU), ou None."""
+        path = self.path_for(ref)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_render(self, ref: str) -> str:
+        return self.get(ref) or self.render(ref)
+
+    def render(self, ref: str) -> str:
+        """
+        Rend la page référencée et l'enregistre dans le cache.
+
+        Raises:
+            ValueError: référence invalide ou page hors limites.
+            FileNotFoundError: PDF source absent.
+        """
+        source_name, page_index = parse_page_ref(ref)
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        source_path = os.path.realpath(os.path.join(media_root, source_name))
+        if not source_path.startswith(media_root + os.sep):
+            raise ValueError(f"Page reference outside MEDIA_ROOT: {ref!r}")
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"PDF not found: {source_path}")
+
+        with fitz.open(source_path) as doc:
+            if page_index < 0 or page_index >= doc.page_count:
+                raise ValueError(f"Page {page_index} out of range for {source_name}")
+            png_bytes = doc.load_page(page_index).get_pixmap(dpi=self.dpi).tobytes("png")
+
+        path = self.path_for(ref)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un rendu concurrent de la même page ne produit
+        # jamais de fichier tronqué.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(png_bytes)
+        os.replace(tmp_path, path)
+
+        logger.debug(f"Rendered {ref} to page cache ({len(png_bytes)} bytes)")
+        self._account(len(png_bytes))
+        return path
+
+    def _iter_entries(self):
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def size(self) -> int:
+        return sum(size for _path, size, _mtime in self._iter_entries())
+
+    def _account(self, added: int):
+        with _sizes_lock:
+            current = _approx_sizes.get(self.root)
+            if current is None:
+                current = self.size()
+            else:
+                current += added
+            _approx_sizes[self.root] = current
+        if current > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_bytes=None) -> int:
+        """
+        Supprime les pages les moins récemment lues jusqu'à passer sous
+        target_bytes (défaut : EVICTION_LOW_WATERMARK × max_bytes).
+
+        Returns:
+            int: octets libérés.
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * self.EVICTION_LOW_WATERMARK)
+
+        entries = sorted(self._iter_entries(), key=lambda e: e[2])
+        total = sum(size for _path, size, _mtime in entries)
+        freed = 0
+        for path, size, _mtime in entries:
+            if total - freed <= target_bytes:
+                break
+            try:
+                os.unlink(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+
+        with _sizes_lock:
+            _approx_sizes[self.root] = total - freed
+        if freed:
+            logger.info(f"Page cache eviction: freed {freed} bytes ({self.root})")
+        return freed
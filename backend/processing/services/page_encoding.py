@@ -0,0 +1,296 @@
+"""
+Page Encoding Service - Stockage compact des images de pages.
+
+Les scans de copies sont en pratique presque toujours en niveaux de gris, voire
+noir et blanc. Les enregistrer en PNG RVB triple (au moins) la taille sur disque
+sans aucun gain de lisibilité.
+
+Avant l'écriture, un test d'histogramme NumPy (sur un sous-échantillon de la
+page) classe chaque page :
+
+- 'color'   : au moins une fraction notable de pixels chromatiques (encre de
+              couleur) -> RVB ;
+- 'gray'    : canaux R, G, B quasi identiques -> 8 bits niveaux de gris ;
+- 'bilevel' : niveaux de gris sans demi-teintes -> 1 bit.
+
+Le codec (settings.PAGE_IMAGE_CODEC) est 'png', 'webp' (sans perte) ou 'auto'
+(les deux sont essayés, le plus petit est gardé). Le format retenu est noté par
+page sous la forme "<mode>/<codec>" (Booklet.pages_formats).
+"""
+import io
+import logging
+import os
+import tempfile
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MODE_COLOR = 'color'
+MODE_GRAY = 'gray'
+MODE_BILEVEL = 'bilevel'
+
+CODEC_PNG = 'png'
+CODEC_WEBP = 'webp'
+CODEC_AUTO = 'auto'
+
+# Tags EXIF XResolution / YResolution / ResolutionUnit : le WebP n'a pas de
+# champ de résolution natif, on la conserve pour retrouver la taille de page.
+_EXIF_XRES, _EXIF_YRES, _EXIF_RES_UNIT = 282, 283, 296
+
+_PIL_MODES = {'1': MODE_BILEVEL, 'L': MODE_GRAY}
+
+EncodedPage = namedtuple('EncodedPage', ['data', 'extension', 'format'])
+PageImage = namedtuple('PageImage', ['path', 'format'])
+
+
+def page_format(mode: str, codec: str) -> str:
+    return f"{mode}/{codec}"
+
+
+def classify_page(image: np.ndarray, color_tolerance=None, color_fraction=None,
+                  bilevel_max_midtones=None, sample_step=4) -> str:
+    """
+    Classe une page d'après son histogramme.
+
+    Args:
+        image (numpy.ndarray): Page (H, W, 3|4) RVB(A) ou (H, W) niveaux de gris.
+        color_tolerance (int): Écart max entre canaux d'un pixel "gris".
+        color_fraction (float): Part de pixels chromatiques au-delà de laquelle
+            la page est en couleur (tolère le bruit de numérisation).
+        bilevel_max_midtones (float): Part max de demi-teintes (64-191) pour
+            une page noir et blanc.
+        sample_step (int): Pas de sous-échantillonnage de l'analyse.
+
+    Returns:
+        str: MODE_COLOR, MODE_GRAY ou MODE_BILEVEL.
+    """
+    if color_tolerance is None:
+        color_tolerance = settings.PAGE_IMAGE_COLOR_TOLERANCE
+    if color_fraction is None:
+        color_fraction = settings.PAGE_IMAGE_COLOR_FRACTION
+    if bilevel_max_midtones is None:
+        bilevel_max_midtones = settings.PAGE_IMAGE_BILEVEL_MAX_MIDTONES
+
+    sample = image[::sample_step, ::sample_step]
+    if sample.size == 0:
+        return MODE_GRAY
+
+    if sample.ndim == 3:
+        rgb = sample[..., :3]
+        spread = rgb.max(axis=2) - rgb.min(axis=2)
+        if np.count_nonzero(spread > color_tolerance) > color_fraction * spread.size:
+            return MODE_COLOR
+        gray = rgb[..., 1]  # canaux quasi égaux : le vert suffit pour l'histogramme
+    else:
+        gray = sample
+
+    hist = np.bincount(gray.ravel(), minlength=256)
+    midtones = hist[64:192].sum() / gray.size
+    return MODE_BILEVEL if midtones <= bilevel_max_midtones else MODE_GRAY
+
+
+def to_pil(image: np.ndarray, mode: str) -> Image.Image:
+    """Convertit une page RVB(A)/gris en image PIL dans le mode de stockage."""
+    if image.ndim == 3:
+        if mode == MODE_COLOR:
+            return Image.fromarray(np.ascontiguousarray(image[..., :3]), 'RGB')
+        code = cv2.COLOR_RGBA2GRAY if image.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        gray = cv2.cvtColor(np.ascontiguousarray(image), code)
+    else:
+        gray = image
+
+    if mode == MODE_BILEVEL:
+        return Image.fromarray(np.where(gray >= 128, 255, 0).astype(np.uint8), 'L').convert(
+            '1', dither=Image.Dither.NONE
+        )
+    return Image.fromarray(np.ascontiguousarray(gray), 'L')
+
+
+def _encode(img: Image.Image, codec: str, dpi) -> bytes:
+    buffer = io.BytesIO()
+    if codec == CODEC_WEBP:
+        exif = Image.Exif()
+        if dpi:
+            exif[_EXIF_XRES], exif[_EXIF_YRES], exif[_EXIF_RES_UNIT] = float(dpi[0]), float(dpi[1]), 2
+        if img.mode == '1':
+            img = img.convert('L')
+        img.save(buffer, format='WEBP', lossless=True, exif=exif.tobytes())
+    else:
+        img.save(buffer, format='PNG', dpi=dpi or (72, 72))
+    return buffer.getvalue()
+
+
+def encode_page(image: np.ndarray, codec=None, dpi=None, mode=None) -> EncodedPage:
+    """
+    Encode une page dans son format le plus compact.
+
+    Args:
+        image (numpy.ndarray): Page RVB(A) ou niveaux de gris.
+        codec (str | None): 'png', 'webp' ou 'auto' (défaut: settings.PAGE_IMAGE_CODEC).
+        dpi (tuple | None): Résolution conservée dans le fichier.
+        mode (str | None): Mode imposé (défaut: classify_page).
+
+    Returns:
+        EncodedPage: (octets, extension sans point, "<mode>/<codec>").
+    """
+    codec = codec or settings.PAGE_IMAGE_CODEC
+    mode = mode or classify_page(image)
+    img = to_pil(image, mode)
+
+    candidates = [CODEC_PNG, CODEC_WEBP] if codec == CODEC_AUTO else [codec]
+    best = None
+    for candidate in candidates:
+        data = _encode(img, candidate, dpi)
+        if best is None or len(data) < len(best[0]):
+            best = (data, candidate)
+
+    data, chosen = best
+    return EncodedPage(data, chosen, page_format(mode, chosen))
+
+
+def pixmap_to_rgb(pix) -> np.ndarray:
+    """Vue ndarray (H, W, n) sur les échantillons d'un fitz.Pixmap."""
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_page_pixmap(pix, path_stem: str, codec=None) -> PageImage:
+    """
+    Enregistre un pixmap de page au format compact.
+
+    Args:
+        pix (fitz.Pixmap): Page rendue.
+        path_stem (str): Chemin de destination sans extension.
+
+    Returns:
+        PageImage: (chemin écrit, format). Si l'encodage compact échoue, la page
+        est enregistrée en PNG tel que rendu (format None) : une page n'est
+        jamais perdue pour une question de compression.
+    """
+    try:
+        encoded = encode_page(pixmap_to_rgb(pix), codec=codec, dpi=(pix.xres, pix.yres))
+    except Exception as e:
+        logger.warning(f"Compact page encoding failed for {path_stem}, saving raw PNG: {e}")
+        path = f"{path_stem}.png"
+        pix.save(path)
+        return PageImage(path, None)
+
+    path = f"{path_stem}.{encoded.extension}"
+    _write_atomic(path, encoded.data)
+    return PageImage(path, encoded.format)
+
+
+def read_dpi(img: Image.Image):
+    """Résolution d'une image PIL (PNG pHYs ou EXIF pour le WebP), ou None."""
+    dpi = img.info.get('dpi')
+    if dpi:
+        return tuple(float(v) for v in dpi)
+    exif = img.getexif()
+    if _EXIF_XRES in exif and _EXIF_YRES in exif:
+        return float(exif[_EXIF_XRES]), float(exif[_EXIF_YRES])
+    return None
+
+
+def _describe(img: Image.Image) -> str:
+    return page_format(
+        _PIL_MODES.get(img.mode, MODE_COLOR),
+        CODEC_WEBP if img.format == 'WEBP' else CODEC_PNG,
+    )
+
+
+def page_formats_for(pages) -> list:
+    """
+    Format de stockage de chaque page, lu dans l'en-tête des fichiers (sans
+    décodage). None pour les références paresseuses et les fichiers illisibles.
+
+    Args:
+        pages (list[str]): Booklet.pages_images.
+    """
+    from processing.services.page_cache import is_lazy_ref
+
+    formats = []
+    for ref in pages:
+        page_fmt = None
+        if not is_lazy_ref(ref):
+            try:
+                with Image.open(os.path.join(settings.MEDIA_ROOT, ref)) as img:
+                    page_fmt = _describe(img)
+            except (OSError, ValueError):
+                pass
+        formats.append(page_fmt)
+    return formats
+
+
+def open_page_image(path: str):
+    """
+    Ouvre une image de page avec PyMuPDF.
+
+    MuPDF ne lit pas le WebP : ces pages sont converties en PNG en mémoire
+    (résolution conservée) avant ouverture.
+
+    Returns:
+        fitz.Document
+    """
+    import fitz  # PyMuPDF
+
+    if not path.lower().endswith('.webp'):
+        return fitz.open(path)
+
+    with Image.open(path) as img:
+        dpi = read_dpi(img)
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', dpi=dpi or (72, 72))
+    return fitz.open("png", buffer.getvalue())
+
+
+def transcode_page_file(full_path: str, codec=None, dry_run=False) -> dict:
+    """
+    Ré-encode une image de page existante dans son format compact.
+
+    Le nouveau fichier n'est écrit que s'il est plus petit. Quand l'extension
+    change (PNG -> WebP), l'ancien fichier est conservé : l'appelant le
+    supprime une fois la référence en base mise à jour.
+
+    Returns:
+        dict: {'path', 'new_path', 'format', 'old_bytes', 'new_bytes', 'changed'}
+        ('format' décrit le fichier conservé) ou {'path', 'error'}.
+    """
+    try:
+        old_bytes = os.path.getsize(full_path)
+        with Image.open(full_path) as img:
+            dpi = read_dpi(img)
+            current_format = _describe(img)
+            if img.mode not in ('1', 'L', 'RGB', 'RGBA'):
+                img = img.convert('RGB')
+            image = np.asarray(img.convert('L') if img.mode == '1' else img)
+        encoded = encode_page(image, codec=codec, dpi=dpi)
+    except Exception as e:
+        return {'path': full_path, 'error': str(e)}
+
+    result = {
+        'path': full_path,
+        'new_path': full_path,
+        'format': current_format,
+        'old_bytes': old_bytes,
+        'new_bytes': old_bytes,
+        'changed': False,
+    }
+    if len(encoded.data) >= old_bytes:
+        return result
+
+    new_path = f"{os.path.splitext(full_path)[0]}.{encoded.extension}"
+    if not dry_run:
+        _write_atomic(new_path, encoded.data)
+    result.update(new_path=new_path, format=encoded.format, new_bytes=len(encoded.data), changed=True)
+    return result
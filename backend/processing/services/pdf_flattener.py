@@ -9,6 +9,8 @@ from django.conf import settings
 from django.core.files import File
 from grading.models import Annotation, Score, QuestionRemark
 from exams.models import Copy
+from processing.services.page_cache import resolve_page_path
+from processing.services.page_encoding import open_page_image
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,11 +22,25 @@ class PDFFlattener:
     Étape 3 : Conforme ADR-002 (coordonnées normalisées).
     """
 
-    def flatten_copy(self, copy: Copy):
+    MODE_AUTO = 'auto'
+    MODE_RASTER = 'raster'
+    MODE_VECTOR = 'vector'
+
+    def __init__(self, mode=None):
+        """
+        Args:
+            mode (str | None): 'auto' (vectoriel si la copie a un PDF source
+                compatible, sinon raster), 'raster' ou 'vector'.
+                Défaut : settings.FINAL_PDF_MODE.
+        """
+        self.mode = mode or getattr(settings, 'FINAL_PDF_MODE', self.MODE_AUTO)
+
+    def flatten_copy(self, copy: Copy, mode=None):
         """
         Génère un PDF final pour la copie donnée.
         1. Crée un nouveau PDF.
-        2. Ajoute chaque page (image PNG) du fascicule.
+        2. Ajoute chaque page : page vectorielle du PDF source (copy.pdf_source)
+           quand c'est possible, sinon image PNG du fascicule.
         3. Dessine les annotations avec dénormalisation coordonnées (ADR-002).
         4. Ajoute une page de synthèse avec scores.
         5. Retourne les bytes du PDF final (sans side-effects DB).
@@ -32,8 +48,86 @@ class PDFFlattener:
         NOTE: Le statut de la copy est géré par GradingService.finalize_copy(),
         pas ici (respect de la séparation des responsabilités).
         """
+        mode = mode or self.mode
         doc = fitz.open()
 
+        # Charger toutes les annotations, indexées par page (0-based)
+        annotations_by_page = {}
+        for annotation in copy.annotations.all().order_by('page_index'):
+            annotations_by_page.setdefault(annotation.page_index, []).append(annotation)
+
+        source = None
+        if mode != self.MODE_RASTER:
+            source = self._open_vector_source(copy)
+            if source is None and mode == self.MODE_VECTOR:
+                raise ValueError("Copy has no source PDF compatible with vector finalize")
+
+        if source is not None:
+            try:
+                self._add_source_pages(doc, source, annotations_by_page)
+            finally:
+                source.close()
+        else:
+            self._add_raster_pages(doc, copy, annotations_by_page)
+
+        # Ajouter page de synthèse
+        self._add_summary_page(doc, copy)
+
+        # Sauvegarder le PDF en mémoire
+        output_filename = f"copy_{copy.id}_corrected.pdf"
+        pdf_bytes = doc.write()
+        doc.close()
+
+        logger.info(
+            f"Copy {copy.id} flattened successfully: {output_filename} "
+            f"({'vector' if source is not None else 'raster'}, {len(pdf_bytes)} bytes)"
+        )
+        return pdf_bytes
+
+    def _open_vector_source(self, copy: Copy):
+        """
+        Ouvre copy.pdf_source si les pages affichées au correcteur en sont
+        issues une à une (imports INDIVIDUAL_A4 / CopyImportView).
+        Retourne None pour les fascicules BATCH_A3 (pas de PDF source propre
+        à la copie) ou si le nombre de pages ne correspond pas.
+        """
+        if not copy.pdf_source:
+            return None
+
+        try:
+            copy.pdf_source.open()
+            try:
+                pdf_bytes = copy.pdf_source.read()
+            finally:
+                copy.pdf_source.close()
+            source = fitz.open("pdf", pdf_bytes)
+        except Exception as e:
+            logger.warning(f"Copy {copy.id}: source PDF unusable for vector finalize ({e}), using raster path")
+            return None
+
+        displayed_pages = sum(len(b.pages_images or []) for b in copy.booklets.all())
+        if displayed_pages and displayed_pages != source.page_count:
+            logger.warning(
+                f"Copy {copy.id}: {displayed_pages} page images vs {source.page_count} source pages, "
+                f"using raster path"
+            )
+            source.close()
+            return None
+        return source
+
+    def _add_source_pages(self, doc, source, annotations_by_page):
+        """Compose les pages vectorielles d'origine et y dessine les annotations."""
+        for page_idx in range(source.page_count):
+            src_rect = source[page_idx].rect
+            page = doc.new_page(width=src_rect.width, height=src_rect.height)
+            page.show_pdf_page(page.rect, source, page_idx)
+
+            page_annotations = annotations_by_page.get(page_idx)
+            if page_annotations:
+                self._draw_annotations_on_page(page, page_annotations, page.rect.width, page.rect.height)
+
+    def _add_raster_pages(self, doc, copy, annotations_by_page):
+        """Chemin historique : une page PDF par image PNG des fascicules."""
         # Récupérer les images des pages
         all_pages_images = []
         for booklet in copy.booklets.all().order_by('start_page'):
@@ -44,20 +138,21 @@ class PDFFlattener:
             logger.warning(f"Copy {copy.id} has no pages to flatten.")
             raise ValueError("No pages found to flatten")
 
-        # Charger toutes les annotations
-        annotations = list(copy.annotations.all().order_by('page_index'))
-
         # Traiter chaque page
         for page_idx, img_path in enumerate(all_pages_images):
-            # Construire chemin complet
-            full_path = os.path.join(settings.MEDIA_ROOT, img_path) if not img_path.startswith('/') else img_path
+            # Construire chemin complet (rend la page si référence paresseuse)
+            try:
+                full_path = resolve_page_path(img_path)
+            except (ValueError, FileNotFoundError) as e:
+                logger.error(f"Page render failed for {img_path}: {e}")
+                continue
 
             if not os.path.exists(full_path):
                 logger.error(f"Image not found: {full_path}")
                 continue
 
             # Ouvrir l'image et la convertir en page PDF
-            img = fitz.open(full_path)
+            img = open_page_image(full_path)
             rect = img[0].rect
             pdfbytes = img.convert_to_pdf()
             img.close()
@@ -67,23 +162,11 @@ class PDFFlattener:
             page.show_pdf_page(rect, img_pdf, 0)
 
             # Filtrer annotations pour cette page (page_index 0-based)
-            page_annotations = [a for a in annotations if a.page_index == page_idx]
+            page_annotations = annotations_by_page.get(page_idx)
 
             if page_annotations:
                 self._draw_annotations_on_page(page, page_annotations, rect.width, rect.height)
 
-        # Ajouter page de synthèse
-        self._add_summary_page(doc, copy)
-
-        # Sauvegarder le PDF dans un fichier temporaire (storage-agnostic)
-        # Sauvegarder le PDF en mémoire
-        output_filename = f"copy_{copy.id}_corrected.pdf"
-        pdf_bytes = doc.write()
-        doc.close()
-
-        logger.info(f"Copy {copy.id} flattened successfully: {output_filename}")
-        return pdf_bytes
-
     def _draw_annotations_on_page(self, page, annotations, page_width, page_height):
         """
         Dessine les annotations sur une page PDF.
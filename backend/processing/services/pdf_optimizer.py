@@ -0,0 +1,96 @@
+"""
+Post-traitement des PDF finaux : garbage collection, compression des flux,
+fusion des objets dupliqués et linéarisation ("fast web view").
+
+Un PDF linéarisé place la première page et sa table de références en tête de
+fichier : un lecteur qui fait des requêtes Range (pdf.js) affiche la page 1
+sans attendre la fin du téléchargement.
+"""
+import logging
+import time
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PDFOptimizer:
+    """
+    Réécrit un PDF avec les options de sauvegarde PyMuPDF.
+
+    Options (défauts : settings.FINAL_PDF_*) :
+        garbage (int): 0-4. 3 fusionne les objets dupliqués, 4 compare aussi
+            le contenu des flux (ressources d'images/polices répétées).
+        deflate (bool): compression des flux non compressés (y compris
+            images et polices).
+        linear (bool): sortie linéarisée.
+    """
+
+    def __init__(self, garbage=None, deflate=None, linear=None):
+        self.garbage = settings.FINAL_PDF_GARBAGE if garbage is None else garbage
+        self.deflate = settings.FINAL_PDF_DEFLATE if deflate is None else deflate
+        self.linear = settings.FINAL_PDF_LINEARIZE if linear is None else linear
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return getattr(settings, 'FINAL_PDF_OPTIMIZE', True)
+
+    def optimize(self, pdf_bytes):
+        """
+        Args:
+            pdf_bytes (bytes): PDF d'entrée.
+
+        Returns:
+            tuple[bytes, dict]: (PDF optimisé, métriques). En cas d'échec,
+            le PDF d'entrée est renvoyé tel quel et les métriques portent
+            la clé 'skipped'.
+        """
+        if not isinstance(pdf_bytes, (bytes, bytearray)) or not pdf_bytes.startswith(b'%PDF'):
+            return pdf_bytes, {'skipped': 'not_a_pdf'}
+
+        started = time.perf_counter()
+        try:
+            with fitz.open("pdf", pdf_bytes) as doc:
+                try:
+                    output = self._write(doc, linear=self.linear)
+                    linearized = self.linear
+                except (RuntimeError, ValueError) as e:
+                    # Linéarisation non supportée par la version de MuPDF :
+                    # on garde les autres optimisations.
+                    if not self.linear:
+                        raise
+                    logger.warning(f"PDF linearization unavailable, saving without it: {e}")
+                    output = self._write(doc, linear=False)
+                    linearized = False
+        except Exception as e:
+            logger.warning(f"PDF optimization skipped: {e}")
+            return pdf_bytes, {'skipped': type(e).__name__}
+
+        stats = {
+            'input_bytes': len(pdf_bytes),
+            'output_bytes': len(output),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'garbage': self.garbage,
+            'deflate': self.deflate,
+            'linearized': linearized,
+        }
+        return output, stats
+
+    def _write(self, doc, linear):
+        return doc.tobytes(
+            garbage=self.garbage,
+            clean=True,
+            deflate=self.deflate,
+            deflate_images=self.deflate,
+            deflate_fonts=self.deflate,
+            linear=linear,
+        )
+
+    @staticmethod
+    def is_linearized(pdf_bytes) -> bool:
+        try:
+            with fitz.open("pdf", pdf_bytes) as doc:
+                return bool(doc.is_fast_webaccess)
+        except Exception:
+            return False
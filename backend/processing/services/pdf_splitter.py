@@ -9,6 +9,8 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from django.db import transaction
 from exams.models import Exam, Booklet
+from processing.services.page_cache import lazy_page_refs
+from processing.services.page_encoding import page_formats_for, save_page_pixmap
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +24,7 @@ class PDFSplitter:
     2. Calcule le nombre de booklets (total_pages // pages_per_booklet)
     3. Pour chaque booklet:
        - Crée un objet Booklet avec start_page, end_page
-       - Extrait chaque page individuelle en PNG
+       - Extrait chaque page individuelle (PNG RVB, gris ou 1 bit selon la page)
        - Stocke les chemins dans booklet.pages_images
 
     Idempotence: Si les booklets existent déjà pour cet exam, skip.
@@ -38,11 +40,22 @@ class PDFSplitter:
         self.dpi = dpi
 
     @transaction.atomic
-    def split_exam(self, exam: Exam, force=False):
+    def split_exam(self, exam: Exam, force=False, boundaries=None, ignored_pages=None):
         """
         Découpe le PDF de l'examen en booklets.
         Adapte le nombre de pages en fonction de exam.pages_per_booklet.
         Gère les reliquats (pages restantes).
+
+        Args:
+            exam: Examen à découper
+            force (bool): Ignore le contrôle d'idempotence
+            boundaries (list[[int, int]] | None): Plages confirmées (1-based,
+                inclusives), typiquement issues de BookletBoundaryDetector.
+                Quand fourni, remplace le découpage à pas fixe et seules ces
+                pages sont rendues en pleine résolution.
+            ignored_pages (list[int] | None): Pages hors de tout fascicule
+                (1-based), à déclarer explicitement : une page ni couverte ni
+                ignorée est refusée (voir validate_boundaries).
         """
         # Idempotence check
         if not force and exam.booklets.exists():
@@ -61,18 +74,26 @@ class PDFSplitter:
         doc = fitz.open(pdf_path)
         total_pages = doc.page_count
         ppb = exam.pages_per_booklet or self.pages_per_booklet
-        
-        # Calculate chunks (ceil division)
-        booklets_count = (total_pages + ppb - 1) // ppb
+
+        if boundaries is not None:
+            try:
+                ranges = self.validate_boundaries(boundaries, total_pages, ignored_pages or ())
+            except ValueError:
+                doc.close()
+                raise
+        else:
+            # Calculate chunks (ceil division)
+            ranges = [
+                (i * ppb + 1, min((i + 1) * ppb, total_pages))  # 1-based, clamped to total
+                for i in range((total_pages + ppb - 1) // ppb)
+            ]
+        booklets_count = len(ranges)
 
         logger.info(f"Total pages: {total_pages}, Pages/Booklet: {ppb}, Expected Booklets: {booklets_count}")
 
         booklets_created = []
 
-        for i in range(booklets_count):
-            start_page = i * ppb + 1  # 1-based
-            end_page = min((i + 1) * ppb, total_pages) # Clamp to total
-
+        for i, (start_page, end_page) in enumerate(ranges):
             logger.info(f"Creating booklet {i+1}/{booklets_count}: pages {start_page}-{end_page}")
 
             # Créer le booklet
@@ -90,10 +111,13 @@ class PDFSplitter:
                 # We could mark it as suspicious if needed, but for now we just log ensuring no data loss.
             
             # Extraire les pages
-            pages_images = self._extract_pages(doc, start_page, end_page, exam.id, booklet.id)
+            pages_images = self._extract_pages(
+                doc, start_page, end_page, exam.id, booklet.id, source_name=exam.pdf_source.name
+            )
 
             # Sauvegarder les chemins
             booklet.pages_images = pages_images
+            booklet.pages_formats = page_formats_for(pages_images)
             booklet.save()
 
             booklets_created.append(booklet)
@@ -109,9 +133,63 @@ class PDFSplitter:
         logger.info(f"PDF split complete for exam {exam.id}: {len(booklets_created)} booklets created")
         return booklets_created
 
-    def _extract_pages(self, doc: fitz.Document, start_page: int, end_page: int, exam_id, booklet_id):
+    @staticmethod
+    def validate_boundaries(boundaries, total_pages, ignored_pages=()):
+        """
+        Vérifie des plages de fascicules fournies par l'appelant.
+
+        Chaque page du PDF doit être soit dans une plage, soit dans
+        `ignored_pages` (page blanche, intercalaire...) : un trou non déclaré
+        ferait disparaître des pages de copie sans avertissement.
+
+        Returns:
+            list[tuple[int, int]]: Plages triées (1-based, inclusives).
+
+        Raises:
+            ValueError: plage hors limites, inversée ou chevauchante, page non
+                couverte et non ignorée, ou page ignorée couverte par une plage.
+        """
+        ranges = []
+        for bounds in boundaries:
+            try:
+                start_page, end_page = (int(b) for b in bounds)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid booklet range: {bounds!r}")
+            if start_page < 1 or end_page > total_pages or start_page > end_page:
+                raise ValueError(f"Booklet range {start_page}-{end_page} out of bounds (1-{total_pages})")
+            ranges.append((start_page, end_page))
+
+        ranges.sort()
+        for (_, prev_end), (next_start, _) in zip(ranges, ranges[1:]):
+            if next_start <= prev_end:
+                raise ValueError(f"Overlapping booklet ranges around page {next_start}")
+
+        try:
+            ignored = {int(page) for page in ignored_pages}
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid ignored pages: {ignored_pages!r}")
+        all_pages = set(range(1, total_pages + 1))
+        covered = set()
+        for start_page, end_page in ranges:
+            covered.update(range(start_page, end_page + 1))
+        if ignored - all_pages:
+            raise ValueError(f"Ignored pages out of bounds (1-{total_pages}): {sorted(ignored - all_pages)}")
+        if ignored & covered:
+            raise ValueError(f"Ignored pages inside a booklet range: {sorted(ignored & covered)}")
+        missing = all_pages - covered - ignored
+        if missing:
+            raise ValueError(f"Pages not in any booklet range and not marked as ignored: {sorted(missing)}")
+        return ranges
+
+    def _extract_pages(self, doc: fitz.Document, start_page: int, end_page: int, exam_id, booklet_id,
+                       source_name=None):
         """
-        Extrait les pages individuelles d'un booklet en PNG.
+        Extrait les pages individuelles d'un booklet, chacune dans son format
+        compact (processing.services.page_encoding).
+
+        En mode settings.LAZY_PAGE_RENDERING, aucune page n'est rendue : on
+        retourne des références (PDF source, index) résolues à la lecture
+        par processing.services.page_cache.
 
         Args:
             doc: PyMuPDF Document
@@ -119,10 +197,16 @@ class PDFSplitter:
             end_page (int): Page de fin (1-based)
             exam_id: UUID de l'exam
             booklet_id: UUID du booklet
+            source_name (str | None): Nom du PDF source relatif à MEDIA_ROOT
+                (requis pour le mode paresseux)
 
         Returns:
-            list[str]: Liste des chemins relatifs à MEDIA_ROOT
+            list[str]: Liste des chemins relatifs à MEDIA_ROOT (ou références paresseuses)
         """
+        last_page = min(end_page, doc.page_count)
+        if settings.LAZY_PAGE_RENDERING and source_name:
+            return lazy_page_refs(source_name, range(start_page - 1, last_page))
+
         pages_paths = []
 
         # Créer le dossier de destination
@@ -141,15 +225,11 @@ class PDFSplitter:
             # Render page to pixmap
             pix = page.get_pixmap(dpi=self.dpi)
 
-            # Filename: page_001.png, page_002.png, etc.
-            filename = f"page_{page_num:03d}.png"
-            output_path = output_dir / filename
-
-            # Save PNG
-            pix.save(str(output_path))
+            # Filename: page_001.png, page_002.png, etc. (.webp selon le codec)
+            saved = save_page_pixmap(pix, str(output_dir / f"page_{page_num:03d}"))
 
             # Stocker le chemin relatif à MEDIA_ROOT
-            relative_path = str(output_path.relative_to(settings.MEDIA_ROOT))
+            relative_path = str(Path(saved.path).relative_to(settings.MEDIA_ROOT))
             pages_paths.append(relative_path)
 
             logger.debug(f"Extracted page {page_num} to {relative_path}")
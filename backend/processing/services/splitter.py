@@ -1,98 +1,149 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 from django.utils.translation import gettext_lazy as _
 from .vision import HeaderDetector
 
+logger = logging.getLogger(__name__)
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    Convertit un fitz.Pixmap en ndarray BGR (ou niveaux de gris) sans passer
+    par un encodage PNG/JPEG intermédiaire.
+    """
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n == 1:
+        return arr[:, :, 0].copy()
+    if pix.n == 4:
+        return cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
+    # cvtColor copie le buffer : le ndarray survit à la libération du pixmap
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = 150):
+    """
+    Rasterise les pages d'un PDF une par une et les produit sous forme de ndarray.
+
+    Le rendu reste séquentiel (PyMuPDF n'est pas thread-safe sur un même
+    document) ; une seule page est matérialisée à la fois.
+
+    Yields:
+        tuple[int, numpy.ndarray]: (index de page 0-based, image BGR)
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index in range(doc.page_count):
+            pix = doc.load_page(page_index).get_pixmap(dpi=dpi, alpha=False)
+            yield page_index, pixmap_to_array(pix)
+    finally:
+        doc.close()
+
+
 class A3Splitter:
     """
     Service responsable du découpage des scans A3 en pages individuelles A4
     et de la reconstruction de l'ordre logique des pages (Recto/Verso).
+
+    Toute la chaîne travaille sur des ndarray en mémoire : aucune image
+    intermédiaire n'est écrite sur disque.
     """
 
-    def __init__(self):
-        self.detector = HeaderDetector()
+    def __init__(self, max_workers=None):
+        """
+        Args:
+            max_workers (int | None): Threads utilisés pour la détection d'en-tête
+                dans process_scans (None = défaut de ThreadPoolExecutor).
+        """
+        self.detector = HeaderDetector(max_workers=max_workers)
+        self.max_workers = max_workers
 
     def process_scan(self, image_path: str):
         """
         Découpe une image A3 en deux A4 et détermine si c'est un Recto ou un Verso.
-        
+
         Args:
             image_path (str): Chemin vers le scan A3.
-            
+
+        Returns:
+            dict: voir process_image.
+        """
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(_("Impossible de lire l'image : ") + image_path)
+
+        return self.process_image(image)
+
+    def process_image(self, image: np.ndarray, has_header=None):
+        """
+        Variante en mémoire de process_scan.
+
+        Args:
+            image (numpy.ndarray): Scan A3 (BGR ou niveaux de gris).
+            has_header (bool | None): Résultat de détection déjà calculé
+                (utilisé par process_scans) ; None = détecter ici.
+
         Returns:
             dict: {
                 'type': 'RECTO' | 'VERSO' | 'UNKNOWN',
-                'left_page': numpy.ndarray,
-                'right_page': numpy.ndarray,
+                'pages': {'p1': ndarray, 'p4': ndarray} | {'p2': ndarray, 'p3': ndarray},
                 'has_header': bool
             }
         """
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(_("Impossible de lire l'image : ") + image_path)
+        left_crop, right_crop = self.split_halves(image)
 
-        height, width, channels = image.shape
-        
-        # Patch C: Functional Split with tempfile
-        import tempfile
-        import os
-
-        # Découpage vertical strict à 50%
-        mid_x = width // 2
-        left_crop = image[:, :mid_x]
-        right_crop = image[:, mid_x:]
-
-        # Create localized temp file for detection
-        # We need check right crop for Header
-        fd, temp_path = tempfile.mkstemp(suffix=".jpg")
-        os.close(fd) # Close handle so cv2 can write
-        
         try:
-             # Logic is delegated to determine_scan_type_and_order
-             # which writes to temp_path and calls detector
-             result = self.determine_scan_type_and_order(left_crop, right_crop, temp_path)
-             
-             # Enrich result with crops if needed by caller (optional but good for debug)
-             # But the contract says 'type' + 'pages'
-             result['has_header'] = (result['type'] == 'RECTO')
-             return result
-             
+            result = self.determine_scan_type_and_order(left_crop, right_crop, has_header=has_header)
+            result['has_header'] = (result['type'] == 'RECTO')
+            return result
+
         except Exception as e:
-             # Fallback
-             return {
-                 'type': 'UNKNOWN',
-                 'left': left_crop,
-                 'right': right_crop,
-                 'error': str(e)
-             }
-        finally:
-             if os.path.exists(temp_path):
-                 os.unlink(temp_path)
-
-    def determine_scan_type_and_order(self, left_img, right_img, temp_right_path: str) -> dict:
+            # Fallback
+            return {
+                'type': 'UNKNOWN',
+                'left': left_crop,
+                'right': right_crop,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def split_halves(image: np.ndarray):
+        """
+        Découpage vertical strict à 50%.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: (gauche, droite) — vues sans copie.
+        """
+        mid_x = image.shape[1] // 2
+        return image[:, :mid_x], image[:, mid_x:]
+
+    def determine_scan_type_and_order(self, left_img, right_img, has_header=None) -> dict:
         """
         Détermine si le scan est Recto ou Verso en cherchant un en-tête à droite.
-        
+
         Args:
             left_img: Image de gauche (Page 4 ou Page 2)
             right_img: Image de droite (Page 1 ou Page 3)
-            temp_right_path: Chemin temporaire de l'image de droite pour le détecteur
-        
+            has_header: Résultat de détection pré-calculé (None = détecter)
+
         Returns:
             dict: {
                 'type': 'RECTO' or 'VERSO',
                 'pages': {
-                   'p1': img, 'p4': img 
+                   'p1': img, 'p4': img
                 } OR {
                    'p2': img, 'p3': img
                 }
             }
         """
-        # Sauvegarder temp_right pour la détection
-        cv2.imwrite(temp_right_path, right_img)
-        
-        is_recto = self.detector.detect_header(temp_right_path)
-        
+        is_recto = self.detector.detect_header(right_img) if has_header is None else has_header
+
         if is_recto:
             # HEADER FOUND ON RIGHT -> RECTO
             # Structure A3 Recto: [Page 4 | Page 1 (Header)]
@@ -124,3 +175,93 @@ class A3Splitter:
             verso_data['pages']['p3'], # Page 3
             recto_data['pages']['p4']  # Page 4
         ]
+
+    def process_scans(self, pdf_path: str, dpi: int = 150, window=None):
+        """
+        Traite un lot complet de scans A3 (un PDF) et reconstruit les fascicules.
+
+        Les pages sont rasterisées une à une (iter_pdf_pages), la détection
+        d'en-tête tourne dans un pool de threads, et au plus `window` scans
+        sont gardés en mémoire en attendant leur résultat. Chaque fascicule est
+        produit dès que son verso est apparié : l'appelant l'écrit puis le
+        libère, la mémoire ne dépend pas de la taille du lot.
+
+        Un fascicule = un RECTO suivi d'un VERSO. Les scans qui ne s'apparient
+        pas (recto sans verso, verso orphelin) sont produits comme anomalies.
+
+        Args:
+            pdf_path (str): PDF du lot de scans A3.
+            dpi (int): Résolution de rendu.
+            window (int | None): Nombre maximum de scans en vol (défaut: 2 × threads).
+
+        Yields:
+            tuple[str, dict]: dans l'ordre des pages,
+                ('booklet', {'pages': [P1, P2, P3, P4], 'source_pages': [recto_idx, verso_idx]})
+                ('anomaly', {'page_index': int, 'type': str, 'reason': str})
+        """
+        ready = deque()
+        pending_recto = None  # (page_index, scan_data)
+        counts = {'booklet': 0, 'anomaly': 0}
+
+        def consume(page_index, scan):
+            nonlocal pending_recto
+            if scan['type'] == 'RECTO':
+                if pending_recto is not None:
+                    ready.append(('anomaly', {
+                        'page_index': pending_recto[0],
+                        'type': 'RECTO',
+                        'reason': 'recto_without_verso',
+                    }))
+                pending_recto = (page_index, scan)
+            elif pending_recto is None:
+                ready.append(('anomaly', {
+                    'page_index': page_index,
+                    'type': scan['type'],
+                    'reason': 'verso_without_recto',
+                }))
+            else:
+                recto_index, recto = pending_recto
+                ready.append(('booklet', {
+                    'pages': self.reconstruct_booklet(recto, scan),
+                    'source_pages': [recto_index, page_index],
+                }))
+                pending_recto = None
+
+        def drain():
+            while ready:
+                kind, item = ready.popleft()
+                counts[kind] += 1
+                yield kind, item
+
+        workers = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+        window = window or 2 * workers
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+
+            for page_index, image in iter_pdf_pages(pdf_path, dpi=dpi):
+                _, right = self.split_halves(image)
+                in_flight.append((page_index, image, pool.submit(self.detector.detect_header, right)))
+
+                while len(in_flight) >= window:
+                    idx, img, future = in_flight.popleft()
+                    consume(idx, self.process_image(img, has_header=future.result()))
+                    yield from drain()
+
+            while in_flight:
+                idx, img, future = in_flight.popleft()
+                consume(idx, self.process_image(img, has_header=future.result()))
+                yield from drain()
+
+        if pending_recto is not None:
+            ready.append(('anomaly', {
+                'page_index': pending_recto[0],
+                'type': 'RECTO',
+                'reason': 'recto_without_verso',
+            }))
+            yield from drain()
+
+        logger.info(
+            f"A3 batch {pdf_path}: {counts['booklet']} booklets reconstructed, "
+            f"{counts['anomaly']} anomalies"
+        )
@@ -0,0 +1,77 @@
+"""
+Détection du sujet (A/B) d'une copie d'après la référence imprimée en pied de
+dernière page (annexe). Convention : BBMATHS... = Sujet A, BBMATH... (sans S) = Sujet B.
+
+La couche texte du pied de page est lue en premier (gratuit pour un PDF
+numérique) ; l'OCR n'est lancé qu'en repli, sur la seule bande de pied de page
+rendue en niveaux de gris. Les fonctions sont de niveau module pour être
+exécutées dans un pool de processus (exams.tasks.detect_subject_variants).
+"""
+import logging
+import re
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# Fraction basse de la dernière page où se trouve la référence
+FOOTER_RATIO = 0.15
+OCR_DPI = 150
+# Délai maximal de lecture d'une copie dans le pool de processus (secondes)
+COPY_TIMEOUT = 120
+
+
+def parse_variant(text):
+    """'A', 'B' ou None selon la référence trouvée dans `text`."""
+    compact = re.sub(r'[^A-Z0-9]', '', (text or '').upper())
+    if 'BBMATHS' in compact:
+        return 'A'
+    if 'BBMATH' in compact:
+        return 'B'
+    return None
+
+
+def footer_clip(page, ratio=FOOTER_RATIO):
+    rect = page.rect
+    return fitz.Rect(rect.x0, rect.y1 - rect.height * ratio, rect.x1, rect.y1)
+
+
+def ocr_footer(page, clip, dpi=OCR_DPI):
+    """OCR de la bande `clip`, rendue seule en niveaux de gris."""
+    import pytesseract
+    from PIL import Image
+
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    image = Image.frombytes('L', (pix.width, pix.height), pix.samples)
+    return pytesseract.image_to_string(image, lang="eng")
+
+
+def read_reference(pdf_path):
+    """
+    Lit la référence du pied de la dernière page de `pdf_path`.
+
+    Returns:
+        dict: {'variant': 'A'|'B'|None, 'method': 'text'|'ocr', 'text': str}
+    """
+    with fitz.open(pdf_path) as doc:
+        page = doc[-1]
+        clip = footer_clip(page)
+        text = page.get_text("text", clip=clip)
+        variant = parse_variant(text)
+        if variant:
+            return {'variant': variant, 'method': 'text', 'text': text.strip()}
+        text = ocr_footer(page, clip)
+    return {'variant': parse_variant(text), 'method': 'ocr', 'text': text.strip()}
+
+
+def detect_copy_variant(item):
+    """
+    (copy_id, pdf_path) -> résultat de read_reference avec 'copy_id',
+    ou {'copy_id', 'detail'} en cas d'erreur.
+    """
+    copy_id, pdf_path = item
+    try:
+        return {'copy_id': copy_id, **read_reference(pdf_path)}
+    except Exception as e:
+        logger.error(f"Détection du sujet impossible pour copie {copy_id}: {e}")
+        return {'copy_id': copy_id, 'detail': str(e)[:200]}
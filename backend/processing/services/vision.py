@@ -1,78 +1,129 @@
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from django.utils.translation import gettext_lazy as _
 
 class HeaderDetector:
     """
     Service responsable de la détection des en-têtes de copies via Vision par Ordinateur.
     Respecte la contrainte : "Absence de QR Code, détection visuelle".
+
+    Les méthodes acceptent indifféremment un chemin de fichier ou une image
+    déjà décodée (numpy.ndarray BGR ou niveaux de gris) afin d'éviter les
+    allers-retours disque/JPEG dans les pipelines en mémoire.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, max_workers=None):
+        """
+        Args:
+            max_workers (int | None): Nombre de threads pour detect_headers
+                (OpenCV libère le GIL, le parallélisme par threads est efficace).
+        """
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _load(image):
+        """Retourne un ndarray à partir d'un chemin ou d'un ndarray."""
+        if isinstance(image, np.ndarray):
+            return image
+        loaded = cv2.imread(image)
+        if loaded is None:
+            raise ValueError(_("Impossible de lire l'image : ") + str(image))
+        return loaded
 
-    def detect_header(self, image_path: str) -> bool:
+    @staticmethod
+    def _to_gray(image: np.ndarray) -> np.ndarray:
+        if image.ndim == 2:
+            return image
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    def detect_header(self, image) -> bool:
         """
         Détecte si une page contient l'en-tête spécifique du Lycée.
         
         Args:
-            image_path (str): Chemin vers le fichier image de la page.
+            image (str | numpy.ndarray): Chemin vers le fichier image de la page,
+                ou image déjà chargée.
             
         Returns:
             bool: Vrai si l'en-tête est détecté, Faux sinon.
         """
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(_("Impossible de lire l'image : ") + image_path)
-
-            height, width, channels = image.shape
-            
-            # Logic Placeholder : Détection de contour rectangulaire dans le top 20%
-            # On se concentre sur la partie supérieure
-            top_crop = image[0:int(height * 0.2), :]
-            
-            gray = cv2.cvtColor(top_crop, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            edged = cv2.Canny(blurred, 50, 150)
-            
-            contours, hierarchy = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                # Approximation du contour
-                peri = cv2.arcLength(contour, True)
-                approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-                
-                # Si le contour a 4 points, c'est potentiellement notre en-tête
-                if len(approx) == 4:
-                    # Vérification de l'aire pour éviter le bruit
-                    area = cv2.contourArea(contour)
-                    if area > (width * height * 0.01): # Arbitraire 1% de l'aire
-                        return True
-                        
-            return False
-
+            return self.detect_header_array(self._load(image))
         except Exception as e:
             # En production, logger l'erreur
             print(f"{_('Erreur lors de la détection')}: {e}")
             return False
 
-    def extract_header_crop(self, image_path: str) -> bytes:
+    def detect_header_array(self, image: np.ndarray) -> bool:
+        """
+        Détection d'en-tête sur une image en mémoire (aucun accès disque).
+
+        Args:
+            image (numpy.ndarray): Page BGR (H, W, 3) ou niveaux de gris (H, W).
+
+        Returns:
+            bool: Vrai si l'en-tête est détecté, Faux sinon.
+        """
+        height, width = image.shape[:2]
+
+        # Logic Placeholder : Détection de contour rectangulaire dans le top 20%
+        # On se concentre sur la partie supérieure
+        top_crop = image[0:int(height * 0.2), :]
+
+        gray = self._to_gray(top_crop)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        edged = cv2.Canny(blurred, 50, 150)
+
+        contours, hierarchy = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        for contour in contours:
+            # Approximation du contour
+            peri = cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
+
+            # Si le contour a 4 points, c'est potentiellement notre en-tête
+            if len(approx) == 4:
+                # Vérification de l'aire pour éviter le bruit
+                area = cv2.contourArea(contour)
+                if area > (width * height * 0.01): # Arbitraire 1% de l'aire
+                    return True
+
+        return False
+
+    def detect_headers(self, images, max_workers=None) -> list:
+        """
+        Détecte les en-têtes sur une série de pages en parallèle (pool de threads).
+
+        Args:
+            images (Iterable[str | numpy.ndarray]): Pages à analyser.
+            max_workers (int | None): Surcharge de self.max_workers.
+
+        Returns:
+            list[bool]: Résultat par page, dans l'ordre d'entrée.
+        """
+        images = list(images)
+        if not images:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as pool:
+            return list(pool.map(self.detect_header, images))
+
+    def extract_header_crop(self, image) -> bytes:
         """
         Extrait la zone où l'élève inscrit son nom pour l'interface "Agrafeuse".
         
         Args:
-            image_path (str): Chemin vers l'image complète.
+            image (str | numpy.ndarray): Chemin vers l'image complète, ou image chargée.
             
         Returns:
             bytes: Contenu de l'image rognée (format JPEG).
         """
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(_("Image introuvable"))
+            image = self._load(image)
 
-            height, width, channels = image.shape
+            height = image.shape[0]
             
             # Placeholder: On prend arbitrairement le top 15% centré
             # En réalité, utiliser les coordonnées du contour détecté par detect_header
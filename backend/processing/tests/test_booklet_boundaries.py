@@ -0,0 +1,83 @@
+import time
+
+import fitz
+import numpy as np
+import pytest
+
+from processing.services.booklet_boundaries import BookletBoundaryDetector
+from processing.services.pdf_splitter import PDFSplitter
+
+
+def _make_batch(path, layout):
+    """A4 batch PDF; 'H' pages carry a header box, '.' pages are plain answer pages."""
+    doc = fitz.open()
+    for kind in layout:
+        page = doc.new_page(width=595, height=842)
+        if kind == 'H':
+            page.draw_rect(fitz.Rect(40, 30, 555, 110), color=(0, 0, 0), width=3)
+        page.insert_text((60, 300), "Réponse manuscrite", fontsize=11)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_detect_headers_vectorized():
+    detector = BookletBoundaryDetector()
+    thumbs = np.full((3, 140, 100), 255, dtype=np.uint8)
+    thumbs[0, 5, 10:90] = 0
+    thumbs[0, 20, 10:90] = 0
+    thumbs[2, 5, 10:90] = 0  # single rule: not a box
+
+    assert detector.detect_headers(thumbs).tolist() == [True, False, False]
+
+
+def test_detect_proposes_cuts_at_headers(tmp_path):
+    # Second booklet is missing a sheet: a fixed 4-page split would shift everything after it
+    pdf_path = _make_batch(tmp_path / "batch.pdf", "H..." "H." "H..." "H...")
+
+    proposal = BookletBoundaryDetector().detect(pdf_path, expected_pages=4)
+
+    assert proposal['page_count'] == 14
+    assert proposal['header_pages'] == [1, 5, 7, 11]
+    assert proposal['booklets'] == [[1, 4], [5, 6], [7, 10], [11, 14]]
+    assert proposal['anomalies'] == [{'start_page': 5, 'end_page': 6, 'reason': 'unexpected_page_count'}]
+
+
+def test_propose_keeps_leading_pages_without_header():
+    proposal = BookletBoundaryDetector().propose([False, True, False])
+
+    assert proposal['booklets'] == [[1, 1], [2, 3]]
+    assert proposal['anomalies'][0]['reason'] == 'no_header_on_first_page'
+
+
+def test_validate_boundaries_rejects_overlap():
+    assert PDFSplitter.validate_boundaries([[5, 8], [1, 4]], 8) == [(1, 4), (5, 8)]
+    with pytest.raises(ValueError):
+        PDFSplitter.validate_boundaries([[1, 4], [4, 6]], 8)
+    with pytest.raises(ValueError):
+        PDFSplitter.validate_boundaries([[1, 9]], 8)
+
+
+def test_validate_boundaries_requires_gaps_to_be_ignored():
+    with pytest.raises(ValueError, match=r"\[5, 6\]"):
+        PDFSplitter.validate_boundaries([[1, 4], [7, 8]], 8)
+    with pytest.raises(ValueError):
+        PDFSplitter.validate_boundaries([[1, 4]], 8, ignored_pages=[5, 6, 7])
+    assert PDFSplitter.validate_boundaries([[1, 4], [7, 8]], 8, ignored_pages=[5, 6]) == [(1, 4), (7, 8)]
+    # Page ignorée mais couverte, ou hors du PDF
+    with pytest.raises(ValueError):
+        PDFSplitter.validate_boundaries([[1, 8]], 8, ignored_pages=[4])
+    with pytest.raises(ValueError):
+        PDFSplitter.validate_boundaries([[1, 8]], 8, ignored_pages=[9])
+
+
+@pytest.mark.slow
+def test_detection_pass_500_pages_is_fast(tmp_path):
+    pdf_path = _make_batch(tmp_path / "big.pdf", "H..." * 125)
+
+    started = time.monotonic()
+    proposal = BookletBoundaryDetector().detect(pdf_path, expected_pages=4)
+    elapsed = time.monotonic() - started
+
+    assert len(proposal['booklets']) == 125
+    assert elapsed < 5.0
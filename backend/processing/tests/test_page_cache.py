@@ -0,0 +1,72 @@
+import os
+import time
+
+import fitz
+import pytest
+
+from processing.services import page_cache
+from processing.services.page_cache import (
+    PageCache, make_page_ref, parse_page_ref, resolve_page_path,
+)
+
+
+@pytest.fixture
+def source_pdf(mock_media):
+    os.makedirs(os.path.join(mock_media, 'copies', 'source'))
+    doc = fitz.open()
+    for i in range(5):
+        doc.new_page(width=200, height=280).insert_text((20, 40), f"Page {i}")
+    doc.save(os.path.join(mock_media, 'copies', 'source', 'copy.pdf'))
+    doc.close()
+    page_cache._approx_sizes.clear()
+    return 'copies/source/copy.pdf'
+
+
+def test_parse_page_ref_roundtrip():
+    ref = make_page_ref('exams/source/a#b.pdf', 12)
+    assert parse_page_ref(ref) == ('exams/source/a#b.pdf', 12)
+    with pytest.raises(ValueError):
+        parse_page_ref('pdf:exams/source/a.pdf')
+
+
+def test_render_on_first_read_then_hit(settings, source_pdf):
+    cache = PageCache(dpi=36)
+    ref = make_page_ref(source_pdf, 2)
+
+    assert cache.get(ref) is None
+    path = cache.get_or_render(ref)
+    assert os.path.exists(path)
+    assert cache.get(ref) == path
+    with fitz.open(path) as img:
+        assert img[0].rect.width == pytest.approx(100, abs=1)
+
+
+def test_render_rejects_out_of_range_and_traversal(settings, source_pdf):
+    cache = PageCache(dpi=36)
+    with pytest.raises(ValueError):
+        cache.render(make_page_ref(source_pdf, 99))
+    with pytest.raises(ValueError):
+        cache.render(make_page_ref('../../etc/passwd', 0))
+
+
+def test_lru_eviction_under_size_cap(settings, source_pdf):
+    probe = PageCache(dpi=36, root=os.path.join(settings.MEDIA_ROOT, 'probe'))
+    page_size = os.path.getsize(probe.render(make_page_ref(source_pdf, 0)))
+
+    cache = PageCache(dpi=36, max_bytes=int(page_size * 3.5))
+    refs = [make_page_ref(source_pdf, i) for i in range(5)]
+    for i, ref in enumerate(refs[:3]):
+        path = cache.render(ref)
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(refs[0])  # page 0 becomes most recently used
+
+    cache.render(refs[3])
+    cache.render(refs[4])
+
+    assert cache.size() <= cache.max_bytes
+    assert cache.get(refs[0]) is not None
+    assert cache.get(refs[1]) is None
+
+
+def test_resolve_page_path_handles_media_paths(settings, source_pdf):
+    assert resolve_page_path(source_pdf) == os.path.join(settings.MEDIA_ROOT, source_pdf)
@@ -0,0 +1,122 @@
+import os
+from io import BytesIO, StringIO
+
+import fitz
+import numpy as np
+import pytest
+from django.core.management import call_command
+from PIL import Image
+
+from exams.models import Booklet, Exam
+from processing.services.page_encoding import (
+    MODE_BILEVEL, MODE_COLOR, MODE_GRAY, classify_page, encode_page,
+    open_page_image, save_page_pixmap,
+)
+
+
+def _page(kind, height=400, width=300):
+    """Page blanche avec un bloc de texte simulé (noir, gris anticrénelé ou rouge)."""
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    page[50:150, 40:260] = 0
+    if kind == 'gray':
+        page[200:300, 40:260] = np.linspace(0, 255, 220, dtype=np.uint8)[None, :, None]
+    elif kind == 'color':
+        page[200:300, 40:260] = (220, 30, 30)
+    return page
+
+
+def test_classify_page_by_histogram():
+    assert classify_page(_page('bilevel')) == MODE_BILEVEL
+    assert classify_page(_page('gray')) == MODE_GRAY
+    assert classify_page(_page('color')) == MODE_COLOR
+    # Bruit de numérisation isolé : reste une page grise
+    noisy = _page('gray')
+    noisy[0, 0] = (255, 0, 0)
+    assert classify_page(noisy) == MODE_GRAY
+
+
+@pytest.mark.parametrize('kind, mode', [('bilevel', '1'), ('gray', 'L'), ('color', 'RGB')])
+def test_encode_page_uses_compact_mode(settings, kind, mode):
+    settings.PAGE_IMAGE_CODEC = 'png'
+    encoded = encode_page(_page(kind), dpi=(150, 150))
+
+    assert encoded.extension == 'png'
+    assert encoded.format == f"{classify_page(_page(kind))}/png"
+    with Image.open(BytesIO(encoded.data)) as img:
+        assert img.mode == mode
+    if kind != 'color':
+        rgb = encode_page(_page(kind), mode=MODE_COLOR)
+        assert len(encoded.data) < len(rgb.data)
+
+
+def test_webp_page_keeps_page_size_in_pymupdf(tmp_path):
+    path = tmp_path / 'page.webp'
+    path.write_bytes(encode_page(_page('gray'), codec='webp', dpi=(150, 150)).data)
+
+    with open_page_image(str(path)) as img:
+        # 300 px @ 150 dpi = 144 pt
+        assert img[0].rect.width == pytest.approx(144, abs=1)
+
+
+def test_save_page_pixmap_from_render(tmp_path, settings):
+    settings.PAGE_IMAGE_CODEC = 'png'
+    doc = fitz.open()
+    doc.new_page(width=200, height=280).insert_text((20, 40), "Nom : Dupont")
+    pix = doc[0].get_pixmap(dpi=72)
+    doc.close()
+
+    saved = save_page_pixmap(pix, str(tmp_path / 'page_001'))
+    assert saved.path.endswith('page_001.png')
+    assert saved.format in ('gray/png', 'bilevel/png')
+    with fitz.open(saved.path) as img:
+        assert img[0].rect.width == pytest.approx(200, abs=1)
+
+
+@pytest.mark.django_db
+def test_transcode_command_rewrites_pages_and_reports_savings(mock_media, settings):
+    settings.PAGE_IMAGE_CODEC = 'png'
+    exam = Exam.objects.create(name='Transcode', date='2026-01-01')
+    os.makedirs(os.path.join(mock_media, 'booklets', 'legacy'))
+    pages = []
+    for i, kind in enumerate(['bilevel', 'gray', 'color']):
+        rel = f'booklets/legacy/page_{i:03d}.png'
+        Image.fromarray(_page(kind), 'RGB').save(os.path.join(mock_media, rel))
+        pages.append(rel)
+    booklet = Booklet.objects.create(exam=exam, start_page=1, end_page=3, pages_images=pages)
+    before = sum(os.path.getsize(os.path.join(mock_media, p)) for p in pages)
+
+    out = StringIO()
+    call_command('transcode_page_images', '--dry-run', '--workers', '1', stdout=out)
+    booklet.refresh_from_db()
+    assert booklet.pages_formats == []
+    assert 'saved' in out.getvalue()
+
+    out = StringIO()
+    call_command('transcode_page_images', '--workers', '1', stdout=out)
+    booklet.refresh_from_db()
+    assert booklet.pages_formats == ['bilevel/png', 'gray/png', 'color/png']
+    after = sum(os.path.getsize(os.path.join(mock_media, p)) for p in booklet.pages_images)
+    assert after < before
+    assert f"({before - after} saved)" in out.getvalue()
+
+    # Formats enregistrés : rien à refaire sans --force
+    out = StringIO()
+    call_command('transcode_page_images', '--workers', '1', stdout=out)
+    assert '0 pages scanned' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_transcode_command_to_webp_replaces_files(mock_media, settings):
+    exam = Exam.objects.create(name='Transcode WebP', date='2026-01-01')
+    os.makedirs(os.path.join(mock_media, 'booklets', 'legacy'))
+    rel = 'booklets/legacy/page_000.png'
+    Image.fromarray(_page('gray'), 'RGB').save(os.path.join(mock_media, rel))
+    booklet = Booklet.objects.create(exam=exam, start_page=1, end_page=1, pages_images=[rel])
+
+    call_command('transcode_page_images', '--codec', 'webp', '--workers', '1', stdout=StringIO())
+
+    booklet.refresh_from_db()
+    assert booklet.pages_images == ['booklets/legacy/page_000.webp']
+    assert booklet.pages_formats == ['gray/webp']
+    assert not os.path.exists(os.path.join(mock_media, rel))
+    assert os.path.exists(os.path.join(mock_media, booklet.pages_images[0]))
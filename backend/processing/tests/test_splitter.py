@@ -2,6 +2,7 @@
 import pytest
 import numpy as np
 from unittest.mock import MagicMock, patch
+from processing.services import splitter as splitter_service
 from processing.services.splitter import A3Splitter
 
 @pytest.fixture
@@ -34,3 +35,96 @@ def test_process_scan_verso(splitter, mock_image):
             assert result['has_header'] is False
             assert 'p2' in result['pages']
             assert 'p3' in result['pages']
+
+def _page_with_header(height=400, width=300):
+    """Blank page with a filled rectangle in the top 20% (header box)."""
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    page[10:60, 30:270] = 0
+    return page
+
+def test_detect_header_accepts_array():
+    from processing.services.vision import HeaderDetector
+    detector = HeaderDetector()
+
+    assert detector.detect_header(_page_with_header()) is True
+    assert detector.detect_header(np.full((400, 300, 3), 255, dtype=np.uint8)) is False
+    # Grayscale input is supported as well
+    assert detector.detect_header(_page_with_header()[:, :, 0]) is True
+
+def test_detect_headers_parallel_preserves_order():
+    from processing.services.vision import HeaderDetector
+    blank = np.full((400, 300, 3), 255, dtype=np.uint8)
+    pages = [_page_with_header(), blank, blank, _page_with_header()]
+
+    assert HeaderDetector(max_workers=2).detect_headers(pages) == [True, False, False, True]
+
+def test_process_image_does_not_touch_disk(splitter):
+    scan = np.hstack([np.full((400, 300, 3), 255, dtype=np.uint8), _page_with_header()])
+    with patch('processing.services.splitter.cv2.imread') as imread, \
+         patch('processing.services.splitter.cv2.imwrite', create=True) as imwrite:
+        result = splitter.process_image(scan)
+
+    imread.assert_not_called()
+    imwrite.assert_not_called()
+    assert result['type'] == 'RECTO'
+    assert result['pages']['p1'].shape == (400, 300, 3)
+
+def _make_a3_batch(path, layout):
+    """Writes an A3-landscape PDF; 'R' pages get a header box on the right half."""
+    import fitz
+    doc = fitz.open()
+    for kind in layout:
+        page = doc.new_page(width=1190, height=842)
+        if kind == 'R':
+            page.draw_rect(fitz.Rect(700, 30, 1100, 130), color=(0, 0, 0), fill=(0, 0, 0))
+        page.insert_text((100, 400), kind, fontsize=20)
+    doc.save(str(path))
+    doc.close()
+
+def test_process_scans_reconstructs_booklets(tmp_path):
+    pdf_path = tmp_path / "batch.pdf"
+    _make_a3_batch(pdf_path, ['R', 'V', 'R', 'V'])
+
+    events = list(A3Splitter(max_workers=2).process_scans(str(pdf_path), dpi=40))
+
+    assert [kind for kind, _item in events] == ['booklet', 'booklet']
+    assert [item['source_pages'] for _kind, item in events] == [[0, 1], [2, 3]]
+    pages = events[0][1]['pages']
+    assert len(pages) == 4
+    assert all(isinstance(p, np.ndarray) for p in pages)
+
+def test_process_scans_reports_unpaired_scans(tmp_path):
+    pdf_path = tmp_path / "batch.pdf"
+    _make_a3_batch(pdf_path, ['V', 'R', 'R', 'V', 'R'])
+
+    events = list(A3Splitter(max_workers=2).process_scans(str(pdf_path), dpi=40, window=2))
+
+    assert [(kind, item.get('source_pages', item.get('page_index'))) for kind, item in events] == [
+        ('anomaly', 0),
+        ('anomaly', 1),
+        ('booklet', [2, 3]),
+        ('anomaly', 4),
+    ]
+    assert [item['reason'] for kind, item in events if kind == 'anomaly'] == [
+        'verso_without_recto', 'recto_without_verso', 'recto_without_verso',
+    ]
+
+def test_process_scans_yields_each_booklet_once_paired(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "batch.pdf"
+    _make_a3_batch(pdf_path, ['R', 'V'] * 4)
+    rendered = []
+    iter_pdf_pages = splitter_service.iter_pdf_pages
+
+    def tracking_pages(path, dpi=150):
+        for page_index, image in iter_pdf_pages(path, dpi=dpi):
+            rendered.append(page_index)
+            yield page_index, image
+
+    monkeypatch.setattr(splitter_service, 'iter_pdf_pages', tracking_pages)
+    events = A3Splitter(max_workers=1).process_scans(str(pdf_path), dpi=40, window=1)
+
+    kind, booklet = next(events)
+
+    assert (kind, booklet['source_pages']) == ('booklet', [0, 1])
+    assert rendered == [0, 1]
+    events.close()